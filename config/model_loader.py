@@ -4,6 +4,10 @@ import yaml
 from pathlib import Path
 from typing import List, Dict, Any
 
+from utils.hedging import parse_hedge_policy
+from utils.log_progress import LOG_PARSERS
+from utils.routing import parse_routes
+
 logger = logging.getLogger(__name__)
 
 
@@ -31,7 +35,7 @@ def load_models_config(file_path: str = "models.yaml") -> List[Dict[str, Any]]:
             "Please ensure models.yaml exists at the project root. "
             "The application will attempt to use fallback configuration from secrets.toml."
         )
-        logger.error(f"models.yaml not found at {file_path}. Error: {error_msg}")
+        logger.error("models.yaml not found at %s. Error: %s", file_path, error_msg)
         raise FileNotFoundError(error_msg)
     
     # Parse YAML
@@ -44,7 +48,7 @@ def load_models_config(file_path: str = "models.yaml") -> List[Dict[str, Any]]:
             mark = e.problem_mark
             error_msg += f" at line {mark.line + 1}, column {mark.column + 1}"
         error_msg += f": {str(e)}"
-        logger.error(f"YAML parsing error in {file_path}: {error_msg}", exc_info=True)
+        logger.error("YAML parsing error in %s: %s", file_path, error_msg, exc_info=True)
         raise yaml.YAMLError(error_msg) from e
     
     # Validate root structure
@@ -81,7 +85,7 @@ def load_models_config(file_path: str = "models.yaml") -> List[Dict[str, Any]]:
                 f"Model '{model_name}' (id: {model_id}): Missing required fields: {', '.join(missing_fields)}. "
                 f"Please ensure all models in models.yaml have 'id', 'name', and 'endpoint' fields."
             )
-            logger.error(f"Validation error for model at index {idx + 1}: {error_msg}")
+            logger.error("Validation error for model at index %d: %s", idx + 1, error_msg)
             raise ValueError(error_msg)
         
         # Validate field types
@@ -104,9 +108,16 @@ def load_models_config(file_path: str = "models.yaml") -> List[Dict[str, Any]]:
                 logger.error(error_msg)
                 raise ValueError(error_msg)
         
+        try:
+            _validate_runtime_options(model)
+        except ValueError as e:
+            error_msg = f"Model {idx + 1}: {e}"
+            logger.error(error_msg)
+            raise ValueError(error_msg) from e
+        
         models.append(model)
     
-    logger.info(f"Successfully loaded {len(models)} model(s) from {file_path}")
+    logger.info("Successfully loaded %d model(s) from %s", len(models), file_path)
     return models
 
 
@@ -166,4 +177,30 @@ def validate_model_config(model: Dict[str, Any]) -> bool:
                 f"Field 'default_settings' must be a dictionary, got {type(model['default_settings']).__name__}"
             )
     
+    _validate_runtime_options(model)
+    
     return True
+
+
+def _validate_runtime_options(model: Dict[str, Any]) -> None:
+    """
+    Validate optional fields that tune how predictions run (max_outputs, hedge, routes, log_parser).
+    
+    Raises:
+        ValueError: If a field is present but invalid.
+    """
+    if 'max_outputs' in model:
+        max_outputs = model['max_outputs']
+        if isinstance(max_outputs, bool) or not isinstance(max_outputs, int) or max_outputs < 1:
+            raise ValueError(f"Field 'max_outputs' must be a positive integer, got {max_outputs!r}")
+    
+    if 'hedge' in model:
+        parse_hedge_policy(model['hedge'])
+    
+    if 'routes' in model:
+        parse_routes(model)
+    
+    log_parser = model.get('log_parser')
+    if 'log_parser' in model and (not isinstance(log_parser, str) or log_parser not in LOG_PARSERS):
+        raise ValueError(f"Field 'log_parser' must be one of {', '.join(sorted(LOG_PARSERS))}, "
+                         f"got {log_parser!r}")
@@ -0,0 +1,607 @@
+#!/usr/bin/env python3
+"""
+Local fake of the Replicate HTTP API for offline load and latency testing.
+
+Emulates the parts of the API the app and main.py use: creating predictions
+(by version, model or deployment), polling, canceling, ``Prefer: wait``
+blocking creates, model version lookups and the file delivery URLs that
+outputs point at. Queue delay and processing time are drawn from
+configurable distributions, failures, 500s and 429s can be injected, and
+every output is a small PNG that is deterministic for a given input, so
+repeated runs download identical bytes.
+
+Point the app (or main.py) at it with ``REPLICATE_BASE_URL``; any API token
+is accepted.
+
+Examples:
+    python fake_replicate.py --port 8765
+    python fake_replicate.py --queue-delay exp:0.5 --processing-time lognormal:3:0.4 --failure-rate 0.05
+    python fake_replicate.py --rate-limit-rate 0.1 --retry-after 2 --http-error-rate 0.01
+    REPLICATE_BASE_URL=http://127.0.0.1:8765 REPLICATE_API_TOKEN=fake streamlit run streamlit_app.py
+"""
+import argparse
+import functools
+import hashlib
+import itertools
+import json
+import logging
+import random
+import re
+import sys
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.png_metadata import PNG_SIGNATURE, make_chunk
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8765
+DEFAULT_STEPS = 20
+DEFAULT_MAX_IMAGE_SIZE = 512
+# The real API holds a ``Prefer: wait`` create for at most 60 seconds
+MAX_PREFER_WAIT = 60.0
+MAX_OUTPUTS = 4
+
+_DISTRIBUTION_ARITY = {'fixed': 1, 'uniform': 2, 'normal': 2, 'lognormal': 2, 'exp': 1}
+
+
+@dataclass(frozen=True)
+class Distribution:
+    """
+    A non-negative duration distribution, in seconds.
+
+    Written on the command line as ``kind:params``:
+
+    - ``1.5`` or ``fixed:1.5``: always 1.5
+    - ``uniform:1:3``: uniform between 1 and 3
+    - ``normal:2:0.5``: mean 2, standard deviation 0.5
+    - ``lognormal:2:0.5``: median 2, shape (sigma) 0.5, a long right tail like real GPU queues
+    - ``exp:2``: exponential with mean 2
+
+    Samples below zero are clamped to zero.
+    """
+    kind: str = 'fixed'
+    params: Tuple[float, ...] = (0.0,)
+
+    @classmethod
+    def parse(cls, spec: str) -> "Distribution":
+        """
+        Parse a distribution spec.
+
+        Raises:
+            ValueError: If the kind is unknown or the parameters are wrong.
+        """
+        kind, _, rest = spec.strip().partition(':')
+        if not rest:
+            kind, rest = 'fixed', kind
+        kind = kind.lower()
+        if kind not in _DISTRIBUTION_ARITY:
+            raise ValueError(f"Unknown distribution '{kind}'. Available: {', '.join(_DISTRIBUTION_ARITY)}")
+        try:
+            params = tuple(float(value) for value in rest.split(':'))
+        except ValueError:
+            raise ValueError(f"Distribution parameters must be numbers, got '{spec}'") from None
+        if len(params) != _DISTRIBUTION_ARITY[kind]:
+            raise ValueError(f"'{kind}' takes {_DISTRIBUTION_ARITY[kind]} parameter(s), got '{spec}'")
+        if any(value < 0 for value in params):
+            raise ValueError(f"Distribution parameters must not be negative, got '{spec}'")
+        return cls(kind, params)
+
+    def sample(self, rng: random.Random) -> float:
+        """Draw one duration."""
+        if self.kind == 'fixed':
+            value = self.params[0]
+        elif self.kind == 'uniform':
+            value = rng.uniform(*self.params)
+        elif self.kind == 'normal':
+            value = rng.gauss(*self.params)
+        elif self.kind == 'lognormal':
+            median, sigma = self.params
+            value = median * rng.lognormvariate(0.0, sigma) if median > 0 else 0.0
+        else:
+            value = rng.expovariate(1.0 / self.params[0]) if self.params[0] > 0 else 0.0
+        return max(value, 0.0)
+
+
+@dataclass
+class FakeConfig:
+    """
+    Behavior of the fake API.
+
+    Attributes:
+        queue_delay: Time a prediction stays ``starting`` (waiting for a GPU).
+        processing_time: Time a prediction stays ``processing``.
+        download_delay: Extra latency before a file URL starts responding.
+        failure_rate: Share of predictions that end ``failed``.
+        rate_limit_rate: Share of create requests answered with 429.
+        retry_after: Seconds sent in the 429 ``Retry-After`` header.
+        http_error_rate: Share of API requests answered with 500.
+        max_image_size: Output PNGs are the requested width/height, capped at this.
+        seed: Seed for delays and fault injection; None for a random seed.
+    """
+    queue_delay: Distribution = field(default_factory=Distribution)
+    processing_time: Distribution = field(default_factory=lambda: Distribution('uniform', (1.0, 3.0)))
+    download_delay: Distribution = field(default_factory=Distribution)
+    failure_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after: int = 1
+    http_error_rate: float = 0.0
+    max_image_size: int = DEFAULT_MAX_IMAGE_SIZE
+    seed: Optional[int] = None
+
+    def __post_init__(self):
+        for name in ('failure_rate', 'rate_limit_rate', 'http_error_rate'):
+            if not 0.0 <= getattr(self, name) <= 1.0:
+                raise ValueError(f"{name} must be between 0 and 1, got {getattr(self, name)}")
+        if self.max_image_size < 1:
+            raise ValueError(f"max_image_size must be at least 1, got {self.max_image_size}")
+
+
+@functools.lru_cache(maxsize=256)
+def render_png(key: str, width: int, height: int) -> bytes:
+    """
+    Render a deterministic RGB PNG for ``key``: a vertical gradient whose hue comes from the key's hash.
+
+    Rows are uniform, so even large images compress to a few kilobytes.
+    """
+    digest = hashlib.sha256(key.encode('utf-8')).digest()
+    red, green, blue = digest[0], digest[1], digest[2]
+    rows = []
+    for y in range(height):
+        shade = (y * 255) // max(height - 1, 1)
+        pixel = bytes(((red + shade) % 256, green, (blue + 255 - shade) % 256))
+        rows.append(b'\x00' + pixel * width)
+    header = width.to_bytes(4, 'big') + height.to_bytes(4, 'big') + bytes((8, 2, 0, 0, 0))
+    return b''.join((PNG_SIGNATURE, make_chunk(b'IHDR', header),
+                     make_chunk(b'IDAT', zlib.compress(b''.join(rows), 6)), make_chunk(b'IEND', b'')))
+
+
+def _iso(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+def _positive_int(value: Any, default: int) -> int:
+    if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+        return default
+    return value
+
+
+@dataclass
+class FakePrediction:
+    """
+    One prediction. Its status is derived from the clock, so nothing runs in the background.
+
+    Attributes:
+        created: Monotonic creation time; ``started``/``completed`` follow from the sampled delays.
+        fails: Whether the prediction ends ``failed`` (decided at creation).
+        canceled_at: Monotonic time of a cancel request, if any.
+    """
+    id: str
+    model: str
+    version: str
+    input: Dict[str, Any]
+    created: float
+    created_wall: float
+    started: float
+    completed: float
+    fails: bool = False
+    canceled_at: Optional[float] = None
+
+    def status(self, now: float) -> str:
+        if self.canceled_at is not None:
+            return 'canceled'
+        if now < self.started:
+            return 'starting'
+        if now < self.completed:
+            return 'processing'
+        return 'failed' if self.fails else 'succeeded'
+
+    def logs(self, now: float) -> str:
+        """tqdm-style sampler logs up to ``now``, like a diffusers-based Cog model prints."""
+        end = min(now, self.completed) if self.canceled_at is None else min(now, self.canceled_at, self.completed)
+        if end < self.started:
+            return ""
+        steps = _positive_int(self.input.get('num_inference_steps'), DEFAULT_STEPS)
+        duration = self.completed - self.started
+        done = steps if duration <= 0 else min(int(steps * (end - self.started) / duration), steps)
+        lines = [f"Using seed: {self.input.get('seed', 0)}\n"]
+        for step in range(done + 1):
+            lines.append(f"{step * 100 // steps:3d}%| | {step}/{steps} [00:00<00:00]\r")
+        if done == steps:
+            lines.append("\n")
+        return "".join(lines)
+
+    def outputs(self, base_url: str) -> List[str]:
+        count = min(_positive_int(self.input.get('num_outputs'), 1), MAX_OUTPUTS)
+        return [f"{base_url}/files/{self.id}/{index}.png" for index in range(count)]
+
+    def to_json(self, now: float, base_url: str) -> Dict[str, Any]:
+        status = self.status(now)
+        ended = {'succeeded', 'failed', 'canceled'}
+        completed = self.completed if self.canceled_at is None else self.canceled_at
+        return {
+            'id': self.id,
+            'model': self.model,
+            'version': self.version,
+            'status': status,
+            'input': self.input,
+            'output': self.outputs(base_url) if status == 'succeeded' else None,
+            'logs': self.logs(now),
+            'error': "Injected failure: CUDA out of memory" if status == 'failed' else None,
+            'metrics': {'predict_time': round(self.completed - self.started, 3)} if status == 'succeeded' else {},
+            'created_at': _iso(self.created_wall),
+            'started_at': _iso(self.created_wall + self.started - self.created) if now >= self.started else None,
+            'completed_at': _iso(self.created_wall + completed - self.created) if status in ended else None,
+            'urls': {'get': f"{base_url}/v1/predictions/{self.id}",
+                     'cancel': f"{base_url}/v1/predictions/{self.id}/cancel"},
+        }
+
+
+class FakeReplicate:
+    """
+    In-memory state of the fake API, shared by all request threads.
+
+    Args:
+        config: Delays and fault injection.
+        clock: Monotonic clock (injectable for tests).
+    """
+
+    def __init__(self, config: Optional[FakeConfig] = None, clock=time.monotonic):
+        self.config = config or FakeConfig()
+        self.clock = clock
+        self._rng = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._predictions: Dict[str, FakePrediction] = {}
+        self._stats = {'created': 0, 'canceled': 0, 'rate_limited': 0, 'server_errors': 0,
+                       'unauthorized': 0, 'files_served': 0}
+
+    def roll(self, rate: float) -> bool:
+        """Return True with probability ``rate`` (thread-safe, seeded)."""
+        if rate <= 0:
+            return False
+        with self._lock:
+            return self._rng.random() < rate
+
+    def sample(self, distribution: Distribution) -> float:
+        with self._lock:
+            return distribution.sample(self._rng)
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def create(self, model: str, version: str, model_input: Dict[str, Any]) -> FakePrediction:
+        now = self.clock()
+        with self._lock:
+            queue = self.config.queue_delay.sample(self._rng)
+            processing = self.config.processing_time.sample(self._rng)
+            fails = self.config.failure_rate > 0 and self._rng.random() < self.config.failure_rate
+            prediction_id = f"fake{next(self._ids):06d}"
+            prediction = FakePrediction(id=prediction_id, model=model, version=version, input=model_input,
+                                        created=now, created_wall=time.time(), started=now + queue,
+                                        completed=now + queue + processing, fails=fails)
+            self._predictions[prediction_id] = prediction
+            self._stats['created'] += 1
+        return prediction
+
+    def get(self, prediction_id: str) -> Optional[FakePrediction]:
+        with self._lock:
+            return self._predictions.get(prediction_id)
+
+    def cancel(self, prediction_id: str) -> Optional[FakePrediction]:
+        now = self.clock()
+        with self._lock:
+            prediction = self._predictions.get(prediction_id)
+            if prediction is not None and prediction.status(now) in ('starting', 'processing'):
+                prediction.canceled_at = now
+                self._stats['canceled'] += 1
+        return prediction
+
+    def stats(self) -> Dict[str, Any]:
+        """Return request counters and predictions per status."""
+        now = self.clock()
+        with self._lock:
+            statuses: Dict[str, int] = {}
+            for prediction in self._predictions.values():
+                status = prediction.status(now)
+                statuses[status] = statuses.get(status, 0) + 1
+            return dict(self._stats, statuses=statuses)
+
+
+_ROUTES = [
+    ('POST', re.compile(r'^/v1/predictions$'), 'create_version'),
+    ('POST', re.compile(r'^/v1/models/([^/]+)/([^/]+)/predictions$'), 'create_model'),
+    ('POST', re.compile(r'^/v1/deployments/([^/]+)/([^/]+)/predictions$'), 'create_deployment'),
+    ('GET', re.compile(r'^/v1/predictions/([^/]+)$'), 'get_prediction'),
+    ('POST', re.compile(r'^/v1/predictions/([^/]+)/cancel$'), 'cancel_prediction'),
+    ('GET', re.compile(r'^/v1/models/([^/]+)/([^/]+)/versions/([^/]+)$'), 'get_version'),
+    ('GET', re.compile(r'^/files/([^/]+)/(\d+)\.png$'), 'get_file'),
+    ('GET', re.compile(r'^/_fake/stats$'), 'get_stats'),
+]
+
+
+class FakeReplicateHandler(BaseHTTPRequestHandler):
+    """HTTP handler; ``self.server.state`` is the shared FakeReplicate."""
+
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def state(self) -> FakeReplicate:
+        return self.server.state
+
+    @property
+    def base_url(self) -> str:
+        host = self.headers.get('Host')
+        return f"http://{host}" if host else self.server.base_url
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug("%s %s", self.address_string(), format % args)
+
+    def do_GET(self) -> None:
+        self._dispatch('GET')
+
+    def do_POST(self) -> None:
+        self._dispatch('POST')
+
+    def _dispatch(self, method: str) -> None:
+        path = self.path.split('?', 1)[0]
+        if self.server.stopped:
+            # Keep-alive connections outlive shutdown(); refuse them like a server that has gone away
+            self.close_connection = True
+            self._read_body()
+            self._send_json(503, {'title': "Unavailable", 'detail': "Fake server stopped", 'status': 503},
+                            headers={'Connection': 'close'})
+            return
+        for route_method, pattern, name in _ROUTES:
+            match = pattern.match(path)
+            if match and route_method == method:
+                break
+        else:
+            self._read_body()
+            self._send_json(404, {'title': "Not found", 'detail': f"No route for {method} {path}", 'status': 404})
+            return
+        body = self._read_body()
+        if path.startswith('/v1/'):
+            if not self.headers.get('Authorization'):
+                self.state.count('unauthorized')
+                self._send_json(401, {'title': "Unauthenticated",
+                                      'detail': "You did not pass an authentication token", 'status': 401})
+                return
+            if self.state.roll(self.state.config.http_error_rate):
+                self.state.count('server_errors')
+                self._send_json(500, {'title': "Internal server error", 'detail': "Injected server error",
+                                      'status': 500})
+                return
+        try:
+            getattr(self, name)(*match.groups(), body=body)
+        except ValueError as e:
+            self._send_json(422, {'title': "Invalid input", 'detail': str(e), 'status': 422})
+
+    def _read_body(self) -> Dict[str, Any]:
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        raw = self.rfile.read(length)
+        try:
+            body = json.loads(raw)
+        except json.JSONDecodeError:
+            return {}
+        return body if isinstance(body, dict) else {}
+
+    def _send_json(self, status: int, payload: Any, headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _prefer_wait(self) -> Optional[float]:
+        prefer = self.headers.get('Prefer', '')
+        match = re.search(r'\bwait(?:=(\d+))?\b', prefer)
+        if not match:
+            return None
+        return min(float(match.group(1)) if match.group(1) else MAX_PREFER_WAIT, MAX_PREFER_WAIT)
+
+    def _create(self, model: str, version: str, body: Dict[str, Any]) -> None:
+        config = self.state.config
+        if self.state.roll(config.rate_limit_rate):
+            self.state.count('rate_limited')
+            self._send_json(429, {'title': "Too many requests",
+                                  'detail': "Request was throttled. Expected available in 1 second.", 'status': 429},
+                            headers={'Retry-After': str(config.retry_after)})
+            return
+        model_input = body.get('input')
+        if not isinstance(model_input, dict):
+            raise ValueError("'input' must be an object")
+        prediction = self.state.create(model, version, model_input)
+        wait = self._prefer_wait()
+        if wait is not None:
+            deadline = prediction.created + wait
+            while prediction.status(self.state.clock()) in ('starting', 'processing'):
+                remaining = min(prediction.completed, deadline) - self.state.clock()
+                if remaining <= 0:
+                    break
+                time.sleep(min(remaining, 0.05))
+        payload = prediction.to_json(self.state.clock(), self.base_url)
+        if wait is not None and payload['status'] == 'processing':
+            # Like the real API, a create that outlives its wait reports "starting" so clients poll
+            payload['status'] = 'starting'
+        self._send_json(201, payload)
+
+    def create_version(self, body: Dict[str, Any]) -> None:
+        version = body.get('version')
+        if not isinstance(version, str) or not version:
+            raise ValueError("'version' is required")
+        model, _, version_id = version.rpartition(':')
+        self._create(model or "fake/model", version_id, body)
+
+    def create_model(self, owner: str, name: str, body: Dict[str, Any]) -> None:
+        self._create(f"{owner}/{name}", "latest", body)
+
+    def create_deployment(self, owner: str, name: str, body: Dict[str, Any]) -> None:
+        self._create(f"{owner}/{name}", "deployment", body)
+
+    def get_prediction(self, prediction_id: str, body: Dict[str, Any]) -> None:
+        prediction = self.state.get(prediction_id)
+        if prediction is None:
+            self._send_json(404, {'title': "Not found", 'detail': "Prediction not found", 'status': 404})
+            return
+        self._send_json(200, prediction.to_json(self.state.clock(), self.base_url))
+
+    def cancel_prediction(self, prediction_id: str, body: Dict[str, Any]) -> None:
+        prediction = self.state.cancel(prediction_id)
+        if prediction is None:
+            self._send_json(404, {'title': "Not found", 'detail': "Prediction not found", 'status': 404})
+            return
+        self._send_json(200, prediction.to_json(self.state.clock(), self.base_url))
+
+    def get_version(self, owner: str, name: str, version_id: str, body: Dict[str, Any]) -> None:
+        self._send_json(200, {
+            'id': version_id,
+            'created_at': _iso(0),
+            'cog_version': "0.9.0",
+            'openapi_schema': {'components': {'schemas': {
+                'Output': {'type': 'array', 'items': {'type': 'string', 'format': 'uri'}},
+            }}},
+        })
+
+    def get_file(self, prediction_id: str, index: str, body: Dict[str, Any]) -> None:
+        prediction = self.state.get(prediction_id)
+        if prediction is None or prediction.status(self.state.clock()) != 'succeeded':
+            self._send_json(404, {'title': "Not found", 'detail': "File not found", 'status': 404})
+            return
+        delay = self.state.sample(self.state.config.download_delay)
+        if delay:
+            time.sleep(delay)
+        limit = self.state.config.max_image_size
+        width = min(_positive_int(prediction.input.get('width'), limit), limit)
+        height = min(_positive_int(prediction.input.get('height'), limit), limit)
+        # Keyed by input and output index, so the same request always downloads the same bytes
+        key = json.dumps([prediction.version, prediction.input, int(index)], sort_keys=True, default=str)
+        data = render_png(key, width, height)
+        self.state.count('files_served')
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def get_stats(self, body: Dict[str, Any]) -> None:
+        self._send_json(200, self.state.stats())
+
+
+class FakeReplicateServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server for the fake API; usable as a context manager that serves in a background thread.
+
+    Args:
+        config: Delays and fault injection.
+        host: Interface to bind.
+        port: Port to bind; 0 picks a free port.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, config: Optional[FakeConfig] = None, host: str = "127.0.0.1", port: int = DEFAULT_PORT):
+        super().__init__((host, port), FakeReplicateHandler)
+        self.state = FakeReplicate(config)
+        self._thread: Optional[threading.Thread] = None
+        self.stopped = False
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeReplicateServer":
+        """Serve in a daemon thread."""
+        self._thread = threading.Thread(target=self.serve_forever, args=(0.1,), name="fake-replicate", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving and close the socket."""
+        self.stopped = True
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "FakeReplicateServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+
+def _distribution(spec: str) -> Distribution:
+    try:
+        return Distribution.parse(spec)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the command-line parser."""
+    parser = argparse.ArgumentParser(prog="fake_replicate.py", description="Local fake Replicate API server.")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port to bind (default: {DEFAULT_PORT})")
+    parser.add_argument("--queue-delay", type=_distribution, default=Distribution(), metavar="DIST",
+                        help="Time predictions wait in 'starting', e.g. 0.5, uniform:0:2, exp:1 (default: 0)")
+    parser.add_argument("--processing-time", type=_distribution, default=Distribution('uniform', (1.0, 3.0)),
+                        metavar="DIST", help="Time predictions spend 'processing', e.g. lognormal:3:0.4 "
+                                             "(default: uniform:1:3)")
+    parser.add_argument("--download-delay", type=_distribution, default=Distribution(), metavar="DIST",
+                        help="Latency before a file download starts (default: 0)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of predictions that fail (0-1)")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0,
+                        help="Share of create requests answered with 429 (0-1)")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429s (default: 1)")
+    parser.add_argument("--http-error-rate", type=float, default=0.0,
+                        help="Share of API requests answered with 500 (0-1)")
+    parser.add_argument("--max-image-size", type=int, default=DEFAULT_MAX_IMAGE_SIZE,
+                        help=f"Cap on output PNG width/height (default: {DEFAULT_MAX_IMAGE_SIZE})")
+    parser.add_argument("--seed", type=int, help="Seed for delays and fault injection (default: random)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log every request")
+    return parser
+
+
+def config_from_args(args: argparse.Namespace) -> FakeConfig:
+    """Build the server configuration from parsed arguments."""
+    return FakeConfig(queue_delay=args.queue_delay, processing_time=args.processing_time,
+                      download_delay=args.download_delay, failure_rate=args.failure_rate,
+                      rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after,
+                      http_error_rate=args.http_error_rate, max_image_size=args.max_image_size, seed=args.seed)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Entry point for the fake server."""
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    try:
+        server = FakeReplicateServer(config_from_args(args), host=args.host, port=args.port)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    print(f"Fake Replicate API on {server.base_url} (point the app at it with REPLICATE_BASE_URL={server.base_url})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
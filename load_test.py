@@ -0,0 +1,547 @@
+#!/usr/bin/env python3
+"""
+Multi-session load test for the Streamlit app.
+
+Runs N simulated browser sessions concurrently in one process, the way a
+single Streamlit server runs one script thread per session. Each session
+drives the real ``streamlit_app.py`` through ``streamlit.testing.v1.AppTest``
+along scripted journeys (open, select a model, tweak settings, submit,
+download) against a local fake Replicate API (see fake_replicate.py), and
+the run is summarized as a JSON report for trend tracking: rerun latency
+percentiles, throughput, memory per session and error rates.
+
+Examples:
+    python load_test.py --sessions 8 --iterations 3
+    python load_test.py --sessions 32 --duration 120 --ramp-up 10 --output reports/load.json
+    python load_test.py --journeys journeys.json --processing-time lognormal:3:0.4 --rate-limit-rate 0.05
+    python load_test.py --base-url http://127.0.0.1:8765 --sessions 4
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import requests
+
+from fake_replicate import Distribution, FakeConfig, FakeReplicateServer
+from utils.image_store import output_url
+
+logger = logging.getLogger(__name__)
+
+APP_PATH = Path(__file__).resolve().parent / "streamlit_app.py"
+DEFAULT_TIMEOUT = 120.0
+PERCENTILES = (50, 90, 95, 99)
+# Widget kinds searched, in order, when a journey step sets a widget by key
+_WIDGET_KINDS = ('number_input', 'slider', 'selectbox', 'text_area', 'text_input', 'checkbox', 'multiselect')
+_SUBMIT_KEY = "FormSubmitter:my_form-Submit"
+
+# Built-in journeys; a journeys file uses the same shape
+JOURNEYS: Dict[str, List[Dict[str, Any]]] = {
+    'generate': [
+        {'action': 'open'},
+        {'action': 'prompt', 'text': "a red fox in the snow, session {session} run {iteration}"},
+        {'action': 'submit'},
+        {'action': 'download'},
+    ],
+    'tweak-and-generate': [
+        {'action': 'open'},
+        {'action': 'select_model'},
+        {'action': 'set', 'key': 'form_num_inference_steps', 'value': 20},
+        {'action': 'set', 'key': 'form_num_outputs', 'value': 2},
+        {'action': 'prompt', 'text': "a lighthouse at dusk, session {session} run {iteration}"},
+        {'action': 'submit'},
+        {'action': 'download'},
+    ],
+    'browse': [
+        {'action': 'open'},
+        {'action': 'select_model'},
+        {'action': 'think', 'seconds': 0.5},
+        {'action': 'select_model'},
+    ],
+}
+ACTIONS = ('open', 'select_model', 'set', 'prompt', 'submit', 'download', 'think')
+
+
+def parse_journeys(data: Any) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Validate journeys loaded from JSON: a mapping of name to a list of steps.
+
+    Each step is an object with an ``action`` (one of ACTIONS) and its
+    parameters: ``select_model`` takes an optional ``model`` name (the next
+    model in the list otherwise), ``set`` takes a widget ``key`` and
+    ``value``, ``prompt`` takes ``text`` (``{session}`` and ``{iteration}``
+    are filled in) and ``think`` takes ``seconds``.
+
+    Raises:
+        ValueError: If the journeys are malformed.
+    """
+    if not isinstance(data, dict) or not data:
+        raise ValueError("Journeys must be a non-empty mapping of name to steps")
+    for name, steps in data.items():
+        if not isinstance(steps, list) or not steps:
+            raise ValueError(f"Journey '{name}' must be a non-empty list of steps")
+        for idx, step in enumerate(steps, 1):
+            action = step.get('action') if isinstance(step, dict) else None
+            if action not in ACTIONS:
+                raise ValueError(f"Journey '{name}' step {idx}: unknown action {action!r}. "
+                                 f"Available: {', '.join(ACTIONS)}")
+            if action == 'set' and not ('key' in step and 'value' in step):
+                raise ValueError(f"Journey '{name}' step {idx}: 'set' needs 'key' and 'value'")
+            if action == 'prompt' and not isinstance(step.get('text'), str):
+                raise ValueError(f"Journey '{name}' step {idx}: 'prompt' needs 'text'")
+        if steps[0]['action'] != 'open':
+            raise ValueError(f"Journey '{name}' must start with 'open'")
+    return data
+
+
+def percentiles(values: Sequence[float], points: Sequence[int] = PERCENTILES) -> Dict[str, Any]:
+    """
+    Summarize samples with nearest-rank percentiles.
+
+    Returns:
+        count, mean, max and ``p<N>`` for each point; only count when empty.
+    """
+    if not values:
+        return {'count': 0}
+    ordered = sorted(values)
+    summary: Dict[str, Any] = {'count': len(ordered), 'mean': round(sum(ordered) / len(ordered), 4)}
+    for point in points:
+        rank = max(int(-(-point * len(ordered) // 100)), 1)
+        summary[f"p{point}"] = round(ordered[rank - 1], 4)
+    summary['max'] = round(ordered[-1], 4)
+    return summary
+
+
+def _rss_mb() -> float:
+    """Current resident set size of this process in MB (peak RSS where /proc is unavailable)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is in KB on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def deep_size(obj: Any, seen: Optional[set] = None) -> int:
+    """Approximate bytes held by ``obj`` and everything it references (containers and instance dicts)."""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj, 0)
+    if isinstance(obj, dict):
+        size += sum(deep_size(key, seen) + deep_size(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_size(item, seen) for item in obj)
+    elif hasattr(obj, '__dict__') and not isinstance(obj, type):
+        size += deep_size(vars(obj), seen)
+    return size
+
+
+@dataclass
+class LoadMetrics:
+    """Thread-safe sample collector shared by all simulated sessions."""
+    reruns: Dict[str, List[float]] = field(default_factory=lambda: defaultdict(list))
+    downloads: List[float] = field(default_factory=list)
+    download_bytes: int = 0
+    journeys: int = 0
+    generations: int = 0
+    steps: int = 0
+    errors: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    error_samples: List[str] = field(default_factory=list)
+    session_state_bytes: List[int] = field(default_factory=list)
+    rss_samples: List[float] = field(default_factory=list)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def rerun(self, action: str, seconds: float) -> None:
+        with self.lock:
+            self.reruns[action].append(seconds)
+
+    def error(self, kind: str, message: str) -> None:
+        with self.lock:
+            self.errors[kind] += 1
+            if len(self.error_samples) < 10:
+                self.error_samples.append(f"{kind}: {message[:300]}")
+
+    def add(self, name: str, amount: int = 1) -> None:
+        with self.lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+
+class SimulatedSession:
+    """
+    One simulated user: a fresh AppTest per journey, like a new browser tab.
+
+    Args:
+        index: Session number, used in prompts and to vary model choice.
+        metrics: Shared collector.
+        timeout: Per-rerun timeout in seconds.
+    """
+
+    def __init__(self, index: int, metrics: LoadMetrics, app_path: Path = APP_PATH,
+                 timeout: float = DEFAULT_TIMEOUT):
+        self.index = index
+        self.metrics = metrics
+        self.app_path = app_path
+        self.timeout = timeout
+        self.app = None
+        self.iteration = 0
+        self._model_turn = index
+
+    def run_journey(self, name: str, steps: List[Dict[str, Any]]) -> bool:
+        """Run one journey; returns False if a step failed (the rest of the journey is skipped)."""
+        for step in steps:
+            self.metrics.add('steps')
+            try:
+                if not self._step(step):
+                    return False
+            except Exception as e:
+                kind = 'timeout' if 'timed out' in str(e).lower() else 'exception'
+                self.metrics.error(kind, f"{name}/{step['action']}: {type(e).__name__}: {e}")
+                return False
+        self.metrics.add('journeys')
+        self._record_session_state()
+        self.iteration += 1
+        return True
+
+    def _rerun(self, action: str, trigger) -> None:
+        started = time.perf_counter()
+        trigger()
+        self.metrics.rerun(action, time.perf_counter() - started)
+
+    def _step(self, step: Dict[str, Any]) -> bool:
+        action = step['action']
+        if action == 'open':
+            from streamlit.testing.v1 import AppTest
+            self.app = AppTest.from_file(str(self.app_path), default_timeout=self.timeout)
+            self._rerun(action, self.app.run)
+        elif action == 'select_model':
+            selector = self.app.selectbox(key="model_selector")
+            model = step.get('model')
+            if model is None:
+                self._model_turn += 1
+                model = selector.options[self._model_turn % len(selector.options)]
+            self._rerun(action, selector.select(model).run)
+        elif action == 'set':
+            self._widget(step['key']).set_value(step['value'])
+        elif action == 'prompt':
+            text = step['text'].format(session=self.index, iteration=self.iteration)
+            self.app.text_area(key="form_prompt").input(text)
+        elif action == 'submit':
+            self._rerun(action, self.app.button(key=_SUBMIT_KEY).click().run)
+            self.metrics.add('generations')
+            return self._check_app()
+        elif action == 'download':
+            return self._download()
+        elif action == 'think':
+            time.sleep(float(step.get('seconds', 1.0)))
+        return self._check_app() if action in ('open', 'select_model') else True
+
+    def _widget(self, key: str):
+        for kind in _WIDGET_KINDS:
+            try:
+                return getattr(self.app, kind)(key=key)
+            except KeyError:
+                continue
+        raise KeyError(f"No widget with key '{key}'")
+
+    def _check_app(self) -> bool:
+        if self.app.exception:
+            self.metrics.error('exception', str(self.app.exception[0].value))
+            return False
+        if self.app.error:
+            self.metrics.error('app_error', str(self.app.error[0].value).splitlines()[0])
+            return False
+        return True
+
+    def _download(self) -> bool:
+        images = self.app.session_state['generated_image'] if 'generated_image' in self.app.session_state else []
+        if not images:
+            self.metrics.error('download', "No generated images to download")
+            return False
+        for image in images:
+            started = time.perf_counter()
+            response = requests.get(output_url(image), timeout=self.timeout)
+            elapsed = time.perf_counter() - started
+            if response.status_code != 200:
+                self.metrics.error('download', f"HTTP {response.status_code} for {output_url(image)}")
+                return False
+            with self.metrics.lock:
+                self.metrics.downloads.append(elapsed)
+                self.metrics.download_bytes += len(response.content)
+        return True
+
+    def _record_session_state(self) -> None:
+        state = self.app.session_state
+        size = sum(deep_size(state[key]) for key in state.keys())
+        with self.metrics.lock:
+            self.metrics.session_state_bytes.append(size)
+
+
+@contextlib.contextmanager
+def _environment(values: Dict[str, str]) -> Iterator[None]:
+    """Set environment variables for the run and restore them afterwards."""
+    saved = {key: os.environ.get(key) for key in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+def _reset_replicate_client() -> None:
+    """Drop the default replicate client's HTTP client so REPLICATE_BASE_URL is read again."""
+    import replicate
+
+    # The default client builds its HTTP client (and base URL) once, on first use
+    vars(replicate.default_client).pop('_Client__client', None)
+
+
+def _monitor_rss(metrics: LoadMetrics, stop: threading.Event, interval: float = 0.25) -> None:
+    while not stop.wait(interval):
+        rss = _rss_mb()
+        with metrics.lock:
+            metrics.rss_samples.append(rss)
+
+
+def run_load_test(journeys: Dict[str, List[Dict[str, Any]]], sessions: int = 4, iterations: int = 1,
+                  duration: Optional[float] = None, ramp_up: float = 0.0, base_url: Optional[str] = None,
+                  fake_config: Optional[FakeConfig] = None, app_path: Path = APP_PATH,
+                  timeout: float = DEFAULT_TIMEOUT, seed: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Run the load test and build its report.
+
+    Sessions start ``ramp_up / sessions`` seconds apart and pick journeys
+    round-robin (offset by session, so every journey runs from the start).
+    Each session runs ``iterations`` journeys, or keeps going until
+    ``duration`` seconds have passed when given.
+
+    Args:
+        journeys: Journeys by name (see parse_journeys).
+        sessions: Concurrent simulated sessions.
+        iterations: Journeys per session when ``duration`` is None.
+        duration: Run for this many seconds instead of a fixed number of iterations.
+        ramp_up: Seconds over which sessions are started.
+        base_url: Replicate API to target; an in-process fake server is started when None.
+        fake_config: Configuration of the in-process fake server.
+        app_path: Streamlit script to drive.
+        timeout: Per-rerun timeout in seconds.
+        seed: Seed for journey order.
+
+    Returns:
+        The JSON-serializable report.
+    """
+    import streamlit as st
+    from streamlit.testing.v1.util import patch_config_options
+
+    if sessions < 1:
+        raise ValueError(f"sessions must be at least 1, got {sessions}")
+    metrics = LoadMetrics()
+    names = sorted(journeys)
+    random.Random(seed).shuffle(names)
+    server = None
+    if base_url is None:
+        server = FakeReplicateServer(fake_config or FakeConfig(), port=0).start()
+        base_url = server.base_url
+    store_dir = tempfile.TemporaryDirectory(prefix="load-test-")
+    env = {
+        'REPLICATE_BASE_URL': base_url,
+        'REPLICATE_API_TOKEN': os.environ.get('REPLICATE_API_TOKEN') or "r8_load_test",
+        # AppTest gives every session the same id, so superseding would cancel other simulated users' predictions
+        'CANCEL_SUPERSEDED': "false",
+        'IMAGE_STORE_DIR': os.environ.get('IMAGE_STORE_DIR') or store_dir.name,
+        'TRACE_PATH': os.environ.get('TRACE_PATH') or os.path.join(store_dir.name, "spans.jsonl"),
+        'REQUEST_LOG_PATH': os.environ.get('REQUEST_LOG_PATH') or os.path.join(store_dir.name, "requests.jsonl"),
+        # The simulated pods share this process's root logger with the CLI's own log output
+        'LOG_FORMAT': os.environ.get('LOG_FORMAT') or "none",
+    }
+    deadline = None
+    # Start from a fresh "pod": no limiter, persister or telemetry left over from an earlier run in this process
+    st.cache_resource.clear()
+    _reset_replicate_client()
+    try:
+        # AppTest toggles this option around every run; holding it on keeps concurrent runs from racing
+        with _environment(env), patch_config_options({'global.appTest': True}):
+            # Warm up imports and process-wide caches so they are not charged to the first sessions
+            SimulatedSession(-1, LoadMetrics(), app_path, timeout).run_journey('warm-up', [{'action': 'open'}])
+            rss_baseline = _rss_mb()
+            stop = threading.Event()
+            monitor = threading.Thread(target=_monitor_rss, args=(metrics, stop), daemon=True)
+            monitor.start()
+            started = time.perf_counter()
+            deadline = started + duration if duration else None
+
+            def session_loop(index: int) -> None:
+                session = SimulatedSession(index, metrics, app_path, timeout)
+                turn = index
+                while True:
+                    if deadline is not None and time.perf_counter() >= deadline:
+                        break
+                    if deadline is None and session.iteration >= iterations:
+                        break
+                    name = names[turn % len(names)]
+                    turn += 1
+                    if not session.run_journey(name, journeys[name]):
+                        session.iteration += 1
+
+            threads = []
+            for index in range(sessions):
+                thread = threading.Thread(target=session_loop, args=(index,), name=f"load-session-{index}")
+                thread.start()
+                threads.append(thread)
+                if ramp_up and index < sessions - 1:
+                    time.sleep(ramp_up / sessions)
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+            stop.set()
+            monitor.join()
+            rss_end = _rss_mb()
+    finally:
+        fake_stats = server.state.stats() if server is not None else None
+        if server is not None:
+            server.stop()
+        st.cache_resource.clear()
+        _reset_replicate_client()
+        store_dir.cleanup()
+
+    all_reruns = [seconds for samples in metrics.reruns.values() for seconds in samples]
+    rss_peak = max(metrics.rss_samples + [rss_end])
+    errors = sum(metrics.errors.values())
+    return {
+        'config': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'sessions': sessions,
+            'iterations': None if duration else iterations,
+            'duration': duration,
+            'ramp_up': ramp_up,
+            'journeys': names,
+            'base_url': base_url if server is None else "in-process fake",
+            'fake_server': _describe_fake(fake_config) if server is not None else None,
+        },
+        'elapsed_seconds': round(elapsed, 3),
+        'reruns': percentiles(all_reruns),
+        'reruns_by_action': {action: percentiles(samples) for action, samples in sorted(metrics.reruns.items())},
+        'downloads': {**percentiles(metrics.downloads), 'bytes': metrics.download_bytes},
+        'throughput': {
+            'journeys_per_minute': round(metrics.journeys * 60 / elapsed, 2),
+            'generations_per_minute': round(metrics.generations * 60 / elapsed, 2),
+            'reruns_per_second': round(len(all_reruns) / elapsed, 3),
+        },
+        'errors': {
+            'count': errors,
+            'rate': round(errors / metrics.steps, 4) if metrics.steps else 0.0,
+            'journeys_completed': metrics.journeys,
+            'by_type': dict(metrics.errors),
+            'samples': metrics.error_samples,
+        },
+        'memory': {
+            'rss_baseline_mb': round(rss_baseline, 1),
+            'rss_peak_mb': round(rss_peak, 1),
+            'rss_end_mb': round(rss_end, 1),
+            'per_session_mb': round(max(rss_peak - rss_baseline, 0.0) / sessions, 2),
+            'session_state_kb': {key: round(value / 1024, 1) if key != 'count' else value
+                                 for key, value in percentiles(metrics.session_state_bytes, (50, 95)).items()},
+        },
+        'fake_server': fake_stats,
+    }
+
+
+def _describe_fake(config: Optional[FakeConfig]) -> Dict[str, Any]:
+    config = config or FakeConfig()
+    return {
+        'queue_delay': f"{config.queue_delay.kind}:{':'.join(str(p) for p in config.queue_delay.params)}",
+        'processing_time': f"{config.processing_time.kind}:{':'.join(str(p) for p in config.processing_time.params)}",
+        'failure_rate': config.failure_rate,
+        'rate_limit_rate': config.rate_limit_rate,
+        'http_error_rate': config.http_error_rate,
+    }
+
+
+def _distribution(spec: str) -> Distribution:
+    try:
+        return Distribution.parse(spec)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the command-line parser."""
+    parser = argparse.ArgumentParser(prog="load_test.py", description="Multi-session load test for the Streamlit app.")
+    parser.add_argument("--sessions", type=int, default=4, help="Concurrent simulated sessions (default: 4)")
+    parser.add_argument("--iterations", type=int, default=1, help="Journeys per session (default: 1)")
+    parser.add_argument("--duration", type=float, help="Run for this many seconds instead of --iterations")
+    parser.add_argument("--ramp-up", type=float, default=0.0, help="Seconds over which sessions start (default: 0)")
+    parser.add_argument("--journey", action="append", dest="journey_names", metavar="NAME",
+                        help=f"Journey to run (repeatable; default: all). Built in: {', '.join(JOURNEYS)}")
+    parser.add_argument("--journeys", help="JSON file of journeys, replacing the built-in ones")
+    parser.add_argument("--base-url", help="Target an already running (fake) Replicate API instead of an in-process one")
+    parser.add_argument("--queue-delay", type=_distribution, default=Distribution(), metavar="DIST",
+                        help="In-process fake: time in 'starting' (default: 0)")
+    parser.add_argument("--processing-time", type=_distribution, default=Distribution('uniform', (1.0, 3.0)),
+                        metavar="DIST", help="In-process fake: time in 'processing' (default: uniform:1:3)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="In-process fake: share of failed predictions")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="In-process fake: share of 429 creates")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help=f"Per-rerun timeout in seconds (default: {DEFAULT_TIMEOUT:g})")
+    parser.add_argument("--seed", type=int, help="Seed for the fake server and journey order")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Show app and Streamlit logs")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Entry point for the load test."""
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.ERROR,
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if not args.verbose:
+        # Rerun warnings from every simulated session drown the report
+        from streamlit import config as st_config
+        from streamlit.logger import set_log_level
+        st_config.set_option("logger.level", "error")
+        set_log_level("error")
+    try:
+        journeys = parse_journeys(json.loads(Path(args.journeys).read_text())) if args.journeys else JOURNEYS
+        if args.journey_names:
+            unknown = set(args.journey_names) - set(journeys)
+            if unknown:
+                raise ValueError(f"Unknown journey(s): {', '.join(sorted(unknown))}")
+            journeys = {name: journeys[name] for name in args.journey_names}
+        fake_config = FakeConfig(queue_delay=args.queue_delay, processing_time=args.processing_time,
+                                 failure_rate=args.failure_rate, rate_limit_rate=args.rate_limit_rate, seed=args.seed)
+        report = run_load_test(journeys, sessions=args.sessions, iterations=args.iterations, duration=args.duration,
+                               ramp_up=args.ramp_up, base_url=args.base_url, fake_config=fake_config,
+                               timeout=args.timeout, seed=args.seed)
+    except (FileNotFoundError, ValueError, json.JSONDecodeError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(text + "\n")
+        print(f"Report written to {args.output}")
+    else:
+        print(text)
+    return 1 if report['errors']['count'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,312 @@
-def main():
-    print("Hello from streamlit-replicate-boss!")
+#!/usr/bin/env python3
+"""
+Headless command-line runner for image generation.
+
+Uses the same models.yaml/presets.yaml configuration, preset and trigger-word
+handling and batch scheduler as the Streamlit app, without a browser or the
+Streamlit server in the loop.
+
+Examples:
+    python main.py generate --prompt "a red fox" --model sdxl --output-dir out
+    python main.py generate --file prompts.jsonl --concurrency 8 --output-dir out
+    python main.py generate --prompt "a fox" --set seed=42 --set num_inference_steps=30
+    python main.py generate --prompt "a {red|arctic} fox in __seasons__" --max-combinations 50
+    python main.py report --log logs/requests.jsonl --top 20
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import yaml
+
+from config.model_loader import load_models_config
+from utils.archive_export import build_manifest
+from utils.batch import (
+    DEFAULT_MAX_CONCURRENCY,
+    BatchCheckpoint,
+    BatchJob,
+    BatchProgress,
+    BatchResult,
+    BatchRow,
+    detect_batch_format,
+    format_eta,
+    iter_batch_rows,
+    plan_jobs,
+    run_batch,
+)
+from utils.image_store import output_urls
+from utils.persister import http_fetch, is_remote_url
+from utils.png_metadata import build_metadata_chunks, find_iend_offset_in_file, generation_metadata, iter_file_with_chunks
+from utils.preset_manager import load_presets_config
+from utils.request_log import DEFAULT_REQUEST_LOG_PATH, DEFAULT_TOP, RequestLogReport, archive_paths, iter_request_log
+from utils.routing import Route, Router, model_routes, run_deployment
+from utils.prompt_template import (
+    DEFAULT_MAX_COMBINATIONS,
+    DEFAULT_WORDLIST_DIR,
+    WordlistLoader,
+    count_expanded,
+    expand_rows,
+)
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_NAME = "checkpoint.jsonl"
+RESULTS_NAME = "results.jsonl"
+MANIFEST_NAME = "manifest.json"
+
+
+def parse_setting(text: str) -> tuple[str, Any]:
+    """
+    Parse a ``key=value`` setting override; values are read as YAML scalars.
+
+    Raises:
+        argparse.ArgumentTypeError: If the text has no '='.
+    """
+    key, sep, value = text.partition('=')
+    if not sep or not key.strip():
+        raise argparse.ArgumentTypeError(f"Expected KEY=VALUE, got '{text}'")
+    return key.strip(), yaml.safe_load(value) if value.strip() else value
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the command-line parser."""
+    parser = argparse.ArgumentParser(prog="main.py", description="Headless Replicate image generation runner.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate = subparsers.add_parser("generate", help="Generate images from prompts or a JSONL/CSV batch file")
+    source = generate.add_mutually_exclusive_group(required=True)
+    source.add_argument("--prompt", action="append", help="Prompt to generate (repeatable)")
+    source.add_argument("--file", help="JSONL or CSV batch file (same format as the app's batch mode)")
+    generate.add_argument("--model", help="Model id from models.yaml (default: the default model)")
+    generate.add_argument("--preset", help="Preset id (default: the model's default preset)")
+    generate.add_argument("--no-preset", action="store_true", help="Do not apply presets or trigger words")
+    generate.add_argument("--negative-prompt", help="Negative prompt for --prompt runs")
+    generate.add_argument("--set", dest="settings", action="append", type=parse_setting, default=[],
+                          metavar="KEY=VALUE", help="Setting override, e.g. --set num_inference_steps=30 (repeatable)")
+    generate.add_argument("--output-dir", default="outputs", help="Directory for images and results (default: outputs)")
+    generate.add_argument("--concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY,
+                          help=f"Maximum predictions in flight (default: {DEFAULT_MAX_CONCURRENCY})")
+    generate.add_argument("--models", default="models.yaml", help="Path to models.yaml")
+    generate.add_argument("--presets", default="presets.yaml", help="Path to presets.yaml")
+    generate.add_argument("--wordlists", default=DEFAULT_WORDLIST_DIR,
+                          help=f"Directory of __name__ wordlist files (default: {DEFAULT_WORDLIST_DIR})")
+    generate.add_argument("--max-combinations", type=int, default=DEFAULT_MAX_COMBINATIONS,
+                          help=f"Maximum prompts expanded from one template (default: {DEFAULT_MAX_COMBINATIONS})")
+    generate.add_argument("--base-url", default=os.environ.get("REPLICATE_BASE_URL"),
+                          help="Replicate API base URL, e.g. a local fake server (default: $REPLICATE_BASE_URL)")
+    generate.add_argument("--no-resume", action="store_true", help="Ignore the checkpoint and rerun every prompt")
+    generate.add_argument("-v", "--verbose", action="store_true", help="Enable debug logging")
+
+    report = subparsers.add_parser("report", help="Summarize the app's request log, rotated archives included")
+    report.add_argument("--log", default=DEFAULT_REQUEST_LOG_PATH,
+                        help=f"Request log written by the app (default: {DEFAULT_REQUEST_LOG_PATH})")
+    report.add_argument("--top", type=int, default=DEFAULT_TOP,
+                        help=f"Most frequent prompts to list (default: {DEFAULT_TOP})")
+    report.add_argument("--json", action="store_true", help="Print the report as JSON")
+    report.add_argument("-v", "--verbose", action="store_true", help="Enable debug logging")
+    return parser
+
+
+def rows_from_args(args: argparse.Namespace) -> List[BatchRow]:
+    """
+    Build batch rows from --file or repeated --prompt flags.
+
+    Flag-level --model/--preset/--negative-prompt/--set act as defaults that
+    file rows can override.
+    """
+    overrides = dict(args.settings)
+    if args.file:
+        rows = list(iter_batch_rows(Path(args.file).read_bytes(), detect_batch_format(args.file)))
+        for row in rows:
+            row.model_id = row.model_id or args.model
+            row.preset = row.preset or args.preset
+            row.negative_prompt = row.negative_prompt or args.negative_prompt
+            row.settings = {**overrides, **row.settings}
+        return rows
+    return [
+        BatchRow(id=f"prompt-{idx + 1}", prompt=prompt, model_id=args.model, preset=args.preset,
+                 negative_prompt=args.negative_prompt, settings=dict(overrides))
+        for idx, prompt in enumerate(args.prompt)
+    ]
+
+
+def save_output(url: str, path: Path, metadata: Dict[str, Any],
+                fetch: Callable[[str], Any] = http_fetch) -> Path:
+    """
+    Download one output to ``path``, embedding generation metadata into PNGs.
+
+    The download is streamed to a ``.part`` file first; metadata chunks are
+    spliced in before IEND while copying to the final name.
+
+    Args:
+        url: Output URL.
+        path: Destination file.
+        metadata: Key/value pairs to embed (see utils.png_metadata).
+        fetch: Function returning byte chunks for a URL.
+
+    Returns:
+        The written path.
+    """
+    partial = path.with_name(path.name + '.part')
+    try:
+        with open(partial, 'wb') as f:
+            for chunk in fetch(url):
+                f.write(chunk)
+        extra = build_metadata_chunks(metadata)
+        with open(partial, 'rb') as f:
+            iend_offset = find_iend_offset_in_file(f)
+        if extra and iend_offset is not None:
+            with open(path, 'wb') as out:
+                for chunk in iter_file_with_chunks(str(partial), iend_offset, extra):
+                    out.write(chunk)
+        else:
+            os.replace(partial, path)
+    finally:
+        partial.unlink(missing_ok=True)
+    return path
+
+
+def make_run_fn(client, output_dir: Path, fetch: Callable[[str], Any] = http_fetch,
+                router: Optional[Router] = None):
+    """
+    Build the per-job function run by the batch scheduler.
+
+    Each job runs its prediction and downloads the outputs into
+    ``output_dir`` on the worker thread, so downloads overlap as well. The
+    returned file names become the job's outputs in the checkpoint. Models
+    with ``routes`` in models.yaml run through ``router``.
+    """
+    def run_route(route: Route, model_input: Dict[str, Any]) -> Any:
+        if route.kind == 'deployment':
+            return run_deployment(client, route.target, model_input)
+        return client.run(route.target, input=model_input, use_file_output=False)
+
+    def run_fn(job: BatchJob) -> List[str]:
+        if router is not None and router.has_routes(job.endpoint):
+            output = router.run(job.endpoint, job.model_input, run_route)
+        else:
+            output = client.run(job.endpoint, input=job.model_input, use_file_output=False)
+        urls = output_urls(output)
+        files = []
+        for idx, url in enumerate(urls):
+            if not is_remote_url(url):
+                files.append(url)
+                continue
+            name = f"{_safe_name(job.record['job_id'])}_{idx + 1}.png"
+            save_output(url, output_dir / name, generation_metadata(job.record), fetch)
+            files.append(name)
+        return files
+
+    return run_fn
+
+
+def _safe_name(text: str) -> str:
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in str(text))[:80] or "job"
+
+
+def _print_progress(result: BatchResult, progress: BatchProgress) -> None:
+    status = "resumed" if result.resumed else ("ok" if result.ok else f"FAILED: {result.error}")
+    print(f"[{progress.done}/{progress.total}] {result.job.record.get('job_id')}: {status} "
+          f"({progress.rate * 60:.1f}/min, ETA {format_eta(progress.eta_seconds)})", flush=True)
+
+
+def run_generate(args: argparse.Namespace, client=None, fetch: Callable[[str], Any] = http_fetch) -> int:
+    """
+    Execute the ``generate`` command.
+
+    Args:
+        args: Parsed arguments.
+        client: Replicate client (created from --base-url and REPLICATE_API_TOKEN if omitted).
+        fetch: Function returning byte chunks for an output URL.
+
+    Returns:
+        Process exit code: 0 if every prompt succeeded, 1 if any failed.
+    """
+    if args.concurrency < 1:
+        raise ValueError(f"--concurrency must be at least 1, got {args.concurrency}")
+    models = load_models_config(args.models)
+    presets = {} if args.no_preset else load_presets_config(args.presets)
+    if args.max_combinations < 1:
+        raise ValueError(f"--max-combinations must be at least 1, got {args.max_combinations}")
+    rows = rows_from_args(args)
+    wordlists = WordlistLoader(args.wordlists)
+    # Validate rows and templates before any prediction runs; expansion itself stays lazy
+    total = count_expanded(rows, wordlists, args.max_combinations)
+    for _ in plan_jobs(rows, models, presets):
+        pass
+    jobs = plan_jobs(expand_rows(rows, wordlists, args.max_combinations), models, presets)
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    checkpoint_path = output_dir / CHECKPOINT_NAME
+    if args.no_resume:
+        checkpoint_path.unlink(missing_ok=True)
+
+    if client is None:
+        import replicate
+        client = replicate.Client(api_token=os.environ.get("REPLICATE_API_TOKEN"), base_url=args.base_url)
+    router = Router(model_routes(models))
+    results = run_batch(jobs, make_run_fn(client, output_dir, fetch, router), max_concurrency=args.concurrency,
+                        checkpoint=BatchCheckpoint(str(checkpoint_path)), total=total,
+                        on_result=_print_progress)
+
+    with open(output_dir / RESULTS_NAME, 'w', encoding='utf-8') as f:
+        for result in results:
+            f.write(json.dumps({
+                'id': result.job.record.get('job_id'),
+                'key': result.job.key,
+                'files': result.outputs,
+                'error': result.error,
+                'duration': round(result.duration, 3),
+                'resumed': result.resumed,
+            }) + '\n')
+    records = [{**result.job.record, 'file': path} for result in results if result.ok for path in result.outputs]
+    (output_dir / MANIFEST_NAME).write_bytes(build_manifest(records))
+
+    failed = sum(1 for result in results if not result.ok)
+    print(f"Done: {len(results) - failed} succeeded, {failed} failed. Results in {output_dir}")
+    return 1 if failed else 0
+
+
+def run_report(args: argparse.Namespace) -> int:
+    """
+    Execute the ``report`` command: per-model volume, latency and failures, and the top prompts.
+
+    Returns:
+        Process exit code: 0.
+
+    Raises:
+        FileNotFoundError: If there is neither a log nor a rotated archive at --log.
+    """
+    if args.top < 1:
+        raise ValueError(f"--top must be at least 1, got {args.top}")
+    if not Path(args.log).is_file() and not archive_paths(args.log):
+        raise FileNotFoundError(f"No request log at {args.log}")
+    report = RequestLogReport(top=args.top)
+    for entry in iter_request_log(args.log):
+        report.add(entry)
+    print(json.dumps(report.as_dict(), indent=2) if args.json else report.format())
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Entry point for the command-line runner."""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING,
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    try:
+        if args.command == "report":
+            return run_report(args)
+        return run_generate(args)
+    except (FileNotFoundError, ValueError, yaml.YAMLError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
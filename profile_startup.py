@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Import-time and cold-start profiler for the Streamlit app.
+
+Starts fresh Python processes under ``-X importtime`` and, in each, drives
+``streamlit_app.py`` through its first render and one more (non-generating)
+rerun with ``streamlit.testing.v1.AppTest``. The report splits cold start
+into phases (interpreter start, importing Streamlit, first render, rerun),
+lists the most expensive imports, and shows whether the modules only
+generation needs were loaded before anything was generated.
+
+Examples:
+    python profile_startup.py
+    python profile_startup.py --runs 5 --top 30
+    python profile_startup.py --output reports/startup.json
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+APP_PATH = Path(__file__).resolve().parent / "streamlit_app.py"
+DEFAULT_TIMEOUT = 60.0
+# Modules first paint should not need: the API client and HTTP stack are loaded on the first generation
+DEFERRED_MODULES = ("replicate", "requests", "httpx")
+PHASES = ("interpreter", "import_streamlit", "first_render", "rerun", "process_to_first_render")
+
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)\s*$")
+
+# Runs in the child process; prints wall-clock marks as JSON on its last stdout line
+_CHILD = """
+import json, sys, time
+marks = {'child_start': time.time()}
+from streamlit import config as st_config
+from streamlit.logger import set_log_level
+from streamlit.testing.v1 import AppTest
+marks['streamlit_imported'] = time.time()
+st_config.set_option("logger.level", "error")
+set_log_level("error")
+app = AppTest.from_file(sys.argv[1], default_timeout=float(sys.argv[2])).run()
+marks['first_render'] = time.time()
+app.run()
+marks['rerun'] = time.time()
+from utils.lazy import is_loaded
+marks['loaded'] = {name: is_loaded(name) for name in sys.argv[3].split(',')}
+marks['exception'] = [str(e.value) for e in app.exception]
+print(json.dumps(marks))
+"""
+
+
+@dataclass(frozen=True)
+class ImportRecord:
+    """One line of ``-X importtime`` output; times are in microseconds."""
+
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def parse_importtime(output: str) -> List[ImportRecord]:
+    """
+    Parse ``python -X importtime`` stderr into records, skipping any other lines.
+
+    Nesting depth comes from the indentation of the module name (two spaces
+    per level); depth 0 is a top-level import.
+    """
+    records = []
+    for line in output.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            records.append(ImportRecord(module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return records
+
+
+def summarize_imports(records: Sequence[ImportRecord], top: int = 20) -> Dict[str, Any]:
+    """
+    Summarize import records: total time, the slowest top-level imports
+    (cumulative) and the modules with the most import time of their own.
+    """
+    def row(record: ImportRecord, value: int) -> Dict[str, Any]:
+        return {'module': record.module, 'ms': round(value / 1000, 2)}
+
+    top_level = sorted((r for r in records if r.depth == 0), key=lambda r: r.cumulative_us, reverse=True)
+    by_self = sorted(records, key=lambda r: r.self_us, reverse=True)
+    return {
+        'modules': len(records),
+        'total_ms': round(sum(r.self_us for r in records) / 1000, 2),
+        'top_cumulative': [row(r, r.cumulative_us) for r in top_level[:top]],
+        'top_self': [row(r, r.self_us) for r in by_self[:top]],
+    }
+
+
+def profile_once(app_path: Path = APP_PATH, timeout: float = DEFAULT_TIMEOUT,
+                 deferred: Sequence[str] = DEFERRED_MODULES) -> Dict[str, Any]:
+    """
+    Profile one cold start in a fresh interpreter.
+
+    Returns:
+        Phase durations in milliseconds, import records, which deferred
+        modules were loaded, and any exceptions the app raised.
+
+    Raises:
+        RuntimeError: If the child process fails.
+    """
+    env = dict(os.environ)
+    env.setdefault('REPLICATE_API_TOKEN', "r8_startup_profile")
+    spawned = time.time()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _CHILD, str(app_path), str(timeout), ",".join(deferred)],
+        capture_output=True, text=True, cwd=app_path.parent, env=env, timeout=timeout * 3,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Profiling run failed with exit code {result.returncode}:\n{result.stderr[-2000:]}")
+    marks = json.loads(result.stdout.strip().splitlines()[-1])
+    return {
+        'phases_ms': {
+            'interpreter': (marks['child_start'] - spawned) * 1000,
+            'import_streamlit': (marks['streamlit_imported'] - marks['child_start']) * 1000,
+            'first_render': (marks['first_render'] - marks['streamlit_imported']) * 1000,
+            'rerun': (marks['rerun'] - marks['first_render']) * 1000,
+            'process_to_first_render': (marks['first_render'] - spawned) * 1000,
+        },
+        'imports': parse_importtime(result.stderr),
+        'loaded': marks['loaded'],
+        'exceptions': marks['exception'],
+    }
+
+
+def profile_startup(runs: int = 3, top: int = 20, app_path: Path = APP_PATH,
+                    timeout: float = DEFAULT_TIMEOUT) -> Dict[str, Any]:
+    """
+    Profile ``runs`` cold starts and build the report.
+
+    Phase times are medians across runs; the import summary is from the
+    fastest run, the one least disturbed by the rest of the machine.
+    """
+    if runs < 1:
+        raise ValueError(f"runs must be at least 1, got {runs}")
+    results = [profile_once(app_path, timeout) for _ in range(runs)]
+    fastest = min(results, key=lambda r: r['phases_ms']['process_to_first_render'])
+    return {
+        'runs': runs,
+        'phases_ms': {phase: round(statistics.median(r['phases_ms'][phase] for r in results), 1) for phase in PHASES},
+        'imports': summarize_imports(fastest['imports'], top),
+        'deferred_loaded_at_first_render': fastest['loaded'],
+        'exceptions': fastest['exceptions'],
+    }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    """Render the report as a plain-text table."""
+    lines = [f"Cold start (median of {report['runs']} run(s)):"]
+    for phase, ms in report['phases_ms'].items():
+        lines.append(f"  {phase:<26}{ms:>10.1f} ms")
+    imports = report['imports']
+    lines.append(f"\nImports: {imports['modules']} modules, {imports['total_ms']:.1f} ms")
+    lines.append("  Slowest top-level imports (cumulative):")
+    lines.extend(f"  {row['ms']:>10.1f} ms  {row['module']}" for row in imports['top_cumulative'])
+    lines.append("  Most time in the module itself:")
+    lines.extend(f"  {row['ms']:>10.1f} ms  {row['module']}" for row in imports['top_self'])
+    lines.append("\nDeferred until first generation:")
+    for name, loaded in report['deferred_loaded_at_first_render'].items():
+        lines.append(f"  {name:<26}{'LOADED at first render' if loaded else 'deferred'}")
+    for exception in report['exceptions']:
+        lines.append(f"\nApp raised: {exception}")
+    return "\n".join(lines)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the command-line parser."""
+    parser = argparse.ArgumentParser(prog="profile_startup.py",
+                                     description="Import-time and cold-start profiler for the Streamlit app.")
+    parser.add_argument("--runs", type=int, default=3, help="Cold starts to profile (default: 3)")
+    parser.add_argument("--top", type=int, default=20, help="Imports to list per table (default: 20)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help=f"Per-rerun timeout in seconds (default: {DEFAULT_TIMEOUT:g})")
+    parser.add_argument("--output", help="Also write the JSON report here")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Entry point for the startup profiler."""
+    args = build_parser().parse_args(argv)
+    try:
+        report = profile_startup(runs=args.runs, top=args.top, timeout=args.timeout)
+    except (ValueError, RuntimeError, subprocess.TimeoutExpired) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    print(format_report(report))
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+        print(f"\nReport written to {args.output}")
+    return 1 if report['exceptions'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,18 +1,88 @@
-import replicate
 import streamlit as st
-import requests
-import zipfile
-import io
+import atexit
 import logging
 import os
+import time
 import yaml
+from concurrent.futures import ThreadPoolExecutor, wait
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from pathlib import Path
 from utils import icon
+from utils.lazy import lazy_import
 from streamlit_image_select import image_select
 from config.model_loader import load_models_config
-from utils.preset_manager import load_presets_config
+from utils.preset_manager import (
+    SETTING_FORM_KEYS,
+    format_trigger_words,
+    inject_trigger_words,
+    load_presets_config,
+    select_preset,
+)
+from utils.image_store import ImageStore, output_url
+from utils.persister import BackgroundPersister, http_fetch
+from utils.archive_export import ARCHIVE_FORMATS, ensure_stored, export_outputs, spool_archive
+from utils.png_metadata import embed_png_metadata, generation_metadata
+from utils.generation import DEFAULT_MAX_CONCURRENT_PREDICTIONS, ConcurrencyLimiter
+from utils.compare import CompareResult, iter_fan_out
+from utils.coalesce import DEFAULT_MAX_OUTPUTS, Coalescer
+from utils.hedging import Hedger, PredictionCanceled, create_prediction, hedge_policies
+from utils.routing import Route, Router, model_routes, run_deployment
+from utils.result_cache import ResultCache
+from utils.telemetry import TelemetryStore, progress_fraction
+from utils.progressive import MAX_DRAFTS, ProgressivePlan, plan_progressive
+from utils.log_progress import CreatedCallback, LogCallback, LogProgressTracker, get_log_parser, run_with_logs
+from utils.inflight import DEFAULT_ORPHAN_TIMEOUT, InflightJob, PredictionRegistry
+from utils.rerun_profiler import DEFAULT_MAX_FILES, PROFILE_FORMATS, RerunProfiler
+from utils.tracing import DEFAULT_TRACE_PATH, Span, SpanContext, Tracer, build_exporter
+from utils.metrics import AppMetrics
+from utils.request_log import DEFAULT_REQUEST_LOG_PATH, RequestLog
+from utils.history import DEFAULT_PAGE_SIZE, HistoryEntry, HistoryStore, thumbnail_png
+from utils.log_pipeline import (
+    DEFAULT_LOG_LEVEL,
+    DEFAULT_SAMPLE_EVERY,
+    LOG_FORMATS,
+    LogPipeline,
+    bind_correlation,
+    log_correlation,
+)
+from utils.prompt_template import (
+    DEFAULT_MAX_COMBINATIONS,
+    DEFAULT_WORDLIST_DIR,
+    WordlistLoader,
+    count_expanded,
+    expand_rows,
+    render_prompt,
+)
+from utils.sweep import (
+    SWEEP_PARAMS,
+    build_contact_sheet,
+    contact_sheet_png,
+    load_thumbnails,
+    parse_values,
+    plan_sweep,
+    sweep_summary,
+)
+from utils.batch import (
+    BATCH_FORMATS,
+    DEFAULT_MAX_CONCURRENCY,
+    BatchCheckpoint,
+    BatchProgress,
+    BatchResult,
+    archive_inputs,
+    checkpoint_path_for,
+    detect_batch_format,
+    format_eta,
+    iter_batch_rows,
+    plan_jobs,
+    run_batch,
+)
 
 logger = logging.getLogger(__name__)
 
+# Only generation needs the API client and HTTP stack; loading them on first use keeps them off first paint
+replicate = lazy_import("replicate")
+requests = lazy_import("requests")
+
 # UI configurations
 st.set_page_config(page_title="Replicate Image Generator",
                    page_icon=":bridge_at_night:",
@@ -73,14 +143,7 @@ def _apply_preset_for_model(selected_model: dict) -> tuple[dict | None, bool]:
         return None, False
     
     # Find preset to use: first preset with default: true, or first preset
-    preset_to_apply = None
-    for preset in model_presets:
-        if preset.get('default', False):
-            preset_to_apply = preset
-            break
-    
-    if not preset_to_apply:
-        preset_to_apply = model_presets[0]
+    preset_to_apply = select_preset(model_presets)
     
     # Check if user has modified values for this model - if so, don't re-apply preset
     user_modified_fields_by_model = st.session_state.get('user_modified_fields_by_model', {})
@@ -105,64 +168,21 @@ def _apply_preset_for_model(selected_model: dict) -> tuple[dict | None, bool]:
     # Apply trigger words to prompt if available
     # Only apply if user hasn't modified the prompt
     trigger_words = preset_to_apply.get('trigger_words')
-    if trigger_words and not user_modified_fields.get('prompt', False):
+    if format_trigger_words(trigger_words) and not user_modified_fields.get('prompt', False):
         # Determine injection position (default to "prepend")
         position = preset_to_apply.get('trigger_words_position', 'prepend')
-        
-        # Format trigger words
-        if isinstance(trigger_words, list):
-            # Filter out empty strings and join
-            filtered = [tw for tw in trigger_words if tw and str(tw).strip()]
-            if filtered:
-                trigger_words_str = ", ".join(str(tw) for tw in filtered)
-            else:
-                trigger_words_str = None
-        elif isinstance(trigger_words, str) and trigger_words.strip():
-            trigger_words_str = trigger_words
-        else:
-            trigger_words_str = None
-        
-        # Apply trigger words to prompt
-        if trigger_words_str:
-            # Get current prompt from session state (may not exist yet)
-            current_prompt = st.session_state.get('form_prompt', '')
-            if position == 'append':
-                # Append trigger words to end of prompt
-                if current_prompt:
-                    new_prompt = f"{current_prompt} {trigger_words_str}".strip()
-                else:
-                    new_prompt = trigger_words_str
-            else:  # prepend (default)
-                # Prepend trigger words to beginning of prompt
-                if current_prompt:
-                    new_prompt = f"{trigger_words_str} {current_prompt}".strip()
-                else:
-                    new_prompt = trigger_words_str
-            
-            _set_session_state('form_prompt', new_prompt)
+        # Get current prompt from session state (may not exist yet)
+        current_prompt = st.session_state.get('form_prompt', '')
+        _set_session_state('form_prompt', inject_trigger_words(current_prompt, trigger_words, position))
     
     # Apply preset settings to form field session state keys
     # Only apply settings that user hasn't modified
     settings = preset_to_apply.get('settings', {})
     if settings:
-        # Map preset settings to form field keys
-        setting_mappings = {
-            'width': 'form_width',
-            'height': 'form_height',
-            'num_outputs': 'form_num_outputs',
-            'scheduler': 'form_scheduler',
-            'num_inference_steps': 'form_num_inference_steps',
-            'guidance_scale': 'form_guidance_scale',
-            'prompt_strength': 'form_prompt_strength',
-            'refine': 'form_refine',
-            'high_noise_frac': 'form_high_noise_frac',
-            'negative_prompt': 'form_negative_prompt',
-        }
-        
         # Get list of user-modified setting keys for this model (convert to set for efficient lookup)
         user_modified_setting_keys = set(user_modified_fields.get('setting_keys', []))
         
-        for setting_key, form_key in setting_mappings.items():
+        for setting_key, form_key in SETTING_FORM_KEYS.items():
             # Only apply if user hasn't modified this specific setting
             if setting_key in settings and setting_key not in user_modified_setting_keys:
                 _set_session_state(form_key, settings[setting_key])
@@ -172,6 +192,84 @@ def _apply_preset_for_model(selected_model: dict) -> tuple[dict | None, bool]:
     
     return preset_to_apply, True
 
+def _render_prompt_template(prompt: str) -> str:
+    """
+    Render one weighted sample of the sidebar prompt's template syntax, if the user opted in.
+
+    Expansion is off unless "Expand prompt templates" is ticked, so plain
+    prompts with braces (e.g. ``{{masterpiece}}`` emphasis) or double
+    underscores reach the model unchanged. Trigger words injected by the
+    preset above are part of the prompt and are rendered with it.
+
+    Raises:
+        ValueError: If the template is malformed or names a missing wordlist.
+    """
+    if not st.session_state.get('form_expand_templates', False):
+        return prompt
+    return render_prompt(prompt, _get_wordlists())
+
+def _track_user_modifications() -> None:
+    """
+    Record which preset-applied form values the user has changed.
+    
+    Compares the current form values with the values the preset set for the
+    selected model and updates user_modified_fields_by_model, so presets are
+    not re-applied over the user's edits. Runs after the form is rendered.
+    """
+    # Get current model to track modifications per model
+    current_model = st.session_state.get('selected_model', None)
+    current_model_id = current_model.get('id') if current_model else None
+    
+    if current_model_id:
+        preset_applied_values_by_model = st.session_state.get('preset_applied_values_by_model', {})
+        preset_applied_values = preset_applied_values_by_model.get(current_model_id, {'prompt': None, 'settings': {}})
+        
+        user_modified_fields_by_model = st.session_state.get('user_modified_fields_by_model', {})
+        user_modified_fields = user_modified_fields_by_model.get(current_model_id, {
+            'prompt': False,
+            'settings': False,
+            'setting_keys': []  # Use list instead of set
+        })
+    else:
+        # No model selected, skip tracking
+        preset_applied_values = {'prompt': None, 'settings': {}}
+        user_modified_fields = {'prompt': False, 'settings': False, 'setting_keys': []}
+    
+    # Check if prompt was modified
+    current_prompt = st.session_state.get('form_prompt', '')
+    preset_prompt = preset_applied_values.get('prompt')
+    if preset_prompt is not None and current_prompt != preset_prompt:
+        # User has modified prompt
+        user_modified_fields['prompt'] = True
+    
+    # Check if settings were modified
+    preset_settings = preset_applied_values.get('settings', {})
+    modified_setting_keys = set()
+    
+    for setting_key, form_key in SETTING_FORM_KEYS.items():
+        if setting_key in preset_settings:
+            # This setting was set by preset, check if user modified it
+            current_value = st.session_state.get(form_key)
+            preset_value = preset_settings[setting_key]
+            
+            # Compare values (handle different types)
+            if current_value != preset_value:
+                modified_setting_keys.add(setting_key)
+    
+    # Update user modification tracking (per model)
+    if current_model_id:
+        if modified_setting_keys:
+            user_modified_fields['settings'] = True
+            # Convert existing list to set, merge with new modifications, convert back to list
+            existing_keys = set(user_modified_fields.get('setting_keys', []))
+            all_modified_keys = existing_keys | modified_setting_keys
+            user_modified_fields['setting_keys'] = list(all_modified_keys)
+        
+        # Update session state with modified tracking for this model
+        user_modified_fields_by_model = st.session_state.get('user_modified_fields_by_model', {})
+        user_modified_fields_by_model[current_model_id] = user_modified_fields
+        _set_session_state('user_modified_fields_by_model', user_modified_fields_by_model)
+
 # Helper function to get secrets with fallback for testing
 def get_secret(key: str, default: str = None) -> str:
     """Get secret from Streamlit secrets or environment variable, with fallback for testing.
@@ -208,6 +306,531 @@ def get_replicate_model_endpoint() -> str:
     """Get Replicate model endpoint."""
     return get_secret("REPLICATE_MODEL_ENDPOINTSTABILITY", "stability-ai/sdxl:test-version")
 
+
+def _secret_flag(key: str, default: bool) -> bool:
+    """Read a boolean feature switch from secrets/environment.
+
+    Args:
+        key: The secret key to read
+        default: Value used when the key is missing or not a string/bool
+
+    Returns:
+        The parsed flag value
+    """
+    value = get_secret(key, None)
+    if isinstance(value, bool):
+        return value
+    if not isinstance(value, str):
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+@st.cache_resource
+def _get_image_store() -> ImageStore:
+    """Get the process-wide local image store (IMAGE_STORE_DIR)."""
+    return ImageStore(get_secret("IMAGE_STORE_DIR", "image_store"))
+
+
+@st.cache_resource
+def _get_persister() -> BackgroundPersister | None:
+    """Get the process-wide background persister for generated images.
+
+    Replicate delivery URLs expire after about an hour, so every output is
+    copied to the local image store in the background as soon as its
+    prediction completes. Disable with PERSIST_OUTPUTS = "false".
+
+    Returns:
+        The shared BackgroundPersister, or None if persistence is disabled
+    """
+    if not _secret_flag("PERSIST_OUTPUTS", True):
+        return None
+    return BackgroundPersister(_get_image_store())
+
+
+def _get_int_setting(key: str, default: int, minimum: int = 1, maximum: int | None = None) -> int:
+    """Read an integer setting from secrets/environment, clamped to [minimum, maximum].
+
+    Args:
+        key: The secret key to read
+        default: Value used when the key is missing or not an integer
+        minimum: Smallest allowed value
+        maximum: Largest allowed value, or None for no upper bound
+
+    Returns:
+        The parsed and clamped value
+    """
+    value = get_secret(key, None)
+    if not isinstance(value, (str, int)) or isinstance(value, bool) or not str(value).strip().isdigit():
+        return default
+    value = max(int(value), minimum)
+    return min(value, maximum) if maximum is not None else value
+
+
+@st.cache_resource
+def _get_result_cache() -> ResultCache:
+    """Get the process-wide cache of prediction outputs keyed by exact inputs (RESULT_CACHE_PATH)."""
+    default_path = os.path.join(get_secret("IMAGE_STORE_DIR", "image_store"), "result_cache.jsonl")
+    path = get_secret("RESULT_CACHE_PATH", default_path)
+    return ResultCache(path if isinstance(path, str) else default_path)
+
+
+@st.cache_resource
+def _get_wordlists() -> WordlistLoader:
+    """Get the process-wide loader for ``__name__`` prompt wordlists (WORDLIST_DIR)."""
+    directory = get_secret("WORDLIST_DIR", DEFAULT_WORDLIST_DIR)
+    return WordlistLoader(directory if isinstance(directory, str) else DEFAULT_WORDLIST_DIR)
+
+
+def _get_template_max_combinations() -> int:
+    """Get the cap on prompts expanded from one template (TEMPLATE_MAX_COMBINATIONS)."""
+    return _get_int_setting("TEMPLATE_MAX_COMBINATIONS", DEFAULT_MAX_COMBINATIONS)
+
+
+@st.cache_resource
+def _get_prediction_limiter() -> ConcurrencyLimiter:
+    """Get the process-wide cap on predictions in flight (MAX_CONCURRENT_PREDICTIONS).
+
+    Shared by single generations, batch mode and compare mode across all
+    sessions, so fan-out features cannot exceed the account's rate limits.
+    """
+    return ConcurrencyLimiter(_get_int_setting("MAX_CONCURRENT_PREDICTIONS", DEFAULT_MAX_CONCURRENT_PREDICTIONS))
+
+
+@st.cache_resource
+def _get_coalescer() -> Coalescer | None:
+    """Get the process-wide request coalescer, or None if COALESCE_WINDOW_MS is 0 (the default).
+
+    Compatible single-image requests from different sessions that arrive within
+    the window share one multi-output prediction.
+    """
+    window_ms = _get_int_setting("COALESCE_WINDOW_MS", 0, minimum=0, maximum=5000)
+    if window_ms == 0:
+        return None
+    logger.info("Request coalescing enabled with a %s ms window", window_ms)
+    return Coalescer(_run_limited_prediction, window=window_ms / 1000)
+
+
+@st.cache_resource
+def _get_hedger() -> Hedger | None:
+    """Get the process-wide hedger for models with a ``hedge`` policy in models.yaml, or None if none have one."""
+    try:
+        policies = hedge_policies(load_models_config("models.yaml"))
+    except (FileNotFoundError, ValueError, yaml.YAMLError) as e:
+        logger.warning("Hedging disabled: %s", e)
+        return None
+    if not policies:
+        return None
+    logger.info("Hedging enabled for %d endpoint(s)", len(policies))
+    return Hedger(lambda endpoint, model_input: create_prediction(replicate, endpoint, model_input), policies)
+
+
+@st.cache_resource
+def _get_router() -> Router | None:
+    """Get the process-wide router for models with ``routes`` in models.yaml, or None if none have any."""
+    try:
+        routes = model_routes(load_models_config("models.yaml"))
+    except (FileNotFoundError, ValueError, yaml.YAMLError) as e:
+        logger.warning("Routing disabled: %s", e)
+        return None
+    if not routes:
+        return None
+    logger.info("Routing enabled for %d model(s)", len(routes))
+    return Router(routes)
+
+
+@st.cache_resource
+def _get_inflight_registry() -> PredictionRegistry:
+    """Get the process-wide registry of in-flight predictions per session.
+
+    Its reaper thread cancels predictions of sessions that have not rerun for
+    ORPHAN_PREDICTION_TIMEOUT seconds (default 600), such as closed tabs.
+    """
+    registry = PredictionRegistry(orphan_timeout=_get_int_setting("ORPHAN_PREDICTION_TIMEOUT",
+                                                                  int(DEFAULT_ORPHAN_TIMEOUT)))
+    registry.start_reaper()
+    return registry
+
+
+def _current_session_id() -> str | None:
+    """Get the browser session id, or None outside a Streamlit session (bare mode, tests)."""
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return ctx.session_id if ctx is not None else None
+
+
+def _session_registry() -> tuple[PredictionRegistry | None, str | None]:
+    """Get the in-flight registry and session id, or (None, None) if supersede is off (CANCEL_SUPERSEDED)."""
+    session_id = _current_session_id()
+    if session_id is None or not _secret_flag("CANCEL_SUPERSEDED", True):
+        return None, None
+    return _get_inflight_registry(), session_id
+
+
+def _supersede_session_predictions() -> None:
+    """Cancel this session's unpinned in-flight predictions (on resubmit or model switch)."""
+    registry, session_id = _session_registry()
+    if registry is not None:
+        canceled = registry.supersede(session_id)
+        if canceled:
+            st.toast(f"Canceled {len(canceled)} earlier generation(s)", icon="🛑")
+
+
+@st.cache_resource
+def _get_telemetry() -> TelemetryStore:
+    """Get the process-wide latency telemetry (queue, predict, download and total time per model and settings)."""
+    return TelemetryStore()
+
+
+@st.cache_resource
+def _get_rerun_profiler() -> RerunProfiler:
+    """Get the process-wide rerun profiler (PROFILE_DIR, PROFILE_FORMAT, PROFILE_MAX_FILES)."""
+    directory = get_secret("PROFILE_DIR", "profiles")
+    profile_format = get_secret("PROFILE_FORMAT", "speedscope")
+    if not isinstance(profile_format, str) or profile_format.strip().lower() not in PROFILE_FORMATS:
+        profile_format = "speedscope"
+    return RerunProfiler(directory if isinstance(directory, str) else "profiles", fmt=profile_format.strip().lower(),
+                         max_files=_get_int_setting("PROFILE_MAX_FILES", DEFAULT_MAX_FILES))
+
+
+@st.cache_resource
+def _get_tracer() -> Tracer:
+    """Get the process-wide tracer for submission spans (TRACE_EXPORTER, TRACE_PATH, OTEL_EXPORTER_OTLP_ENDPOINT).
+
+    Spans go to a JSONL file by default, or to an OpenTelemetry collector
+    over OTLP/HTTP when OTEL_EXPORTER_OTLP_ENDPOINT is set. TRACE_EXPORTER =
+    "none" turns exporting off.
+    """
+    endpoint = get_secret("OTEL_EXPORTER_OTLP_ENDPOINT", None)
+    endpoint = endpoint.strip() if isinstance(endpoint, str) and endpoint.strip() else None
+    kind = get_secret("TRACE_EXPORTER", None)
+    kind = kind.strip().lower() if isinstance(kind, str) else ("otlp" if endpoint else "jsonl")
+    path = get_secret("TRACE_PATH", DEFAULT_TRACE_PATH)
+    path = path if isinstance(path, str) else DEFAULT_TRACE_PATH
+    try:
+        exporter = build_exporter(kind, path, endpoint,
+                                  service_name=get_secret("OTEL_SERVICE_NAME", "streamlit-replicate-boss"))
+    except ValueError as e:
+        logger.warning("%s; writing spans to %s instead", e, path)
+        exporter = build_exporter("jsonl", path)
+    return Tracer(exporter)
+
+
+@st.cache_resource
+def _get_metrics() -> AppMetrics:
+    """Get the process-wide metrics, served at ``/metrics`` on METRICS_PORT from a sidecar thread.
+
+    Components keep their own counters; the values below are read from
+    their stats() only when /metrics is scraped. METRICS_PORT = "0" (the
+    default) collects without serving.
+    """
+    metrics = AppMetrics()
+
+    def limiter_stats() -> dict:
+        return _get_prediction_limiter().stats()
+
+    def queue_depths() -> dict:
+        depths = {('predictions',): limiter_stats()['waiting'], ('spans',): _get_tracer().stats()['queued']}
+        persister = _get_persister()
+        if persister is not None:
+            depths[('persister',)] = persister.stats()['queued']
+        return depths
+
+    def cache_lookups() -> dict:
+        stats = _get_result_cache().stats()
+        return {('result', 'hit'): stats['hits'], ('result', 'miss'): stats['misses']}
+
+    def cache_hit_ratios() -> dict:
+        stats = _get_result_cache().stats()
+        lookups = stats['hits'] + stats['misses']
+        return {('result',): stats['hits'] / lookups} if lookups else {}
+
+    def downloaded_bytes() -> int:
+        persister = _get_persister()
+        return persister.stats()['bytes'] if persister is not None else 0
+
+    metrics.watch("app_predictions_in_flight", "Predictions holding a concurrency slot.",
+                  lambda: limiter_stats()['in_flight'])
+    metrics.watch("app_queue_depth", "Work waiting: predictions for a slot, images to persist, spans to export.",
+                  queue_depths, ('queue',))
+    metrics.watch("app_cache_lookups_total", "Cache lookups by cache and result.", cache_lookups,
+                  ('cache', 'result'), kind='counter')
+    metrics.watch("app_cache_hit_ratio", "Cache hits over lookups since the process started.", cache_hit_ratios,
+                  ('cache',))
+    metrics.watch("app_downloaded_bytes_total", "Bytes of generated images downloaded into the image store.",
+                  downloaded_bytes, kind='counter')
+
+    port = _get_int_setting("METRICS_PORT", 0, minimum=0, maximum=65535)
+    if port:
+        from utils.metrics_server import MetricsServer
+        try:
+            server = MetricsServer(metrics.registry, get_secret("METRICS_HOST", "0.0.0.0"), port).start()
+            logger.info("Serving metrics at %s", server.url)
+        except OSError as e:
+            logger.warning("Could not serve metrics on port %s: %s", port, e)
+    return metrics
+
+
+@st.cache_resource
+def _get_log_pipeline() -> LogPipeline | None:
+    """Get the process-wide log pipeline (LOG_FORMAT, LOG_LEVEL, LOG_DEBUG_SAMPLE), or None if LOG_FORMAT is "none".
+
+    Records are queued on the script thread and formatted and written to
+    stderr by a listener thread, tagged with the session id and, during a
+    submission, its job id (the submission's trace id).
+    """
+    fmt = get_secret("LOG_FORMAT", "json")
+    fmt = fmt.strip().lower() if isinstance(fmt, str) else "json"
+    if fmt not in LOG_FORMATS:
+        logger.warning("Unknown LOG_FORMAT %r; logging JSON lines", fmt)
+        fmt = "json"
+    if fmt == "none":
+        return None
+    level = get_secret("LOG_LEVEL", DEFAULT_LOG_LEVEL)
+    sample_every = _get_int_setting("LOG_DEBUG_SAMPLE", DEFAULT_SAMPLE_EVERY)
+    try:
+        pipeline = LogPipeline(fmt, level, sample_every)
+    except ValueError as e:
+        logger.warning("%s; logging at %s", e, DEFAULT_LOG_LEVEL)
+        pipeline = LogPipeline(fmt, DEFAULT_LOG_LEVEL, sample_every)
+    atexit.register(pipeline.stop)
+    return pipeline.start()
+
+
+@st.cache_resource
+def _get_request_log() -> RequestLog | None:
+    """Get the process-wide request log (REQUEST_LOG, REQUEST_LOG_PATH, REQUEST_LOG_MAX_MB, REQUEST_LOG_MAX_HOURS).
+
+    One JSON line per submission, with its outcome and timings; summarize
+    it with ``python main.py report``. Returns None if REQUEST_LOG is off.
+    """
+    if not _secret_flag("REQUEST_LOG", True):
+        return None
+    path = get_secret("REQUEST_LOG_PATH", DEFAULT_REQUEST_LOG_PATH)
+    request_log = RequestLog(path if isinstance(path, str) and path.strip() else DEFAULT_REQUEST_LOG_PATH,
+                             max_bytes=_get_int_setting("REQUEST_LOG_MAX_MB", 64) * 1024 * 1024,
+                             max_age=_get_int_setting("REQUEST_LOG_MAX_HOURS", 24) * 3600)
+    atexit.register(request_log.close)
+    return request_log
+
+
+def _log_request(span: Span, request: dict, status: str, error_type: str | None = None,
+                 error: Exception | None = None) -> None:
+    """Append a finished submission to the request log (see _get_request_log)."""
+    request_log = _get_request_log()
+    if request_log is None:
+        return
+    entry = {**request, 'status': status, 'duration': round(time.time() - span.start, 3)}
+    if error is not None:
+        entry.update(error_type=error_type, error=f"{type(error).__name__}: {error}")
+    request_log.record(entry)
+
+
+@st.cache_resource
+def _get_history() -> HistoryStore | None:
+    """Get the process-wide generation history (HISTORY, HISTORY_PATH).
+
+    Every successful submission is queued here and written to SQLite in
+    batches by a background thread; the history panel searches it by
+    prompt. Returns None if HISTORY is off.
+    """
+    if not _secret_flag("HISTORY", True):
+        return None
+    default_path = os.path.join(get_secret("IMAGE_STORE_DIR", "image_store"), "history.db")
+    path = get_secret("HISTORY_PATH", default_path)
+    history = HistoryStore(path if isinstance(path, str) and path.strip() else default_path)
+    atexit.register(history.close)
+    return history
+
+
+def _applied_preset_id(model_id: str | None) -> str | None:
+    """Id (or name) of the preset applied to the form for this model, if any."""
+    if model_id is None or st.session_state.get('preset_applied_for_model_id') != model_id:
+        return None
+    model_presets = st.session_state.get('presets', {}).get(model_id, [])
+    preset = select_preset(model_presets) if model_presets else None
+    return (preset.get('id') or preset.get('name')) if isinstance(preset, dict) else None
+
+
+def _record_history(request: dict, images: list) -> None:
+    """Queue a successful submission for the generation history (see _get_history)."""
+    history = _get_history()
+    if history is None or not images:
+        return
+    store = _get_image_store()
+    settings = request.get('settings', {})
+    history.add(HistoryEntry(
+        prompt=request.get('prompt', ''), model_id=request.get('model_id'), endpoint=request.get('endpoint'),
+        preset=_applied_preset_id(request.get('model_id')), negative_prompt=request.get('negative_prompt'),
+        seed=settings.get('seed'), settings=settings, timings=dict(request.get('timings', {})),
+        # The image store key each output is (or will be) persisted under
+        outputs=[{'url': image, 'key': store.key_for(image)} for image in images],
+        session_id=request.get('session_id'), job_id=request.get('job_id')))
+
+
+def _submission_failed(span: Span, error_type: str, error: Exception, request: dict) -> None:
+    """Record a failed submission on its span, in the error counter (see REPLICATE_ERROR_TYPES) and the request log."""
+    span.set_error(error)
+    _get_metrics().error(error_type)
+    _log_request(span, request, 'failed', error_type, error)
+
+
+def _profiling_requested() -> bool:
+    """Whether to profile this rerun: opened with ``?profile=1`` or PROFILE_RERUNS = "true"."""
+    return st.query_params.get("profile") == "1" or _secret_flag("PROFILE_RERUNS", False)
+
+
+def _interaction_snapshot() -> dict:
+    """Form values and selected model id, to tell what the user did between two reruns."""
+    snapshot = {key: st.session_state[key] for key in list(st.session_state.keys())
+                if isinstance(key, str) and key.startswith('form_')}
+    model = st.session_state.get('selected_model')
+    snapshot['model_id'] = model.get('id') if isinstance(model, dict) else None
+    return snapshot
+
+
+def _rerun_interaction(previous: dict | None, current: dict, generated: bool) -> str:
+    """Classify a rerun as generate, initial, model-switch, edit-<field> or rerun."""
+    if generated:
+        return "generate"
+    if previous is None:
+        return "initial"
+    if previous.get('model_id') != current.get('model_id'):
+        return "model-switch"
+    changed = sorted(key for key in current if previous.get(key) != current[key])
+    return f"edit-{changed[0].removeprefix('form_')}" if changed else "rerun"
+
+
+def _get_archive_format() -> str:
+    """Get the archive format for "Download All Images" (ARCHIVE_FORMAT: zip or tar)."""
+    archive_format = get_secret("ARCHIVE_FORMAT", "zip")
+    if isinstance(archive_format, str) and archive_format.strip().lower() in ARCHIVE_FORMATS:
+        return archive_format.strip().lower()
+    return "zip"
+
+
+def _deferred_archive(outputs: list, records: list[dict], archive_format: str,
+                      name_template: str = "output_file_{index}.png", trace_parent: SpanContext | None = None):
+    """Build a zero-argument callable that streams the download archive on click.
+
+    The callable runs on a separate thread when the user clicks the download
+    button, so it must not touch Streamlit APIs or session state.
+
+    Args:
+        outputs: Output URLs or stored paths to archive
+        records: Per-output generation details for the manifest
+        archive_format: 'zip' or 'tar'
+        name_template: File name pattern inside the archive; ``{index}`` is 1-based
+        trace_parent: Submission span the "archive" span belongs to, if any
+
+    Returns:
+        Callable returning the archive bytes
+    """
+    store = _get_image_store()
+    tracer = _get_tracer()
+    outputs = list(outputs)
+    records = list(records)
+
+    def _build() -> bytes:
+        with tracer.span("archive", parent=trace_parent, format=archive_format, images=len(outputs)) as span:
+            # Streamlit only takes bytes or a few io types from the callable, not a spooled file
+            with spool_archive(export_outputs(outputs, store, http_fetch, records, archive_format,
+                                              name_template=name_template)) as archive:
+                data = archive.read()
+            span.set_attribute('bytes', len(data))
+            return data
+
+    return _build
+
+
+def _deferred_image(output, record: dict):
+    """Build a zero-argument callable returning one image with embedded metadata.
+
+    The prompt, model and settings are spliced into the PNG as text chunks
+    on click; pixels are never re-encoded.
+
+    Args:
+        output: Output URL or stored path of the image
+        record: Generation details to embed
+
+    Returns:
+        Callable returning the PNG bytes
+    """
+    store = _get_image_store()
+
+    def _build() -> bytes:
+        data = ensure_stored(output, store, http_fetch).read_bytes()
+        try:
+            return embed_png_metadata(data, generation_metadata(record))
+        except ValueError as e:
+            logger.warning("Could not embed metadata into %s: %s", output_url(output), e)
+            return data
+
+    return _build
+
+
+def _download_recorder(persister: BackgroundPersister, image, model_id: str, model_input: dict,
+                       trace_parent: SpanContext | None):
+    """Build the persister's on_stored callback for one output.
+
+    Records the download time in the telemetry and a "download" span with
+    the stored size under the submission span. It runs on a persister
+    worker thread, so it must not touch Streamlit APIs.
+    """
+    telemetry = _get_telemetry()
+    tracer = _get_tracer()
+
+    def _stored(seconds: float) -> None:
+        telemetry.record(model_id, model_input, {'download': seconds})
+        path = persister.resolve(image)
+        now = time.time()
+        tracer.record("download", now - seconds, now, parent=trace_parent, url=output_url(image),
+                      bytes=os.path.getsize(path) if os.path.isfile(path) else None)
+
+    return _stored
+
+
+def _pinned_generations_panel() -> None:
+    """Offer pinning of in-flight generations and show pinned ones that finished after being left behind.
+
+    A pinned generation keeps running when the session submits again or
+    switches models, and its images appear here on a later rerun.
+    """
+    registry, session_id = _session_registry()
+    if registry is None:
+        return
+    registry.touch(session_id)
+    if st.checkbox("📌 Keep generations running if I submit again or switch models", key="pin_generations"):
+        for job in registry.jobs(session_id):
+            registry.pin(job.job_id)
+    for job in registry.take_finished(session_id):
+        if job.error is not None:
+            st.warning(f"📌 Pinned generation failed: {job.error}")
+            continue
+        st.toast("📌 A pinned generation finished", icon="😍")
+        with st.expander(f"📌 Pinned: {job.label}", expanded=True):
+            for image in job.outputs:
+                st.image(image, use_column_width=True)
+        persister = _get_persister()
+        if persister is not None:
+            for image in job.outputs:
+                persister.submit(image)
+
+
+def _rewrite_persisted_images() -> None:
+    """Point image references held in session state at their stored copies.
+
+    Runs on every rerun; entries whose background copy has not finished yet
+    keep their original URL and are rewritten on a later rerun.
+    """
+    persister = _get_persister()
+    if persister is None:
+        return
+    for key in ('generated_image', 'all_images'):
+        images = st.session_state.get(key)
+        if images:
+            rewritten = persister.rewrite(images)
+            if rewritten != list(images):
+                _set_session_state(key, rewritten)
+
 # Resources text, link, and logo
 replicate_text = "Stability AI SDXL Model on Replicate"
 replicate_link = "https://replicate.com/stability-ai/sdxl"
@@ -215,6 +838,12 @@ replicate_logo = "https://storage.googleapis.com/llama2_release/Screen%20Shot%20
 
 # Placeholders for images and gallery
 generated_images_placeholder = st.empty()
+progressive_placeholder = st.empty()
+compare_placeholder = st.empty()
+sweep_placeholder = st.empty()
+batch_placeholder = st.empty()
+history_placeholder = st.empty()
+admin_placeholder = st.empty()
 gallery_placeholder = st.empty()
 
 
@@ -239,9 +868,9 @@ def initialize_session_state() -> None:
             try:
                 presets = load_presets_config("presets.yaml")
                 _set_session_state('presets', presets)
-                logger.info(f"Presets loaded: {len(presets)} model(s) with presets")
+                logger.info("Presets loaded: %d model(s) with presets", len(presets))
             except (yaml.YAMLError, ValueError) as e:
-                logger.error(f"Error loading presets: {e}")
+                logger.error("Error loading presets: %s", e)
                 _set_session_state('presets', {})
                 try:
                     st.error(f"Error loading presets configuration: {e}")
@@ -260,9 +889,9 @@ def initialize_session_state() -> None:
         try:
             presets = load_presets_config("presets.yaml")
             _set_session_state('presets', presets)
-            logger.info(f"Presets loaded: {len(presets)} model(s) with presets")
+            logger.info("Presets loaded: %d model(s) with presets", len(presets))
         except (yaml.YAMLError, ValueError) as e:
-            logger.error(f"Error loading presets: {e}")
+            logger.error("Error loading presets: %s", e)
             _set_session_state('presets', {})
             try:
                 st.error(f"Error loading presets configuration: {e}")
@@ -280,22 +909,22 @@ def initialize_session_state() -> None:
         for model in models:
             if model.get('default', False) is True:
                 default_model = model
-                logger.info(f"Using explicit default model: {model.get('name', model.get('id'))}")
+                logger.info("Using explicit default model: %s", model.get('name', model.get('id')))
                 break
         
         # If no explicit default, use first model
         if default_model is None:
             default_model = models[0]
-            logger.info(f"Using first model as default: {default_model.get('name', default_model.get('id'))}")
+            logger.info("Using first model as default: %s", default_model.get('name', default_model.get('id')))
         
         # Initialize selected_model with default
         _set_session_state('selected_model', default_model)
         
-        logger.info(f"Session state initialized successfully with {len(models)} model(s)")
+        logger.info("Session state initialized successfully with %d model(s)", len(models))
         
     except FileNotFoundError as e:
         # Handle missing models.yaml - attempt fallback to secrets.toml
-        logger.warning(f"models.yaml not found: {e}")
+        logger.warning("models.yaml not found: %s", e)
         # Show warning to user
         try:
             st.warning(f"models.yaml not found: {e}")
@@ -323,12 +952,12 @@ def initialize_session_state() -> None:
                 try:
                     presets = load_presets_config("presets.yaml")
                     _set_session_state('presets', presets)
-                    logger.info(f"Presets loaded: {len(presets)} model(s) with presets")
+                    logger.info("Presets loaded: %d model(s) with presets", len(presets))
                 except (yaml.YAMLError, ValueError) as e:
-                    logger.error(f"Error loading presets: {e}")
+                    logger.error("Error loading presets: %s", e)
                     _set_session_state('presets', {})
                 
-                logger.info(f"Using fallback configuration from secrets.toml: {fallback_endpoint}")
+                logger.info("Using fallback configuration from secrets.toml: %s", fallback_endpoint)
                 st.info(
                     "ℹ️ **Fallback Mode Activated**\n\n"
                     "The models.yaml configuration file was not found. "
@@ -344,9 +973,9 @@ def initialize_session_state() -> None:
                 try:
                     presets = load_presets_config("presets.yaml")
                     _set_session_state('presets', presets)
-                    logger.info(f"Presets loaded: {len(presets)} model(s) with presets")
+                    logger.info("Presets loaded: %d model(s) with presets", len(presets))
                 except (yaml.YAMLError, ValueError) as e:
-                    logger.error(f"Error loading presets: {e}")
+                    logger.error("Error loading presets: %s", e)
                     _set_session_state('presets', {})
                 
                 logger.error("No fallback configuration available. models.yaml missing and REPLICATE_MODEL_ENDPOINTSTABILITY not found in secrets.toml.")
@@ -359,7 +988,7 @@ def initialize_session_state() -> None:
                 )
         except Exception as fallback_error:
             # Fallback also failed
-            logger.error(f"Fallback to secrets.toml failed: {fallback_error}")
+            logger.error("Fallback to secrets.toml failed: %s", fallback_error)
             _set_session_state('model_configs', [])
             _set_session_state('selected_model', None)
             
@@ -367,9 +996,9 @@ def initialize_session_state() -> None:
             try:
                 presets = load_presets_config("presets.yaml")
                 _set_session_state('presets', presets)
-                logger.info(f"Presets loaded: {len(presets)} model(s) with presets")
+                logger.info("Presets loaded: %d model(s) with presets", len(presets))
             except (yaml.YAMLError, ValueError) as preset_error:
-                logger.error(f"Error loading presets: {preset_error}")
+                logger.error("Error loading presets: %s", preset_error)
                 _set_session_state('presets', {})
             st.error(
                 "❌ **Configuration Error**\n\n"
@@ -381,7 +1010,7 @@ def initialize_session_state() -> None:
     except yaml.YAMLError as e:
         # Handle invalid YAML syntax
         error_msg = str(e)
-        logger.error(f"Invalid YAML syntax in models.yaml: {error_msg}", exc_info=True)
+        logger.error("Invalid YAML syntax in models.yaml: %s", error_msg, exc_info=True)
         _set_session_state('model_configs', [])
         _set_session_state('selected_model', None)
         
@@ -399,7 +1028,7 @@ def initialize_session_state() -> None:
                 }
                 _set_session_state('model_configs', [fallback_model])
                 _set_session_state('selected_model', fallback_model)
-                logger.info(f"Using fallback configuration from secrets.toml due to YAML error: {fallback_endpoint}")
+                logger.info("Using fallback configuration from secrets.toml due to YAML error: %s", fallback_endpoint)
                 st.warning(
                     "⚠️ **YAML Syntax Error - Fallback Mode Activated**\n\n"
                     f"The models.yaml file contains invalid YAML syntax: {error_msg}\n\n"
@@ -424,7 +1053,7 @@ def initialize_session_state() -> None:
     except ValueError as e:
         # Handle validation errors (missing fields, invalid endpoint format, etc.)
         error_msg = str(e)
-        logger.error(f"Model configuration validation error: {error_msg}", exc_info=True)
+        logger.error("Model configuration validation error: %s", error_msg, exc_info=True)
         _set_session_state('model_configs', [])
         _set_session_state('selected_model', None)
         
@@ -442,7 +1071,8 @@ def initialize_session_state() -> None:
                 }
                 _set_session_state('model_configs', [fallback_model])
                 _set_session_state('selected_model', fallback_model)
-                logger.info(f"Using fallback configuration from secrets.toml due to validation error: {fallback_endpoint}")
+                logger.info("Using fallback configuration from secrets.toml due to validation error: %s",
+                            fallback_endpoint)
                 st.warning(
                     "⚠️ **Configuration Validation Error - Fallback Mode Activated**\n\n"
                     f"{error_msg}\n\n"
@@ -465,7 +1095,7 @@ def initialize_session_state() -> None:
     except Exception as e:
         # Handle any other unexpected errors
         error_msg = str(e)
-        logger.error(f"Unexpected error initializing session state: {error_msg}", exc_info=True)
+        logger.error("Unexpected error initializing session state: %s", error_msg, exc_info=True)
         _set_session_state('model_configs', [])
         _set_session_state('selected_model', None)
         
@@ -483,7 +1113,8 @@ def initialize_session_state() -> None:
                 }
                 _set_session_state('model_configs', [fallback_model])
                 _set_session_state('selected_model', fallback_model)
-                logger.info(f"Using fallback configuration from secrets.toml due to unexpected error: {fallback_endpoint}")
+                logger.info("Using fallback configuration from secrets.toml due to unexpected error: %s",
+                            fallback_endpoint)
                 st.warning(
                     "⚠️ **Configuration Error - Fallback Mode Activated**\n\n"
                     f"An unexpected error occurred while loading models.yaml: {error_msg}\n\n"
@@ -581,6 +1212,10 @@ def configure_sidebar() -> None:
                             new_selected_model.get('name') != previous_model.get('name')
                         )
                         
+                        # A switched-away model's in-flight generation will never be shown
+                        if model_changed and previous_model is not None:
+                            _supersede_session_predictions()
+                        
                         # If model changed, preserve current form values before switching
                         if model_changed:
                             # Capture current form values from session state keys (form inputs use keys)
@@ -635,21 +1270,8 @@ def configure_sidebar() -> None:
                                 }
                                 
                                 # Store preset-applied setting values
-                                setting_mappings = {
-                                    'width': 'form_width',
-                                    'height': 'form_height',
-                                    'num_outputs': 'form_num_outputs',
-                                    'scheduler': 'form_scheduler',
-                                    'num_inference_steps': 'form_num_inference_steps',
-                                    'guidance_scale': 'form_guidance_scale',
-                                    'prompt_strength': 'form_prompt_strength',
-                                    'refine': 'form_refine',
-                                    'high_noise_frac': 'form_high_noise_frac',
-                                    'negative_prompt': 'form_negative_prompt',
-                                }
-                                
                                 preset_settings = preset_applied.get('settings', {})
-                                for setting_key, form_key in setting_mappings.items():
+                                for setting_key in SETTING_FORM_KEYS:
                                     if setting_key in preset_settings:
                                         preset_applied_values['settings'][setting_key] = preset_settings[setting_key]
                                 
@@ -819,79 +1441,20 @@ def configure_sidebar() -> None:
                 help="This is a negative prompt, basically type what you don't want to see in the generated image",
                 key='form_negative_prompt'
             )
+            st.checkbox(
+                "🎲 Expand prompt templates",
+                value=False,
+                help="Render `{red|blue}` alternations, `__wordlist__` files and `${var}` variables in the prompt "
+                     "to one random sample per generation",
+                key='form_expand_templates'
+            )
 
             # The Big Red "Submit" Button!
             submitted = st.form_submit_button(
                 "Submit", type="primary", use_container_width=True)
         
-        # Detect user modifications by comparing current form values with preset-applied values
-        # This runs after form fields are rendered, so we can detect if user changed values
-        # Get current model to track modifications per model
-        current_model = st.session_state.get('selected_model', None)
-        current_model_id = current_model.get('id') if current_model else None
-        
-        if current_model_id:
-            preset_applied_values_by_model = st.session_state.get('preset_applied_values_by_model', {})
-            preset_applied_values = preset_applied_values_by_model.get(current_model_id, {'prompt': None, 'settings': {}})
-            
-            user_modified_fields_by_model = st.session_state.get('user_modified_fields_by_model', {})
-            user_modified_fields = user_modified_fields_by_model.get(current_model_id, {
-                'prompt': False,
-                'settings': False,
-                'setting_keys': []  # Use list instead of set
-            })
-        else:
-            # No model selected, skip tracking
-            preset_applied_values = {'prompt': None, 'settings': {}}
-            user_modified_fields = {'prompt': False, 'settings': False, 'setting_keys': []}
-        
-        # Check if prompt was modified
-        current_prompt = st.session_state.get('form_prompt', '')
-        preset_prompt = preset_applied_values.get('prompt')
-        if preset_prompt is not None and current_prompt != preset_prompt:
-            # User has modified prompt
-            user_modified_fields['prompt'] = True
-        
-        # Check if settings were modified
-        setting_mappings = {
-            'width': 'form_width',
-            'height': 'form_height',
-            'num_outputs': 'form_num_outputs',
-            'scheduler': 'form_scheduler',
-            'num_inference_steps': 'form_num_inference_steps',
-            'guidance_scale': 'form_guidance_scale',
-            'prompt_strength': 'form_prompt_strength',
-            'refine': 'form_refine',
-            'high_noise_frac': 'form_high_noise_frac',
-            'negative_prompt': 'form_negative_prompt',
-        }
-        
-        preset_settings = preset_applied_values.get('settings', {})
-        modified_setting_keys = set()
-        
-        for setting_key, form_key in setting_mappings.items():
-            if setting_key in preset_settings:
-                # This setting was set by preset, check if user modified it
-                current_value = st.session_state.get(form_key)
-                preset_value = preset_settings[setting_key]
-                
-                # Compare values (handle different types)
-                if current_value != preset_value:
-                    modified_setting_keys.add(setting_key)
-        
-        # Update user modification tracking (per model)
-        if current_model_id:
-            if modified_setting_keys:
-                user_modified_fields['settings'] = True
-                # Convert existing list to set, merge with new modifications, convert back to list
-                existing_keys = set(user_modified_fields.get('setting_keys', []))
-                all_modified_keys = existing_keys | modified_setting_keys
-                user_modified_fields['setting_keys'] = list(all_modified_keys)
-            
-            # Update session state with modified tracking for this model
-            user_modified_fields_by_model = st.session_state.get('user_modified_fields_by_model', {})
-            user_modified_fields_by_model[current_model_id] = user_modified_fields
-            _set_session_state('user_modified_fields_by_model', user_modified_fields_by_model)
+        # Detect user modifications now that the form fields hold this rerun's values
+        _track_user_modifications()
 
         # Credits and resources
         st.divider()
@@ -935,39 +1498,63 @@ def main_page(submitted: bool, width: int, height: int, num_outputs: int,
         prompt (str): Text prompt for the image generation.
         negative_prompt (str): Text prompt for elements to avoid in the image.
     """
+    # Swap expiring delivery URLs for stored copies persisted since the last rerun
+    _rewrite_persisted_images()
+    _pinned_generations_panel()
+
     if submitted:
-        with st.status('👩🏾‍🍳 Whipping up your words into art...', expanded=True) as status:
+        with st.status('👩🏾‍🍳 Whipping up your words into art...', expanded=True) as status, \
+                _get_tracer().span("submission") as submission, \
+                log_correlation(job_id=submission.trace_id):
             st.write("⚙️ Model initiated")
             st.write("🙆‍♀️ Stand up and strecth in the meantime")
+            # Filled in as the submission progresses, then appended to the request log
+            request = {'session_id': _current_session_id(), 'job_id': submission.trace_id}
             try:
                 # Only call the API if the "Submit" button was pressed
                 if submitted:
-                    # Get the selected model endpoint with backward compatibility fallback
-                    selected_model = st.session_state.get('selected_model', None)
-                    
-                    # Determine endpoint: use selected model endpoint if available, otherwise fallback
-                    if selected_model and isinstance(selected_model, dict) and 'endpoint' in selected_model:
-                        model_endpoint = selected_model['endpoint']
-                        model_name = selected_model.get('name', selected_model.get('id', 'Unknown'))
-                        logger.info(f"Using selected model endpoint: {model_endpoint} (Model: {model_name})")
-                    else:
-                        # Backward compatibility: fallback to secrets.toml endpoint
-                        model_endpoint = get_replicate_model_endpoint()
-                        model_name = "Default (from secrets.toml)"
-                        logger.info(f"Using fallback endpoint: {model_endpoint} (selected_model not available)")
-                        if selected_model is None:
-                            st.warning("⚠️ No model selected. Using default endpoint from secrets.toml.")
-                    
-                    # Validate endpoint is not empty
-                    if not model_endpoint or not isinstance(model_endpoint, str) or not model_endpoint.strip():
-                        raise ValueError(f"Invalid model endpoint: {model_endpoint}. Cannot proceed with image generation.")
-                    
+                    tracer = _get_tracer()
+                    with tracer.span("resolve_preset") as span:
+                        # Get the selected model endpoint with backward compatibility fallback
+                        selected_model = st.session_state.get('selected_model', None)
+
+                        # Determine endpoint: use selected model endpoint if available, otherwise fallback
+                        if selected_model and isinstance(selected_model, dict) and 'endpoint' in selected_model:
+                            model_endpoint = selected_model['endpoint']
+                            model_name = selected_model.get('name', selected_model.get('id', 'Unknown'))
+                            logger.info("Using selected model endpoint: %s (Model: %s)", model_endpoint, model_name)
+                        else:
+                            # Backward compatibility: fallback to secrets.toml endpoint
+                            model_endpoint = get_replicate_model_endpoint()
+                            model_name = "Default (from secrets.toml)"
+                            logger.info("Using fallback endpoint: %s (selected_model not available)", model_endpoint)
+                            if selected_model is None:
+                                st.warning("⚠️ No model selected. Using default endpoint from secrets.toml.")
+
+                        # Validate endpoint is not empty
+                        if not model_endpoint or not isinstance(model_endpoint, str) or not model_endpoint.strip():
+                            raise ValueError(f"Invalid model endpoint: {model_endpoint}. Cannot proceed with image generation.")
+
+                        model_id = selected_model.get('id') if isinstance(selected_model, dict) else None
+                        submission.set_attribute('model_id', model_id)
+                        submission.set_attribute('endpoint', model_endpoint)
+                        span.set_attribute('model_id', model_id)
+                        span.set_attribute('preset_applied', st.session_state.get('preset_applied_for_model_id') == model_id)
+
+                        # Templated prompts ({a|b}, __wordlist__) render to one weighted sample per submission, if opted in
+                        rendered_prompt = _render_prompt_template(prompt)
+                        span.set_attribute('templated', rendered_prompt != prompt)
+                        if rendered_prompt != prompt:
+                            st.write(f"🎲 Prompt: {rendered_prompt}")
+                            prompt = rendered_prompt
+                        request.update(model_id=model_id, endpoint=model_endpoint, prompt=prompt,
+                                       negative_prompt=negative_prompt)
+
                     # Calling the replicate API to get the image
                     with generated_images_placeholder.container():
                         all_images = []  # List to store all generated images
-                        output = replicate.run(
-                            model_endpoint,
-                            input={
+                        with tracer.span("build_input", num_outputs=num_outputs):
+                            model_input = {
                                 "prompt": prompt,
                                 "width": width,
                                 "height": height,
@@ -979,52 +1566,86 @@ def main_page(submitted: bool, width: int, height: int, num_outputs: int,
                                 "refine": refine,
                                 "high_noise_frac": high_noise_frac
                             }
-                        )
+                            max_outputs = selected_model.get('max_outputs') if isinstance(selected_model, dict) else None
+                            telemetry_id = (selected_model.get('id') if isinstance(selected_model, dict) else None) or model_endpoint
+                            log_parser = selected_model.get('log_parser') if isinstance(selected_model, dict) else None
+                        submission.set_attribute('num_outputs', num_outputs)
+                        request['settings'] = {key: value for key, value in model_input.items() if key != 'prompt'}
+                        request['timings'] = {}
+                        # A new submit supersedes this session's earlier, unpinned generations
+                        _supersede_session_predictions()
+                        registry, session_id = _session_registry()
+                        job = None
+                        if registry is not None:
+                            job = registry.begin(session_id, label=prompt[:80],
+                                                 pinned=bool(st.session_state.get('pin_generations')))
+                        output = _generate_with_progress(telemetry_id, model_endpoint, model_input, max_outputs,
+                                                         log_parser=log_parser, job=job, timings=request['timings'])
+                        # Generation details embedded into downloaded PNGs and the archive manifest
+                        generation_record = {
+                            'prompt': prompt,
+                            'negative_prompt': negative_prompt,
+                            'model_id': selected_model.get('id') if isinstance(selected_model, dict) else None,
+                            'endpoint': model_endpoint,
+                            'seed': model_input.get('seed'),
+                            'settings': model_input,
+                        }
                         if output:
                             st.toast(
                                 'Your image has been generated!', icon='😍')
+                            output = [output_url(image) for image in output]
                             # Save generated image to session state
                             _set_session_state('generated_image', output)
 
+                            # Copy outputs to local storage in the background before the URLs expire
+                            persister = _get_persister()
+                            if persister is not None:
+                                for image in output:
+                                    persister.submit(image, on_stored=_download_recorder(
+                                        persister, image, telemetry_id, model_input, submission.context))
+
                             # Displaying the image
-                            for image in st.session_state.generated_image:
-                                with st.container():
-                                    st.image(image, caption="Generated Image 🎈",
-                                             use_column_width=True)
-                                    # Add image to the list
-                                    all_images.append(image)
-
-                                    response = requests.get(image)
+                            with tracer.span("render", images=len(output)):
+                                for idx, image in enumerate(output):
+                                    with st.container():
+                                        st.image(image, caption="Generated Image 🎈",
+                                                 use_column_width=True)
+                                        st.download_button(
+                                            "Download image",
+                                            data=_deferred_image(image, generation_record),
+                                            file_name=f"output_file_{idx + 1}.png",
+                                            mime="image/png",
+                                            on_click="ignore",
+                                            key=f"download_image_{idx + 1}")
+                                        # Add image to the list
+                                        all_images.append(image)
+                        submission.set_attribute('images', len(all_images))
+                        request['images'] = len(all_images)
                         # Save all generated images to session state
                         _set_session_state('all_images', all_images)
 
-                        # Create a BytesIO object
-                        zip_io = io.BytesIO()
-
-                        # Download option for each image
-                        with zipfile.ZipFile(zip_io, 'w') as zipf:
-                            for i, image in enumerate(st.session_state.all_images):
-                                response = requests.get(image)
-                                if response.status_code == 200:
-                                    image_data = response.content
-                                    # Write each image to the zip file with a name
-                                    zipf.writestr(
-                                        f"output_file_{i+1}.png", image_data)
-                                else:
-                                    st.error(
-                                        f"Failed to fetch image {i+1} from {image}. Error code: {response.status_code}", icon="🚨")
-                        # Create a download button for the zip file
+                        # The archive is streamed from the image store only when the button is clicked
+                        archive_format = _get_archive_format()
                         st.download_button(
-                            ":red[**Download All Images**]", data=zip_io.getvalue(), file_name="output_files.zip", mime="application/zip", use_container_width=True)
+                            ":red[**Download All Images**]",
+                            data=_deferred_archive(all_images, [generation_record] * len(all_images), archive_format,
+                                                   trace_parent=submission.context),
+                            file_name=f"output_files.{archive_format}",
+                            mime=ARCHIVE_FORMATS[archive_format],
+                            on_click="ignore",
+                            use_container_width=True)
                 status.update(label="✅ Images generated!",
                               state="complete", expanded=False)
+                _log_request(submission, request, 'succeeded')
+                _record_history(request, all_images)
             except ValueError as e:
                 # Handle validation errors (missing endpoint, invalid endpoint)
+                _submission_failed(submission, 'validation', e, request)
                 error_msg = str(e)
                 selected_model = st.session_state.get('selected_model', None)
                 model_name = selected_model.get('name', 'Unknown') if selected_model else 'Default'
                 model_id = selected_model.get('id', 'unknown') if selected_model else 'unknown'
-                logger.error(f"Validation error for model '{model_name}' (id: {model_id}): {error_msg}")
+                logger.error("Validation error for model '%s' (id: %s): %s", model_name, model_id, error_msg)
                 st.error(
                     f'❌ **Configuration Error for Model "{model_name}"**\n\n'
                     f'{error_msg}\n\n'
@@ -1034,11 +1655,12 @@ def main_page(submitted: bool, width: int, height: int, num_outputs: int,
                 status.update(label="❌ Configuration Error", state="error", expanded=False)
             except KeyError as e:
                 # Handle missing keys in selected_model
+                _submission_failed(submission, 'configuration', e, request)
                 error_msg = f"Missing required field in model configuration: {e}"
                 selected_model = st.session_state.get('selected_model', None)
                 model_name = selected_model.get('name', 'Unknown') if selected_model else 'Unknown'
                 model_id = selected_model.get('id', 'unknown') if selected_model else 'unknown'
-                logger.error(f"Configuration error for model '{model_name}' (id: {model_id}): {error_msg}")
+                logger.error("Configuration error for model '%s' (id: %s): %s", model_name, model_id, error_msg)
                 st.error(
                     f'❌ **Model Configuration Error for "{model_name}"**\n\n'
                     f'{error_msg}\n\n'
@@ -1048,11 +1670,13 @@ def main_page(submitted: bool, width: int, height: int, num_outputs: int,
                 status.update(label="❌ Configuration Error", state="error", expanded=False)
             except requests.exceptions.RequestException as e:
                 # Handle network errors
+                _submission_failed(submission, 'network', e, request)
                 error_msg = str(e)
                 selected_model = st.session_state.get('selected_model', None)
                 model_name = selected_model.get('name', 'Unknown') if selected_model else 'Default'
                 model_id = selected_model.get('id', 'unknown') if selected_model else 'unknown'
-                logger.error(f"Network error for model '{model_name}' (id: {model_id}): {error_msg}", exc_info=True)
+                logger.error("Network error for model '%s' (id: %s): %s",
+                             model_name, model_id, error_msg, exc_info=True)
                 st.error(
                     f'❌ **Network Error with Model "{model_name}"**\n\n'
                     f'Unable to connect to the Replicate API: {error_msg}\n\n'
@@ -1062,11 +1686,13 @@ def main_page(submitted: bool, width: int, height: int, num_outputs: int,
                 status.update(label="❌ Network Error", state="error", expanded=False)
             except replicate.exceptions.ReplicateError as e:
                 # Handle Replicate API-specific errors
+                _submission_failed(submission, 'replicate', e, request)
                 error_msg = str(e)
                 selected_model = st.session_state.get('selected_model', None)
                 model_name = selected_model.get('name', 'Unknown') if selected_model else 'Default'
                 model_id = selected_model.get('id', 'unknown') if selected_model else 'unknown'
-                logger.error(f"Replicate API error for model '{model_name}' (id: {model_id}): {error_msg}", exc_info=True)
+                logger.error("Replicate API error for model '%s' (id: %s): %s",
+                             model_name, model_id, error_msg, exc_info=True)
                 st.error(
                     f'❌ **Replicate API Error with Model "{model_name}"**\n\n'
                     f'{error_msg}\n\n'
@@ -1077,12 +1703,14 @@ def main_page(submitted: bool, width: int, height: int, num_outputs: int,
                 status.update(label="❌ API Error", state="error", expanded=False)
             except Exception as e:
                 # Handle other API errors and unexpected exceptions
+                _submission_failed(submission, 'unexpected', e, request)
                 error_msg = str(e)
                 selected_model = st.session_state.get('selected_model', None)
                 model_name = selected_model.get('name', 'Unknown') if selected_model else 'Default'
                 model_id = selected_model.get('id', 'unknown') if selected_model else 'unknown'
                 error_type = type(e).__name__
-                logger.error(f"Unexpected error for model '{model_name}' (id: {model_id}): {error_type}: {error_msg}", exc_info=True)
+                logger.error("Unexpected error for model '%s' (id: %s): %s: %s",
+                             model_name, model_id, error_type, error_msg, exc_info=True)
                 st.error(
                     f'❌ **Error Generating Image with Model "{model_name}"**\n\n'
                     f'Error type: {error_type}\n'
@@ -1117,6 +1745,829 @@ def main_page(submitted: bool, width: int, height: int, num_outputs: int,
         )
 
 
+def _compare_cell(placeholder, result: CompareResult) -> None:
+    """Render one model's cell in the compare grid."""
+    with placeholder.container():
+        st.markdown(f"**{result.model_name}**")
+        if not result.ok:
+            st.error(f"❌ {result.error}", icon="🚨")
+            return
+        for image in result.outputs:
+            st.image(image, use_column_width=True)
+        caption = f"⏱️ {result.latency:.1f}s"
+        if result.queued >= 0.05:
+            caption += f" (+{result.queued:.1f}s queued)"
+        st.caption(caption)
+
+
+def _compare_grid(count: int, columns: int = 4) -> list:
+    """Create an empty grid of ``count`` cells, ``columns`` per row, and return their placeholders."""
+    placeholders = []
+    for row_start in range(0, count, columns):
+        cols = st.columns(columns)
+        for offset in range(min(columns, count - row_start)):
+            with cols[offset]:
+                placeholders.append(st.empty())
+    return placeholders
+
+
+def _compare_summary(results: list[CompareResult], wall_clock: float) -> None:
+    """Show wall-clock time next to the sum of per-model latencies."""
+    total_latency = sum(result.latency for result in results)
+    st.caption(f"Wall clock {wall_clock:.1f}s for {len(results)} model(s) · "
+               f"sum of model latencies {total_latency:.1f}s")
+
+
+def _run_compare(models: list[dict], prompt: str, negative_prompt: str | None) -> dict:
+    """Fan a prompt out to ``models`` and fill the grid as each model finishes.
+
+    Args:
+        models: Selected model configurations, in grid order
+        prompt: Prompt without trigger words (each model's preset adds its own)
+        negative_prompt: Negative prompt applied to every model
+
+    Returns:
+        Dict with the results in grid order and the wall-clock time
+    """
+    placeholders = _compare_grid(len(models))
+    for placeholder, model in zip(placeholders, models):
+        placeholder.info(f"⏳ {model.get('name', model.get('id'))}...")
+
+    persister = _get_persister()
+    results = []
+    started = time.monotonic()
+    for result in iter_fan_out(models, st.session_state.get('presets', {}), prompt,
+                               _run_prediction, negative_prompt=negative_prompt or None,
+                               limiter=_get_prediction_limiter()):
+        _compare_cell(placeholders[result.index], result)
+        if persister is not None:
+            for image in result.outputs:
+                persister.submit(image)
+        results.append(result)
+    wall_clock = time.monotonic() - started
+    results.sort(key=lambda result: result.index)
+    _compare_summary(results, wall_clock)
+    logger.info("Compare finished: %d model(s) in %.2fs", len(results), wall_clock)
+    return {'results': results, 'wall_clock': wall_clock}
+
+
+def compare_mode() -> None:
+    """Compare mode: run one prompt against several models concurrently.
+
+    Each model gets its own trigger words and default preset. Results fill
+    a grid as each model finishes, with per-model latency.
+    """
+    with compare_placeholder.container():
+        with st.expander("🆚 **Compare models: run one prompt on several models at once**"):
+            model_configs = st.session_state.get('model_configs', [])
+            if not isinstance(model_configs, list) or not model_configs:
+                st.info("No models configured. Add models to models.yaml to compare them.")
+                return
+            names = [model.get('name', model.get('id', 'Unknown')) for model in model_configs]
+            selected_names = st.multiselect("Models", names, default=names, key="compare_models")
+            prompt = st.text_area("Prompt", value="An astronaut riding a rainbow unicorn, cinematic, dramatic",
+                                  help="Each model's trigger words and default preset are added automatically.",
+                                  key="compare_prompt")
+            negative_prompt = st.text_input("Negative prompt", value="the absolute worst quality, distorted features",
+                                            key="compare_negative_prompt")
+            ran = False
+            if st.button("Compare", type="primary", use_container_width=True, key="compare_run"):
+                selected = [model for model, name in zip(model_configs, names) if name in selected_names]
+                if not selected:
+                    st.warning("Select at least one model to compare.")
+                elif not isinstance(prompt, str) or not prompt.strip():
+                    st.warning("Enter a prompt to compare.")
+                else:
+                    _set_session_state('compare_results', _run_compare(selected, prompt, negative_prompt))
+                    ran = True
+
+            # Re-render the last comparison on later reruns
+            previous = st.session_state.get('compare_results')
+            if previous and not ran:
+                for placeholder, result in zip(_compare_grid(len(previous['results'])), previous['results']):
+                    _compare_cell(placeholder, result)
+                _compare_summary(previous['results'], previous['wall_clock'])
+
+
+def _run_sweep(model: dict, prompt: str, params: dict, seed: int | None, column_param: str,
+               max_concurrency: int) -> dict:
+    """Run a parameter sweep and compose its contact sheet.
+
+    Cells whose exact inputs are already in the result cache are not re-run.
+    The remaining cells run concurrently under ``max_concurrency`` and the
+    global prediction cap.
+
+    Args:
+        model: Model configuration to sweep
+        prompt: Prompt without trigger words (the model's preset adds them)
+        params: Parameter name to list of values
+        seed: Fixed seed shared by all cells, so only the swept parameters differ
+        column_param: Parameter laid out across columns
+        max_concurrency: Maximum cells in flight
+
+    Returns:
+        Dict with the PNG contact sheet, counts and the per-cell results
+
+    Raises:
+        ValueError: If the sweep is empty, too large or the model is invalid
+    """
+    base_settings = {'seed': seed} if seed is not None else {}
+    plan = plan_sweep(model, st.session_state.get('presets', {}), prompt, params,
+                      base_settings=base_settings, column_param=column_param)
+    progress_bar = st.progress(0.0, text=f"0/{len(plan.jobs)} cells · starting…")
+    persister = _get_persister()
+
+    def _on_result(result: BatchResult, progress: BatchProgress) -> None:
+        if persister is not None and result.ok and not result.resumed:
+            for image in result.outputs:
+                persister.submit(image)
+        progress_bar.progress(progress.fraction, text=_batch_progress_text(progress, unit="cells"))
+
+    results = run_batch(plan.jobs, _run_batch_prediction, max_concurrency=max_concurrency,
+                        checkpoint=_get_result_cache(), total=len(plan.jobs), on_result=_on_result)
+
+    store = _get_image_store()
+    thumbnails = load_thumbnails(results, lambda output: ensure_stored(output, store, http_fetch))
+    sheet = build_contact_sheet(thumbnails, plan.row_labels, plan.column_labels)
+    executed, cached, failed = sweep_summary(results)
+    logger.info("Sweep finished: %s executed, %s cached, %s failed", executed, cached, failed)
+    return {'sheet': contact_sheet_png(sheet), 'executed': executed, 'cached': cached,
+            'failed': failed, 'results': results}
+
+
+def _render_sweep(sweep: dict) -> None:
+    """Show the sweep contact sheet and its download button."""
+    st.caption(f"{sweep['executed']} cell(s) generated · {sweep['cached']} from cache · {sweep['failed']} failed")
+    st.image(sweep['sheet'], caption="Parameter sweep", use_column_width=True)
+    st.download_button("Download contact sheet", data=sweep['sheet'], file_name="sweep_contact_sheet.png",
+                       mime="image/png", on_click="ignore", key="download_sweep_sheet")
+
+
+def sweep_mode() -> None:
+    """Sweep mode: generate a grid over guidance scale, steps and scheduler values.
+
+    Cells run against the model selected in the sidebar, with a fixed seed so
+    only the swept parameters change. The result is a single contact-sheet
+    image with labelled axes.
+    """
+    with sweep_placeholder.container():
+        with st.expander("🎛️ **Parameter sweep: compare settings side by side**"):
+            selected_model = st.session_state.get('selected_model', None)
+            if not isinstance(selected_model, dict) or not selected_model.get('endpoint'):
+                st.info("Select a model in the sidebar to run a sweep.")
+                return
+            st.caption(f"Model: **{selected_model.get('name', selected_model.get('id'))}**. "
+                       "Enter comma-separated values for each parameter.")
+            prompt = st.text_area("Prompt", value="An astronaut riding a rainbow unicorn, cinematic, dramatic",
+                                  key="sweep_prompt")
+            guidance_text = st.text_input("guidance_scale values", value="5, 7.5, 10", key="sweep_guidance_scale")
+            steps_text = st.text_input("num_inference_steps values", value="25, 50", key="sweep_num_inference_steps")
+            schedulers = st.multiselect(
+                "scheduler values",
+                ['DDIM', 'DPMSolverMultistep', 'HeunDiscrete', 'KarrasDPM', 'K_EULER_ANCESTRAL', 'K_EULER', 'PNDM'],
+                default=['DDIM'], key="sweep_scheduler")
+            column_param = st.selectbox("Columns", SWEEP_PARAMS, index=0, key="sweep_columns")
+            seed = st.number_input("Seed (shared by every cell)", min_value=0, value=42, step=1, key="sweep_seed")
+
+            if st.button("Run sweep", type="primary", use_container_width=True, key="sweep_run"):
+                try:
+                    params = {
+                        'guidance_scale': parse_values(guidance_text, float),
+                        'num_inference_steps': parse_values(steps_text, int),
+                        'scheduler': list(schedulers),
+                    }
+                    _set_session_state('sweep_result', _run_sweep(
+                        selected_model, prompt, params, int(seed), column_param, _get_batch_concurrency()))
+                except ValueError as e:
+                    logger.error("Sweep error: %s", e)
+                    st.error(f"❌ **Sweep Error**\n\n{e}", icon="🚨")
+
+            sweep = st.session_state.get('sweep_result')
+            if sweep:
+                _render_sweep(sweep)
+
+
+def _run_progressive_jobs(jobs: list, stage: str) -> dict[int, BatchResult]:
+    """Run progressive draft or final jobs concurrently, reusing cached results.
+
+    Args:
+        jobs: Draft or final jobs from a ProgressivePlan
+        stage: "draft" or "final", used in the progress label
+
+    Returns:
+        Results keyed by draft index
+    """
+    progress_bar = st.progress(0.0, text=f"0/{len(jobs)} {stage}s · starting…")
+    persister = _get_persister()
+    telemetry = _get_telemetry()
+
+    def _on_result(result: BatchResult, progress: BatchProgress) -> None:
+        if result.ok and not result.resumed:
+            telemetry.record(result.job.record.get('model_id') or result.job.endpoint,
+                             result.job.model_input, {'total': result.duration})
+            if persister is not None:
+                for image in result.outputs:
+                    persister.submit(image)
+        progress_bar.progress(progress.fraction, text=_batch_progress_text(progress, unit=f"{stage}s"))
+
+    results = run_batch(jobs, _run_batch_prediction, max_concurrency=_get_batch_concurrency(),
+                        checkpoint=_get_result_cache(), total=len(jobs), on_result=_on_result)
+    return {result.job.index: result for result in results if result is not None}
+
+
+def _promote_drafts(state: dict, indices: list[int]) -> None:
+    """Render the chosen drafts at full quality and remember the results in ``state``."""
+    plan: ProgressivePlan = state['plan']
+    jobs = [plan.finals[idx] for idx in indices if idx not in state['finals'] or not state['finals'][idx].ok]
+    if jobs:
+        state['finals'].update(_run_progressive_jobs(jobs, "final"))
+
+
+def _render_progressive(state: dict) -> list[int]:
+    """Show drafts next to their promoted renders; return the indices ticked for promotion."""
+    plan: ProgressivePlan = state['plan']
+    chosen = []
+    for placeholder, draft_job in zip(_compare_grid(len(plan.drafts)), plan.drafts):
+        idx = draft_job.index
+        draft, final = state['drafts'].get(idx), state['finals'].get(idx)
+        settings = draft_job.model_input
+        with placeholder.container():
+            if final is not None and final.ok and final.outputs:
+                st.image(final.outputs[0], caption=f"Final · seed {settings.get('seed')}", use_column_width=True)
+            elif draft is not None and draft.ok and draft.outputs:
+                st.image(draft.outputs[0], use_column_width=True,
+                         caption=f"Draft · seed {settings.get('seed')} · {settings.get('num_inference_steps')} steps · "
+                                 f"{settings.get('width')}×{settings.get('height')}")
+                if final is not None:
+                    st.warning(f"Final render failed: {final.error}")
+                if st.checkbox("Promote", key=f"progressive_promote_{idx}"):
+                    chosen.append(idx)
+            else:
+                st.error(f"**Seed {settings.get('seed')}**\n\n{draft.error if draft else 'Not run'}", icon="🚨")
+    return chosen
+
+
+def progressive_mode() -> None:
+    """Progressive mode: quick low-step, low-resolution drafts first, then full-quality renders.
+
+    Each draft has its own seed, so promoting it renders the same composition
+    with the final settings. Draft and final settings come from the preset's
+    ``progressive`` section in presets.yaml, which can also promote every
+    draft automatically.
+    """
+    with progressive_placeholder.container():
+        with st.expander("⚡ **Progressive: quick drafts first, promote the best to full quality**"):
+            selected_model = st.session_state.get('selected_model', None)
+            if not isinstance(selected_model, dict) or not selected_model.get('endpoint'):
+                st.info("Select a model in the sidebar to draft with it.")
+                return
+            prompt = st.text_area("Prompt", value="An astronaut riding a rainbow unicorn, cinematic, dramatic",
+                                  key="progressive_prompt")
+            count = st.slider("Drafts", min_value=1, max_value=MAX_DRAFTS, value=4, key="progressive_count")
+            seed = st.number_input("First seed (blank for random)", min_value=0, value=None, step=1,
+                                   key="progressive_seed")
+
+            if st.button("Draft", type="primary", use_container_width=True, key="progressive_run"):
+                try:
+                    plan = plan_progressive(selected_model, st.session_state.get('presets', {}), prompt,
+                                            count=int(count), seed=int(seed) if seed is not None else None)
+                    state = {'plan': plan, 'drafts': _run_progressive_jobs(plan.drafts, "draft"), 'finals': {}}
+                    if plan.auto_promote:
+                        _promote_drafts(state, [idx for idx, result in state['drafts'].items() if result.ok])
+                    _set_session_state('progressive_result', state)
+                except ValueError as e:
+                    logger.error("Progressive mode error: %s", e)
+                    st.error(f"❌ **Progressive Error**\n\n{e}", icon="🚨")
+
+            state = st.session_state.get('progressive_result')
+            if state:
+                chosen = _render_progressive(state)
+                if st.button("Promote selected drafts", disabled=not chosen, use_container_width=True,
+                             key="progressive_promote"):
+                    _promote_drafts(state, chosen)
+                    st.rerun()
+
+
+def _get_batch_concurrency() -> int:
+    """Get the default number of concurrent batch predictions (BATCH_CONCURRENCY, 1-16)."""
+    return _get_int_setting("BATCH_CONCURRENCY", DEFAULT_MAX_CONCURRENCY, maximum=16)
+
+
+def _run_prediction(endpoint: str, model_input: dict, on_logs: LogCallback | None = None,
+                    on_created: CreatedCallback | None = None):
+    """Run one prediction, routed across deployments if the model has routes.
+
+    Called from worker threads, so it must not touch Streamlit APIs.
+
+    Args:
+        endpoint: Replicate endpoint
+        model_input: Prediction input
+        on_logs: Optional callback receiving the prediction's logs while it runs
+        on_created: Optional callback receiving the prediction once created, so it can be canceled
+    """
+    router = _get_router()
+    if router is not None and router.has_routes(endpoint):
+        return router.run(endpoint, model_input,
+                          lambda route, route_input: _run_route(route, route_input, on_logs, on_created))
+    return _run_endpoint(endpoint, model_input, on_logs, on_created)
+
+
+def _run_route(route: Route, model_input: dict, on_logs: LogCallback | None = None,
+               on_created: CreatedCallback | None = None):
+    """Run one prediction on a route: a deployment, or an endpoint (hedged if configured)."""
+    if route.kind == 'deployment':
+        return run_deployment(replicate, route.target, model_input, on_logs=on_logs, on_created=on_created)
+    return _run_endpoint(route.target, model_input, on_logs, on_created)
+
+
+def _run_endpoint(endpoint: str, model_input: dict, on_logs: LogCallback | None = None,
+                  on_created: CreatedCallback | None = None):
+    """Run one prediction on an endpoint, hedged if the endpoint has a hedge policy.
+
+    With ``on_logs`` or ``on_created`` the prediction is created and polled so
+    its logs can be followed and it can be canceled; a hedged run passes
+    every prediction it creates, hedges included, to ``on_created`` and the
+    logs of the first one to start to ``on_logs``.
+    """
+    hedger = _get_hedger()
+    if hedger is not None and hedger.policy_for(endpoint) is not None:
+        return hedger.run(endpoint, model_input, on_logs=on_logs, on_created=on_created)
+    if on_logs is not None or on_created is not None:
+        return run_with_logs(replicate, endpoint, model_input, on_logs, on_created=on_created)
+    return replicate.run(endpoint, input=model_input)
+
+
+def _timed_prediction(endpoint: str, model_input: dict, max_outputs: int | None,
+                      on_logs: LogCallback | None = None,
+                      on_created: CreatedCallback | None = None,
+                      job: InflightJob | None = None) -> tuple[list, dict]:
+    """Run a single generation, coalesced or under the concurrency cap, and time its phases.
+
+    Called from a worker thread, so it must not touch Streamlit APIs.
+
+    Args:
+        job: The session's in-flight job; if it was superseded while waiting
+            for a slot, no prediction is created. A coalesced prediction is
+            shared with other requests, so it is never attached to the job
+            (canceling it would cancel theirs too).
+
+    Returns:
+        The outputs and the seconds spent per telemetry phase ('queue', 'predict')
+
+    Raises:
+        PredictionCanceled: If the job was canceled before its prediction was created
+    """
+    tracer = _get_tracer()
+    coalescer = _get_coalescer()
+    if coalescer is not None:
+        if job is not None and job.canceled:
+            raise PredictionCanceled(f"Job {job.job_id} was superseded before it was submitted")
+        # Time waiting for other requests to join is part of the shared prediction
+        started = time.monotonic()
+        with tracer.span("prediction", endpoint=endpoint, coalesced=True):
+            output = coalescer.submit(endpoint, model_input, max_outputs=max_outputs or DEFAULT_MAX_OUTPUTS)
+        return output, {'predict': time.monotonic() - started}
+    with _get_prediction_limiter().slot() as waited:
+        now = time.time()
+        tracer.record("queue_wait", now - waited, now, endpoint=endpoint)
+        if job is not None and job.canceled:
+            raise PredictionCanceled(f"Job {job.job_id} was superseded while waiting for a prediction slot")
+        started = time.monotonic()
+        with tracer.span("prediction", endpoint=endpoint, num_outputs=model_input.get('num_outputs')) as span:
+            created = []
+            try:
+                output = _run_prediction(endpoint, model_input, on_logs,
+                                         _traced_created(tracer, span, on_created, created))
+            finally:
+                # Predictions are reloaded in place while followed, so they now carry Replicate's timestamps
+                for prediction, created_at in created:
+                    tracer.record_prediction(prediction, created_at, parent=span.context)
+            span.set_attribute('outputs', len(output) if isinstance(output, list) else None)
+        return output, {'queue': waited, 'predict': time.monotonic() - started}
+
+
+def _traced_created(tracer: Tracer, span: Span, on_created: CreatedCallback | None,
+                    created: list) -> CreatedCallback | None:
+    """Wrap an on_created callback to trace the prediction create call.
+
+    Each created prediction is appended to ``created`` with the time it was
+    created, for Replicate's queue and processing spans once it finishes.
+    Without a callback the prediction runs through ``replicate.run`` and
+    only the enclosing "prediction" span is recorded.
+    """
+    if on_created is None:
+        return None
+
+    def _on_created(prediction) -> None:
+        now = time.time()
+        prediction_id = getattr(prediction, 'id', None)
+        tracer.record("prediction.create", span.start, now, parent=span.context, prediction_id=prediction_id)
+        span.set_attribute('prediction_id', prediction_id)
+        created.append((prediction, now))
+        on_created(prediction)
+
+    return _on_created
+
+
+def _tracked_prediction(job: InflightJob | None, endpoint: str, model_input: dict, max_outputs: int | None,
+                        on_logs: LogCallback | None = None) -> tuple[list, dict]:
+    """Run _timed_prediction, keeping the session's in-flight registry up to date.
+
+    Runs in the worker thread, so the job is finished even if the script run
+    that started it was interrupted by a rerun.
+    """
+    if job is None:
+        return _timed_prediction(endpoint, model_input, max_outputs, on_logs)
+    registry = _get_inflight_registry()
+    try:
+        output, phases = _timed_prediction(endpoint, model_input, max_outputs, on_logs,
+                                           lambda prediction: registry.attach(job, prediction), job)
+    except Exception as e:
+        registry.finish(job, error=str(e))
+        raise
+    registry.finish(job, outputs=[output_url(image) for image in output or []])
+    return output, phases
+
+
+def _generation_progress_text(elapsed: float, estimate: float | None) -> str:
+    """Format the single-generation progress bar label with elapsed time and ETA."""
+    if estimate is None:
+        return f"⏳ {format_eta(elapsed)} elapsed · first run of these settings, no ETA yet"
+    if elapsed <= estimate:
+        return f"⏳ {format_eta(elapsed)} elapsed · ETA {format_eta(estimate - elapsed)}"
+    return f"⏳ {format_eta(elapsed)} elapsed · taking longer than the usual {format_eta(estimate)}"
+
+
+def _step_progress_text(tracker: LogProgressTracker) -> str:
+    """Format the progress bar label from the sampler step counter parsed from the logs."""
+    progress = tracker.latest
+    text = f"🖌️ Step {progress.step}/{progress.total}"
+    if progress.pass_number > 1:
+        text += f" (pass {progress.pass_number})"
+    return f"{text} · ETA {format_eta(tracker.eta())}"
+
+
+def _generate_with_progress(model_id: str, endpoint: str, model_input: dict, max_outputs: int | None,
+                            log_parser: str | None = None, job: InflightJob | None = None,
+                            poll_interval: float = 0.25, timings: dict | None = None) -> list:
+    """Run a single generation in a worker thread while a progress bar tracks it.
+
+    For models with a ``log_parser`` the bar follows the sampler step counter
+    in the prediction logs. Otherwise, and until the first step is logged, it
+    follows the median total time of earlier generations of the same model
+    and setting bucket (see TelemetryStore.estimate). Queue, predict and total
+    time are recorded once the generation succeeds.
+
+    Args:
+        model_id: Model id used as the telemetry key
+        endpoint: Replicate endpoint
+        model_input: Prediction input
+        max_outputs: Per-model cap on merged outputs when coalescing
+        log_parser: Log parser family from models.yaml, or None to skip log polling
+        job: In-flight registry job, so a later submit can cancel this prediction
+        poll_interval: Seconds between progress bar updates
+        timings: Filled with the queue, predict and total seconds once the generation succeeds
+
+    Returns:
+        The prediction outputs
+
+    Raises:
+        Exception: Whatever the prediction raised
+    """
+    telemetry = _get_telemetry()
+    estimate = telemetry.estimate(model_id, model_input)
+    tracker = LogProgressTracker(get_log_parser(log_parser)) if log_parser else None
+    progress = st.progress(0.0, text=_generation_progress_text(0.0, estimate))
+    started = time.monotonic()
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="generation")
+    try:
+        # Bound to the open span and log ids so the worker's spans and records belong to the submission
+        worker = bind_correlation(_get_tracer().bind(_tracked_prediction))
+        future = executor.submit(worker, job, endpoint, model_input, max_outputs,
+                                 tracker.update if tracker is not None else None)
+        while not wait([future], timeout=poll_interval).done:
+            if job is not None:
+                _get_inflight_registry().touch(job.session_id)
+            if tracker is not None and tracker.latest is not None:
+                progress.progress(min(tracker.latest.fraction, 0.99), text=_step_progress_text(tracker))
+                continue
+            elapsed = time.monotonic() - started
+            progress.progress(progress_fraction(elapsed, estimate), text=_generation_progress_text(elapsed, estimate))
+        output, phases = future.result()
+        if job is not None:
+            # Delivered here, so a pinned job must not be shown again on the next rerun
+            _get_inflight_registry().discard(job)
+    finally:
+        # Never block a rerun on an abandoned prediction; it is canceled by the next submit or the reaper
+        executor.shutdown(wait=False)
+    total = time.monotonic() - started
+    phases = {**phases, 'total': total}
+    telemetry.record(model_id, model_input, phases)
+    if timings is not None:
+        timings.update({phase: round(seconds, 3) for phase, seconds in phases.items()})
+    progress.progress(1.0, text=f"✅ Done in {format_eta(total)}")
+    return output
+
+
+def _run_limited_prediction(endpoint: str, model_input: dict):
+    """Run one prediction under the global concurrency cap (see _get_prediction_limiter)."""
+    with _get_prediction_limiter().slot():
+        return _run_prediction(endpoint, model_input)
+
+
+def _run_batch_prediction(job) -> list:
+    """Run one batch prediction. Called from batch worker threads, so it must not touch Streamlit APIs."""
+    return _run_limited_prediction(job.endpoint, job.model_input)
+
+
+def _batch_progress_text(progress: BatchProgress, unit: str = "prompts") -> str:
+    """Format the batch progress bar label with throughput and ETA."""
+    text = f"{progress.done}/{progress.total} {unit} · {progress.rate * 60:.1f}/min · ETA {format_eta(progress.eta_seconds)}"
+    if progress.failed:
+        text += f" · {progress.failed} failed"
+    return text
+
+
+def _read_batch_source(uploaded, path: str) -> tuple[str, bytes]:
+    """Return (file name, content) from an uploaded file or a path on the server.
+
+    Raises:
+        ValueError: If neither source was provided
+        FileNotFoundError: If the path does not exist
+    """
+    if uploaded is not None:
+        return uploaded.name, uploaded.getvalue()
+    if isinstance(path, str) and path.strip():
+        batch_path = Path(path.strip())
+        return batch_path.name, batch_path.read_bytes()
+    raise ValueError("Upload a batch file or enter the path to one.")
+
+
+def _run_batch_file(name: str, content: bytes, max_concurrency: int) -> list[BatchResult]:
+    """Plan and run a batch file, updating a progress bar as prompts complete.
+
+    Rows without a model_id use the model selected in the sidebar. Finished
+    prompts are checkpointed under BATCH_DIR, keyed by the file content, so
+    running the same file again resumes where it stopped. Templated prompts
+    expand into one prompt per combination (up to TEMPLATE_MAX_COMBINATIONS
+    per row), generated lazily as workers become free.
+
+    Args:
+        name: File name (used to detect JSONL vs CSV)
+        content: Raw file content
+        max_concurrency: Maximum number of predictions in flight
+
+    Returns:
+        Results in row order
+
+    Raises:
+        ValueError: If the file or one of its rows is invalid
+    """
+    rows = list(iter_batch_rows(content, detect_batch_format(name)))
+    if not rows:
+        raise ValueError("The batch file has no prompt rows.")
+    selected_model = st.session_state.get('selected_model', None)
+    default_model_id = selected_model.get('id') if isinstance(selected_model, dict) else None
+    models = st.session_state.get('model_configs', [])
+    presets = st.session_state.get('presets', {})
+    wordlists = _get_wordlists()
+    max_combinations = _get_template_max_combinations()
+    # Validate every row and template up front so a bad row fails before any prediction is paid for
+    total = count_expanded(rows, wordlists, max_combinations)
+    for _ in plan_jobs(rows, models, presets, default_model_id):
+        pass
+    # Templated rows expand lazily as the scheduler pulls jobs, so large expansions never sit in memory
+    jobs = plan_jobs(expand_rows(rows, wordlists, max_combinations), models, presets, default_model_id)
+    checkpoint = BatchCheckpoint(checkpoint_path_for(get_secret("BATCH_DIR", "batches"), content))
+
+    progress_bar = st.progress(0.0, text=f"0/{total} prompts · starting…")
+    persister = _get_persister()
+
+    def _on_result(result: BatchResult, progress: BatchProgress) -> None:
+        if persister is not None and result.ok and not result.resumed:
+            for image in result.outputs:
+                persister.submit(image)
+        progress_bar.progress(progress.fraction, text=_batch_progress_text(progress))
+
+    logger.info("Running batch '%s': %s prompt(s) from %d row(s), concurrency %s",
+                name, total, len(rows), max_concurrency)
+    return run_batch(jobs, _run_batch_prediction, max_concurrency=max_concurrency,
+                     checkpoint=checkpoint, total=total, on_result=_on_result)
+
+
+def _render_batch_results(results: list[BatchResult]) -> None:
+    """Show a batch summary, failures and the streamed results archive."""
+    succeeded = [result for result in results if result.ok]
+    failed = [result for result in results if not result.ok]
+    resumed = sum(1 for result in results if result.resumed)
+    summary = f"✅ {len(succeeded)} of {len(results)} prompts completed"
+    if resumed:
+        summary += f" ({resumed} resumed from a previous run)"
+    st.success(summary)
+    if failed:
+        with st.expander(f"⚠️ {len(failed)} prompt(s) failed"):
+            for result in failed:
+                st.write(f"**{result.job.record.get('job_id')}**: {result.error}")
+
+    outputs, records = archive_inputs(results)
+    if outputs:
+        archive_format = _get_archive_format()
+        st.download_button(
+            ":red[**Download Batch Results**]",
+            data=_deferred_archive(outputs, records, archive_format, name_template="batch_{index:05d}.png"),
+            file_name=f"batch_results.{archive_format}",
+            mime=ARCHIVE_FORMATS[archive_format],
+            on_click="ignore",
+            use_container_width=True,
+            key="download_batch_results")
+
+
+def batch_mode() -> None:
+    """Batch mode: run a JSONL or CSV file of prompts with bounded concurrency.
+
+    Each row needs a prompt and may override model_id, preset, negative_prompt
+    and any generation setting. Presets and trigger words are applied per row
+    the same way the sidebar applies them.
+    """
+    with batch_placeholder.container():
+        with st.expander("📦 **Batch mode: run a JSONL or CSV file of prompts**"):
+            st.caption(
+                'One row per prompt, e.g. `{"id": "fox-1", "prompt": "a red fox", "model_id": "sdxl", '
+                '"preset": "sdxl-default", "settings": {"num_inference_steps": 30}}`. '
+                'CSV files need a `prompt` column; extra columns are treated as settings. '
+                'Prompts may be templates: `{red|blue}` expands to one prompt per option, '
+                '`__colors__` reads options from a wordlist file.'
+            )
+            uploaded = st.file_uploader("Prompt file", type=list(BATCH_FORMATS) + ["json"], key="batch_file")
+            path = st.text_input("...or path to a prompt file on the server", key="batch_path")
+            max_concurrency = st.slider("Concurrent predictions", min_value=1, max_value=16,
+                                        value=_get_batch_concurrency(), key="batch_concurrency")
+            if st.button("Run batch", type="primary", use_container_width=True, key="batch_run"):
+                try:
+                    name, content = _read_batch_source(uploaded, path)
+                    _set_session_state('batch_results', _run_batch_file(name, content, max_concurrency))
+                except (ValueError, FileNotFoundError) as e:
+                    logger.error("Batch error: %s", e)
+                    st.error(f"❌ **Batch Error**\n\n{e}", icon="🚨")
+
+            results = st.session_state.get('batch_results')
+            if results:
+                _render_batch_results(results)
+
+
+def _history_thumbnail(output: dict) -> bytes | str | None:
+    """Thumbnail of a history output from the image store, or its delivery URL if it was never stored."""
+    store = _get_image_store()
+    key = output.get('key')
+    if key and store.contains(key):
+        thumbnail = thumbnail_png(str(store.path_for(key)))
+        if thumbnail is not None:
+            return thumbnail
+    return output.get('url')
+
+
+def _render_history_entry(entry: HistoryEntry) -> None:
+    """Show one past generation: its first output's thumbnail next to the prompt and settings."""
+    thumb_col, detail_col = st.columns([1, 3])
+    with thumb_col:
+        thumbnail = _history_thumbnail(entry.outputs[0]) if entry.outputs else None
+        if thumbnail is not None:
+            st.image(thumbnail, use_column_width=True)
+    with detail_col:
+        st.code(entry.prompt, language=None)
+        details = [time.strftime("%Y-%m-%d %H:%M", time.localtime(entry.created)), entry.model_id or entry.endpoint]
+        if entry.preset:
+            details.append(f"preset {entry.preset}")
+        if entry.seed is not None:
+            details.append(f"seed {entry.seed}")
+        if entry.timings.get('total') is not None:
+            details.append(f"{entry.timings['total']:.1f}s")
+        details.append(f"{len(entry.outputs)} image(s)")
+        st.caption(" · ".join(str(detail) for detail in details if detail))
+        if entry.negative_prompt:
+            st.caption(f"Negative prompt: {entry.negative_prompt}")
+        st.json({'settings': entry.settings, 'outputs': entry.outputs}, expanded=False)
+
+
+def history_panel() -> None:
+    """History panel: search past generations by prompt, newest first, a page at a time.
+
+    Pages are fetched by cursor; the cursors of the pages seen so far are
+    kept in session state so "Newer" can step back, and are reset when the
+    search changes. Thumbnails are built only for the page on screen.
+    Nothing is queried until "Show history" is ticked, so reruns with the
+    panel closed never touch the database.
+    """
+    history = _get_history()
+    if history is None:
+        return
+    with history_placeholder.container():
+        with st.expander("🕘 **History: find the prompt behind an image**"):
+            if not st.checkbox("Show history", value=False, key="history_show"):
+                return
+            query = st.text_input("Search prompts", key="history_query", placeholder="e.g. red fox lighthouse")
+            model_id = st.selectbox("Model", [None] + history.models(), key="history_model",
+                                    format_func=lambda option: "All models" if option is None else option)
+            if st.session_state.get('history_filters') != (query, model_id):
+                _set_session_state('history_filters', (query, model_id))
+                _set_session_state('history_cursors', [None])
+            cursors = st.session_state.get('history_cursors') or [None]
+            page = history.search(query, model_id, cursors[-1], limit=DEFAULT_PAGE_SIZE)
+            if not page.entries:
+                st.info("No matching generations yet." if query or model_id else "No generations recorded yet.")
+                return
+            for entry in page.entries:
+                _render_history_entry(entry)
+
+            newer_col, older_col = st.columns(2)
+            with newer_col:
+                if st.button("‹ Newer", disabled=len(cursors) == 1, use_container_width=True, key="history_newer"):
+                    _set_session_state('history_cursors', cursors[:-1])
+                    st.rerun()
+            with older_col:
+                if st.button("Older ›", disabled=page.next_cursor is None, use_container_width=True,
+                             key="history_older"):
+                    _set_session_state('history_cursors', cursors + [page.next_cursor])
+                    st.rerun()
+
+
+def _stats_table(stats: dict) -> list[dict]:
+    """Flatten per-endpoint counter dicts into table rows."""
+    return [{'endpoint': endpoint, **counters} for endpoint, counters in stats.items()]
+
+
+def admin_view() -> None:
+    """Admin view (open the app with ``?admin=1``): latency telemetry and runtime counters.
+
+    Shows p50/p95 queue, predict, download and total time per model and
+    setting bucket, plus the concurrency limiter, in-flight registry,
+    coalescer, hedger, router, result cache, tracing, request log, history, logging and persister counters. Aggregates are per process.
+    """
+    if st.query_params.get("admin") != "1":
+        return
+    with admin_placeholder.container():
+        with st.expander("🛠️ **Admin: latency telemetry and runtime stats**", expanded=True):
+            telemetry = _get_telemetry()
+            throughput = telemetry.throughput()
+            if throughput:
+                st.caption(" · ".join(f"{model}: {count} generation(s)" for model, count in throughput.items()))
+                st.dataframe(telemetry.snapshot(), use_container_width=True, hide_index=True,
+                             column_config={name: st.column_config.NumberColumn(name, format="%.2f s")
+                                            for name in ('mean', 'p50', 'p95', 'max')})
+            else:
+                st.info("No generations recorded yet in this process.")
+
+            st.markdown("**Runtime**")
+            runtime = {'prediction limiter': _get_prediction_limiter().stats(),
+                       'in-flight predictions': _get_inflight_registry().stats(),
+                       'result cache': _get_result_cache().stats(),
+                       'tracing': _get_tracer().stats()}
+            request_log = _get_request_log()
+            if request_log is not None:
+                runtime['request log'] = request_log.stats()
+            history = _get_history()
+            if history is not None:
+                runtime['history'] = history.stats()
+            pipeline = _get_log_pipeline()
+            if pipeline is not None:
+                runtime['logging'] = pipeline.stats()
+            persister = _get_persister()
+            if persister is not None:
+                runtime['persister'] = persister.stats()
+            coalescer = _get_coalescer()
+            if coalescer is not None:
+                runtime['coalescer'] = coalescer.stats()
+            st.json(runtime)
+            hedger = _get_hedger()
+            if hedger is not None:
+                st.markdown("**Hedging**")
+                st.dataframe(_stats_table(hedger.stats()), use_container_width=True, hide_index=True)
+            router = _get_router()
+            if router is not None:
+                st.markdown("**Routes**")
+                st.dataframe([{'endpoint': endpoint, **route} for endpoint, routes in router.stats().items()
+                              for route in routes], use_container_width=True, hide_index=True)
+            _profiled_reruns_panel()
+
+
+def _profiled_reruns_panel() -> None:
+    """List the slowest recent profiled reruns, with a download for each profile file."""
+    st.markdown("**Slowest recent reruns**")
+    profiler = _get_rerun_profiler()
+    slowest = profiler.slowest(10)
+    if not slowest:
+        st.caption('No profiled reruns yet. Open the app with `?profile=1` or set PROFILE_RERUNS = "true".')
+        return
+    st.dataframe([profile.to_row() for profile in slowest], use_container_width=True, hide_index=True)
+    names = [profile.path.name for profile in slowest]
+    choice = st.selectbox("Profile", names, key="admin_profile_choice",
+                          help="pstats files open with `python -m pstats`; speedscope files at speedscope.app")
+    profile = slowest[names.index(choice)]
+    st.download_button("Download profile", data=profile.path.read_bytes if profile.path.exists() else b"",
+                       file_name=profile.path.name, mime="application/octet-stream", on_click="ignore",
+                       key="download_rerun_profile")
+
+
 def main():
     """
     Main function to run the Streamlit application.
@@ -1126,6 +2577,8 @@ def main():
     - Initializes the sidebar configuration
     - Sets up the main page layout
     - Retrieves user inputs from the sidebar and passes them to the main page function
+    - Renders progressive, compare, sweep and batch modes and the history panel below the generated images
+    - Renders the admin view when opened with ``?admin=1``
     """
     # Initialize session state before UI rendering
     initialize_session_state()
@@ -1133,7 +2586,54 @@ def main():
     submitted, width, height, num_outputs, scheduler, num_inference_steps, guidance_scale, prompt_strength, refine, high_noise_frac, prompt, negative_prompt = configure_sidebar()
     main_page(submitted, width, height, num_outputs, scheduler, num_inference_steps,
               guidance_scale, prompt_strength, refine, high_noise_frac, prompt, negative_prompt)
+    progressive_mode()
+    compare_mode()
+    sweep_mode()
+    batch_mode()
+    history_panel()
+    admin_view()
+
+
+def run_app() -> None:
+    """Run main() with records tagged by session, and record the rerun and its logging cost in the metrics."""
+    pipeline = _get_log_pipeline()
+    session_id = _current_session_id()
+    records, log_seconds = pipeline.thread_overhead() if pipeline is not None else (0, 0.0)
+    started = time.perf_counter()
+    try:
+        with log_correlation(session_id=session_id):
+            _run_main()
+    finally:
+        # In finally: st.rerun() and stop() end the script by raising
+        metrics = _get_metrics()
+        metrics.observe_rerun(session_id, time.perf_counter() - started)
+        if pipeline is not None:
+            records_after, log_seconds_after = pipeline.thread_overhead()
+            metrics.observe_logging(records_after - records, log_seconds_after - log_seconds)
+
+
+def _run_main() -> None:
+    """Run main(), profiled when ``?profile=1`` or PROFILE_RERUNS is set (see utils.rerun_profiler).
+
+    When profiling is off, main() runs directly with no profiler installed.
+    """
+    if not _profiling_requested():
+        main()
+        return
+    previous = st.session_state.get('profile_last_snapshot')
+    before = _interaction_snapshot()
+    generated_before = st.session_state.get('generated_image')
+    with _get_rerun_profiler().profile() as rerun:
+        try:
+            main()
+        finally:
+            # Tag in finally: st.rerun() and stop() end the script by raising
+            after = _interaction_snapshot()
+            generated = st.session_state.get('generated_image') is not generated_before
+            rerun.tags.update(session_id=_current_session_id() or "bare", model_id=after['model_id'],
+                              interaction=_rerun_interaction(previous, before, generated))
+            st.session_state['profile_last_snapshot'] = after
 
 
 if __name__ == "__main__":
-    main()
+    run_app()
@@ -0,0 +1 @@
+"""Benchmark tests for performance-sensitive code paths."""
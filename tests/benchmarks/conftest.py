@@ -0,0 +1,122 @@
+"""Timing fixture, catalogue sizes and baseline JSON for the benchmark suite.
+
+Run the suite and save a baseline, then compare a later run against it:
+
+    pytest tests/benchmarks --no-cov --benchmark-save benchmarks.json
+    pytest tests/benchmarks --no-cov --benchmark-compare benchmarks.json
+
+Larger catalogues are opt-in (loading 100k models takes minutes, so lift the
+per-test timeout):
+
+    pytest tests/benchmarks --no-cov --timeout 0 --benchmark-sizes 10,1000,10000,100000
+
+The history search benchmark checks the 50 ms query budget at a million rows
+the same way:
+
+    pytest tests/benchmarks/test_history_benchmark.py --no-cov --timeout 0 --benchmark-history-rows 1000000
+"""
+import json
+import platform
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+import pytest
+
+RESULTS_KEY = pytest.StashKey[Dict[str, Dict[str, Any]]]()
+BASELINE_KEY = pytest.StashKey[Dict[str, Dict[str, Any]]]()
+
+
+def _sizes(config) -> list:
+    try:
+        sizes = [int(size) for size in config.getoption("benchmark_sizes").split(",") if size.strip()]
+    except ValueError:
+        raise pytest.UsageError("--benchmark-sizes must be a comma-separated list of integers")
+    if not sizes or min(sizes) < 1:
+        raise pytest.UsageError("--benchmark-sizes must list positive sizes")
+    return sizes
+
+
+def pytest_generate_tests(metafunc):
+    if "catalogue_size" in metafunc.fixturenames:
+        metafunc.parametrize("catalogue_size", _sizes(metafunc.config))
+
+
+def _load_baseline(config) -> Dict[str, Dict[str, Any]]:
+    if BASELINE_KEY not in config.stash:
+        path = config.getoption("benchmark_compare")
+        baseline: Dict[str, Dict[str, Any]] = {}
+        if path:
+            try:
+                baseline = json.loads(Path(path).read_text(encoding='utf-8'))['results']
+            except (OSError, ValueError, KeyError) as e:
+                raise pytest.UsageError(f"Cannot read benchmark baseline {path}: {e}")
+        config.stash[BASELINE_KEY] = baseline
+    return config.stash[BASELINE_KEY]
+
+
+@pytest.fixture
+def bench(request) -> Callable[..., float]:
+    """
+    Time a callable and record the result under the test's node id.
+
+    ``bench(fn, repeats=5, number=1)`` runs ``fn`` ``number`` times per repeat
+    and returns the best repeat's time per call. With --benchmark-compare the
+    test fails when that time exceeds the baseline by more than the tolerance.
+    """
+    config = request.config
+    results = config.stash.setdefault(RESULTS_KEY, {})
+    baseline = _load_baseline(config)
+    tolerance = config.getoption("benchmark_tolerance")
+
+    def run(fn: Callable[[], Any], repeats: int = 5, number: int = 1) -> float:
+        best = float('inf')
+        for _ in range(repeats):
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            best = min(best, time.perf_counter() - start)
+        seconds = best / number
+        key = request.node.nodeid
+        results[key] = {'seconds': seconds, 'repeats': repeats, 'number': number}
+        previous = baseline.get(key)
+        if previous and seconds > previous['seconds'] * (1 + tolerance):
+            pytest.fail(f"Regression: {seconds * 1000:.3f} ms vs baseline {previous['seconds'] * 1000:.3f} ms "
+                        f"(+{seconds / previous['seconds'] - 1:.0%}, tolerance {tolerance:.0%})")
+        return seconds
+
+    return run
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    results = config.stash.get(RESULTS_KEY, {})
+    if not results:
+        return
+    baseline = config.stash.get(BASELINE_KEY, {})
+    terminalreporter.section("benchmarks")
+    for key, result in sorted(results.items()):
+        line = f"{result['seconds'] * 1000:12.4f} ms  {key}"
+        if key in baseline:
+            line += f"  ({result['seconds'] / baseline[key]['seconds'] - 1:+.0%} vs baseline)"
+        terminalreporter.write_line(line)
+
+
+def pytest_sessionfinish(session):
+    config = session.config
+    path = config.getoption("benchmark_save")
+    results = config.stash.get(RESULTS_KEY, {})
+    if not path or not results:
+        return
+    target = Path(path)
+    saved: Dict[str, Dict[str, Any]] = {}
+    if target.exists():
+        saved = json.loads(target.read_text(encoding='utf-8')).get('results', {})
+    saved.update(results)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    target.write_text(json.dumps({
+        'saved_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': dict(sorted(saved.items())),
+    }, indent=2) + "\n", encoding='utf-8')
@@ -0,0 +1,146 @@
+"""Benchmarks for catalogue loading and the per-rerun preset hot paths.
+
+Each benchmark runs once per size in --benchmark-sizes against synthetic
+models.yaml and presets.yaml with that many models and presets.
+"""
+import logging
+
+import pytest
+import streamlit as st
+
+from config.model_loader import load_models_config
+from streamlit_app import _apply_preset_for_model, _track_user_modifications
+from tests.support.catalogue import synthetic_models, synthetic_presets, write_catalogue
+from utils.preset_manager import SETTING_FORM_KEYS, load_presets_config
+from validate_models_yaml import validate_models_yaml
+
+_catalogues = {}
+
+
+@pytest.fixture
+def catalogue(catalogue_size, tmp_path_factory):
+    """Synthetic catalogue of ``catalogue_size`` models and presets, written once per size."""
+    if catalogue_size not in _catalogues:
+        models = synthetic_models(catalogue_size)
+        presets = synthetic_presets(catalogue_size, [model['id'] for model in models])
+        directory = tmp_path_factory.mktemp(f"catalogue-{catalogue_size}")
+        write_catalogue(directory, models, presets)
+        _catalogues[catalogue_size] = (directory, models, presets)
+    return _catalogues[catalogue_size]
+
+
+@pytest.fixture
+def quiet_bare_mode():
+    """Silence the per-access "missing ScriptRunContext" warning, which would dominate bare-mode timings."""
+    script_logger = logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context")
+    level = script_logger.level
+    script_logger.setLevel(logging.ERROR)
+    yield
+    script_logger.setLevel(level)
+
+
+def _repeats(size: int) -> int:
+    """Repeat small loads for stable timings; large ones take seconds each."""
+    return 5 if size <= 1000 else 1
+
+
+def _grouped(presets):
+    grouped = {}
+    for preset in presets:
+        grouped.setdefault(preset['model_id'], []).append(preset)
+    return grouped
+
+
+class TestCatalogueLoadingBenchmark:
+    """Benchmarks loading and validating the YAML catalogues."""
+
+    @pytest.mark.slow
+    def test_load_models_config(self, catalogue, catalogue_size, bench):
+        """[P2] Benchmark load_models_config on a synthetic models.yaml."""
+        directory, _, _ = catalogue
+        path = str(directory / "models.yaml")
+
+        bench(lambda: load_models_config(path), repeats=_repeats(catalogue_size))
+
+        assert len(load_models_config(path)) == catalogue_size
+
+    @pytest.mark.slow
+    def test_validate_models_yaml(self, catalogue, catalogue_size, bench):
+        """[P2] Benchmark the standalone models.yaml validator."""
+        directory, _, _ = catalogue
+        path = str(directory / "models.yaml")
+        if catalogue_size < 3:
+            pytest.skip("validate_models_yaml requires at least 3 models")
+
+        bench(lambda: validate_models_yaml(path), repeats=_repeats(catalogue_size))
+
+        assert validate_models_yaml(path) == (True, [])
+
+    @pytest.mark.slow
+    @pytest.mark.parametrize("validate_model_ids", [True, False], ids=["with-models-reload", "presets-only"])
+    def test_load_presets_config(self, catalogue, catalogue_size, validate_model_ids, bench, monkeypatch):
+        """[P2] Benchmark load_presets_config, with and without its nested models.yaml reload."""
+        # GIVEN: The catalogue's directory as the working directory, where the nested reload looks
+        directory, models, _ = catalogue
+        monkeypatch.chdir(directory)
+
+        # WHEN: Loading presets, cross-checking model ids against models.yaml or not
+        bench(lambda: load_presets_config("presets.yaml", validate_model_ids=validate_model_ids),
+              repeats=_repeats(catalogue_size))
+
+        # THEN: Every model got its preset
+        assert len(load_presets_config("presets.yaml", validate_model_ids=validate_model_ids)) == len(models)
+
+
+@pytest.mark.usefixtures("quiet_bare_mode")
+class TestRerunHotPathBenchmark:
+    """Benchmarks the preset work done on every rerun of the sidebar."""
+
+    @pytest.mark.slow
+    def test_apply_preset_for_model(self, catalogue, catalogue_size, bench):
+        """[P2] Benchmark applying a preset on model switch with catalogue-sized session state."""
+        # GIVEN: Session state holding every preset and modification tracking for every model
+        _, models, presets = catalogue
+        model = models[len(models) // 2]
+        st.session_state.presets = _grouped(presets)
+        st.session_state.user_modified_fields_by_model = {
+            m['id']: {'prompt': False, 'settings': False, 'setting_keys': []} for m in models
+        }
+
+        def switch_to_model():
+            st.session_state.preset_applied_for_model_id = None
+            st.session_state.form_prompt = "a lighthouse at dusk"
+            return _apply_preset_for_model(model)
+
+        # WHEN: Switching to the model repeatedly
+        bench(switch_to_model, number=1000)
+
+        # THEN: The preset applies to the model
+        preset, applied = switch_to_model()
+        assert applied and preset['model_id'] == model['id']
+
+    @pytest.mark.slow
+    def test_track_user_modifications(self, catalogue, catalogue_size, bench):
+        """[P2] Benchmark the sidebar's end-of-rerun modification tracking."""
+        # GIVEN: Preset-applied values for every model, and a user who changed the width
+        _, models, presets = catalogue
+        model = models[len(models) // 2]
+        preset = _grouped(presets)[model['id']][0]
+        st.session_state.selected_model = model
+        st.session_state.preset_applied_values_by_model = {
+            m['id']: {'prompt': "a lighthouse at dusk", 'settings': dict(preset['settings'])} for m in models
+        }
+        st.session_state.user_modified_fields_by_model = {
+            m['id']: {'prompt': False, 'settings': False, 'setting_keys': []} for m in models
+        }
+        st.session_state.form_prompt = "a lighthouse at dusk"
+        for setting_key, value in preset['settings'].items():
+            st.session_state[SETTING_FORM_KEYS[setting_key]] = value
+        st.session_state.form_width = 512
+
+        # WHEN: Running the tracking block as every rerun does
+        bench(_track_user_modifications, number=1000)
+
+        # THEN: Only the width is flagged
+        tracked = st.session_state.user_modified_fields_by_model[model['id']]
+        assert tracked == {'prompt': False, 'settings': True, 'setting_keys': ['width']}
@@ -0,0 +1,61 @@
+"""Benchmark for generation history searches: prompt match, model filter and deep pages against a query budget."""
+import random
+
+import pytest
+
+from utils.history import HistoryEntry, HistoryStore
+
+# Every history query the panel makes should finish within this budget, at any history size
+QUERY_BUDGET = 0.050
+WORDS = ("fox lighthouse portrait castle forest neon city ocean dragon robot sunset mountain cat astronaut "
+         "garden desert river temple samurai cyberpunk watercolor cinematic photo painting sketch golden "
+         "misty rainy snowy ancient futuristic cozy dramatic vibrant moody detailed minimal").split()
+MODELS = ("sdxl", "flux-dev", "flux-schnell", "playground", "kandinsky")
+
+
+@pytest.fixture(scope="module")
+def history(request, tmp_path_factory):
+    """A history of --benchmark-history-rows generations with prompts drawn from a small vocabulary."""
+    rows = request.config.getoption("benchmark_history_rows")
+    store = HistoryStore(str(tmp_path_factory.mktemp("history") / "history.db"))
+    rng = random.Random(50)
+    for start in range(0, rows, 10000):
+        # Write straight through the writer's batch path; the queue is sized for live traffic, not bulk loads
+        store._write([HistoryEntry(prompt=" ".join(rng.choices(WORDS, k=8)), model_id=MODELS[idx % len(MODELS)],
+                                   seed=idx, settings={'num_inference_steps': 30},
+                                   outputs=[{'url': f"https://example.com/{idx}.png", 'key': f"{idx:032x}.png"}],
+                                   job_id=str(idx))
+                      for idx in range(start, min(start + 10000, rows))])
+    yield store
+    store.close()
+
+
+class TestHistoryBenchmark:
+    """Benchmarks history queries against QUERY_BUDGET."""
+
+    @pytest.mark.slow
+    @pytest.mark.parametrize("text, model_id", [
+        ("", None),
+        ("fox", None),
+        ("golden lighthouse", None),
+        ("samurai drag", "flux-dev"),
+    ], ids=["latest", "one-word", "two-words", "prefix-and-model"])
+    def test_first_page(self, history, bench, text, model_id):
+        """[P1] Benchmark the first page of a search."""
+        seconds = bench(lambda: history.search(text, model_id), repeats=5, number=5)
+        assert len(history.search(text, model_id).entries) > 0
+        assert seconds < QUERY_BUDGET, f"{seconds * 1000:.1f} ms for {text!r} / {model_id}"
+
+    @pytest.mark.slow
+    def test_deep_page(self, history, bench):
+        """[P1] Benchmark a page far down the history, which keyset pagination reaches without an offset."""
+        cursor = str(history.stats()['written'] // 10)
+        seconds = bench(lambda: history.search("fox", cursor=cursor), repeats=5, number=5)
+        assert seconds < QUERY_BUDGET, f"{seconds * 1000:.1f} ms at cursor {cursor}"
+
+    @pytest.mark.slow
+    def test_model_list(self, history, bench):
+        """[P2] Benchmark listing the models for the panel's filter."""
+        seconds = bench(history.models, repeats=5, number=5)
+        assert history.models() == sorted(MODELS)
+        assert seconds < QUERY_BUDGET
@@ -0,0 +1,71 @@
+"""Benchmark for what logging costs the script thread: a synchronous file handler vs. the queued log pipeline."""
+import logging
+
+import pytest
+
+from utils.log_pipeline import JsonFormatter, LogPipeline, log_correlation
+
+# About what one generation rerun logs at INFO, plus the per-image DEBUG lines at LOG_LEVEL = "DEBUG"
+RECORDS_PER_RERUN = 12
+
+
+@pytest.fixture
+def bench_logger():
+    log = logging.getLogger("tests.benchmarks.logging")
+    log.propagate = False
+    log.setLevel(logging.DEBUG)
+    yield log
+    log.handlers.clear()
+    log.propagate = True
+
+
+def _rerun(log: logging.Logger) -> None:
+    with log_correlation(session_id="s1", job_id="0af7651916cd43dd8448eb211c80319c"):
+        for idx in range(RECORDS_PER_RERUN):
+            log.info("Persisted %s to %s (%d bytes) in %.2fs", f"https://example.com/{idx}.png",
+                     f"store/{idx}.png", 1_500_000, 1.25)
+
+
+class TestLoggingBenchmark:
+    """Benchmarks the per-rerun logging cost on the calling thread.
+
+    The synchronous and queued variants are separate benchmarks, so both
+    land in the saved baseline and the summary lists them side by side.
+    """
+
+    @pytest.mark.slow
+    def test_rerun_logging_synchronous(self, bench_logger, bench, tmp_path):
+        """[P2] Benchmark one rerun's records through a synchronous JSON file handler."""
+        # GIVEN: A synchronous handler writing JSON to a file
+        path = tmp_path / "sync.jsonl"
+        handler = logging.FileHandler(path)
+        handler.setFormatter(JsonFormatter())
+        bench_logger.addHandler(handler)
+
+        # WHEN: Logging reruns on the calling thread
+        try:
+            bench(lambda: _rerun(bench_logger), repeats=5, number=200)
+        finally:
+            bench_logger.removeHandler(handler)
+            handler.close()
+
+        # THEN: Every record was written
+        assert len(path.read_text().splitlines()) == 5 * 200 * RECORDS_PER_RERUN
+
+    @pytest.mark.slow
+    def test_rerun_logging_queued(self, bench_logger, bench, tmp_path):
+        """[P2] Benchmark one rerun's records through the queued log pipeline."""
+        # GIVEN: The pipeline writing JSON to a file from its own thread
+        with open(tmp_path / "queued.jsonl", "w") as stream:
+            pipeline = LogPipeline('json', 'INFO', stream=stream, loggers=()).start(bench_logger)
+
+            # WHEN: Logging reruns; the calling thread only enqueues
+            try:
+                bench(lambda: _rerun(bench_logger), repeats=5, number=200)
+            finally:
+                pipeline.stop()
+
+        # THEN: Nothing was dropped
+        records, _ = pipeline.thread_overhead()
+        assert records == 5 * 200 * RECORDS_PER_RERUN
+        assert pipeline.stats()['dropped_full'] == 0
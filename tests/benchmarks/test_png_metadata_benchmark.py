@@ -0,0 +1,59 @@
+"""Benchmark for embedding generation metadata into full-size PNG outputs, with a Pillow re-encode for reference."""
+import io
+
+import pytest
+from PIL import Image, PngImagePlugin
+
+from tests.support.helpers import create_png_bytes
+from utils.png_metadata import embed_png_metadata, generation_metadata
+
+NUM_IMAGES = 4
+SIZE = 1024
+
+RECORD = {
+    'prompt': "An astronaut riding a rainbow unicorn, cinematic, dramatic",
+    'negative_prompt': "the absolute worst quality, distorted features",
+    'model_id': 'sdxl',
+    'endpoint': 'stability-ai/sdxl:2b017d9b67edd2ee1401238df49d75da53c523f36e363881e057f5dc3ed3c5b2',
+    'seed': 1234,
+    'settings': {'width': SIZE, 'height': SIZE, 'num_inference_steps': 50, 'guidance_scale': 7.5},
+}
+
+
+@pytest.fixture(scope="module")
+def full_size_pngs():
+    """Four 1024x1024 RGB PNGs with incompressible pixel data (~3 MB each)."""
+    return [create_png_bytes(SIZE, SIZE, noise=True) for _ in range(NUM_IMAGES)]
+
+
+class TestPngMetadataBenchmark:
+    """Benchmarks chunk-level embedding against a Pillow re-encode."""
+
+    @pytest.mark.slow
+    def test_embed_four_1024_images(self, full_size_pngs, bench):
+        """[P2] Benchmark splicing metadata chunks into 4x1024² PNGs."""
+        # GIVEN: Four full-size outputs and their generation metadata
+        metadata = generation_metadata(RECORD)
+
+        # WHEN: Timing the chunk splice
+        bench(lambda: [embed_png_metadata(png, metadata) for png in full_size_pngs], repeats=3)
+
+        # THEN: The pixels are untouched and the metadata reads back
+        with Image.open(io.BytesIO(embed_png_metadata(full_size_pngs[0], metadata))) as image:
+            assert image.text['prompt'] == RECORD['prompt']
+            assert image.size == (SIZE, SIZE)
+
+    @pytest.mark.slow
+    def test_pillow_reencode_four_1024_images(self, full_size_pngs, bench):
+        """[P2] Benchmark the Pillow decode and re-encode that splicing avoids, for comparison."""
+        metadata = generation_metadata(RECORD)
+
+        def reencode():
+            for png in full_size_pngs:
+                info = PngImagePlugin.PngInfo()
+                for key, value in metadata.items():
+                    info.add_text(key, str(value))
+                with Image.open(io.BytesIO(png)) as image:
+                    image.save(io.BytesIO(), format='PNG', pnginfo=info)
+
+        bench(reencode, repeats=1)
@@ -2,11 +2,27 @@
 import pytest
 import tempfile
 import os
+import sys
 from pathlib import Path
 from unittest.mock import Mock, patch, MagicMock
 import streamlit as st
 
 
+def pytest_addoption(parser):
+    """Options for the benchmark suite in tests/benchmarks."""
+    group = parser.getgroup("benchmarks")
+    group.addoption("--benchmark-sizes", default="10,100", metavar="N,N,...",
+                    help="Synthetic catalogue sizes to benchmark (default: 10,100; up to 100000)")
+    group.addoption("--benchmark-history-rows", type=int, default=20000, metavar="N",
+                    help="Generations in the history search benchmark (default: 20000; the target is 1000000)")
+    group.addoption("--benchmark-save", metavar="PATH",
+                    help="Write benchmark timings to this baseline JSON file (merged with existing entries)")
+    group.addoption("--benchmark-compare", metavar="PATH",
+                    help="Fail benchmarks that are slower than this baseline JSON file by more than the tolerance")
+    group.addoption("--benchmark-tolerance", type=float, default=0.25, metavar="FRACTION",
+                    help="Allowed slowdown against the baseline before failing (default: 0.25)")
+
+
 def pytest_configure(config):
     """Configure pytest hooks - runs before test collection."""
     # Set up st.secrets early to avoid import-time errors
@@ -50,6 +66,32 @@ def mock_streamlit_secrets():
         yield mock_secrets
 
 
+@pytest.fixture(scope="function", autouse=True)
+def disable_background_services():
+    """Disable process-wide background workers started by streamlit_app.
+
+    The output persister streams generated image URLs in worker threads, which
+    would otherwise outlive each test's request mocks and hit the network.
+    Spans are created but not exported, so tests never write trace files, and
+    the log pipeline is off, so caplog sees records as they are logged, and
+    the request log and history are off, so tests never write logs/requests.jsonl
+    or image_store/history.db.
+    Tests that exercise these patch streamlit_app._get_persister,
+    streamlit_app._get_tracer, streamlit_app._get_log_pipeline,
+    streamlit_app._get_request_log or streamlit_app._get_history explicitly.
+    """
+    if 'streamlit_app' not in sys.modules:
+        yield
+        return
+    from utils.tracing import Tracer
+    with patch('streamlit_app._get_persister', return_value=None), \
+            patch('streamlit_app._get_tracer', return_value=Tracer(None)), \
+            patch('streamlit_app._get_log_pipeline', return_value=None), \
+            patch('streamlit_app._get_request_log', return_value=None), \
+            patch('streamlit_app._get_history', return_value=None):
+        yield
+
+
 @pytest.fixture(scope="function")
 def mock_replicate_run():
     """Mock Replicate API run function."""
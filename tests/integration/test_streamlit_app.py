@@ -1,9 +1,13 @@
 """Integration tests for streamlit_app.py application."""
+import io
+import json
+import zipfile
 import pytest
 import requests
 import yaml
-from unittest.mock import Mock, patch, MagicMock
+from unittest.mock import ANY, Mock, patch, MagicMock
 import streamlit as st
+from utils.image_store import ImageStore
 from streamlit_app import configure_sidebar, main_page, main, initialize_session_state
 
 
@@ -885,6 +889,10 @@ class TestMain:
         # GIVEN: Mocked Streamlit and functions
         with patch('streamlit_app.configure_sidebar') as mock_sidebar, \
              patch('streamlit_app.main_page') as mock_main_page, \
+             patch('streamlit_app.progressive_mode') as mock_progressive_mode, \
+             patch('streamlit_app.compare_mode') as mock_compare_mode, \
+             patch('streamlit_app.sweep_mode') as mock_sweep_mode, \
+             patch('streamlit_app.batch_mode') as mock_batch_mode, \
              patch('streamlit_app.st'):
             
             # Setup sidebar mock return
@@ -897,9 +905,13 @@ class TestMain:
             # WHEN: Calling main()
             main()
             
-            # THEN: Both functions should be called
+            # THEN: Sidebar, main page, progressive, compare, sweep and batch modes should be rendered
             mock_sidebar.assert_called_once()
             mock_main_page.assert_called_once()
+            mock_progressive_mode.assert_called_once()
+            mock_compare_mode.assert_called_once()
+            mock_sweep_mode.assert_called_once()
+            mock_batch_mode.assert_called_once()
             
             # Verify main_page called with correct arguments
             call_args = mock_main_page.call_args[0]
@@ -914,6 +926,10 @@ class TestMain:
         with patch('streamlit_app.initialize_session_state') as mock_init, \
              patch('streamlit_app.configure_sidebar') as mock_sidebar, \
              patch('streamlit_app.main_page') as mock_main_page, \
+             patch('streamlit_app.progressive_mode'), \
+             patch('streamlit_app.compare_mode'), \
+             patch('streamlit_app.sweep_mode'), \
+             patch('streamlit_app.batch_mode'), \
              patch('streamlit_app.st'):
             
             mock_sidebar.return_value = (
@@ -934,8 +950,9 @@ class TestMainPageImageDownload:
     
     @pytest.mark.integration
     @pytest.mark.slow
-    def test_main_page_creates_zip_file_for_multiple_images(self, mock_streamlit_secrets, mock_replicate_run, mock_requests_get):
-        """[P1] Test main_page creates ZIP file when multiple images are generated."""
+    def test_main_page_creates_zip_file_for_multiple_images(self, mock_streamlit_secrets, mock_replicate_run, mock_requests_get, tmp_path):
+        """[P1] Test main_page offers a lazily built ZIP of all generated images."""
+        from tests.support.helpers import click_download
         # GIVEN: Form submitted with multiple outputs
         submitted = True
         num_outputs = 3
@@ -948,82 +965,81 @@ class TestMainPageImageDownload:
         
         # WHEN: Calling main_page
         with patch('streamlit_app.st') as mock_st, \
-             patch('streamlit_app.zipfile.ZipFile') as mock_zipfile, \
-             patch('streamlit_app.io.BytesIO') as mock_bytesio:
+             patch('streamlit_app._get_image_store', return_value=ImageStore(str(tmp_path))), \
+             patch('streamlit_app.http_fetch', side_effect=lambda url: [b'png:', url.encode()]) as mock_fetch:
             
             mock_container = MagicMock()
             mock_st.empty.return_value.container.return_value = mock_container
             mock_st.status.return_value.__enter__.return_value = MagicMock()
-            mock_st.session_state = {}
+            mock_st.session_state = {
+                'selected_model': {'id': 'test-model', 'name': 'Test Model', 'endpoint': 'owner/model:version'}
+            }
             mock_st.download_button = MagicMock()
             
-            # Mock BytesIO
-            mock_zip_io = MagicMock()
-            mock_bytesio.return_value = mock_zip_io
-            mock_zip_io.getvalue.return_value = b'fake-zip-data'
-            
-            # Mock ZipFile context manager
-            mock_zip = MagicMock()
-            mock_zipfile.return_value.__enter__.return_value = mock_zip
-            mock_zipfile.return_value.__exit__.return_value = None
-            
             main_page(
                 submitted, 1024, 1024, num_outputs, "DDIM",
                 50, 7.5, 0.8, "expert_ensemble_refiner",
                 0.8, "test", "test"
             )
             
-            # THEN: ZIP file should be created with all images
-            mock_zipfile.assert_called_once()
-            # Verify writestr called for each image
-            assert mock_zip.writestr.call_count == num_outputs
-            # Verify download button created
-            mock_st.download_button.assert_called_once()
-            assert 'output_files.zip' in str(mock_st.download_button.call_args)
+            # THEN: Download button is created without building the archive yet
+            archive_calls = [c for c in mock_st.download_button.call_args_list if 'Download All Images' in c.args[0]]
+            assert len(archive_calls) == 1
+            assert 'output_files.zip' in str(archive_calls[0])
+            build_archive = archive_calls[0].kwargs['data']
+            assert callable(build_archive)
+            mock_fetch.assert_not_called()
+            
+            # AND: Clicking builds a stored (uncompressed) ZIP Streamlit can serve with every image plus a manifest
+            with zipfile.ZipFile(io.BytesIO(click_download(build_archive))) as zf:
+                names = zf.namelist()
+                assert names == [f"output_file_{i}.png" for i in range(1, num_outputs + 1)] + ["manifest.json"]
+                assert all(info.compress_type == zipfile.ZIP_STORED for info in zf.infolist())
+                assert zf.read("output_file_2.png") == b'png:https://example.com/image2.png'
+                manifest = json.loads(zf.read("manifest.json"))
+            assert manifest['files'][0]['prompt'] == "test"
+            assert manifest['files'][0]['model_id'] == 'test-model'
     
     @pytest.mark.integration
     @pytest.mark.slow
-    def test_main_page_handles_image_download_failure(self, mock_streamlit_secrets, mock_replicate_run):
-        """[P1] Test main_page handles HTTP errors when downloading images for ZIP."""
+    def test_main_page_handles_image_download_failure(self, mock_streamlit_secrets, mock_replicate_run, tmp_path):
+        """[P1] Test HTTP errors while fetching images for the archive are reported, not raised."""
+        from tests.support.helpers import click_download
         # GIVEN: Form submitted but image download fails
         submitted = True
         image_urls = ["https://example.com/image1.png"]
         mock_replicate_run.return_value = image_urls
         
-        # Mock requests.get to return error
-        with patch('streamlit_app.requests.get') as mock_get:
-            mock_response = MagicMock()
-            mock_response.status_code = 404
-            mock_get.return_value = mock_response
+        def failing_fetch(url):
+            raise requests.exceptions.HTTPError("404 Client Error: Not Found")
+        
+        # WHEN: Calling main_page and clicking download
+        with patch('streamlit_app.st') as mock_st, \
+             patch('streamlit_app._get_image_store', return_value=ImageStore(str(tmp_path))), \
+             patch('streamlit_app.http_fetch', side_effect=failing_fetch):
             
-            # WHEN: Calling main_page
-            with patch('streamlit_app.st') as mock_st, \
-                 patch('streamlit_app.zipfile.ZipFile') as mock_zipfile, \
-                 patch('streamlit_app.io.BytesIO') as mock_bytesio:
-                
-                mock_container = MagicMock()
-                mock_st.empty.return_value.container.return_value = mock_container
-                mock_st.status.return_value.__enter__.return_value = MagicMock()
-                mock_st.session_state = {}
-                mock_st.download_button = MagicMock()
-                mock_st.error = MagicMock()
-                
-                mock_zip_io = MagicMock()
-                mock_bytesio.return_value = mock_zip_io
-                mock_zip = MagicMock()
-                mock_zipfile.return_value.__enter__.return_value = mock_zip
-                mock_zipfile.return_value.__exit__.return_value = None
-                
-                main_page(
-                    submitted, 1024, 1024, 1, "DDIM",
-                    50, 7.5, 0.8, "expert_ensemble_refiner",
-                    0.8, "test", "test"
-                )
-                
-                # THEN: Error should be displayed for failed download
-                assert mock_st.error.called
-                error_call = str(mock_st.error.call_args)
-                assert "Failed to fetch image" in error_call or "404" in error_call
+            mock_container = MagicMock()
+            mock_st.empty.return_value.container.return_value = mock_container
+            mock_st.status.return_value.__enter__.return_value = MagicMock()
+            mock_st.session_state = {
+                'selected_model': {'id': 'test-model', 'name': 'Test Model', 'endpoint': 'owner/model:version'}
+            }
+            mock_st.download_button = MagicMock()
+            mock_st.error = MagicMock()
+            
+            main_page(
+                submitted, 1024, 1024, 1, "DDIM",
+                50, 7.5, 0.8, "expert_ensemble_refiner",
+                0.8, "test", "test"
+            )
+            archive = click_download(mock_st.download_button.call_args_list[-1].kwargs['data'])
+            
+            # THEN: The archive only holds the manifest, which records the failure
+            with zipfile.ZipFile(io.BytesIO(archive)) as zf:
+                assert zf.namelist() == ["manifest.json"]
+                manifest = json.loads(zf.read("manifest.json"))
+            assert "404" in manifest['files'][0]['error']
+            assert manifest['files'][0]['file'] is None
     
     @pytest.mark.integration
     @pytest.mark.slow
@@ -1160,9 +1176,7 @@ class TestMainPageEdgeCases:
             mock_get.side_effect = requests.exceptions.Timeout("Connection timeout")
             
             # WHEN: Calling main_page
-            with patch('streamlit_app.st') as mock_st, \
-                 patch('streamlit_app.zipfile.ZipFile') as mock_zipfile, \
-                 patch('streamlit_app.io.BytesIO') as mock_bytesio:
+            with patch('streamlit_app.st') as mock_st:
                 
                 mock_container = MagicMock()
                 mock_st.empty.return_value.container.return_value = mock_container
@@ -1171,12 +1185,6 @@ class TestMainPageEdgeCases:
                 mock_st.download_button = MagicMock()
                 mock_st.error = MagicMock()
                 
-                mock_zip_io = MagicMock()
-                mock_bytesio.return_value = mock_zip_io
-                mock_zip = MagicMock()
-                mock_zipfile.return_value.__enter__.return_value = mock_zip
-                mock_zipfile.return_value.__exit__.return_value = None
-                
                 # THEN: Should handle timeout gracefully
                 try:
                     main_page(
@@ -3358,4 +3366,1189 @@ class TestEnhancedUIUpdatesForModelSwitching:
             
             # THEN: Last selected model should be correctly applied (model2)
             assert st.session_state.selected_model['id'] == model2['id'], \
-                "Last selected model (model2) should be correctly applied"
\ No newline at end of file
+                "Last selected model (model2) should be correctly applied"
+
+class TestOutputPersistence:
+    """Tests for background persistence of generated outputs in main_page()."""
+
+    @pytest.mark.integration
+    def test_main_page_submits_outputs_to_persister(self, mock_streamlit_secrets, mock_replicate_run, mock_requests_get):
+        """[P1] Test main_page hands every output to the background persister."""
+        # GIVEN: A persister and a prediction with two outputs
+        image_urls = ["https://example.com/image1.png", "https://example.com/image2.png"]
+        mock_replicate_run.return_value = image_urls
+        persister = MagicMock()
+        persister.rewrite.side_effect = lambda images: list(images)
+
+        # WHEN: Calling main_page with a submitted form
+        with patch('streamlit_app.st') as mock_st, \
+             patch('streamlit_app._get_persister', return_value=persister):
+            mock_st.empty.return_value.container.return_value = MagicMock()
+            mock_st.status.return_value.__enter__.return_value = MagicMock()
+            mock_st.session_state = {
+                'selected_model': {'id': 'test-model', 'name': 'Test Model', 'endpoint': 'owner/model:version'}
+            }
+
+            main_page(
+                True, 1024, 1024, 2, "DDIM",
+                50, 7.5, 0.8, "expert_ensemble_refiner",
+                0.8, "test", "test"
+            )
+
+            # THEN: Each output URL is queued for persistence
+            submitted_urls = [call.args[0] for call in persister.submit.call_args_list]
+            assert submitted_urls == image_urls
+            assert mock_st.session_state['all_images'] == image_urls
+
+    @pytest.mark.integration
+    def test_main_page_rewrites_persisted_urls_on_rerun(self, mock_streamlit_secrets):
+        """[P1] Test session state URLs are rewritten to stored copies on later reruns."""
+        # GIVEN: Session state holding delivery URLs that have since been persisted
+        urls = ["https://example.com/image1.png"]
+        persister = MagicMock()
+        persister.rewrite.side_effect = lambda images: [f"image_store/{i}.png" for i, _ in enumerate(images)]
+
+        # WHEN: main_page runs without a submission
+        with patch('streamlit_app.st') as mock_st, \
+             patch('streamlit_app._get_persister', return_value=persister), \
+             patch('streamlit_app.image_select'):
+            mock_st.session_state = {'generated_image': list(urls), 'all_images': list(urls)}
+
+            main_page(
+                False, 1024, 1024, 1, "DDIM",
+                50, 7.5, 0.8, "expert_ensemble_refiner",
+                0.8, "test", "test"
+            )
+
+            # THEN: Both session state lists point at the stored copies
+            assert mock_st.session_state['generated_image'] == ["image_store/0.png"]
+            assert mock_st.session_state['all_images'] == ["image_store/0.png"]
+
+
+class TestPngMetadataDownloads:
+    """Tests for generation metadata embedded into downloaded PNGs."""
+
+    @pytest.mark.integration
+    def test_single_and_archive_downloads_embed_metadata(self, mock_streamlit_secrets, mock_replicate_run, tmp_path):
+        """[P1] Test per-image and ZIP downloads both carry prompt/model/settings PNG text chunks."""
+        # GIVEN: A generated PNG output
+        from PIL import Image
+        from tests.support.helpers import click_download, create_png_bytes
+        png = create_png_bytes(8, 8)
+        mock_replicate_run.return_value = ["https://example.com/image1.png"]
+
+        # WHEN: Calling main_page and clicking both download buttons
+        with patch('streamlit_app.st') as mock_st, \
+             patch('streamlit_app._get_image_store', return_value=ImageStore(str(tmp_path))), \
+             patch('streamlit_app.http_fetch', return_value=[png]):
+            mock_st.empty.return_value.container.return_value = MagicMock()
+            mock_st.status.return_value.__enter__.return_value = MagicMock()
+            mock_st.session_state = {
+                'selected_model': {'id': 'sdxl', 'name': 'SDXL', 'endpoint': 'stability-ai/sdxl:v1'}
+            }
+
+            main_page(
+                True, 1024, 1024, 1, "DDIM",
+                50, 7.5, 0.8, "expert_ensemble_refiner",
+                0.8, "a red fox", "blurry"
+            )
+            calls = {c.args[0]: c.kwargs for c in mock_st.download_button.call_args_list}
+            single = click_download(calls["Download image"]['data'])
+            with zipfile.ZipFile(io.BytesIO(click_download(calls[":red[**Download All Images**]"]['data']))) as zf:
+                archived = zf.read("output_file_1.png")
+
+        # THEN: Both payloads carry the generation parameters
+        for payload in (single, archived):
+            with Image.open(io.BytesIO(payload)) as image:
+                assert image.text['prompt'] == "a red fox"
+                assert image.text['negative_prompt'] == "blurry"
+                assert image.text['model_id'] == "sdxl"
+                assert image.text['endpoint'] == "stability-ai/sdxl:v1"
+                assert json.loads(image.text['settings'])['num_inference_steps'] == 50
+        assert single == archived
+
+
+class TestBatchMode:
+    """Tests for batch_mode() and the batch file runner."""
+
+    @pytest.mark.integration
+    def test_batch_mode_runs_uploaded_file_and_offers_archive(self, mock_streamlit_secrets, tmp_path):
+        """[P1] Test that an uploaded JSONL batch runs per-row models and offers one downloadable archive."""
+        # GIVEN: An uploaded batch with two rows for different models
+        from streamlit_app import batch_mode
+        from tests.support.helpers import click_download
+        uploaded = MagicMock()
+        uploaded.name = "prompts.jsonl"
+        uploaded.getvalue.return_value = (
+            b'{"id": "a", "prompt": "a fox", "model_id": "sdxl"}\n'
+            b'{"id": "b", "prompt": "a trooper", "model_id": "helldiver", "seed": 5}\n'
+        )
+        models = [
+            {'id': 'sdxl', 'name': 'SDXL', 'endpoint': 'stability-ai/sdxl:v1'},
+            {'id': 'helldiver', 'name': 'Helldiver', 'endpoint': 'owner/helldiver:v2'},
+        ]
+        presets = {'helldiver': [{'id': 'h', 'name': 'H', 'model_id': 'helldiver', 'trigger_words': ['HD']}]}
+
+        # WHEN: Clicking "Run batch"
+        with patch('streamlit_app.st') as mock_st, \
+             patch('streamlit_app.replicate.run', side_effect=lambda endpoint, input: [f"https://example.com/{input['prompt']}.png"]) as mock_run, \
+             patch('streamlit_app.get_secret', side_effect=lambda key, default=None: str(tmp_path) if key == "BATCH_DIR" else default), \
+             patch('streamlit_app._get_image_store', return_value=ImageStore(str(tmp_path / "store"))), \
+             patch('streamlit_app.http_fetch', side_effect=lambda url: [f"png:{url}".encode()]):
+            mock_st.file_uploader.return_value = uploaded
+            mock_st.text_input.return_value = ""
+            mock_st.slider.return_value = 2
+            mock_st.button.return_value = True
+            mock_st.session_state = {'model_configs': models, 'presets': presets, 'selected_model': models[0]}
+
+            batch_mode()
+
+            # THEN: Each row ran against its own model with presets applied
+            calls = {c.args[0]: c.kwargs['input'] for c in mock_run.call_args_list}
+            assert calls['stability-ai/sdxl:v1']['prompt'] == "a fox"
+            assert calls['owner/helldiver:v2']['prompt'] == "HD a trooper"
+            assert calls['owner/helldiver:v2']['seed'] == 5
+            results = mock_st.session_state['batch_results']
+            assert [r.ok for r in results] == [True, True]
+            mock_st.progress.return_value.progress.assert_called()
+            labels = [c.args[0] for c in mock_st.download_button.call_args_list]
+            assert labels == [":red[**Download Batch Results**]"]
+            assert list(tmp_path.glob("*.jsonl"))
+
+            # AND: Clicking the button serves a ZIP holding both images and the manifest
+            archive = click_download(mock_st.download_button.call_args.kwargs['data'])
+            with zipfile.ZipFile(io.BytesIO(archive)) as zf:
+                assert zf.namelist() == ["batch_00001.png", "batch_00002.png", "manifest.json"]
+                assert zf.read("batch_00001.png").startswith(b"png:https://example.com/")
+
+    @pytest.mark.integration
+    def test_batch_mode_expands_templated_rows(self, mock_streamlit_secrets, tmp_path):
+        """[P1] Test that a templated row fans out into one prediction per combination."""
+        # GIVEN: A batch row with a wildcard template
+        from streamlit_app import batch_mode
+        uploaded = MagicMock()
+        uploaded.name = "prompts.jsonl"
+        uploaded.getvalue.return_value = b'{"id": "fox", "prompt": "a {red|arctic} fox, {day|night}"}\n'
+        model = {'id': 'sdxl', 'name': 'SDXL', 'endpoint': 'stability-ai/sdxl:v1'}
+
+        # WHEN: Clicking "Run batch"
+        with patch('streamlit_app.st') as mock_st, \
+             patch('streamlit_app.replicate.run', side_effect=lambda endpoint, input: ["https://example.com/x.png"]) as mock_run, \
+             patch('streamlit_app.get_secret', side_effect=lambda key, default=None: str(tmp_path) if key == "BATCH_DIR" else default):
+            mock_st.file_uploader.return_value = uploaded
+            mock_st.text_input.return_value = ""
+            mock_st.slider.return_value = 2
+            mock_st.button.return_value = True
+            mock_st.session_state = {'model_configs': [model], 'presets': {}, 'selected_model': model}
+
+            batch_mode()
+
+            # THEN: Every combination ran once and results keep the expansion order
+            prompts = sorted(c.kwargs['input']['prompt'] for c in mock_run.call_args_list)
+            assert prompts == ["a arctic fox, day", "a arctic fox, night", "a red fox, day", "a red fox, night"]
+            results = mock_st.session_state['batch_results']
+            assert [r.job.record['job_id'] for r in results] == ["fox-1", "fox-2", "fox-3", "fox-4"]
+            assert "0/4 prompts" in mock_st.progress.call_args.kwargs['text']
+
+    @pytest.mark.integration
+    def test_batch_mode_reports_invalid_rows(self, mock_streamlit_secrets):
+        """[P1] Test that an invalid row is reported without running any prediction."""
+        from streamlit_app import batch_mode
+        uploaded = MagicMock()
+        uploaded.name = "prompts.csv"
+        uploaded.getvalue.return_value = b"prompt,model_id\na fox,unknown-model\n"
+
+        with patch('streamlit_app.st') as mock_st, \
+             patch('streamlit_app.replicate.run') as mock_run:
+            mock_st.file_uploader.return_value = uploaded
+            mock_st.button.return_value = True
+            mock_st.session_state = {'model_configs': [{'id': 'sdxl', 'name': 'SDXL', 'endpoint': 'a/b:c'}]}
+
+            batch_mode()
+
+            mock_run.assert_not_called()
+            assert "Unknown model_id 'unknown-model'" in mock_st.error.call_args[0][0]
+
+
+class TestSidebarPromptTemplates:
+    """Tests for opt-in template expansion of the sidebar prompt."""
+
+    def _submit(self, prompt: str, expand: bool) -> dict:
+        selected_model = {'id': 'sdxl', 'name': 'SDXL', 'endpoint': 'stability-ai/sdxl:v1'}
+        with patch('streamlit_app.st') as mock_st, \
+             patch('streamlit_app._get_coalescer', return_value=None), \
+             patch('streamlit_app._get_hedger', return_value=None), \
+             patch('streamlit_app._get_router', return_value=None), \
+             patch('streamlit_app.replicate.run', return_value=["https://example.com/a.png"]) as run:
+            mock_st.empty.return_value.container.return_value = MagicMock()
+            mock_st.status.return_value.__enter__.return_value = MagicMock()
+            mock_st.checkbox.return_value = False
+            mock_st.session_state = {'selected_model': selected_model, 'form_expand_templates': expand}
+            main_page(True, 1024, 1024, 1, "DDIM", 50, 7.5, 0.8, "expert_ensemble_refiner", 0.8, prompt, "blurry")
+            mock_st.error.assert_not_called()
+        return run.call_args.kwargs['input']
+
+    @pytest.mark.integration
+    def test_plain_prompt_with_braces_reaches_the_model_unchanged(self, mock_streamlit_secrets):
+        """[P0] Test that emphasis braces, a stray brace and double underscores are not parsed without opting in."""
+        prompt = "{{masterpiece}}, a fox {in the snow, __dunder__ style"
+        assert self._submit(prompt, expand=False)['prompt'] == prompt
+
+    @pytest.mark.integration
+    def test_opted_in_template_renders_one_sample(self, mock_streamlit_secrets):
+        """[P1] Test that ticking "Expand prompt templates" renders the template before submitting."""
+        assert self._submit("a {red|blue} fox", expand=True)['prompt'] in ("a red fox", "a blue fox")
+
+
+class TestCompareMode:
+    """Tests for compare_mode() fan-out grid."""
+
+    @pytest.mark.integration
+    def test_compare_fills_grid_per_model_with_latency(self, mock_streamlit_secrets):
+        """[P1] Test that each selected model gets its own trigger words and grid cell."""
+        # GIVEN: Two configured models, one with a trigger-word preset
+        from streamlit_app import compare_mode
+        models = [
+            {'id': 'sdxl', 'name': 'SDXL', 'endpoint': 'stability-ai/sdxl:v1'},
+            {'id': 'helldiver', 'name': 'Helldiver', 'endpoint': 'owner/helldiver:v2'},
+        ]
+        presets = {'helldiver': [{'id': 'h', 'name': 'H', 'model_id': 'helldiver', 'trigger_words': ['HD']}]}
+
+        # WHEN: Clicking "Compare" with both models selected
+        with patch('streamlit_app.st') as mock_st, \
+             patch('streamlit_app.replicate.run', side_effect=lambda endpoint, input: [f"https://example.com/{endpoint}.png"]) as mock_run:
+            mock_st.session_state = {'model_configs': models, 'presets': presets}
+            mock_st.multiselect.return_value = ['SDXL', 'Helldiver']
+            mock_st.text_area.return_value = "a castle"
+            mock_st.text_input.return_value = ""
+            mock_st.button.return_value = True
+            mock_st.columns.return_value = [MagicMock() for _ in range(4)]
+            cells = [MagicMock(), MagicMock()]
+            mock_st.empty.side_effect = cells
+
+            compare_mode()
+
+            # THEN: Both models ran with their own prompts and the results were stored
+            prompts = sorted(c.kwargs['input']['prompt'] for c in mock_run.call_args_list)
+            assert prompts == ["HD a castle", "a castle"]
+            stored = mock_st.session_state['compare_results']
+            assert [r.model_id for r in stored['results']] == ['sdxl', 'helldiver']
+            assert all(r.ok for r in stored['results'])
+            for cell in cells:
+                cell.info.assert_called_once()
+                cell.container.assert_called()
+            assert "Wall clock" in mock_st.caption.call_args_list[-1][0][0]
+
+
+class TestSweepMode:
+    """Tests for sweep_mode() grid runs and the result cache."""
+
+    @pytest.mark.integration
+    def test_sweep_builds_contact_sheet_and_reuses_cached_cells(self, mock_streamlit_secrets, tmp_path):
+        """[P1] Test that a sweep renders one contact sheet and a repeat run hits the cache."""
+        # GIVEN: A selected model, a 2x2 sweep and an empty result cache
+        from PIL import Image
+        from streamlit_app import sweep_mode
+        from tests.support.helpers import create_png_bytes
+        from utils.result_cache import ResultCache
+        model = {'id': 'sdxl', 'name': 'SDXL', 'endpoint': 'stability-ai/sdxl:v1'}
+        cache = ResultCache()
+        values = {'guidance_scale values': "5, 10", 'num_inference_steps values': "20, 40"}
+
+        def _run_twice():
+            with patch('streamlit_app.st') as mock_st, \
+                 patch('streamlit_app._get_result_cache', return_value=cache), \
+                 patch('streamlit_app._get_image_store', return_value=ImageStore(str(tmp_path))), \
+                 patch('streamlit_app.http_fetch', side_effect=lambda url: [create_png_bytes(16, 16)]), \
+                 patch('streamlit_app.replicate.run',
+                       side_effect=lambda endpoint, input: [f"https://example.com/{input['guidance_scale']}-{input['num_inference_steps']}.png"]) as mock_run:
+                mock_st.session_state = {'selected_model': model, 'presets': {}}
+                mock_st.text_area.return_value = "a fox"
+                mock_st.text_input.side_effect = lambda label, **kwargs: values[label]
+                mock_st.multiselect.return_value = ['DDIM']
+                mock_st.selectbox.return_value = 'guidance_scale'
+                mock_st.number_input.return_value = 7
+                mock_st.button.return_value = True
+
+                sweep_mode()
+                return mock_st, mock_run
+
+        # WHEN: Running the same sweep twice
+        first_st, first_run = _run_twice()
+        second_st, second_run = _run_twice()
+
+        # THEN: Four cells ran once with a shared seed, and the second run was served from the cache
+        assert first_run.call_count == 4
+        assert {c.kwargs['input']['seed'] for c in first_run.call_args_list} == {7}
+        assert {c.kwargs['input']['num_outputs'] for c in first_run.call_args_list} == {1}
+        second_run.assert_not_called()
+        first = first_st.session_state['sweep_result']
+        second = second_st.session_state['sweep_result']
+        assert (first['executed'], first['cached'], first['failed']) == (4, 0, 0)
+        assert (second['executed'], second['cached'], second['failed']) == (0, 4, 0)
+        with Image.open(io.BytesIO(second['sheet'])) as sheet:
+            assert sheet.size == (200 + 2 * 256, 28 + 2 * 256)
+        assert second_st.download_button.call_args[0][0] == "Download contact sheet"
+
+    @pytest.mark.integration
+    def test_sweep_reports_oversized_grid(self, mock_streamlit_secrets):
+        """[P1] Test that a grid over the cell cap is rejected before any prediction runs."""
+        from streamlit_app import sweep_mode
+        with patch('streamlit_app.st') as mock_st, \
+             patch('streamlit_app.replicate.run') as mock_run:
+            mock_st.session_state = {'selected_model': {'id': 'sdxl', 'name': 'SDXL', 'endpoint': 'a/b:c'}}
+            mock_st.text_area.return_value = "a fox"
+            mock_st.text_input.return_value = ", ".join(str(v) for v in range(1, 10))
+            mock_st.multiselect.return_value = ['DDIM']
+            mock_st.selectbox.return_value = 'guidance_scale'
+            mock_st.number_input.return_value = 1
+            mock_st.button.return_value = True
+
+            sweep_mode()
+
+            mock_run.assert_not_called()
+            assert "limit is 64" in mock_st.error.call_args[0][0]
+
+
+class TestRequestCoalescing:
+    """Tests for routing main_page generations through the request coalescer."""
+
+    @pytest.mark.integration
+    def test_main_page_submits_through_coalescer_when_enabled(self, mock_streamlit_secrets):
+        """[P1] Test that an enabled coalescer runs the prediction with the model's output cap."""
+        # GIVEN: Coalescing enabled and a model with max_outputs configured
+        from utils.coalesce import Coalescer
+        run = MagicMock(return_value=["https://example.com/merged.png"])
+        coalescer = Coalescer(run, window=0.01)
+
+        with patch('streamlit_app.st') as mock_st, \
+             patch('streamlit_app._get_coalescer', return_value=coalescer), \
+             patch('streamlit_app.replicate.run') as mock_run:
+            mock_st.empty.return_value.container.return_value = MagicMock()
+            mock_st.status.return_value.__enter__.return_value = MagicMock()
+            mock_st.session_state = {
+                'selected_model': {'id': 'sdxl', 'name': 'SDXL', 'endpoint': 'stability-ai/sdxl:v1', 'max_outputs': 2}
+            }
+
+            # WHEN: Submitting a single-image generation
+            main_page(
+                True, 1024, 1024, 1, "DDIM",
+                50, 7.5, 0.8, "expert_ensemble_refiner",
+                0.8, "a red fox", "blurry"
+            )
+
+            # THEN: The coalescer ran the prediction and the image reached the session
+            mock_run.assert_not_called()
+            run.assert_called_once()
+            assert run.call_args[0][0] == 'stability-ai/sdxl:v1'
+            assert run.call_args[0][1]['num_outputs'] == 1
+            assert mock_st.session_state['generated_image'] == ["https://example.com/merged.png"]
+            assert coalescer.stats()['predictions'] == 1
+
+
+class TestHedgedPredictions:
+    """Tests for routing predictions through the hedger."""
+
+    @pytest.mark.integration
+    def test_hedged_model_uses_prediction_api(self, mock_streamlit_secrets):
+        """[P1] Test that a model with a hedge policy runs via the hedger instead of replicate.run."""
+        from streamlit_app import _run_prediction
+        from utils.hedging import Hedger, HedgePolicy
+        prediction = MagicMock(status='succeeded', output=["https://example.com/hedged.png"])
+        create_fn = MagicMock(return_value=prediction)
+        hedger = Hedger(create_fn, {'owner/slow:v1': HedgePolicy()}, poll_interval=0)
+
+        with patch('streamlit_app._get_hedger', return_value=hedger), \
+             patch('streamlit_app.replicate.run', return_value=["https://example.com/plain.png"]) as mock_run:
+            hedged = _run_prediction('owner/slow:v1', {'prompt': 'x'})
+            plain = _run_prediction('owner/fast:v1', {'prompt': 'y'})
+
+        assert hedged == ["https://example.com/hedged.png"]
+        create_fn.assert_called_once_with('owner/slow:v1', {'prompt': 'x'})
+        assert plain == ["https://example.com/plain.png"]
+        mock_run.assert_called_once_with('owner/fast:v1', input={'prompt': 'y'})
+
+
+class TestRoutedPredictions:
+    """Tests for routing predictions across deployments."""
+
+    @pytest.mark.integration
+    def test_routed_model_fails_over_from_deployment_to_endpoint(self, mock_streamlit_secrets):
+        """[P1] Test that a failing deployment route fails over to the model endpoint via replicate.run."""
+        from streamlit_app import _run_prediction
+        from utils.routing import Router, model_routes
+        model = {'id': 'm', 'endpoint': 'owner/m:v1', 'routes': [{'deployment': 'owner/m-prod'}]}
+        router = Router(model_routes([model]))
+
+        with patch('streamlit_app._get_router', return_value=router), \
+             patch('streamlit_app._get_hedger', return_value=None), \
+             patch('streamlit_app.replicate.predictions') as mock_predictions, \
+             patch('streamlit_app.replicate.run', return_value=["https://example.com/fallback.png"]) as mock_run:
+            mock_predictions.create.return_value = MagicMock(status='failed', error="no capacity")
+
+            output = _run_prediction('owner/m:v1', {'prompt': 'x'})
+
+        mock_predictions.create.assert_called_once_with(deployment='owner/m-prod', input={'prompt': 'x'})
+        mock_run.assert_called_once_with('owner/m:v1', input={'prompt': 'x'})
+        assert output == ["https://example.com/fallback.png"]
+
+
+class TestGenerationTelemetry:
+    """Tests for the generation progress bar, telemetry recording and admin view."""
+
+    @pytest.mark.integration
+    def test_main_page_records_telemetry_and_shows_eta(self, mock_streamlit_secrets):
+        """[P1] Test that a generation records its phases and the next one gets an ETA."""
+        # GIVEN: A fresh telemetry store and a fast prediction
+        from utils.telemetry import TelemetryStore
+        telemetry = TelemetryStore()
+        selected_model = {'id': 'sdxl', 'name': 'SDXL', 'endpoint': 'stability-ai/sdxl:v1'}
+
+        with patch('streamlit_app.st') as mock_st, \
+             patch('streamlit_app._get_telemetry', return_value=telemetry), \
+             patch('streamlit_app._get_coalescer', return_value=None), \
+             patch('streamlit_app.replicate.run', return_value=["https://example.com/a.png"]):
+            mock_st.empty.return_value.container.return_value = MagicMock()
+            mock_st.status.return_value.__enter__.return_value = MagicMock()
+            mock_st.session_state = {'selected_model': selected_model}
+
+            # WHEN: Generating twice with the same settings
+            for _ in range(2):
+                main_page(True, 1024, 1024, 1, "DDIM", 50, 7.5, 0.8, "expert_ensemble_refiner",
+                          0.8, "a red fox", "blurry")
+
+            # THEN: Queue, predict and total time were recorded for the model and bucket
+            rows = {(row['bucket'], row['phase']): row for row in telemetry.snapshot()}
+            assert rows[('1024x1024@50', 'total')]['count'] == 2
+            assert rows[('1024x1024@50', 'queue')]['count'] == 2
+            assert rows[('*', 'predict')]['count'] == 2
+
+            # AND: The progress bar finished, and the second run started with an ETA
+            texts = [c.kwargs.get('text', '') for c in mock_st.progress.call_args_list]
+            assert "no ETA yet" in texts[0]
+            assert "ETA" in texts[1] and "no ETA yet" not in texts[1]
+            mock_st.progress.return_value.progress.assert_called_with(1.0, text=ANY)
+
+    @pytest.mark.integration
+    def test_admin_view_only_with_query_param(self, mock_streamlit_secrets):
+        """[P2] Test that the admin view renders telemetry only when opened with ?admin=1."""
+        from streamlit_app import admin_view
+        from utils.telemetry import TelemetryStore
+        telemetry = TelemetryStore()
+        telemetry.record('sdxl', {'width': 512, 'height': 512, 'num_inference_steps': 20}, {'total': 3.0})
+
+        with patch('streamlit_app.st') as mock_st, \
+             patch('streamlit_app._get_telemetry', return_value=telemetry):
+            mock_st.query_params = {}
+            admin_view()
+            mock_st.dataframe.assert_not_called()
+
+            mock_st.query_params = {'admin': '1'}
+            admin_view()
+            assert mock_st.dataframe.call_args_list[0][0][0] == telemetry.snapshot()
+
+    @pytest.mark.integration
+    @pytest.mark.parametrize("hedged", [False, True], ids=["plain", "hedged"])
+    def test_main_page_follows_log_steps_for_models_with_log_parser(self, mock_streamlit_secrets, hedged):
+        """[P1] Test that a model with a log_parser, hedged or not, polls its prediction logs and shows sampler steps."""
+        # GIVEN: A prediction that is halfway through sampling until its last poll
+        import streamlit_app
+        from utils.hedging import HedgePolicy, Hedger, create_prediction
+        from utils.telemetry import TelemetryStore
+        prediction = MagicMock(status='processing', output=["https://example.com/stepped.png"], error=None,
+                               logs="Using seed: 1\n\r 50%|█████     | 5/10 [00:01<00:01]\r")
+        # The hedger reloads before it reads the logs, so it needs one more poll to see the halfway point
+        reloads = iter([False] * hedged + [True])
+
+        def finish():
+            if next(reloads):
+                prediction.status = 'succeeded'
+                prediction.logs += " 100%|██████████| 10/10 [00:02<00:00]\n"
+        prediction.reload.side_effect = finish
+        selected_model = {'id': 'sdxl', 'name': 'SDXL', 'endpoint': 'stability-ai/sdxl:v1', 'log_parser': 'tqdm'}
+        hedger = Hedger(lambda endpoint, model_input: create_prediction(streamlit_app.replicate, endpoint, model_input),
+                        {'stability-ai/sdxl:v1': HedgePolicy()}) if hedged else None
+
+        with patch('streamlit_app.st') as mock_st, \
+             patch('streamlit_app._get_telemetry', return_value=TelemetryStore()), \
+             patch('streamlit_app._get_coalescer', return_value=None), \
+             patch('streamlit_app._get_hedger', return_value=hedger), \
+             patch('streamlit_app._get_router', return_value=None), \
+             patch('streamlit_app.replicate.predictions.create', return_value=prediction) as mock_create, \
+             patch('streamlit_app.replicate.run') as mock_run:
+            mock_st.empty.return_value.container.return_value = MagicMock()
+            mock_st.status.return_value.__enter__.return_value = MagicMock()
+            mock_st.session_state = {'selected_model': selected_model}
+
+            # WHEN: Generating with the log-following model
+            main_page(True, 1024, 1024, 1, "DDIM", 50, 7.5, 0.8, "expert_ensemble_refiner",
+                      0.8, "a red fox", "blurry")
+
+            # THEN: The prediction was created and polled instead of replicate.run
+            mock_run.assert_not_called()
+            mock_create.assert_called_once()
+            assert mock_create.call_args.kwargs['version'] == 'v1'
+            assert mock_st.session_state['generated_image'] == ["https://example.com/stepped.png"]
+
+            # AND: The progress bar showed the parsed step counter
+            updates = mock_st.progress.return_value.progress.call_args_list
+            assert any(c.args[0] == 0.5 and c.kwargs['text'].startswith("🖌️ Step 5/10") for c in updates)
+
+
+class TestProgressiveMode:
+    """Tests for progressive_mode() drafts and promotion."""
+
+    @pytest.mark.integration
+    def test_drafts_then_promotes_chosen_draft(self, mock_streamlit_secrets):
+        """[P1] Test that drafts run cheap with distinct seeds and promotion renders the same seed at full quality."""
+        # GIVEN: A selected model with a progressive preset
+        from streamlit_app import progressive_mode
+        from utils.result_cache import ResultCache
+        presets = {'sdxl': [{'id': 'sdxl-default', 'name': 'SDXL Default', 'model_id': 'sdxl',
+                             'settings': {'width': 1024, 'height': 1024, 'num_inference_steps': 40},
+                             'progressive': {'draft': {'num_inference_steps': 6}}}]}
+        session = {'selected_model': {'id': 'sdxl', 'name': 'SDXL', 'endpoint': 'stability-ai/sdxl:v1'},
+                   'presets': presets}
+
+        def fake_run(endpoint, input):
+            return [f"https://example.com/{input['seed']}-{input['num_inference_steps']}.png"]
+
+        with patch('streamlit_app.st') as mock_st, \
+             patch('streamlit_app._get_result_cache', return_value=ResultCache()), \
+             patch('streamlit_app.replicate.run', side_effect=fake_run) as mock_run:
+            mock_st.session_state = session
+            mock_st.text_area.return_value = "a fox"
+            mock_st.slider.return_value = 2
+            mock_st.number_input.return_value = 7
+            mock_st.columns.side_effect = lambda n: [MagicMock() for _ in range(n)]
+
+            # WHEN: Drafting, with the second draft ticked for promotion
+            mock_st.button.side_effect = lambda label, **kwargs: label == "Draft"
+            mock_st.checkbox.side_effect = lambda label, key: key == "progressive_promote_1"
+            progressive_mode()
+
+            # THEN: Two cheap drafts ran with consecutive seeds
+            drafts = [c.kwargs['input'] for c in mock_run.call_args_list]
+            assert [(d['seed'], d['num_inference_steps'], d['width']) for d in drafts] == [(7, 6, 512), (8, 6, 512)]
+            assert session['progressive_result']['finals'] == {}
+
+            # WHEN: Promoting the ticked draft on the next rerun
+            mock_run.reset_mock()
+            mock_st.button.side_effect = lambda label, **kwargs: label == "Promote selected drafts"
+            progressive_mode()
+
+            # THEN: Only that draft was rendered, at full quality with the same seed
+            mock_run.assert_called_once()
+            final = mock_run.call_args.kwargs['input']
+            assert (final['seed'], final['num_inference_steps'], final['width']) == (8, 40, 1024)
+            assert session['progressive_result']['finals'][1].outputs == ["https://example.com/8-40.png"]
+            mock_st.rerun.assert_called_once()
+
+    @pytest.mark.integration
+    def test_auto_promote_renders_every_draft(self, mock_streamlit_secrets):
+        """[P2] Test that auto_promote renders finals right after the drafts."""
+        from streamlit_app import progressive_mode
+        from utils.result_cache import ResultCache
+        presets = {'sdxl': [{'id': 'sdxl-default', 'name': 'SDXL Default', 'model_id': 'sdxl',
+                             'progressive': {'auto_promote': True}}]}
+        session = {'selected_model': {'id': 'sdxl', 'name': 'SDXL', 'endpoint': 'stability-ai/sdxl:v1'},
+                   'presets': presets}
+
+        with patch('streamlit_app.st') as mock_st, \
+             patch('streamlit_app._get_result_cache', return_value=ResultCache()), \
+             patch('streamlit_app.replicate.run', return_value=["https://example.com/x.png"]) as mock_run:
+            mock_st.session_state = session
+            mock_st.text_area.return_value = "a fox"
+            mock_st.slider.return_value = 2
+            mock_st.number_input.return_value = None
+            mock_st.columns.side_effect = lambda n: [MagicMock() for _ in range(n)]
+            mock_st.button.side_effect = lambda label, **kwargs: label == "Draft"
+            mock_st.checkbox.return_value = False
+
+            progressive_mode()
+
+            assert mock_run.call_count == 4
+            assert sorted(session['progressive_result']['finals']) == [0, 1]
+
+
+class TestSupersedePredictions:
+    """Tests for canceling a session's earlier predictions on resubmit."""
+
+    @pytest.mark.integration
+    def test_resubmit_cancels_previous_prediction(self, mock_streamlit_secrets):
+        """[P0] Test that a new submit cancels the session's unpinned in-flight prediction and tracks the new one."""
+        # GIVEN: A session whose earlier generation is still running (its script run was interrupted)
+        from utils.inflight import CANCELED, PredictionRegistry
+        registry = PredictionRegistry()
+        earlier = registry.begin("s1", label="an owl")
+        registry.attach(earlier, MagicMock(id="p-old"))
+        prediction = MagicMock(id="p-new", status='succeeded', output=["https://example.com/new.png"], error=None)
+        selected_model = {'id': 'sdxl', 'name': 'SDXL', 'endpoint': 'stability-ai/sdxl:v1'}
+
+        with patch('streamlit_app.st') as mock_st, \
+             patch('streamlit_app._current_session_id', return_value="s1"), \
+             patch('streamlit_app._get_inflight_registry', return_value=registry), \
+             patch('streamlit_app._get_coalescer', return_value=None), \
+             patch('streamlit_app._get_hedger', return_value=None), \
+             patch('streamlit_app._get_router', return_value=None), \
+             patch('streamlit_app.replicate.predictions.create', return_value=prediction) as mock_create:
+            mock_st.empty.return_value.container.return_value = MagicMock()
+            mock_st.status.return_value.__enter__.return_value = MagicMock()
+            mock_st.checkbox.return_value = False
+            mock_st.session_state = {'selected_model': selected_model}
+
+            # WHEN: Submitting again
+            main_page(True, 1024, 1024, 1, "DDIM", 50, 7.5, 0.8, "expert_ensemble_refiner",
+                      0.8, "a red fox", "blurry")
+
+            # THEN: The earlier prediction was canceled through the API and the new one ran to completion
+            earlier.prediction.cancel.assert_called_once()
+            assert earlier.status == CANCELED
+            mock_create.assert_called_once()
+            prediction.cancel.assert_not_called()
+            assert mock_st.session_state['generated_image'] == ["https://example.com/new.png"]
+            assert registry.jobs("s1") == []
+            assert registry.stats()['superseded'] == 1
+
+    @pytest.mark.integration
+    def test_job_superseded_while_queued_never_creates_a_prediction(self, mock_streamlit_secrets):
+        """[P0] Test that a job canceled before it got a concurrency slot raises instead of creating a prediction."""
+        from streamlit_app import _tracked_prediction
+        from utils.hedging import PredictionCanceled
+        from utils.inflight import PredictionRegistry
+        registry = PredictionRegistry()
+        job = registry.begin("s1", label="an owl")
+        registry.supersede("s1")
+
+        with patch('streamlit_app._get_inflight_registry', return_value=registry), \
+             patch('streamlit_app._get_coalescer', return_value=None), \
+             patch('streamlit_app._get_hedger', return_value=None), \
+             patch('streamlit_app._get_router', return_value=None), \
+             patch('streamlit_app.replicate.predictions.create') as mock_create:
+            with pytest.raises(PredictionCanceled, match="superseded"):
+                _tracked_prediction(job, 'stability-ai/sdxl:v1', {'prompt': "an owl"}, None)
+
+        mock_create.assert_not_called()
+        assert job.canceled
+
+    @pytest.mark.integration
+    def test_supersede_cancels_primary_and_hedge_of_a_hedged_model(self, mock_streamlit_secrets):
+        """[P0] Test that superseding a hedged generation cancels both predictions of its race."""
+        # GIVEN: A hedged model whose predictions stay starting, so a hedge is issued right away
+        import threading
+        from streamlit_app import _tracked_prediction
+        from utils.hedging import HedgePolicy, Hedger, PredictionCanceled
+        from utils.inflight import PredictionRegistry
+        created = []
+
+        def create_fn(endpoint, model_input):
+            created.append(MagicMock(id=f"p-{len(created) + 1}", status='starting', logs="", output=None, error=None))
+            created[-1].cancel.side_effect = lambda prediction=created[-1]: setattr(prediction, 'status', 'canceled')
+            return created[-1]
+
+        hedger = Hedger(create_fn, {'stability-ai/sdxl:v1': HedgePolicy(initial_delay=0, min_delay=0)},
+                        poll_interval=0.01)
+        registry = PredictionRegistry()
+        job = registry.begin("s1", label="an owl")
+        raised = []
+
+        def generate():
+            try:
+                _tracked_prediction(job, 'stability-ai/sdxl:v1', {'prompt': "an owl"}, None)
+            except Exception as e:
+                raised.append(e)
+
+        with patch('streamlit_app._get_inflight_registry', return_value=registry), \
+             patch('streamlit_app._get_coalescer', return_value=None), \
+             patch('streamlit_app._get_hedger', return_value=hedger), \
+             patch('streamlit_app._get_router', return_value=None):
+            worker = threading.Thread(target=generate, daemon=True)
+            worker.start()
+            try:
+                for _ in range(500):
+                    if len(created) == 2:
+                        break
+                    threading.Event().wait(0.01)
+
+                # WHEN: The session resubmits while the race is on
+                registry.supersede("s1")
+                worker.join(5)
+
+                # THEN: Both predictions got a cancel call and the generation ended as canceled, not failed
+                assert len(created) == 2
+                for prediction in created:
+                    prediction.cancel.assert_called()
+                assert [type(e) for e in raised] == [PredictionCanceled]
+                assert job.canceled
+            finally:
+                # Never leave the race polling past the test, even when the assertions fail
+                for prediction in list(created):
+                    prediction.status = 'canceled'
+                worker.join(5)
+
+    @pytest.mark.integration
+    def test_pinned_generation_is_kept_and_delivered_later(self, mock_streamlit_secrets):
+        """[P1] Test that ticking the pin keeps a running generation alive and shows its images on a later rerun."""
+        from utils.inflight import PredictionRegistry
+        registry = PredictionRegistry()
+        earlier = registry.begin("s1", label="an owl")
+        registry.attach(earlier, MagicMock(id="p-old"))
+
+        with patch('streamlit_app.st') as mock_st, \
+             patch('streamlit_app._current_session_id', return_value="s1"), \
+             patch('streamlit_app._get_inflight_registry', return_value=registry), \
+             patch('streamlit_app._get_persister', return_value=None):
+            mock_st.checkbox.side_effect = lambda label, key=None, **kwargs: key == "pin_generations"
+            mock_st.session_state = {'selected_model': {'id': 'sdxl', 'name': 'SDXL',
+                                                        'endpoint': 'stability-ai/sdxl:v1'}}
+
+            # WHEN: A rerun with the pin ticked, then the prediction finishes and the page reruns again
+            main_page(False, 1024, 1024, 1, "DDIM", 50, 7.5, 0.8, "expert_ensemble_refiner",
+                      0.8, "a red fox", "blurry")
+            assert registry.supersede("s1") == []
+            registry.finish(earlier, outputs=["https://example.com/owl.png"])
+            main_page(False, 1024, 1024, 1, "DDIM", 50, 7.5, 0.8, "expert_ensemble_refiner",
+                      0.8, "a red fox", "blurry")
+
+            # THEN: The pinned images were shown once and the job is no longer tracked
+            earlier.prediction.cancel.assert_not_called()
+            mock_st.image.assert_any_call("https://example.com/owl.png", use_column_width=True)
+            assert registry.jobs("s1") == []
+
+
+class TestRerunProfiling:
+    """Tests for the opt-in per-rerun profiler."""
+
+    @pytest.mark.integration
+    def test_reruns_are_profiled_and_tagged_only_when_requested(self, mock_streamlit_secrets, tmp_path):
+        """[P1] Test that ?profile=1 profiles each rerun tagged with its interaction, and nothing runs otherwise."""
+        from streamlit_app import run_app
+        from utils.rerun_profiler import RerunProfiler
+        profiler = RerunProfiler(str(tmp_path), fmt='speedscope')
+        session_state = {'selected_model': {'id': 'sdxl'}, 'form_width': 1024}
+
+        def fake_main():
+            if session_state.get('form_prompt') == "generate":
+                session_state['generated_image'] = ["https://example.com/out.png"]
+
+        with patch('streamlit_app.st') as mock_st, \
+             patch('streamlit_app.main', side_effect=fake_main) as mock_main, \
+             patch('streamlit_app._current_session_id', return_value="3f2a9c1e-session"), \
+             patch('streamlit_app._get_rerun_profiler', return_value=profiler) as mock_get_profiler:
+            mock_st.session_state = session_state
+
+            # GIVEN: Profiling is off; WHEN: the app reruns; THEN: main runs without any profiler
+            mock_st.query_params = {}
+            run_app()
+            mock_main.assert_called_once()
+            mock_get_profiler.assert_not_called()
+
+            # WHEN: Opened with ?profile=1, then the width is edited, the model switched and a prompt generated
+            mock_st.query_params = {'profile': '1'}
+            run_app()
+            session_state['form_width'] = 768
+            run_app()
+            session_state['selected_model'] = {'id': 'flux'}
+            run_app()
+            session_state['form_prompt'] = "generate"
+            run_app()
+
+        # THEN: Each rerun was written with the session, model and interaction
+        profiles = list(reversed(profiler.recent()))
+        assert [p.interaction for p in profiles] == ['initial', 'edit-width', 'model-switch', 'generate']
+        assert [p.model_id for p in profiles] == ['sdxl', 'sdxl', 'flux', 'flux']
+        assert {p.session_id for p in profiles} == {"3f2a9c1e"}
+        assert all(p.path.exists() for p in profiles)
+
+    @pytest.mark.integration
+    def test_admin_view_lists_slowest_profiled_reruns(self, mock_streamlit_secrets, tmp_path):
+        """[P2] Test that the admin view lists profiled reruns slowest first with a download."""
+        from streamlit_app import _profiled_reruns_panel
+        from utils.rerun_profiler import RerunProfiler
+        (tmp_path / "1700000000000_120_s1_sdxl_initial.speedscope.json").write_text("{}")
+        (tmp_path / "1700000001000_900_s1_sdxl_generate.speedscope.json").write_text("{}")
+        profiler = RerunProfiler(str(tmp_path))
+
+        with patch('streamlit_app.st') as mock_st, \
+             patch('streamlit_app._get_rerun_profiler', return_value=profiler):
+            mock_st.selectbox.side_effect = lambda label, options, **kwargs: options[0]
+            _profiled_reruns_panel()
+
+        rows = mock_st.dataframe.call_args[0][0]
+        assert [(row['interaction'], row['duration_ms']) for row in rows] == [('generate', 900), ('initial', 120)]
+        assert mock_st.download_button.call_args.kwargs['file_name'] == "1700000001000_900_s1_sdxl_generate.speedscope.json"
+
+
+class TestSubmissionTracing:
+    """Tests for the spans recorded across a submission."""
+
+    @pytest.mark.integration
+    def test_submission_phases_are_traced_under_one_trace(self, mock_streamlit_secrets, tmp_path):
+        """[P1] Test that each phase of a submission, including later downloads and the ZIP, is a span of one trace."""
+        # GIVEN: A JSONL tracer, a persister and a prediction that is already finished when created
+        from utils.inflight import PredictionRegistry
+        from utils.persister import BackgroundPersister
+        from utils.tracing import JsonlSpanExporter, Tracer
+        tracer = Tracer(JsonlSpanExporter(str(tmp_path / "spans.jsonl")))
+        store = ImageStore(str(tmp_path / "store"))
+        persister = BackgroundPersister(store, fetch=lambda url: [b"\x89PNG" + b"x" * 96])
+        prediction = MagicMock(id="p-1", status='succeeded', output=["https://example.com/a.png"], error=None,
+                               logs="", metrics={'predict_time': 2.0}, created_at="2026-10-19T10:00:00.000Z",
+                               started_at="2026-10-19T10:00:01.500Z", completed_at="2026-10-19T10:00:03.500Z")
+        selected_model = {'id': 'sdxl', 'name': 'SDXL', 'endpoint': 'stability-ai/sdxl:v1'}
+
+        with patch('streamlit_app.st') as mock_st, \
+             patch('streamlit_app._get_tracer', return_value=tracer), \
+             patch('streamlit_app._get_persister', return_value=persister), \
+             patch('streamlit_app._get_image_store', return_value=store), \
+             patch('streamlit_app._current_session_id', return_value="s1"), \
+             patch('streamlit_app._get_inflight_registry', return_value=PredictionRegistry()), \
+             patch('streamlit_app._get_coalescer', return_value=None), \
+             patch('streamlit_app._get_hedger', return_value=None), \
+             patch('streamlit_app._get_router', return_value=None), \
+             patch('streamlit_app.replicate.predictions.create', return_value=prediction):
+            mock_st.empty.return_value.container.return_value = MagicMock()
+            mock_st.status.return_value.__enter__.return_value = MagicMock()
+            mock_st.checkbox.return_value = False
+            mock_st.session_state = {'selected_model': selected_model}
+
+            # WHEN: Submitting, letting the download finish and building the ZIP
+            main_page(True, 1024, 1024, 1, "DDIM", 50, 7.5, 0.8, "expert_ensemble_refiner",
+                      0.8, "a red fox", "blurry")
+            assert persister.wait(5)
+            archive = mock_st.download_button.call_args_list[-1].kwargs['data']()
+            persister.close()
+        assert tracer.flush(5)
+
+        # THEN: Every phase is a span of the submission's trace, nested under the right parent
+        spans = {span['name']: span for span in map(json.loads, (tmp_path / "spans.jsonl").read_text().splitlines())}
+        assert set(spans) == {'submission', 'resolve_preset', 'build_input', 'queue_wait', 'prediction',
+                              'prediction.create', 'prediction.queue', 'prediction.processing',
+                              'render', 'download', 'archive'}
+        root = spans['submission']
+        assert root['parent_id'] is None and root['status'] == 'ok'
+        assert {span['trace_id'] for span in spans.values()} == {root['trace_id']}
+        for name in ('resolve_preset', 'build_input', 'queue_wait', 'prediction', 'render', 'download', 'archive'):
+            assert spans[name]['parent_id'] == root['span_id'], name
+        for name in ('prediction.create', 'prediction.queue', 'prediction.processing'):
+            assert spans[name]['parent_id'] == spans['prediction']['span_id'], name
+
+        # AND: Spans carry the model, endpoint, output count and sizes, with Replicate's own phase durations
+        assert root['attributes'] == {'model_id': 'sdxl', 'endpoint': 'stability-ai/sdxl:v1',
+                                      'num_outputs': 1, 'images': 1}
+        assert spans['prediction']['attributes']['prediction_id'] == "p-1"
+        assert spans['prediction.queue']['duration_ms'] == pytest.approx(1500, abs=1)
+        assert spans['prediction.processing']['duration_ms'] == pytest.approx(2000, abs=1)
+        assert spans['download']['attributes']['bytes'] == 100
+        assert spans['archive']['attributes']['bytes'] == len(archive) > 0
+
+
+class TestAppMetrics:
+    """Tests for the Prometheus metrics recorded by the app."""
+
+    @pytest.mark.integration
+    def test_failed_submissions_and_reruns_are_counted(self, mock_streamlit_secrets):
+        """[P1] Test that errors are counted by except branch and every rerun is recorded, even when it raises."""
+        from streamlit_app import run_app
+        from utils.metrics import AppMetrics
+        metrics = AppMetrics()
+        selected_model = {'id': 'sdxl', 'name': 'SDXL', 'endpoint': 'stability-ai/sdxl:v1'}
+
+        with patch('streamlit_app.st') as mock_st, \
+             patch('streamlit_app._get_metrics', return_value=metrics), \
+             patch('streamlit_app._get_coalescer', return_value=None), \
+             patch('streamlit_app._get_hedger', return_value=None), \
+             patch('streamlit_app._get_router', return_value=None), \
+             patch('streamlit_app.replicate.run', side_effect=requests.exceptions.ConnectionError("reset")):
+            mock_st.empty.return_value.container.return_value = MagicMock()
+            mock_st.status.return_value.__enter__.return_value = MagicMock()
+            mock_st.session_state = {'selected_model': selected_model}
+            mock_st.query_params = {}
+
+            # WHEN: A submission hits a network error, then the page reruns normally and once with an error
+            main_page(True, 1024, 1024, 1, "DDIM", 50, 7.5, 0.8, "expert_ensemble_refiner",
+                      0.8, "a red fox", "blurry")
+            with patch('streamlit_app.main'), patch('streamlit_app._current_session_id', return_value="s1"):
+                run_app()
+            with patch('streamlit_app.main', side_effect=RuntimeError("stop")), pytest.raises(RuntimeError):
+                run_app()
+
+        # THEN: The error is counted under its branch and both reruns are recorded
+        text = metrics.registry.render()
+        assert 'app_replicate_errors_total{type="network"} 1\n' in text
+        assert 'app_replicate_errors_total{type="unexpected"} 0\n' in text
+        assert "app_reruns_total 2\n" in text
+        assert "app_active_sessions 1\n" in text
+
+    @pytest.mark.integration
+    def test_metrics_read_component_stats_at_scrape_time(self, mock_streamlit_secrets, tmp_path):
+        """[P2] Test that in-flight predictions, queue depths, cache ratios and bytes downloaded are exposed."""
+        from streamlit_app import _get_metrics
+        from utils.generation import ConcurrencyLimiter
+        from utils.persister import BackgroundPersister
+        limiter = ConcurrencyLimiter(2)
+        persister = BackgroundPersister(ImageStore(str(tmp_path / "store")), fetch=lambda url: [b"x" * 300])
+        cache = MagicMock()
+        cache.stats.return_value = {'entries': 1, 'hits': 3, 'misses': 1}
+
+        with patch('streamlit_app._get_prediction_limiter', return_value=limiter), \
+             patch('streamlit_app._get_persister', return_value=persister), \
+             patch('streamlit_app._get_result_cache', return_value=cache):
+            metrics = _get_metrics.__wrapped__()
+            persister.submit("https://example.com/a.png")
+            assert persister.wait(5)
+            with limiter.slot():
+                text = metrics.registry.render()
+        persister.close()
+
+        assert "app_predictions_in_flight 1\n" in text
+        assert 'app_queue_depth{queue="predictions"} 0\n' in text
+        assert 'app_queue_depth{queue="persister"} 0\n' in text
+        assert 'app_cache_lookups_total{cache="result",result="hit"} 3\n' in text
+        assert 'app_cache_hit_ratio{cache="result"} 0.75\n' in text
+        assert "app_downloaded_bytes_total 300\n" in text
+
+
+    @pytest.mark.integration
+    def test_rerun_sweep_cells_count_as_cache_hits(self, mock_streamlit_secrets, tmp_path):
+        """[P1] Test that a repeated sweep's cached cells raise the result cache hit counter and ratio."""
+        # GIVEN: Metrics over a real, empty result cache and a 2-cell sweep
+        from streamlit_app import _get_metrics, sweep_mode
+        from tests.support.helpers import create_png_bytes
+        from utils.result_cache import ResultCache
+        cache = ResultCache()
+        values = {'guidance_scale values': "5, 10", 'num_inference_steps values': "20"}
+
+        def scrape_after_sweep():
+            with patch('streamlit_app.st') as mock_st, \
+                 patch('streamlit_app._get_image_store', return_value=ImageStore(str(tmp_path))), \
+                 patch('streamlit_app.http_fetch', side_effect=lambda url: [create_png_bytes(16, 16)]), \
+                 patch('streamlit_app.replicate.run',
+                       side_effect=lambda endpoint, input: [f"https://example.com/{input['guidance_scale']}.png"]):
+                mock_st.session_state = {'selected_model': {'id': 'sdxl', 'name': 'SDXL',
+                                                            'endpoint': 'stability-ai/sdxl:v1'}, 'presets': {}}
+                mock_st.text_area.return_value = "a fox"
+                mock_st.text_input.side_effect = lambda label, **kwargs: values[label]
+                mock_st.multiselect.return_value = ['DDIM']
+                mock_st.selectbox.return_value = 'guidance_scale'
+                mock_st.number_input.return_value = 7
+                mock_st.button.return_value = True
+                sweep_mode()
+            return metrics.registry.render()
+
+        with patch('streamlit_app._get_result_cache', return_value=cache):
+            metrics = _get_metrics.__wrapped__()
+            # WHEN: Running the same sweep twice
+            first = scrape_after_sweep()
+            second = scrape_after_sweep()
+
+        # THEN: The first run missed every cell and the repeat hit every cell
+        assert 'app_cache_lookups_total{cache="result",result="hit"} 0\n' in first
+        assert 'app_cache_lookups_total{cache="result",result="miss"} 2\n' in first
+        assert 'app_cache_lookups_total{cache="result",result="hit"} 2\n' in second
+        assert 'app_cache_hit_ratio{cache="result"} 0.5\n' in second
+
+class TestLogPipeline:
+    """Tests for correlation ids and logging cost in the app's log pipeline."""
+
+    @pytest.fixture
+    def pipeline(self):
+        """A JSON pipeline on the root logger, with the app logger's level restored afterwards."""
+        import logging
+        from utils.log_pipeline import LogPipeline
+        level = logging.getLogger('streamlit_app').level
+        pipeline = LogPipeline('json', 'INFO', stream=io.StringIO(), loggers=('streamlit_app',))
+        pipeline.start(logging.getLogger())
+        yield pipeline
+        pipeline.stop()
+        logging.getLogger('streamlit_app').setLevel(level)
+
+    @staticmethod
+    def _lines(pipeline) -> list:
+        pipeline.stop()
+        return [json.loads(line) for line in pipeline.listener.handlers[0].stream.getvalue().splitlines()]
+
+    @pytest.mark.integration
+    def test_submission_records_carry_its_trace_id_as_job_id(self, mock_streamlit_secrets, pipeline, tmp_path):
+        """[P1] Test that records logged during a submission are tagged with the submission's trace id."""
+        from utils.tracing import JsonlSpanExporter, Tracer
+        tracer = Tracer(JsonlSpanExporter(str(tmp_path / "spans.jsonl")))
+        selected_model = {'id': 'sdxl', 'name': 'SDXL', 'endpoint': 'stability-ai/sdxl:v1'}
+
+        with patch('streamlit_app.st') as mock_st, \
+             patch('streamlit_app._get_tracer', return_value=tracer), \
+             patch('streamlit_app._get_coalescer', return_value=None), \
+             patch('streamlit_app._get_hedger', return_value=None), \
+             patch('streamlit_app._get_router', return_value=None), \
+             patch('streamlit_app.replicate.run', return_value=["https://example.com/a.png"]):
+            mock_st.empty.return_value.container.return_value = MagicMock()
+            mock_st.status.return_value.__enter__.return_value = MagicMock()
+            mock_st.session_state = {'selected_model': selected_model}
+            main_page(True, 1024, 1024, 1, "DDIM", 50, 7.5, 0.8, "expert_ensemble_refiner",
+                      0.8, "a red fox", "blurry")
+
+        assert tracer.flush(5)
+
+        spans = {span['name']: span for span in map(json.loads, (tmp_path / "spans.jsonl").read_text().splitlines())}
+        [line] = [line for line in self._lines(pipeline) if line['message'].startswith("Using selected model")]
+        assert line['message'] == "Using selected model endpoint: stability-ai/sdxl:v1 (Model: SDXL)"
+        assert line['job_id'] == spans['submission']['trace_id']
+
+    @pytest.mark.integration
+    def test_reruns_are_tagged_by_session_and_their_logging_cost_is_recorded(self, mock_streamlit_secrets, pipeline):
+        """[P1] Test that run_app tags records with the session id and observes the rerun's logging overhead."""
+        import logging
+        from streamlit_app import run_app
+        from utils.metrics import AppMetrics
+        metrics = AppMetrics()
+
+        def rerun():
+            logging.getLogger('streamlit_app').warning("rendered %s", "page")
+            logging.getLogger('utils.persister').warning("queued %d", 2)
+
+        with patch('streamlit_app._get_log_pipeline', return_value=pipeline), \
+             patch('streamlit_app._get_metrics', return_value=metrics), \
+             patch('streamlit_app._current_session_id', return_value="s1"), \
+             patch('streamlit_app.main', side_effect=rerun):
+            run_app()
+
+        lines = self._lines(pipeline)
+        assert [(line['message'], line['session_id']) for line in lines] == [("rendered page", "s1"),
+                                                                             ("queued 2", "s1")]
+        text = metrics.registry.render()
+        assert "app_log_records_total 2\n" in text
+        assert "app_log_overhead_seconds_count 1\n" in text
+
+
+class TestRequestLog:
+    """Tests for the per-submission request log."""
+
+    @pytest.mark.integration
+    def test_successful_and_failed_submissions_are_logged_with_timings(self, mock_streamlit_secrets, tmp_path):
+        """[P1] Test that each submission appends one line with its outcome, settings and phase timings."""
+        from utils.request_log import RequestLog, iter_request_log
+        request_log = RequestLog(str(tmp_path / "requests.jsonl"), flush_interval=0)
+        selected_model = {'id': 'sdxl', 'name': 'SDXL', 'endpoint': 'stability-ai/sdxl:v1'}
+        prediction = MagicMock(id="p-1", status='succeeded', output=["https://example.com/a.png"], error=None,
+                               logs="", metrics={'predict_time': 2.0})
+
+        with patch('streamlit_app.st') as mock_st, \
+             patch('streamlit_app._get_request_log', return_value=request_log), \
+             patch('streamlit_app._current_session_id', return_value="s1"), \
+             patch('streamlit_app._get_coalescer', return_value=None), \
+             patch('streamlit_app._get_hedger', return_value=None), \
+             patch('streamlit_app._get_router', return_value=None), \
+             patch('streamlit_app.replicate.predictions.create',
+                   side_effect=[prediction, requests.exceptions.ConnectionError("reset")]):
+            mock_st.empty.return_value.container.return_value = MagicMock()
+            mock_st.status.return_value.__enter__.return_value = MagicMock()
+            mock_st.checkbox.return_value = False
+            mock_st.session_state = {'selected_model': selected_model}
+            for prompt in ("a red fox", "a blue fox"):
+                main_page(True, 1024, 1024, 1, "DDIM", 50, 7.5, 0.8, "expert_ensemble_refiner",
+                          0.8, prompt, "blurry")
+        request_log.close()
+
+        succeeded, failed = iter_request_log(str(tmp_path / "requests.jsonl"))
+        assert (succeeded['status'], succeeded['model_id'], succeeded['prompt'], succeeded['images']) == \
+            ("succeeded", "sdxl", "a red fox", 1)
+        assert succeeded['session_id'] == "s1" and len(succeeded['job_id']) == 32
+        assert succeeded['settings']['num_inference_steps'] == 50 and 'prompt' not in succeeded['settings']
+        assert set(succeeded['timings']) >= {'queue', 'predict', 'total'}
+        assert succeeded['duration'] >= succeeded['timings']['total']
+        assert (failed['status'], failed['error_type'], failed['prompt']) == ("failed", "network", "a blue fox")
+        assert failed['error'] == "ConnectionError: reset" and failed['timings'] == {}
+
+
+class TestGenerationHistory:
+    """Tests for recording submissions in the generation history and the history panel."""
+
+    @pytest.mark.integration
+    def test_successful_submission_is_searchable_with_preset_and_blob_keys(self, mock_streamlit_secrets, tmp_path):
+        """[P1] Test that a generation is stored with its preset, settings and image store keys, and failures are not."""
+        from utils.history import HistoryStore
+        history = HistoryStore(str(tmp_path / "history.db"), flush_interval=0)
+        store = ImageStore(str(tmp_path / "store"))
+        selected_model = {'id': 'sdxl', 'name': 'SDXL', 'endpoint': 'stability-ai/sdxl:v1'}
+        prediction = MagicMock(id="p-1", status='succeeded', output=["https://example.com/a.png"], error=None,
+                               logs="", metrics={'predict_time': 2.0})
+
+        with patch('streamlit_app.st') as mock_st, \
+             patch('streamlit_app._get_history', return_value=history), \
+             patch('streamlit_app._get_image_store', return_value=store), \
+             patch('streamlit_app._current_session_id', return_value="s1"), \
+             patch('streamlit_app._get_coalescer', return_value=None), \
+             patch('streamlit_app._get_hedger', return_value=None), \
+             patch('streamlit_app._get_router', return_value=None), \
+             patch('streamlit_app.replicate.predictions.create',
+                   side_effect=[prediction, requests.exceptions.ConnectionError("reset")]):
+            mock_st.empty.return_value.container.return_value = MagicMock()
+            mock_st.status.return_value.__enter__.return_value = MagicMock()
+            mock_st.checkbox.return_value = False
+            mock_st.session_state = {'selected_model': selected_model, 'preset_applied_for_model_id': 'sdxl',
+                                     'presets': {'sdxl': [{'id': 'sdxl-photo', 'name': 'Photo', 'default': True}]}}
+            for prompt in ("a red fox in the snow", "a blue fox"):
+                main_page(True, 1024, 1024, 1, "DDIM", 50, 7.5, 0.8, "expert_ensemble_refiner",
+                          0.8, prompt, "blurry")
+        assert history.flush(5)
+
+        [entry] = history.search("fox").entries
+        assert (entry.prompt, entry.model_id, entry.preset, entry.negative_prompt) == \
+            ("a red fox in the snow", "sdxl", "sdxl-photo", "blurry")
+        assert entry.outputs == [{'url': "https://example.com/a.png", 'key': store.key_for("https://example.com/a.png")}]
+        assert entry.settings['num_inference_steps'] == 50 and 'prompt' not in entry.settings
+        assert entry.session_id == "s1" and set(entry.timings) >= {'queue', 'predict', 'total'}
+        assert history.search("snow", model_id="flux").entries == []
+        history.close()
+
+    @pytest.mark.integration
+    def test_panel_pages_back_and_forth_with_stored_thumbnails(self, tmp_path):
+        """[P2] Test that the panel queries nothing until shown, then pages back and forth with stored thumbnails."""
+        from PIL import Image
+        from streamlit_app import history_panel
+        from utils.history import DEFAULT_PAGE_SIZE, HistoryEntry, HistoryStore
+        history = HistoryStore(str(tmp_path / "history.db"), flush_interval=0)
+        store = ImageStore(str(tmp_path / "store"))
+        key = store.key_for("https://example.com/0.png")
+        png = io.BytesIO()
+        Image.new("RGB", (512, 512), "red").save(png, format="PNG")
+        store.write_stream(key, [png.getvalue()])
+        for idx in range(DEFAULT_PAGE_SIZE + 5):
+            url = f"https://example.com/{idx}.png"
+            history.add(HistoryEntry(prompt=f"fox {idx}", model_id="sdxl", outputs=[{'url': url, 'key': store.key_for(url)}]))
+        assert history.flush(5)
+
+        def render(clicked=None, show=True):
+            with patch('streamlit_app.st') as mock_st:
+                mock_st.session_state = session_state
+                mock_st.checkbox.return_value = show
+                mock_st.text_input.return_value = "fox"
+                mock_st.selectbox.return_value = None
+                mock_st.columns.side_effect = lambda spec: [MagicMock() for _ in range(spec if isinstance(spec, int) else len(spec))]
+                mock_st.button.side_effect = lambda label, **kwargs: kwargs['key'] == clicked
+                history_panel()
+            return mock_st
+
+        session_state = {}
+        with patch('streamlit_app._get_history', return_value=history), \
+             patch('streamlit_app._get_image_store', return_value=store):
+            with patch.object(history, 'models') as models, patch.object(history, 'search') as search:
+                hidden = render(show=False)
+            models.assert_not_called()
+            search.assert_not_called()
+            hidden.image.assert_not_called()
+
+            first = render(clicked="history_older")
+            assert first.code.call_args_list[0].args[0] == f"fox {DEFAULT_PAGE_SIZE + 4}"
+            assert first.image.call_count == DEFAULT_PAGE_SIZE
+            first.rerun.assert_called_once()
+            assert len(session_state['history_cursors']) == 2
+
+            older = render()
+            assert [call.args[0] for call in older.code.call_args_list] == [f"fox {idx}" for idx in range(4, -1, -1)]
+            thumbnail = older.image.call_args_list[-1].args[0]
+            assert isinstance(thumbnail, bytes) and Image.open(io.BytesIO(thumbnail)).size == (160, 160)
+
+            render(clicked="history_newer")
+            assert session_state['history_cursors'] == [None]
+        history.close()
@@ -181,9 +181,7 @@ class TestMainPageEdgeCasesAdvanced:
             ]
             
             # WHEN: Calling main_page
-            with patch('streamlit_app.st') as mock_st, \
-                 patch('streamlit_app.zipfile.ZipFile') as mock_zipfile, \
-                 patch('streamlit_app.io.BytesIO') as mock_bytesio:
+            with patch('streamlit_app.st') as mock_st:
                 
                 mock_container = MagicMock()
                 mock_st.empty.return_value.container.return_value = mock_container
@@ -194,12 +192,6 @@ class TestMainPageEdgeCasesAdvanced:
                 mock_st.download_button = MagicMock()
                 mock_st.error = MagicMock()
                 
-                mock_zip_io = MagicMock()
-                mock_bytesio.return_value = mock_zip_io
-                mock_zip = MagicMock()
-                mock_zipfile.return_value.__enter__.return_value = mock_zip
-                mock_zipfile.return_value.__exit__.return_value = None
-                
                 main_page(
                     submitted, 1024, 1024, 3, "DDIM",
                     50, 7.5, 0.8, "expert_ensemble_refiner",
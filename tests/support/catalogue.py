@@ -0,0 +1,76 @@
+"""Synthetic model and preset catalogues for benchmarks and scale tests."""
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Tuple
+
+import yaml
+
+SCHEDULERS = ["DDIM", "DPMSolverMultistep", "K_EULER", "K_EULER_ANCESTRAL", "PNDM"]
+
+
+def synthetic_models(count: int) -> List[Dict[str, Any]]:
+    """
+    Build ``count`` valid models shaped like the entries in models.yaml.
+
+    Every model has trigger words and default settings; every tenth also sets
+    max_outputs, so optional-field validation runs too.
+    """
+    models = []
+    for index in range(count):
+        model: Dict[str, Any] = {
+            'id': f"model-{index:06d}",
+            'name': f"Synthetic Model {index}",
+            'endpoint': f"owner-{index % 97}/model-{index}:{index:064x}",
+            'trigger_words': [f"TOK{index}", "synthetic style"],
+            'default_settings': {
+                'width': 1024,
+                'height': 1024,
+                'num_inference_steps': 20 + index % 30,
+                'guidance_scale': 7.5,
+            },
+        }
+        if index % 10 == 0:
+            model['max_outputs'] = 4
+        models.append(model)
+    return models
+
+
+def synthetic_presets(count: int, model_ids: Sequence[str]) -> List[Dict[str, Any]]:
+    """
+    Build ``count`` valid presets spread round-robin over ``model_ids``.
+
+    The first preset of each model is marked ``default: true`` and every third
+    preset appends its trigger words instead of prepending them.
+    """
+    presets = []
+    for index in range(count):
+        model_id = model_ids[index % len(model_ids)]
+        preset: Dict[str, Any] = {
+            'id': f"preset-{index:06d}",
+            'name': f"Synthetic Preset {index}",
+            'model_id': model_id,
+            'trigger_words': [f"PRESET{index}"],
+            'settings': {
+                'width': 768 + 64 * (index % 5),
+                'height': 768,
+                'num_inference_steps': 25,
+                'guidance_scale': 5.0 + index % 5,
+                'scheduler': SCHEDULERS[index % len(SCHEDULERS)],
+                'negative_prompt': "blurry, low quality",
+            },
+        }
+        if index < len(model_ids):
+            preset['default'] = True
+        if index % 3 == 2:
+            preset['trigger_words_position'] = 'append'
+        presets.append(preset)
+    return presets
+
+
+def write_catalogue(directory: Path, models: List[Dict[str, Any]],
+                    presets: List[Dict[str, Any]]) -> Tuple[Path, Path]:
+    """Write models.yaml and presets.yaml into ``directory`` and return their paths."""
+    models_path = Path(directory) / "models.yaml"
+    presets_path = Path(directory) / "presets.yaml"
+    models_path.write_text(yaml.safe_dump({'models': models}, sort_keys=False), encoding='utf-8')
+    presets_path.write_text(yaml.safe_dump({'presets': presets}, sort_keys=False), encoding='utf-8')
+    return models_path, presets_path
@@ -3,6 +3,9 @@ from typing import Dict, Any, List, Optional
 from unittest.mock import Mock, MagicMock
 import zipfile
 import io
+import os
+import struct
+import zlib
 
 
 def create_mock_image_url(index: int = 1) -> str:
@@ -144,3 +147,44 @@ def create_mock_http_response(status_code: int = 200, content: bytes = b'fake-im
     mock_response.content = content
     mock_response.text = content.decode('utf-8', errors='ignore')
     return mock_response
+
+
+def create_png_bytes(width: int = 8, height: int = 8, noise: bool = False) -> bytes:
+    """Create a valid RGB PNG without depending on an imaging library.
+    
+    Args:
+        width: Image width in pixels
+        height: Image height in pixels
+        noise: Fill with random pixels (realistic, poorly compressible size)
+        
+    Returns:
+        Bytes of the PNG file
+    """
+    def chunk(chunk_type: bytes, data: bytes) -> bytes:
+        crc = zlib.crc32(data, zlib.crc32(chunk_type)) & 0xFFFFFFFF
+        return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', crc)
+    
+    row_size = width * 3
+    if noise:
+        pixels = os.urandom(row_size * height)
+    else:
+        pixels = bytes((x * 7) % 256 for x in range(row_size)) * height
+    raw = b''.join(b'\x00' + pixels[y * row_size:(y + 1) * row_size] for y in range(height))
+    ihdr = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', ihdr) +
+            chunk(b'IDAT', zlib.compress(raw, 1)) + chunk(b'IEND', b''))
+
+
+def click_download(data: Any) -> bytes:
+    """Return what a download button serves for ``data``, as Streamlit converts it on click.
+
+    Args:
+        data: The ``data`` passed to ``st.download_button``; callables are called first
+
+    Returns:
+        The downloaded bytes
+    """
+    from streamlit.runtime.download_data_util import convert_data_to_bytes_and_infer_mime
+    payload = data() if callable(data) else data
+    content, _ = convert_data_to_bytes_and_infer_mime(payload, TypeError(f"Unsupported download data {type(payload)}"))
+    return content
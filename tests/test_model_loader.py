@@ -257,6 +257,47 @@ class TestValidateModelConfig:
         with pytest.raises(ValueError) as exc_info:
             validate_model_config(model)
         assert "default_settings" in str(exc_info.value).lower()
+    
+    def test_validate_hedge_and_max_outputs(self):
+        """Test validation of the optional max_outputs and hedge fields."""
+        model = {
+            'id': 'test-model',
+            'name': 'Test Model',
+            'endpoint': 'owner/model:version',
+            'max_outputs': 4,
+            'hedge': {'percentile': 90, 'budget': 0.2, 'alternate': 'owner/model-deployment'}
+        }
+        assert validate_model_config(model) is True
+        with pytest.raises(ValueError, match="max_outputs"):
+            validate_model_config({**model, 'max_outputs': 0})
+        with pytest.raises(ValueError, match="Unknown 'hedge' option"):
+            validate_model_config({**model, 'hedge': {'percentil': 90}})
+        with pytest.raises(ValueError, match="hedge.percentile"):
+            validate_model_config({**model, 'hedge': {'percentile': 150}})
+    
+    def test_validate_routes(self):
+        """Test validation of the optional routes list (deployments and fallback versions)."""
+        model = {
+            'id': 'test-model',
+            'name': 'Test Model',
+            'endpoint': 'owner/model:version',
+            'routes': [
+                {'deployment': 'owner/model-prod', 'weight': 3},
+                {'endpoint': 'owner/model:older-version', 'fallback': True}
+            ]
+        }
+        assert validate_model_config(model) is True
+        with pytest.raises(ValueError, match="exactly one of"):
+            validate_model_config({**model, 'routes': [{'weight': 2}]})
+
+    def test_validate_log_parser(self):
+        """Test validation of the optional log_parser family name."""
+        model = {'id': 'test-model', 'name': 'Test Model', 'endpoint': 'owner/model:version', 'log_parser': 'tqdm'}
+        assert validate_model_config(model) is True
+        with pytest.raises(ValueError, match="log_parser"):
+            validate_model_config({**model, 'log_parser': 'comfy'})
+        with pytest.raises(ValueError, match="log_parser"):
+            validate_model_config({**model, 'log_parser': ['tqdm']})
 
 
 class TestPerformance:
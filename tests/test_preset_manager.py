@@ -5,7 +5,13 @@ import tempfile
 import os
 import time
 from pathlib import Path
-from utils.preset_manager import load_presets_config, validate_preset_config
+from utils.preset_manager import (
+    format_trigger_words,
+    inject_trigger_words,
+    load_presets_config,
+    select_preset,
+    validate_preset_config,
+)
 
 
 # Test fixtures
@@ -209,6 +215,22 @@ presets:
         finally:
             os.unlink(temp_path)
     
+    def test_load_invalid_progressive(self, tmp_path):
+        """Test that a malformed progressive section is reported with its preset index."""
+        path = tmp_path / "presets.yaml"
+        path.write_text("""
+presets:
+  - id: "test-preset"
+    name: "Test Preset"
+    model_id: "test-model"
+    progressive:
+      auto_promote: "sometimes"
+""")
+        with pytest.raises(ValueError) as exc_info:
+            load_presets_config(str(path), validate_model_ids=False)
+        assert "Preset 1" in str(exc_info.value)
+        assert "auto_promote" in str(exc_info.value)
+    
     def test_load_presets_grouped_by_model_id(self, temp_presets_file):
         """Test that presets are grouped by model_id (AC: 1, 2)."""
         presets = load_presets_config(temp_presets_file, validate_model_ids=False)
@@ -419,6 +441,20 @@ class TestValidatePresetConfig:
         assert "settings" in str(exc_info.value)
         assert "must be a dictionary" in str(exc_info.value)
     
+    def test_validate_preset_progressive(self):
+        """Test validation of the optional progressive draft/final section."""
+        preset = {
+            'id': 'test-preset',
+            'name': 'Test Preset',
+            'model_id': 'test-model',
+            'progressive': {'draft': {'num_inference_steps': 12}, 'auto_promote': True}
+        }
+        assert validate_preset_config(preset) is True
+        
+        with pytest.raises(ValueError) as exc_info:
+            validate_preset_config({**preset, 'progressive': {'draft': 'fast'}})
+        assert "progressive.draft" in str(exc_info.value)
+    
     def test_validate_preset_valid_settings(self):
         """Test validation accepts valid settings dict (AC: 2)."""
         preset = {
@@ -430,3 +466,35 @@ class TestValidatePresetConfig:
         
         result = validate_preset_config(preset)
         assert result is True
+
+
+class TestPresetHelpers:
+    """Tests for select_preset(), format_trigger_words() and inject_trigger_words()."""
+
+    def test_select_preset_prefers_explicit_then_default_then_first(self):
+        """Test preset selection order."""
+        presets = [{'id': 'a'}, {'id': 'b', 'default': True}, {'id': 'c'}]
+
+        assert select_preset(presets, 'c')['id'] == 'c'
+        assert select_preset(presets)['id'] == 'b'
+        assert select_preset(presets[:1])['id'] == 'a'
+        assert select_preset([]) is None
+
+    def test_select_preset_unknown_id_raises(self):
+        """Test that an unknown explicit preset id raises ValueError."""
+        with pytest.raises(ValueError, match="Unknown preset 'zzz'"):
+            select_preset([{'id': 'a'}], 'zzz')
+
+    def test_format_trigger_words(self):
+        """Test trigger word normalization."""
+        assert format_trigger_words(["A", "", "  ", "B"]) == "A, B"
+        assert format_trigger_words("SINGLE") == "SINGLE"
+        assert format_trigger_words([]) is None
+        assert format_trigger_words("  ") is None
+
+    def test_inject_trigger_words(self):
+        """Test prepend/append injection."""
+        assert inject_trigger_words("a fox", ["TW"]) == "TW a fox"
+        assert inject_trigger_words("a fox", "TW", 'append') == "a fox TW"
+        assert inject_trigger_words("", "TW") == "TW"
+        assert inject_trigger_words("a fox", []) == "a fox"
@@ -0,0 +1,167 @@
+"""Unit tests for utils.archive_export module."""
+import io
+import json
+import tarfile
+import zipfile
+
+import pytest
+
+from utils.archive_export import (
+    ArchiveEntry,
+    build_manifest,
+    bytes_entry,
+    export_outputs,
+    file_entry,
+    iter_archive_chunks,
+    iter_tar_chunks,
+    iter_zip_chunks,
+    spool_archive,
+)
+from utils.image_store import ImageStore
+
+
+def _chunked_entry(name: str, payload: bytes, chunk_size: int = 7) -> ArchiveEntry:
+    """Build an entry that yields its payload in small chunks."""
+    return ArchiveEntry(
+        name=name,
+        size=len(payload),
+        chunks=lambda: (payload[i:i + chunk_size] for i in range(0, len(payload), chunk_size)),
+    )
+
+
+class TestIterZipChunks:
+    """Tests for iter_zip_chunks() function."""
+
+    @pytest.mark.unit
+    def test_zip_roundtrip_uses_stored_entries(self):
+        """[P0] Test that streamed ZIPs are valid and entries are ZIP_STORED."""
+        # GIVEN: Two entries streamed in small chunks
+        entries = [_chunked_entry("a.png", b'A' * 100), _chunked_entry("b.png", b'B' * 33)]
+
+        # WHEN: Streaming the archive
+        chunks = list(iter_zip_chunks(entries))
+
+        # THEN: The archive is produced incrementally and reads back intact
+        assert len(chunks) > 2
+        with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as zf:
+            assert zf.testzip() is None
+            assert zf.read("a.png") == b'A' * 100
+            assert zf.read("b.png") == b'B' * 33
+            assert {info.compress_type for info in zf.infolist()} == {zipfile.ZIP_STORED}
+
+    @pytest.mark.unit
+    def test_zip_consumes_entries_lazily(self):
+        """[P1] Test that entries are only pulled as the stream is consumed."""
+        pulled = []
+
+        def entries():
+            for name in ("1.png", "2.png"):
+                pulled.append(name)
+                yield bytes_entry(name, b'data')
+
+        stream = iter_zip_chunks(entries())
+        next(stream)
+
+        assert pulled == ["1.png"]
+
+
+class TestIterTarChunks:
+    """Tests for iter_tar_chunks() function."""
+
+    @pytest.mark.unit
+    def test_tar_roundtrip(self):
+        """[P0] Test that streamed TARs are readable by tarfile."""
+        entries = [_chunked_entry("a.png", b'A' * 1000), _chunked_entry("b.png", b'')]
+
+        data = b''.join(iter_tar_chunks(entries))
+
+        assert len(data) % tarfile.RECORDSIZE == 0
+        with tarfile.open(fileobj=io.BytesIO(data)) as tf:
+            assert tf.getnames() == ["a.png", "b.png"]
+            assert tf.extractfile("a.png").read() == b'A' * 1000
+            assert tf.extractfile("b.png").read() == b''
+
+    @pytest.mark.unit
+    def test_tar_rejects_size_mismatch(self):
+        """[P1] Test that entries producing the wrong byte count raise ValueError."""
+        entry = ArchiveEntry(name="bad.png", size=10, chunks=lambda: [b'short'])
+
+        with pytest.raises(ValueError, match="expected 10"):
+            list(iter_tar_chunks([entry]))
+
+
+class TestIterArchiveChunks:
+    """Tests for iter_archive_chunks() dispatch."""
+
+    @pytest.mark.unit
+    def test_unknown_format_raises(self):
+        """[P2] Test that unsupported formats raise ValueError."""
+        with pytest.raises(ValueError, match="Unsupported archive format"):
+            iter_archive_chunks([], 'rar')
+
+
+class TestSpoolArchive:
+    """Tests for spool_archive() function."""
+
+    @pytest.mark.unit
+    def test_spool_rolls_over_to_disk(self):
+        """[P1] Test that large archives spill to a temporary file and are rewound."""
+        spool = spool_archive([b'x' * 100, b'y' * 100], max_memory=50)
+
+        assert spool.read() == b'x' * 100 + b'y' * 100
+        assert spool._rolled
+
+
+class TestExportOutputs:
+    """Tests for export_outputs() function."""
+
+    @pytest.mark.unit
+    def test_export_fetches_missing_and_reuses_stored(self, tmp_path):
+        """[P0] Test that remote outputs are streamed into the store once and archived."""
+        # GIVEN: One stored output, one remote output and a local file
+        store = ImageStore(str(tmp_path / "store"))
+        stored_url = "https://example.com/stored.png"
+        store.write_stream(store.key_for(stored_url), [b'stored'])
+        local = tmp_path / "local.png"
+        local.write_bytes(b'local')
+        fetched = []
+
+        def fetch(url):
+            fetched.append(url)
+            return [b'remote']
+
+        # WHEN: Exporting as tar with manifest records
+        data = b''.join(export_outputs(
+            [stored_url, "https://example.com/remote.png", str(local)], store, fetch,
+            records=[{'prompt': 'p1'}, {'prompt': 'p2'}, {'prompt': 'p3'}], archive_format='tar'))
+
+        # THEN: Only the missing output was fetched and the manifest lists all files
+        assert fetched == ["https://example.com/remote.png"]
+        with tarfile.open(fileobj=io.BytesIO(data)) as tf:
+            assert tf.extractfile("output_file_1.png").read() == b'stored'
+            assert tf.extractfile("output_file_2.png").read() == b'remote'
+            assert tf.extractfile("output_file_3.png").read() == b'local'
+            manifest = json.loads(tf.extractfile("manifest.json").read())
+        assert [f['prompt'] for f in manifest['files']] == ['p1', 'p2', 'p3']
+        assert manifest['count'] == 3
+
+
+class TestBuildManifest:
+    """Tests for build_manifest() and file_entry() helpers."""
+
+    @pytest.mark.unit
+    def test_manifest_is_json_with_unicode(self):
+        """[P2] Test that the manifest keeps non-ASCII prompts readable."""
+        manifest = json.loads(build_manifest([{'prompt': 'café ☕'}]).decode('utf-8'))
+        assert manifest['files'][0]['prompt'] == 'café ☕'
+
+    @pytest.mark.unit
+    def test_file_entry_reads_lazily(self, tmp_path):
+        """[P2] Test that file entries report size and stream content."""
+        path = tmp_path / "f.png"
+        path.write_bytes(b'0123456789')
+
+        entry = file_entry("f.png", str(path), chunk_size=4)
+
+        assert entry.size == 10
+        assert list(entry.chunks()) == [b'0123', b'4567', b'89']
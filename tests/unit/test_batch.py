@@ -0,0 +1,277 @@
+"""Unit tests for utils.batch module."""
+import json
+import threading
+import time
+
+import pytest
+
+from utils.batch import (
+    BatchCheckpoint,
+    BatchJob,
+    BatchProgress,
+    archive_inputs,
+    checkpoint_path_for,
+    detect_batch_format,
+    format_eta,
+    iter_batch_rows,
+    plan_jobs,
+    run_batch,
+)
+
+MODELS = [
+    {'id': 'sdxl', 'name': 'SDXL', 'endpoint': 'stability-ai/sdxl:v1'},
+    {'id': 'helldiver', 'name': 'Helldiver', 'endpoint': 'owner/helldiver:v2'},
+]
+
+PRESETS = {
+    'helldiver': [{
+        'id': 'helldiver-default', 'name': 'Helldiver Default', 'model_id': 'helldiver',
+        'trigger_words': ['HELLDIVER'], 'settings': {'num_inference_steps': 40},
+    }],
+}
+
+
+def _jobs(count: int):
+    """Build simple jobs without going through plan_jobs()."""
+    return [BatchJob(index=i, key=f"k{i}", endpoint="owner/model:v", model_input={'prompt': f"p{i}"},
+                     record={'job_id': str(i)}) for i in range(count)]
+
+
+class TestIterBatchRows:
+    """Tests for iter_batch_rows() parsing."""
+
+    @pytest.mark.unit
+    def test_parses_jsonl_with_overrides(self):
+        """[P0] Test that JSONL rows keep ids, overrides and flat setting keys."""
+        data = (
+            '{"id": "fox", "prompt": "a fox", "model_id": "sdxl", "settings": {"width": 512}, "seed": 7}\n'
+            '\n'
+            '# comment lines are skipped\n'
+            '{"request_id": "r-2", "prompt": "an owl", "preset": "helldiver-default"}\n'
+        )
+
+        rows = list(iter_batch_rows(data.encode('utf-8'), 'jsonl'))
+
+        assert [row.id for row in rows] == ['fox', 'r-2']
+        assert rows[0].settings == {'width': 512, 'seed': 7}
+        assert rows[0].model_id == 'sdxl'
+        assert rows[1].preset == 'helldiver-default'
+
+    @pytest.mark.unit
+    def test_parses_csv_and_coerces_setting_columns(self):
+        """[P0] Test that CSV extra columns become typed settings and ids default to line numbers."""
+        data = "prompt,model_id,num_inference_steps,guidance_scale,refine\na fox,sdxl,30,6.5,None\nan owl,,,,\n"
+
+        rows = list(iter_batch_rows(data, 'csv'))
+
+        assert rows[0].settings == {'num_inference_steps': 30, 'guidance_scale': 6.5, 'refine': 'None'}
+        assert rows[1].model_id is None
+        assert rows[1].settings == {}
+        assert rows[1].id == '3'
+
+    @pytest.mark.unit
+    def test_invalid_rows_report_line_numbers(self):
+        """[P1] Test that missing prompts and bad JSON raise ValueError with the line number."""
+        with pytest.raises(ValueError, match="Line 2: 'prompt' is required"):
+            list(iter_batch_rows('{"prompt": "ok"}\n{"width": 512}\n', 'jsonl'))
+        with pytest.raises(ValueError, match="Line 1: invalid JSON"):
+            list(iter_batch_rows('{not json}\n', 'jsonl'))
+        with pytest.raises(ValueError, match="'prompt' column"):
+            list(iter_batch_rows('text\nhello\n', 'csv'))
+
+    @pytest.mark.unit
+    def test_detect_batch_format(self):
+        """[P2] Test format detection from file names."""
+        assert detect_batch_format("prompts.JSONL") == 'jsonl'
+        assert detect_batch_format("prompts.csv") == 'csv'
+        with pytest.raises(ValueError, match="Unsupported batch file"):
+            detect_batch_format("prompts.txt")
+
+
+class TestPlanJobs:
+    """Tests for plan_jobs() resolution."""
+
+    @pytest.mark.unit
+    def test_applies_preset_trigger_words_and_overrides(self):
+        """[P0] Test that presets, trigger words and row overrides are layered in order."""
+        rows = iter_batch_rows(
+            '{"id": "a", "prompt": "a soldier", "model_id": "helldiver", "settings": {"width": 768}}\n'
+            '{"id": "b", "prompt": "a fox"}\n', 'jsonl')
+
+        jobs = list(plan_jobs(rows, MODELS, PRESETS, default_model_id='sdxl'))
+
+        assert jobs[0].endpoint == 'owner/helldiver:v2'
+        assert jobs[0].model_input['prompt'] == 'HELLDIVER a soldier'
+        assert jobs[0].model_input['num_inference_steps'] == 40
+        assert jobs[0].model_input['width'] == 768
+        assert jobs[0].record['preset'] == 'helldiver-default'
+        assert jobs[1].endpoint == 'stability-ai/sdxl:v1'
+        assert jobs[1].model_input['prompt'] == 'a fox'
+
+    @pytest.mark.unit
+    def test_job_key_changes_with_inputs(self):
+        """[P1] Test that editing a row produces a new resume key."""
+        first = next(plan_jobs(iter_batch_rows('{"id": "a", "prompt": "x"}', 'jsonl'), MODELS, {}))
+        same = next(plan_jobs(iter_batch_rows('{"id": "a", "prompt": "x"}', 'jsonl'), MODELS, {}))
+        edited = next(plan_jobs(iter_batch_rows('{"id": "a", "prompt": "y"}', 'jsonl'), MODELS, {}))
+
+        assert first.key == same.key
+        assert first.key != edited.key
+
+    @pytest.mark.unit
+    def test_unknown_model_raises(self):
+        """[P1] Test that unknown model ids fail with the row id."""
+        rows = iter_batch_rows('{"id": "z", "prompt": "x", "model_id": "nope"}', 'jsonl')
+        with pytest.raises(ValueError, match="Row z: Unknown model_id 'nope'"):
+            list(plan_jobs(rows, MODELS, {}))
+
+
+class TestRunBatch:
+    """Tests for run_batch() scheduling."""
+
+    @pytest.mark.unit
+    def test_bounds_concurrency(self):
+        """[P0] Test that no more than max_concurrency predictions run at once."""
+        # GIVEN: A run function that tracks how many calls overlap
+        lock = threading.Lock()
+        active = [0]
+        peak = [0]
+
+        def run_fn(job):
+            model_input = job.model_input
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+            return [f"https://example.com/{model_input['prompt']}.png"]
+
+        # WHEN: Running ten jobs with concurrency three
+        results = run_batch(_jobs(10), run_fn, max_concurrency=3, total=10)
+
+        # THEN: Overlap never exceeded three and results stay in order
+        assert peak[0] == 3
+        assert [r.outputs for r in results] == [[f"https://example.com/p{i}.png"] for i in range(10)]
+
+    @pytest.mark.unit
+    def test_pulls_jobs_lazily(self):
+        """[P1] Test that a job generator is only advanced when a slot is free."""
+        pulled = []
+        seen_at_start = {}
+
+        def jobs():
+            for job in _jobs(5):
+                pulled.append(job.index)
+                yield job
+
+        def run_fn(job):
+            model_input = job.model_input
+            seen_at_start[model_input['prompt']] = len(pulled)
+            time.sleep(0.01)
+            return []
+
+        run_batch(jobs(), run_fn, max_concurrency=2)
+
+        # Job i starts before more than i + 2 jobs have been pulled from the generator
+        assert pulled == [0, 1, 2, 3, 4]
+        assert all(seen_at_start[f"p{i}"] <= i + 2 for i in range(5))
+
+    @pytest.mark.unit
+    def test_failures_are_recorded_and_batch_continues(self):
+        """[P0] Test that one failing prediction does not stop the batch."""
+        def run_fn(job):
+            model_input = job.model_input
+            if model_input['prompt'] == 'p1':
+                raise RuntimeError("model exploded")
+            return "https://example.com/ok.png"
+
+        results = run_batch(_jobs(3), run_fn, max_concurrency=2)
+
+        assert [r.ok for r in results] == [True, False, True]
+        assert results[1].error == "RuntimeError: model exploded"
+        assert results[0].outputs == ["https://example.com/ok.png"]
+
+    @pytest.mark.unit
+    def test_resumes_from_checkpoint(self, tmp_path):
+        """[P0] Test that checkpointed jobs are skipped on the next run."""
+        # GIVEN: A first run where the last job fails
+        checkpoint = BatchCheckpoint(str(tmp_path / "batch.jsonl"))
+        calls = []
+
+        def flaky(job):
+            model_input = job.model_input
+            calls.append(model_input['prompt'])
+            if model_input['prompt'] == 'p2' and calls.count('p2') == 1:
+                raise ConnectionError("interrupted")
+            return [f"out-{model_input['prompt']}"]
+
+        run_batch(_jobs(3), flaky, max_concurrency=1, checkpoint=checkpoint)
+
+        # WHEN: Running the same jobs again
+        progress_seen = []
+        results = run_batch(_jobs(3), flaky, max_concurrency=1, checkpoint=checkpoint, total=3,
+                            on_result=lambda r, p: progress_seen.append(p.done))
+
+        # THEN: Only the failed job is re-executed and completed jobs keep their outputs
+        assert calls == ['p0', 'p1', 'p2', 'p2']
+        assert [r.resumed for r in results] == [True, True, False]
+        assert [r.outputs for r in results] == [['out-p0'], ['out-p1'], ['out-p2']]
+        assert progress_seen == [1, 2, 3]
+
+    @pytest.mark.unit
+    def test_rejects_invalid_concurrency(self):
+        """[P2] Test that max_concurrency below one raises ValueError."""
+        with pytest.raises(ValueError, match="max_concurrency"):
+            run_batch([], lambda job: None, max_concurrency=0)
+
+
+class TestBatchCheckpoint:
+    """Tests for BatchCheckpoint persistence."""
+
+    @pytest.mark.unit
+    def test_ignores_truncated_lines(self, tmp_path):
+        """[P1] Test that a partially written last line does not break resuming."""
+        path = tmp_path / "batch.jsonl"
+        path.write_text(json.dumps({'key': 'a', 'outputs': ['x']}) + '\n{"key": "b", "outp')
+
+        assert BatchCheckpoint(str(path)).load() == {'a': ['x']}
+
+    @pytest.mark.unit
+    def test_checkpoint_path_depends_on_content(self, tmp_path):
+        """[P2] Test that the same file content maps to the same checkpoint."""
+        assert checkpoint_path_for(str(tmp_path), b'a') == checkpoint_path_for(str(tmp_path), b'a')
+        assert checkpoint_path_for(str(tmp_path), b'a') != checkpoint_path_for(str(tmp_path), b'b')
+
+
+class TestBatchProgress:
+    """Tests for BatchProgress and ETA formatting."""
+
+    @pytest.mark.unit
+    def test_eta_uses_executed_throughput_only(self):
+        """[P1] Test that resumed jobs do not inflate throughput."""
+        progress = BatchProgress(total=10, completed=2, resumed=4, elapsed=4.0)
+
+        assert progress.rate == 0.5
+        assert progress.eta_seconds == 8.0
+        assert progress.fraction == 0.6
+
+    @pytest.mark.unit
+    def test_format_eta(self):
+        """[P2] Test ETA formatting."""
+        assert format_eta(None) == "estimating…"
+        assert format_eta(42) == "42s"
+        assert format_eta(185) == "3m 05s"
+        assert format_eta(7260) == "2h 01m"
+
+    @pytest.mark.unit
+    def test_archive_inputs_flattens_successful_outputs(self):
+        """[P2] Test that multi-output jobs are flattened with their output index."""
+        jobs = _jobs(2)
+        results = run_batch(jobs, lambda job: ["a", "b"] if job.model_input['prompt'] == 'p0' else None)
+
+        outputs, records = archive_inputs(results)
+
+        assert outputs == ["a", "b"]
+        assert [r['output_index'] for r in records] == [0, 1]
+        assert records[0]['job_id'] == '0'
@@ -0,0 +1,56 @@
+"""Unit tests for utils.batch_writer module."""
+import threading
+import time
+
+import pytest
+
+from utils.batch_writer import BatchWriter
+
+
+class TestBatchWriter:
+    """Tests for batching, flushing, dropping and closing."""
+
+    @pytest.mark.unit
+    def test_writes_in_batches_and_flush_does_not_wait_for_a_full_batch(self):
+        """[P0] Test that items are written in order, at most batch_size at a time, and flush writes a partial batch."""
+        batches = []
+        writer = BatchWriter(batches.append, "test-writer", max_queue=100, batch_size=4, flush_interval=60)
+
+        for idx in range(10):
+            assert writer.put(idx)
+        started = time.perf_counter()
+        assert writer.flush(5)
+
+        assert time.perf_counter() - started < 5
+        assert [item for batch in batches for item in batch] == list(range(10))
+        assert max(len(batch) for batch in batches) <= 4
+        assert writer.stats() == {'dropped': 0, 'queued': 0}
+        writer.close()
+
+    @pytest.mark.unit
+    def test_full_queue_drops_without_blocking_and_close_runs_on_close_last(self):
+        """[P1] Test that a stalled write never blocks put(), drops are counted, and on_close follows the last write."""
+        # GIVEN: A writer whose first write stalls until released
+        release = threading.Event()
+        events = []
+
+        def write(batch):
+            release.wait(5)
+            events.append(('write', list(batch)))
+
+        writer = BatchWriter(write, "test-writer", max_queue=2, batch_size=1, flush_interval=0,
+                             on_close=lambda: events.append(('close', threading.current_thread().name)))
+
+        # WHEN: Putting more items than the queue holds, then closing
+        started = time.perf_counter()
+        accepted = [writer.put(idx) for idx in range(10)]
+        assert time.perf_counter() - started < 1
+        release.set()
+        writer.close()
+
+        # THEN: Rejected items were counted, accepted ones written, and on_close ran once on the writer thread
+        assert writer.stats()['dropped'] == accepted.count(False) >= 7
+        assert [batch for kind, batch in events if kind == 'write'] == [[idx] for idx, ok in enumerate(accepted) if ok]
+        assert events[-1] == ('close', "test-writer")
+        writer.close()
+        assert [kind for kind, _ in events].count('close') == 1
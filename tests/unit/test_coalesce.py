@@ -0,0 +1,131 @@
+"""Unit tests for utils.coalesce module."""
+import threading
+import time
+
+import pytest
+
+from utils.coalesce import Coalescer, coalesce_key
+
+
+class RecordingRun:
+    """run_fn returning one URL per requested output and recording each prediction."""
+
+    def __init__(self, delay=0.0, error=None):
+        self.calls = []
+        self.delay = delay
+        self.error = error
+        self._lock = threading.Lock()
+
+    def __call__(self, endpoint, model_input):
+        with self._lock:
+            self.calls.append(dict(model_input))
+            call = len(self.calls)
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return [f"https://example.com/{call}-{i}.png" for i in range(model_input['num_outputs'])]
+
+
+def _submit_concurrently(coalescer, inputs, endpoint="a/b:v"):
+    """Submit each input from its own thread (like separate sessions) and return results in input order."""
+    results = [None] * len(inputs)
+
+    def _worker(index, model_input):
+        try:
+            results[index] = coalescer.submit(endpoint, model_input)
+        except Exception as e:
+            results[index] = e
+
+    threads = [threading.Thread(target=_worker, args=(i, model_input)) for i, model_input in enumerate(inputs)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.01)
+    for thread in threads:
+        thread.join(timeout=5)
+    return results
+
+
+class TestCoalesceKey:
+    """Tests for coalesce_key() function."""
+
+    @pytest.mark.unit
+    def test_ignores_seed_and_num_outputs_only(self):
+        """[P1] Test that only seed and num_outputs may differ between merged requests."""
+        base = {'prompt': 'a fox', 'num_outputs': 1, 'seed': 1}
+        assert coalesce_key("a/b:v", base) == coalesce_key("a/b:v", {**base, 'num_outputs': 2, 'seed': 9})
+        assert coalesce_key("a/b:v", base) != coalesce_key("a/b:v", {**base, 'prompt': 'an owl'})
+        assert coalesce_key("a/b:v", base) != coalesce_key("a/b:v2", base)
+
+
+class TestCoalescer:
+    """Tests for Coalescer class."""
+
+    @pytest.mark.unit
+    def test_merges_compatible_requests_and_fans_out_outputs(self):
+        """[P0] Test that requests within the window share one prediction with summed num_outputs."""
+        # GIVEN: Three compatible single-image requests arriving close together
+        run = RecordingRun()
+        coalescer = Coalescer(run, window=0.5)
+
+        # WHEN: Submitting them from separate threads
+        results = _submit_concurrently(coalescer, [{'prompt': 'a fox', 'num_outputs': 1}] * 3)
+
+        # THEN: One prediction ran and each request got its own distinct output
+        assert len(run.calls) == 1
+        assert run.calls[0]['num_outputs'] == 3
+        assert [len(r) for r in results] == [1, 1, 1]
+        assert len({r[0] for r in results}) == 3
+        assert coalescer.stats() == {'requests': 3, 'predictions': 1, 'merged': 3, 'bypassed': 0}
+
+    @pytest.mark.unit
+    def test_full_group_launches_before_window_and_overflow_starts_new_group(self):
+        """[P0] Test the max_outputs cap: a full group runs immediately and extra requests form a new one."""
+        run = RecordingRun()
+        coalescer = Coalescer(run, window=1.0, max_outputs=4)
+
+        started = time.monotonic()
+        results = _submit_concurrently(coalescer, [{'prompt': 'a fox', 'num_outputs': 2}] * 2
+                                       + [{'prompt': 'a fox', 'num_outputs': 1}])
+
+        assert [len(r) for r in results] == [2, 2, 1]
+        assert sorted(call['num_outputs'] for call in run.calls) == [1, 4]
+        # The full group did not wait out its window; only the overflow group did
+        assert run.calls[0]['num_outputs'] == 4
+        assert time.monotonic() - started < 2.0
+
+    @pytest.mark.unit
+    def test_incompatible_and_seeded_requests_are_not_merged(self):
+        """[P1] Test that different settings and explicit seeds each get their own prediction."""
+        run = RecordingRun()
+        coalescer = Coalescer(run, window=0.2)
+
+        results = _submit_concurrently(coalescer, [
+            {'prompt': 'a fox', 'num_outputs': 1},
+            {'prompt': 'an owl', 'num_outputs': 1},
+            {'prompt': 'a fox', 'num_outputs': 1, 'seed': 42},
+        ])
+
+        assert all(len(r) == 1 for r in results)
+        assert len(run.calls) == 3
+        assert {'prompt': 'a fox', 'num_outputs': 1, 'seed': 42} in run.calls
+        assert coalescer.stats()['bypassed'] == 1
+
+    @pytest.mark.unit
+    def test_errors_reach_every_merged_request(self):
+        """[P1] Test that a failed shared prediction fails each waiting request."""
+        coalescer = Coalescer(RecordingRun(error=RuntimeError("boom")), window=0.3)
+
+        results = _submit_concurrently(coalescer, [{'prompt': 'a fox', 'num_outputs': 1}] * 2)
+
+        assert all(isinstance(r, RuntimeError) and str(r) == "boom" for r in results)
+
+    @pytest.mark.unit
+    def test_zero_window_passes_requests_straight_through(self):
+        """[P2] Test that a zero window disables merging."""
+        run = RecordingRun()
+        coalescer = Coalescer(run, window=0)
+
+        assert coalescer.submit("a/b:v", {'prompt': 'x', 'num_outputs': 1}) == ["https://example.com/1-0.png"]
+        assert coalescer.stats()['bypassed'] == 1
+        with pytest.raises(ValueError):
+            Coalescer(run, window=-1)
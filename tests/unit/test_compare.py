@@ -0,0 +1,117 @@
+"""Unit tests for utils.compare module."""
+import threading
+import time
+
+import pytest
+
+from utils.compare import iter_fan_out
+from utils.generation import ConcurrencyLimiter
+
+MODELS = [
+    {'id': 'sdxl', 'name': 'SDXL', 'endpoint': 'stability-ai/sdxl:v1'},
+    {'id': 'helldiver', 'name': 'Helldiver', 'endpoint': 'owner/helldiver:v2'},
+    {'id': 'trooper', 'name': 'Trooper', 'endpoint': 'owner/trooper:v3'},
+]
+
+PRESETS = {
+    'helldiver': [{'id': 'h', 'name': 'H', 'model_id': 'helldiver', 'trigger_words': ['HELLDIVER']}],
+    'trooper': [{'id': 't', 'name': 'T', 'model_id': 'trooper', 'trigger_words': 'TROOPER',
+                 'settings': {'num_inference_steps': 20}}],
+}
+
+DELAYS = {'stability-ai/sdxl:v1': 0.15, 'owner/helldiver:v2': 0.05, 'owner/trooper:v3': 0.10}
+
+
+def _sleepy_run(endpoint, model_input):
+    """Fake prediction whose duration depends on the model."""
+    time.sleep(DELAYS[endpoint])
+    return [f"https://example.com/{endpoint.split('/')[0]}.png"]
+
+
+class TestIterFanOut:
+    """Tests for iter_fan_out() function."""
+
+    @pytest.mark.unit
+    def test_runs_models_in_parallel_and_yields_in_completion_order(self):
+        """[P0] Test that wall-clock time tracks the slowest model, not the sum."""
+        # GIVEN: Three models taking 0.15s, 0.05s and 0.10s
+        started = time.monotonic()
+
+        # WHEN: Fanning out one prompt
+        results = list(iter_fan_out(MODELS, PRESETS, "a castle", _sleepy_run))
+        wall_clock = time.monotonic() - started
+
+        # THEN: Results arrive fastest first and the run takes about as long as the slowest model
+        assert [r.model_id for r in results] == ['helldiver', 'trooper', 'sdxl']
+        assert wall_clock < sum(DELAYS.values())
+        assert all(r.ok and r.latency >= DELAYS[r.endpoint] * 0.9 for r in results)
+
+    @pytest.mark.unit
+    def test_applies_each_models_trigger_words_and_preset(self):
+        """[P0] Test that every model gets its own trigger words and preset settings."""
+        seen = {}
+        lock = threading.Lock()
+
+        def run_fn(endpoint, model_input):
+            with lock:
+                seen[endpoint] = model_input
+            return []
+
+        list(iter_fan_out(MODELS, PRESETS, "a castle", run_fn, negative_prompt="ugly"))
+
+        assert seen['stability-ai/sdxl:v1']['prompt'] == "a castle"
+        assert seen['owner/helldiver:v2']['prompt'] == "HELLDIVER a castle"
+        assert seen['owner/trooper:v3']['prompt'] == "TROOPER a castle"
+        assert seen['owner/trooper:v3']['num_inference_steps'] == 20
+        assert {m['negative_prompt'] for m in seen.values()} == {"ugly"}
+
+    @pytest.mark.unit
+    def test_respects_global_limiter_and_reports_queue_time(self):
+        """[P1] Test that the shared limiter caps concurrency and queued time is separate from latency."""
+        limiter = ConcurrencyLimiter(1)
+
+        results = list(iter_fan_out(MODELS, PRESETS, "a castle", _sleepy_run, limiter=limiter))
+
+        assert limiter.stats()['peak'] == 1
+        assert max(r.queued for r in results) >= 0.05
+        assert all(r.latency < DELAYS[r.endpoint] + 0.1 for r in results)
+
+    @pytest.mark.unit
+    def test_closing_early_does_not_wait_for_slower_models(self):
+        """[P0] Test that closing the generator after the first result returns without waiting for the rest."""
+        # GIVEN: One fast model and two that block until released
+        release = threading.Event()
+
+        def run_fn(endpoint, model_input):
+            if 'helldiver' not in endpoint:
+                release.wait(5)
+            return ["https://example.com/out.png"]
+
+        results = iter_fan_out(MODELS, PRESETS, "a castle", run_fn)
+        first = next(results)
+
+        # WHEN: The consumer goes away, as a rerun does to the script thread
+        started = time.monotonic()
+        results.close()
+        closed_after = time.monotonic() - started
+        release.set()
+
+        # THEN: The close returned promptly instead of waiting on the blocked models
+        assert first.model_id == 'helldiver'
+        assert closed_after < 1.0
+
+    @pytest.mark.unit
+    def test_failing_model_does_not_affect_others(self):
+        """[P1] Test that one failing or misconfigured model yields an error result only for itself."""
+        def run_fn(endpoint, model_input):
+            if 'helldiver' in endpoint:
+                raise RuntimeError("boom")
+            return "https://example.com/ok.png"
+
+        models = MODELS + [{'id': 'broken', 'name': 'Broken', 'endpoint': ''}]
+        results = {r.model_id: r for r in iter_fan_out(models, PRESETS, "a castle", run_fn)}
+
+        assert results['helldiver'].error == "RuntimeError: boom"
+        assert "Invalid model endpoint" in results['broken'].error
+        assert results['sdxl'].outputs == ["https://example.com/ok.png"]
+        assert results['sdxl'].record['model_id'] == 'sdxl'
@@ -0,0 +1,253 @@
+"""Unit tests for the fake_replicate.py local API server."""
+import io
+import random
+
+import pytest
+import replicate
+import requests
+from PIL import Image
+from replicate.exceptions import ModelError, ReplicateError
+
+import main as cli
+from fake_replicate import (
+    Distribution,
+    FakeConfig,
+    FakeReplicate,
+    FakeReplicateServer,
+    build_parser,
+    config_from_args,
+    render_png,
+)
+from utils.log_progress import LogProgressTracker, StepProgress, TqdmParser
+
+
+# =============================================================================
+# Fixtures
+# =============================================================================
+
+
+def _fast(**overrides):
+    """Config with short, fixed delays so tests stay quick."""
+    return FakeConfig(processing_time=Distribution('fixed', (0.05,)), seed=7, **overrides)
+
+
+@pytest.fixture
+def server():
+    with FakeReplicateServer(_fast(), port=0) as fake:
+        yield fake
+
+
+@pytest.fixture
+def client(server):
+    return replicate.Client(api_token="r8_fake", base_url=server.base_url)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+# =============================================================================
+# Distributions and payloads
+# =============================================================================
+
+
+class TestDistribution:
+    """Tests for delay distribution specs."""
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("spec, expected", [
+        ("1.5", Distribution('fixed', (1.5,))),
+        ("uniform:1:3", Distribution('uniform', (1.0, 3.0))),
+        ("LogNormal:2:0.5", Distribution('lognormal', (2.0, 0.5))),
+        ("exp:2", Distribution('exp', (2.0,))),
+    ])
+    def test_parse(self, spec, expected):
+        """[P1] Test that distribution specs parse into kind and parameters."""
+        assert Distribution.parse(spec) == expected
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("spec, match", [
+        ("gamma:1:2", "Unknown distribution"),
+        ("uniform:1", "takes 2 parameter"),
+        ("fixed:soon", "must be numbers"),
+        ("normal:-1:1", "must not be negative"),
+    ])
+    def test_parse_rejects_bad_specs(self, spec, match):
+        """[P2] Test that malformed specs are rejected."""
+        with pytest.raises(ValueError, match=match):
+            Distribution.parse(spec)
+
+    @pytest.mark.unit
+    def test_samples_are_seeded_and_non_negative(self):
+        """[P1] Test that sampling is reproducible with a seed and never negative."""
+        dist = Distribution.parse("normal:0.1:1")
+        first = [dist.sample(random.Random(3)) for _ in range(50)]
+        assert first == [dist.sample(random.Random(3)) for _ in range(50)]
+        assert min(first) >= 0.0
+        assert 1.0 <= Distribution.parse("uniform:1:2").sample(random.Random(0)) <= 2.0
+
+
+class TestRenderPng:
+    """Tests for deterministic PNG payloads."""
+
+    @pytest.mark.unit
+    def test_png_is_valid_and_deterministic(self):
+        """[P0] Test that the same key renders identical bytes and different keys differ."""
+        data = render_png("fox-0", 64, 32)
+        image = Image.open(io.BytesIO(data))
+        assert image.size == (64, 32)
+        assert image.mode == "RGB"
+        assert render_png.__wrapped__("fox-0", 64, 32) == data
+        assert render_png("fox-1", 64, 32) != data
+
+
+# =============================================================================
+# Prediction lifecycle
+# =============================================================================
+
+
+class TestFakePrediction:
+    """Tests for clock-driven prediction state."""
+
+    @pytest.mark.unit
+    def test_status_and_logs_follow_queue_and_processing_time(self):
+        """[P0] Test that a prediction queues, processes with growing tqdm logs, then succeeds."""
+        # GIVEN: A 2s queue and 10s of processing
+        clock = FakeClock()
+        state = FakeReplicate(FakeConfig(queue_delay=Distribution.parse("2"),
+                                         processing_time=Distribution.parse("10")), clock=clock)
+        prediction = state.create("acme/sdxl", "v1", {'prompt': 'a fox', 'num_inference_steps': 40})
+        tracker = LogProgressTracker(TqdmParser())
+
+        # WHEN/THEN: Status moves through starting, processing and succeeded
+        assert prediction.status(clock()) == 'starting'
+        assert prediction.logs(clock()) == ""
+        clock.now += 7
+        assert prediction.status(clock()) == 'processing'
+        assert tracker.update(prediction.logs(clock())) == StepProgress(20, 40)
+        clock.now += 5
+        assert prediction.status(clock()) == 'succeeded'
+        assert tracker.update(prediction.logs(clock())) == StepProgress(40, 40)
+
+    @pytest.mark.unit
+    def test_cancel_freezes_progress(self):
+        """[P1] Test that a canceled prediction stays canceled and its logs stop growing."""
+        clock = FakeClock()
+        state = FakeReplicate(FakeConfig(processing_time=Distribution.parse("10")), clock=clock)
+        prediction = state.create("acme/sdxl", "v1", {'prompt': 'a fox'})
+        clock.now += 5
+        state.cancel(prediction.id)
+        logs = prediction.logs(clock())
+
+        clock.now += 20
+
+        assert prediction.status(clock()) == 'canceled'
+        assert prediction.logs(clock()) == logs
+        assert state.stats()['canceled'] == 1
+
+
+# =============================================================================
+# HTTP API
+# =============================================================================
+
+
+class TestFakeReplicateServer:
+    """Tests driving the server through the real replicate client and requests."""
+
+    @pytest.mark.unit
+    def test_run_and_download(self, server, client):
+        """[P0] Test that replicate.run returns delivery URLs serving deterministic PNGs sized like the input."""
+        model_input = {'prompt': 'a fox', 'width': 96, 'height': 64, 'num_outputs': 2}
+
+        first = client.run("stability-ai/sdxl:v1", input=model_input)
+        second = client.run("stability-ai/sdxl:v1", input=model_input)
+
+        urls = [str(output) for output in first]
+        assert len(urls) == 2 and all(url.startswith(server.base_url + "/files/") for url in urls)
+        downloads = [requests.get(url, timeout=5).content for url in urls + [str(second[0])]]
+        assert Image.open(io.BytesIO(downloads[0])).size == (96, 64)
+        assert downloads[0] != downloads[1]
+        assert downloads[0] == downloads[2]
+        assert server.state.stats()['files_served'] == 3
+
+    @pytest.mark.unit
+    def test_create_poll_and_cancel(self):
+        """[P1] Test that predictions can be polled and canceled through the API."""
+        with FakeReplicateServer(FakeConfig(processing_time=Distribution.parse("30")), port=0) as slow:
+            slow_client = replicate.Client(api_token="r8_fake", base_url=slow.base_url)
+            prediction = slow_client.models.predictions.create(model="acme/flux", input={'prompt': 'a fox'})
+            assert prediction.status in ('starting', 'processing')
+
+            prediction.cancel()
+            prediction.reload()
+
+            assert prediction.status == 'canceled'
+            assert slow.state.stats()['statuses'] == {'canceled': 1}
+
+    @pytest.mark.unit
+    def test_injected_rate_limit(self):
+        """[P0] Test that rate-limit injection answers creates with 429 and Retry-After."""
+        with FakeReplicateServer(_fast(rate_limit_rate=1.0, retry_after=3), port=0) as limited:
+            client = replicate.Client(api_token="r8_fake", base_url=limited.base_url)
+            with pytest.raises(ReplicateError) as excinfo:
+                client.run("stability-ai/sdxl:v1", input={'prompt': 'a fox'})
+            assert excinfo.value.status == 429
+            response = requests.post(limited.base_url + "/v1/predictions", timeout=5,
+                                     headers={'Authorization': "Bearer r8_fake"},
+                                     json={'version': "v1", 'input': {}})
+            assert response.headers['Retry-After'] == "3"
+            assert limited.state.stats()['rate_limited'] == 2
+
+    @pytest.mark.unit
+    def test_injected_failures_and_errors(self):
+        """[P1] Test failed predictions, injected 500s and missing tokens."""
+        with FakeReplicateServer(_fast(failure_rate=1.0), port=0) as failing:
+            client = replicate.Client(api_token="r8_fake", base_url=failing.base_url)
+            with pytest.raises(ModelError, match="CUDA out of memory"):
+                client.run("stability-ai/sdxl:v1", input={'prompt': 'a fox'})
+            assert requests.get(failing.base_url + "/v1/predictions/fake000001", timeout=5).status_code == 401
+
+        with FakeReplicateServer(_fast(http_error_rate=1.0), port=0) as erroring:
+            response = requests.get(erroring.base_url + "/v1/predictions/fake000001", timeout=5,
+                                    headers={'Authorization': "Bearer r8_fake"})
+            assert response.status_code == 500
+            assert erroring.state.stats()['server_errors'] == 1
+
+
+class TestCommandLine:
+    """Tests for the fake server's command line and for pointing clients at it."""
+
+    @pytest.mark.unit
+    def test_parser_builds_config(self):
+        """[P2] Test that flags map onto the server configuration and bad values are rejected."""
+        args = build_parser().parse_args(["--queue-delay", "exp:0.5", "--processing-time", "uniform:1:2",
+                                          "--rate-limit-rate", "0.1", "--seed", "4"])
+        config = config_from_args(args)
+        assert config.queue_delay == Distribution('exp', (0.5,))
+        assert config.rate_limit_rate == 0.1
+        assert config.seed == 4
+        with pytest.raises(SystemExit):
+            build_parser().parse_args(["--queue-delay", "soon"])
+        with pytest.raises(ValueError, match="failure_rate"):
+            FakeConfig(failure_rate=2)
+
+    @pytest.mark.unit
+    def test_headless_runner_against_fake_server(self, server, tmp_path, monkeypatch):
+        """[P1] Test main.py end to end over HTTP: create, poll and download from the fake server."""
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setenv("REPLICATE_API_TOKEN", "r8_fake")
+        (tmp_path / "models.yaml").write_text(
+            "models:\n  - id: sdxl\n    name: SDXL\n    endpoint: stability-ai/sdxl:v1\n")
+        (tmp_path / "presets.yaml").write_text("presets: []\n")
+
+        code = cli.main(["generate", "--prompt", "a fox", "--prompt", "an owl", "--set", "width=32",
+                         "--set", "height=32", "--output-dir", "out", "--base-url", server.base_url])
+
+        assert code == 0
+        images = sorted((tmp_path / "out").glob("*.png"))
+        assert len(images) == 2
+        assert Image.open(images[0]).size == (32, 32)
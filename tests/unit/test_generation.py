@@ -0,0 +1,109 @@
+"""Unit tests for utils.generation module."""
+import threading
+import time
+
+import pytest
+
+from utils.generation import (
+    DEFAULT_NEGATIVE_PROMPT,
+    ConcurrencyLimiter,
+    build_model_input,
+    find_model,
+    resolve_generation,
+)
+
+MODELS = [
+    {'id': 'sdxl', 'name': 'SDXL', 'endpoint': 'stability-ai/sdxl:v1'},
+    {'id': 'fire', 'name': 'Fire', 'endpoint': 'owner/fire:v2', 'default': True},
+]
+
+
+class TestFindModel:
+    """Tests for find_model() lookup."""
+
+    @pytest.mark.unit
+    def test_finds_by_id_and_default(self):
+        """[P1] Test lookup by id and fallback to the default model."""
+        assert find_model(MODELS, 'sdxl')['endpoint'] == 'stability-ai/sdxl:v1'
+        assert find_model(MODELS, None)['id'] == 'fire'
+
+    @pytest.mark.unit
+    def test_unknown_model_lists_valid_ids(self):
+        """[P1] Test that unknown ids raise ValueError naming the valid ids."""
+        with pytest.raises(ValueError, match="Valid model IDs: sdxl, fire"):
+            find_model(MODELS, 'missing')
+        with pytest.raises(ValueError, match="No models configured"):
+            find_model([], None)
+
+
+class TestResolveGeneration:
+    """Tests for resolve_generation() layering."""
+
+    @pytest.mark.unit
+    def test_layers_defaults_preset_and_overrides(self):
+        """[P0] Test defaults < preset settings < overrides, with trigger words applied."""
+        presets = {'fire': [{'id': 'fire-default', 'name': 'Fire', 'model_id': 'fire',
+                             'trigger_words': 'FIREBEARD', 'trigger_words_position': 'append',
+                             'settings': {'width': 768, 'guidance_scale': 5.0}}]}
+
+        endpoint, model_input, preset = resolve_generation(
+            MODELS[1], presets, "a pirate", settings={'guidance_scale': 9.0, 'seed': 3})
+
+        assert endpoint == 'owner/fire:v2'
+        assert preset['id'] == 'fire-default'
+        assert model_input['prompt'] == "a pirate FIREBEARD"
+        assert model_input['width'] == 768
+        assert model_input['height'] == 1024
+        assert model_input['guidance_scale'] == 9.0
+        assert model_input['seed'] == 3
+        assert model_input['negative_prompt'] == DEFAULT_NEGATIVE_PROMPT
+
+    @pytest.mark.unit
+    def test_invalid_endpoint_raises(self):
+        """[P1] Test that models without an endpoint are rejected."""
+        with pytest.raises(ValueError, match="Invalid model endpoint"):
+            resolve_generation({'id': 'x', 'endpoint': ' '}, {}, "p")
+
+    @pytest.mark.unit
+    def test_build_model_input_drops_none_values(self):
+        """[P2] Test that unset settings are not sent to the API."""
+        assert build_model_input("p", {'seed': None, 'width': 512}) == {'prompt': "p", 'width': 512}
+
+
+class TestConcurrencyLimiter:
+    """Tests for ConcurrencyLimiter class."""
+
+    @pytest.mark.unit
+    def test_caps_in_flight_work(self):
+        """[P0] Test that no more than `limit` slots are held at once."""
+        limiter = ConcurrencyLimiter(2)
+
+        def work():
+            with limiter.slot():
+                time.sleep(0.02)
+
+        threads = [threading.Thread(target=work) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert limiter.stats() == {'limit': 2, 'in_flight': 0, 'peak': 2, 'waiting': 0}
+
+    @pytest.mark.unit
+    def test_releases_slot_on_error(self):
+        """[P1] Test that a failing block still releases its slot."""
+        limiter = ConcurrencyLimiter(1)
+
+        with pytest.raises(RuntimeError):
+            with limiter.slot():
+                raise RuntimeError("failed")
+
+        with limiter.slot() as waited:
+            assert waited < 0.5
+
+    @pytest.mark.unit
+    def test_rejects_invalid_limit(self):
+        """[P2] Test that limits below one raise ValueError."""
+        with pytest.raises(ValueError, match="at least 1"):
+            ConcurrencyLimiter(0)
@@ -0,0 +1,265 @@
+"""Unit tests for utils.hedging module."""
+import pytest
+
+from utils.hedging import (
+    HedgePolicy,
+    Hedger,
+    PredictionCanceled,
+    PredictionFailed,
+    StartLatencyTracker,
+    create_prediction,
+    hedge_policies,
+    parse_hedge_policy,
+)
+
+
+class FakeClock:
+    """Manual clock; sleeping advances time."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class FakePrediction:
+    """Prediction whose status follows a timeline of (time, status) steps."""
+
+    def __init__(self, clock, timeline, output=None, error=None, logs=""):
+        self.clock = clock
+        self.timeline = timeline
+        self.status = 'starting'
+        self.output = output
+        self.error = error
+        self.logs = logs
+        self.canceled = False
+
+    def reload(self):
+        if self.canceled:
+            return
+        for at, status in self.timeline:
+            if self.clock() >= at:
+                self.status = status
+
+    def cancel(self):
+        self.canceled = True
+        self.status = 'canceled'
+
+
+def _hedger(clock, predictions, policy):
+    """Hedger whose create_fn hands out the given predictions in order, recording targets."""
+    created = []
+
+    def create_fn(endpoint, model_input):
+        created.append(endpoint)
+        factory = predictions[len(created) - 1]
+        return factory(clock.now)
+
+    hedger = Hedger(create_fn, {'a/b:v': policy}, poll_interval=0.5, clock=clock, sleep=clock.sleep)
+    return hedger, created
+
+
+class TestParseHedgePolicy:
+    """Tests for parse_hedge_policy() and hedge_policies()."""
+
+    @pytest.mark.unit
+    def test_true_mapping_and_disabled(self):
+        """[P1] Test the accepted forms of the models.yaml hedge key."""
+        assert parse_hedge_policy(True) == HedgePolicy()
+        assert parse_hedge_policy({'percentile': 90, 'alternate': 'o/d'}).alternate == 'o/d'
+        assert parse_hedge_policy({'enabled': False, 'percentile': 90}) is None
+        assert parse_hedge_policy(None) is None
+
+    @pytest.mark.unit
+    def test_policies_keyed_by_endpoint_with_model_context(self):
+        """[P1] Test that errors name the model and only hedged models get policies."""
+        models = [{'id': 'a', 'endpoint': 'a/b:v', 'hedge': True}, {'id': 'c', 'endpoint': 'c/d:v'}]
+        assert list(hedge_policies(models)) == ['a/b:v']
+        with pytest.raises(ValueError, match="Model 'x': 'hedge.budget'"):
+            hedge_policies([{'id': 'x', 'endpoint': 'x/y:v', 'hedge': {'budget': -1}}])
+
+
+class TestStartLatencyTracker:
+    """Tests for StartLatencyTracker thresholds."""
+
+    @pytest.mark.unit
+    def test_threshold_uses_initial_delay_then_learned_percentile(self):
+        """[P0] Test that the threshold switches to the percentile once enough samples exist."""
+        tracker = StartLatencyTracker()
+        policy = HedgePolicy(percentile=90, min_delay=0.5, initial_delay=10, min_samples=10)
+
+        assert tracker.threshold('a/b:v', policy) == 10
+        for seconds in range(1, 11):
+            tracker.record('a/b:v', float(seconds))
+
+        assert tracker.threshold('a/b:v', policy) == 9.0
+        assert tracker.threshold('a/b:v', HedgePolicy(percentile=10, min_delay=5, min_samples=10)) == 5
+
+
+class TestHedger:
+    """Tests for Hedger.run()."""
+
+    @pytest.mark.unit
+    def test_slow_start_is_hedged_and_loser_canceled(self):
+        """[P0] Test that a cold primary gets a hedge on the alternate and the winner's output is returned."""
+        # GIVEN: A primary stuck starting for 30s and a hedge that finishes quickly
+        clock = FakeClock()
+        primary, hedge = [], []
+
+        def make_primary(t0):
+            primary.append(FakePrediction(clock, [(t0 + 30, 'processing'), (t0 + 40, 'succeeded')], output=['p.png']))
+            return primary[0]
+
+        def make_hedge(t0):
+            hedge.append(FakePrediction(clock, [(t0 + 1, 'processing'), (t0 + 3, 'succeeded')], output=['h.png']))
+            return hedge[0]
+
+        hedger, created = _hedger(clock, [make_primary, make_hedge],
+                                  HedgePolicy(initial_delay=5, alternate='a/b-deploy'))
+
+        # WHEN: Running the prediction
+        output = hedger.run('a/b:v', {'prompt': 'x'})
+
+        # THEN: The hedge went to the alternate after 5s, won, and the primary was canceled
+        assert output == ['h.png']
+        assert created == ['a/b:v', 'a/b-deploy']
+        assert primary[0].canceled
+        stats = hedger.stats()['a/b:v']
+        assert stats['hedges_issued'] == 1 and stats['hedge_wins'] == 1
+        assert stats['extra_seconds'] == 0  # the primary never started, so it cost nothing
+        assert 8.0 <= clock.now <= 9.0
+
+    @pytest.mark.unit
+    def test_started_primary_is_not_hedged(self):
+        """[P0] Test that a prediction that starts before the threshold runs alone and trains the tracker."""
+        clock = FakeClock()
+        hedger, created = _hedger(clock, [
+            lambda t0: FakePrediction(clock, [(t0 + 1, 'processing'), (t0 + 20, 'succeeded')], output=['p.png'])
+        ], HedgePolicy(initial_delay=5))
+
+        assert hedger.run('a/b:v', {'prompt': 'x'}) == ['p.png']
+        assert created == ['a/b:v']
+        assert hedger.stats()['a/b:v']['hedges_issued'] == 0
+        assert hedger.tracker.threshold('a/b:v', HedgePolicy(min_samples=1, min_delay=0)) == 1.0
+
+    @pytest.mark.unit
+    def test_primary_win_charges_hedge_running_time(self):
+        """[P1] Test that a hedge that started but lost is counted as extra cost."""
+        clock = FakeClock()
+        hedger, _ = _hedger(clock, [
+            lambda t0: FakePrediction(clock, [(t0 + 6, 'processing'), (t0 + 10, 'succeeded')], output=['p.png']),
+            lambda t0: FakePrediction(clock, [(t0 + 1, 'processing'), (t0 + 60, 'succeeded')], output=['h.png']),
+        ], HedgePolicy(initial_delay=5))
+
+        assert hedger.run('a/b:v', {'prompt': 'x'}) == ['p.png']
+        stats = hedger.stats()['a/b:v']
+        assert stats['primary_wins'] == 1 and stats['hedge_wins'] == 0
+        assert stats['extra_seconds'] == pytest.approx(4.0)  # started at t=6, canceled at t=10
+
+    @pytest.mark.unit
+    def test_budget_caps_hedges(self):
+        """[P1] Test that hedges beyond the budget are denied."""
+        clock = FakeClock()
+        slow = lambda t0: FakePrediction(clock, [(t0 + 8, 'succeeded')], output=['p.png'])
+        hedger, created = _hedger(clock, [slow] * 10, HedgePolicy(initial_delay=5, budget=0.0))
+
+        for _ in range(3):
+            hedger.run('a/b:v', {'prompt': 'x'})
+
+        stats = hedger.stats()['a/b:v']
+        assert stats['hedges_issued'] == 1
+        assert stats['budget_denied'] == 2
+        assert len(created) == 4
+
+    @pytest.mark.unit
+    def test_all_failed_raises(self):
+        """[P1] Test that a failed unhedged prediction raises PredictionFailed with its error."""
+        clock = FakeClock()
+        hedger, _ = _hedger(clock, [
+            lambda t0: FakePrediction(clock, [(t0 + 1, 'failed')], error="CUDA out of memory")
+        ], HedgePolicy(initial_delay=5))
+
+        with pytest.raises(PredictionFailed, match="CUDA out of memory"):
+            hedger.run('a/b:v', {'prompt': 'x'})
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("initial_delay, expected_predictions", [(30, 1), (5, 2)], ids=["unhedged", "hedged"])
+    def test_canceled_predictions_raise_prediction_canceled(self, initial_delay, expected_predictions):
+        """[P0] Test that a race whose predictions were all canceled (e.g. superseded) raises PredictionCanceled."""
+        # GIVEN: Every prediction is canceled at t=6, as a supersede does; the hedge (if any) was issued at t=5
+        clock = FakeClock()
+        canceled_at_6 = lambda t0: FakePrediction(clock, [(6, 'canceled')])
+        hedger, created = _hedger(clock, [canceled_at_6, canceled_at_6], HedgePolicy(initial_delay=initial_delay))
+
+        # WHEN / THEN: The run raises the non-retryable PredictionCanceled rather than a plain failure
+        with pytest.raises(PredictionCanceled, match="primary canceled"):
+            hedger.run('a/b:v', {'prompt': 'x'})
+        assert len(created) == expected_predictions
+
+    @pytest.mark.unit
+    def test_on_created_sees_every_prediction_and_logs_follow_the_first_to_start(self):
+        """[P0] Test that both predictions of a race are reported when created and logs come from the hedge that started."""
+        # GIVEN: A primary stuck starting and a hedge logging sampler steps
+        clock = FakeClock()
+        hedger, created = _hedger(clock, [
+            lambda t0: FakePrediction(clock, [(t0 + 60, 'succeeded')], output=['p.png'], logs="booting"),
+            lambda t0: FakePrediction(clock, [(t0 + 1, 'processing'), (t0 + 3, 'succeeded')], output=['h.png'],
+                                      logs="5/20"),
+        ], HedgePolicy(initial_delay=5))
+        seen, logs = [], []
+
+        # WHEN: Running with both hooks
+        output = hedger.run('a/b:v', {'prompt': 'x'}, on_logs=logs.append, on_created=seen.append)
+
+        # THEN: Both predictions were handed to on_created, and only the hedge's logs were reported
+        assert output == ['h.png']
+        assert [prediction.output for prediction in seen] == [['p.png'], ['h.png']]
+        assert seen[0].canceled
+        assert logs and set(logs) == {"5/20"}
+
+    @pytest.mark.unit
+    def test_poll_error_cancels_every_running_prediction(self):
+        """[P0] Test that a reload that raises mid-race cancels the primary and the hedge before propagating."""
+        # GIVEN: A hedged race whose hedge's reload starts failing at t=7
+        clock = FakeClock()
+        predictions = []
+
+        class FlakyPrediction(FakePrediction):
+            def reload(self):
+                if clock.now >= 7:
+                    raise ConnectionError("connection reset")
+                super().reload()
+
+        def make(t0):
+            predictions.append((FakePrediction if not predictions else FlakyPrediction)(clock, [(t0 + 60, 'succeeded')]))
+            return predictions[-1]
+
+        hedger, created = _hedger(clock, [make, make], HedgePolicy(initial_delay=5))
+
+        # WHEN: Running the prediction
+        with pytest.raises(ConnectionError, match="connection reset"):
+            hedger.run('a/b:v', {'prompt': 'x'})
+
+        # THEN: Both predictions were hedged into the race and then canceled
+        assert len(created) == 2
+        assert all(prediction.canceled for prediction in predictions)
+
+
+class TestCreatePrediction:
+    """Tests for create_prediction() endpoint handling."""
+
+    @pytest.mark.unit
+    def test_versioned_and_unversioned_endpoints(self):
+        """[P1] Test that versioned endpoints use predictions.create and bare models use models.predictions."""
+        from unittest.mock import MagicMock
+        client = MagicMock()
+
+        create_prediction(client, 'owner/model:abc123', {'prompt': 'x'})
+        create_prediction(client, 'owner/model', {'prompt': 'y'})
+
+        client.predictions.create.assert_called_once_with(version='abc123', input={'prompt': 'x'})
+        client.models.predictions.create.assert_called_once_with(model='owner/model', input={'prompt': 'y'})
@@ -0,0 +1,110 @@
+"""Unit tests for utils.history module."""
+import io
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+from PIL import Image
+
+from utils.history import HistoryEntry, HistoryStore, fts_query, thumbnail_png
+
+
+def _entry(idx: int, prompt: str = "a red fox", model: str = "sdxl", **extra) -> HistoryEntry:
+    return HistoryEntry(prompt=f"{prompt} {idx}", model_id=model, seed=idx, job_id=f"job-{idx}",
+                        settings={'num_inference_steps': 30}, timings={'total': 1.5},
+                        outputs=[{'url': f"https://example.com/{idx}.png", 'key': f"{idx:032x}.png"}], **extra)
+
+
+@pytest.fixture
+def history(tmp_path):
+    store = HistoryStore(str(tmp_path / "history" / "history.db"), flush_interval=5.0)
+    yield store
+    store.close()
+
+
+class TestHistoryStore:
+    """Tests for batched writes and searches."""
+
+    @pytest.mark.unit
+    def test_entries_are_written_in_one_batch_and_round_trip(self, history):
+        """[P0] Test that queued entries are committed together on flush and read back with every field."""
+        # GIVEN: Entries queued behind a long flush interval, one of them a repeat of a job already added
+        for idx in range(3):
+            history.add(_entry(idx, preset="sdxl-photo", negative_prompt="blurry"))
+        history.add(_entry(1, prompt="a duplicate"))
+
+        # WHEN: Flushing
+        assert history.flush(5)
+
+        # THEN: They are written in one transaction, newest first, and the repeated job id is skipped
+        stats = history.stats()
+        assert (stats['recorded'], stats['written'], stats['batches'], stats['dropped']) == (4, 3, 1, 0)
+        newest = history.search().entries[0]
+        assert (newest.prompt, newest.model_id, newest.preset, newest.negative_prompt, newest.seed) == \
+            ("a red fox 2", "sdxl", "sdxl-photo", "blurry", 2)
+        assert newest.settings == {'num_inference_steps': 30} and newest.timings == {'total': 1.5}
+        assert newest.outputs == [{'url': "https://example.com/2.png", 'key': f"{2:032x}.png"}]
+        assert [entry.job_id for entry in history.search().entries] == ["job-2", "job-1", "job-0"]
+
+    @pytest.mark.unit
+    def test_search_matches_word_prefixes_filters_by_model_and_pages_by_cursor(self, history):
+        """[P0] Test prompt search, the model filter and cursor pages that neither skip nor repeat entries."""
+        for idx in range(25):
+            history.add(_entry(idx, prompt="a lighthouse at dusk" if idx % 2 else "a red fox",
+                               model="flux" if idx % 5 == 0 else "sdxl"))
+        assert history.flush(5)
+
+        seen, cursor = [], None
+        while True:
+            page = history.search("light", cursor=cursor, limit=5)
+            seen.extend(entry.seed for entry in page.entries)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        assert seen == list(range(23, 0, -2))
+        assert [entry.seed for entry in history.search("fox dusk").entries] == []
+        assert [entry.seed for entry in history.search("RED", model_id="flux").entries] == [20, 10, 0]
+        assert history.search("", limit=5).next_cursor == "21"
+        assert history.models() == ["flux", "sdxl"]
+
+    @pytest.mark.unit
+    def test_query_syntax_in_user_text_is_ignored(self, history):
+        """[P1] Test that FTS5 operators and punctuation are searched as plain words, and bad cursors rejected."""
+        history.add(_entry(0, prompt="fox NOT (lighthouse)"))
+        assert history.flush(5)
+        assert fts_query('fox "NOT" (light*') == '"fox"* "NOT"* "light"*'
+        assert fts_query(" -- ") is None
+        assert len(history.search('fox "NOT" (light*').entries) == 1
+        with pytest.raises(ValueError, match="Invalid history cursor"):
+            history.search(cursor="1; DROP TABLE generations")
+
+    @pytest.mark.unit
+    def test_full_queue_drops_without_blocking(self, tmp_path):
+        """[P1] Test that a stalled writer never blocks add() and entries over the queue size are counted as dropped."""
+        store = HistoryStore(str(tmp_path / "history.db"), max_queue=2, batch_size=1, flush_interval=0)
+        release = threading.Event()
+        with patch.object(store, '_write', side_effect=lambda batch: release.wait(5)):
+            started = time.perf_counter()
+            for idx in range(10):
+                store.add(_entry(idx))
+            assert time.perf_counter() - started < 1
+            release.set()
+            assert store.flush(5)
+        store.close()
+        assert store.stats()['dropped'] >= 7
+
+
+class TestThumbnails:
+    """Tests for the panel's thumbnail helper."""
+
+    @pytest.mark.unit
+    def test_thumbnails_are_downscaled_and_cached(self, tmp_path):
+        """[P2] Test that a stored image becomes a small PNG once, and unreadable files give None."""
+        path = tmp_path / "a.png"
+        Image.new("RGB", (1024, 512), "blue").save(path)
+        thumbnail = thumbnail_png(str(path), 128)
+        assert Image.open(io.BytesIO(thumbnail)).size == (128, 64)
+        assert thumbnail_png(str(path), 128) is thumbnail
+        (tmp_path / "broken.png").write_bytes(b"not an image")
+        assert thumbnail_png(str(tmp_path / "broken.png")) is None
@@ -0,0 +1,97 @@
+"""Unit tests for utils.image_store module."""
+import hashlib
+
+import pytest
+
+from utils.image_store import ImageStore, output_url, output_urls
+
+
+class TestOutputUrl:
+    """Tests for output_url() helper."""
+
+    @pytest.mark.unit
+    def test_output_url_returns_plain_string(self):
+        """[P2] Test that plain URL strings pass through unchanged."""
+        assert output_url("https://example.com/a.png") == "https://example.com/a.png"
+
+    @pytest.mark.unit
+    def test_output_url_reads_url_attribute(self):
+        """[P2] Test that FileOutput-like objects are normalized to their url."""
+        # GIVEN: An object exposing a url attribute (like replicate.helpers.FileOutput)
+        class FakeFileOutput:
+            url = "https://replicate.delivery/x/out-0.png"
+
+        # WHEN/THEN: The url attribute is returned
+        assert output_url(FakeFileOutput()) == "https://replicate.delivery/x/out-0.png"
+
+    @pytest.mark.unit
+    def test_output_urls_normalizes_whole_outputs(self):
+        """[P2] Test that single items, lists and None become URL lists."""
+        assert output_urls(None) == []
+        assert output_urls("https://example.com/a.png") == ["https://example.com/a.png"]
+        assert output_urls(["a.png", "b.png"]) == ["a.png", "b.png"]
+
+
+class TestImageStore:
+    """Tests for ImageStore class."""
+
+    @pytest.mark.unit
+    def test_key_for_is_stable_and_keeps_extension(self, tmp_path):
+        """[P1] Test that keys are deterministic and preserve the URL extension."""
+        store = ImageStore(str(tmp_path))
+
+        key = store.key_for("https://example.com/out-0.webp")
+
+        assert key == store.key_for("https://example.com/out-0.webp")
+        assert key.endswith('.webp')
+        assert key != store.key_for("https://example.com/out-1.webp")
+
+    @pytest.mark.unit
+    def test_key_for_defaults_to_png(self, tmp_path):
+        """[P2] Test that URLs without an extension are stored as .png."""
+        store = ImageStore(str(tmp_path))
+        assert store.key_for("https://example.com/file").endswith('.png')
+
+    @pytest.mark.unit
+    def test_write_stream_stores_chunks_atomically(self, tmp_path):
+        """[P0] Test that streamed chunks are written and hashed correctly."""
+        # GIVEN: A store and a chunked payload
+        store = ImageStore(str(tmp_path / "store"))
+        chunks = [b'abc', b'', b'def']
+
+        # WHEN: Writing the stream
+        path, size, digest = store.write_stream('k.png', iter(chunks))
+
+        # THEN: The blob is complete and no temporary files remain
+        assert path.read_bytes() == b'abcdef'
+        assert size == 6
+        assert digest == hashlib.sha256(b'abcdef').hexdigest()
+        assert store.contains('k.png')
+        assert [p.name for p in path.parent.iterdir()] == ['k.png']
+
+    @pytest.mark.unit
+    def test_write_stream_cleans_up_on_failure(self, tmp_path):
+        """[P1] Test that a failing stream leaves no partial blob behind."""
+        store = ImageStore(str(tmp_path))
+
+        def broken():
+            yield b'partial'
+            raise IOError("connection reset")
+
+        with pytest.raises(IOError):
+            store.write_stream('k.png', broken())
+
+        assert not store.contains('k.png')
+        assert list(tmp_path.iterdir()) == []
+
+    @pytest.mark.unit
+    def test_iter_chunks_streams_blob(self, tmp_path):
+        """[P2] Test that stored blobs are read back in bounded chunks."""
+        store = ImageStore(str(tmp_path))
+        store.write_stream('k.png', [b'x' * 10])
+
+        chunks = list(store.iter_chunks('k.png', chunk_size=4))
+
+        assert chunks == [b'xxxx', b'xxxx', b'xx']
+        assert store.size_of('k.png') == 10
+        assert store.size_of('missing.png') is None
@@ -0,0 +1,193 @@
+"""Unit tests for utils.inflight module."""
+import pytest
+
+from utils.inflight import CANCELED, SUCCEEDED, PredictionRegistry
+from utils.log_progress import run_with_logs
+
+
+class StandInPrediction:
+    """Prediction from the stand-in API: stays running until finished or canceled."""
+
+    def __init__(self, prediction_id, fail_cancel=False):
+        self.id = prediction_id
+        self.status = 'starting'
+        self.logs = ""
+        self.output = None
+        self.error = None
+        self.fail_cancel = fail_cancel
+
+    def reload(self):
+        pass
+
+    def cancel(self):
+        if self.fail_cancel:
+            raise ConnectionError("API unreachable")
+        self.status = 'canceled'
+
+
+class StandInPredictionsAPI:
+    """Local stand-in for ``client.predictions`` that records create and cancel calls."""
+
+    def __init__(self):
+        self.created = []
+
+    def create(self, version=None, model=None, input=None):
+        prediction = StandInPrediction(f"p{len(self.created) + 1}")
+        self.created.append(prediction)
+        return prediction
+
+    @property
+    def canceled(self):
+        return [p.id for p in self.created if p.status == 'canceled']
+
+
+class StandInClient:
+    def __init__(self):
+        self.predictions = StandInPredictionsAPI()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _start(registry, client, session_id, pinned=False):
+    job = registry.begin(session_id, label="a fox", pinned=pinned)
+    registry.attach(job, client.predictions.create(version="v1", input={'prompt': 'a fox'}))
+    return job
+
+
+class TestSupersede:
+    """Tests for canceling a session's older predictions."""
+
+    @pytest.mark.unit
+    def test_new_submit_cancels_older_unpinned_jobs(self):
+        """[P0] Test that supersede cancels the session's running jobs but not pinned, kept or other sessions' jobs."""
+        # GIVEN: Two sessions with jobs in flight, one of them pinned
+        client = StandInClient()
+        registry = PredictionRegistry()
+        old = _start(registry, client, "s1")
+        pinned = _start(registry, client, "s1", pinned=True)
+        other = _start(registry, client, "s2")
+        new = _start(registry, client, "s1")
+
+        # WHEN: The new submit supersedes session s1
+        canceled = registry.supersede("s1", keep=new)
+
+        # THEN: Only the old unpinned job's prediction was canceled through the API
+        assert canceled == [old]
+        assert client.predictions.canceled == [old.prediction_id]
+        assert old.status == CANCELED
+        assert {job.job_id for job in registry.jobs("s1")} == {pinned.job_id, new.job_id}
+        assert registry.jobs("s2") == [other]
+        assert registry.stats()['superseded'] == 1
+
+    @pytest.mark.unit
+    def test_supersede_cancels_every_running_prediction_of_a_job(self):
+        """[P0] Test that a job racing a primary and a hedge has both canceled, but not one that already failed."""
+        # GIVEN: A job whose first route failed, then a primary and a hedge still starting
+        client = StandInClient()
+        registry = PredictionRegistry()
+        job = _start(registry, client, "s1")
+        job.prediction.status = 'failed'
+        for _ in range(2):
+            registry.attach(job, client.predictions.create(version="v1", input={}))
+
+        # WHEN: The session resubmits
+        registry.supersede("s1")
+
+        # THEN: Both running predictions were canceled through the API
+        assert client.predictions.canceled == ["p2", "p3"]
+        assert job.prediction_id == "p3"
+
+    @pytest.mark.unit
+    def test_job_superseded_before_creation_is_canceled_on_attach(self):
+        """[P1] Test that a job canceled while waiting for its prediction cancels it as soon as it exists."""
+        client = StandInClient()
+        registry = PredictionRegistry()
+        job = registry.begin("s1")
+        registry.supersede("s1")
+
+        registry.attach(job, client.predictions.create(version="v1", input={}))
+        registry.finish(job, outputs=["https://example.com/late.png"])
+
+        assert client.predictions.canceled == ["p1"]
+        assert job.status == CANCELED
+        assert job.outputs == []
+
+    @pytest.mark.unit
+    def test_created_callback_attaches_prediction(self):
+        """[P1] Test that run_with_logs hands the prediction to the registry before polling it."""
+        client = StandInClient()
+        registry = PredictionRegistry()
+        job = registry.begin("s1")
+
+        def on_created(prediction):
+            registry.attach(job, prediction)
+            # The user resubmits while the prediction is starting
+            registry.supersede("s1")
+
+        with pytest.raises(Exception, match="canceled"):
+            run_with_logs(client, "owner/model:v1", {'prompt': 'x'}, poll_interval=0, on_created=on_created)
+        assert client.predictions.canceled == ["p1"]
+
+    @pytest.mark.unit
+    def test_cancel_errors_are_counted(self):
+        """[P2] Test that a failing cancel call is logged and counted instead of raised."""
+        registry = PredictionRegistry()
+        job = registry.begin("s1")
+        registry.attach(job, StandInPrediction("p1", fail_cancel=True))
+
+        assert registry.supersede("s1") == [job]
+        assert registry.stats()['cancel_errors'] == 1
+
+
+class TestPinnedJobs:
+    """Tests for pinned jobs delivering their results later."""
+
+    @pytest.mark.unit
+    def test_finished_pinned_job_is_taken_once(self):
+        """[P1] Test that a pinned job's result waits for the next rerun and unpinned results are dropped."""
+        client = StandInClient()
+        registry = PredictionRegistry()
+        pinned = _start(registry, client, "s1")
+        assert registry.pin(pinned.job_id)
+        unpinned = _start(registry, client, "s1")
+
+        registry.finish(pinned, outputs=["https://example.com/a.png"])
+        registry.finish(unpinned, outputs=["https://example.com/b.png"])
+
+        assert registry.take_finished("s1") == [pinned]
+        assert pinned.status == SUCCEEDED
+        assert registry.take_finished("s1") == []
+        assert registry.pin(999) is False
+
+
+class TestReaper:
+    """Tests for canceling predictions of closed sessions."""
+
+    @pytest.mark.unit
+    def test_reap_cancels_orphaned_sessions_only(self):
+        """[P0] Test that sessions without a heartbeat past the timeout have their predictions canceled."""
+        # GIVEN: Two sessions with running jobs; only s2 keeps rerunning
+        clock = FakeClock()
+        client = StandInClient()
+        registry = PredictionRegistry(orphan_timeout=60, clock=clock)
+        orphan = _start(registry, client, "s1", pinned=True)
+        live = _start(registry, client, "s2")
+        clock.now = 50
+        registry.touch("s2")
+
+        # WHEN: The reaper runs after s1's timeout
+        clock.now = 70
+        reaped = registry.reap()
+
+        # THEN: s1's prediction is canceled even though pinned; s2 is untouched
+        assert reaped == [orphan]
+        assert client.predictions.canceled == [orphan.prediction_id]
+        assert registry.jobs("s2") == [live]
+        assert registry.stats()['reaped'] == 1
+        assert registry.stats()['sessions'] == 1
@@ -0,0 +1,67 @@
+"""Unit tests for utils.lazy module."""
+import sys
+from unittest.mock import patch
+
+import pytest
+
+from utils.lazy import is_loaded, lazy_import
+
+
+@pytest.fixture
+def heavy_module(tmp_path, monkeypatch):
+    """An importable module that records when it is executed."""
+    (tmp_path / "heavy_probe.py").write_text(
+        "import builtins\n"
+        "builtins.heavy_probe_executions = getattr(builtins, 'heavy_probe_executions', 0) + 1\n"
+        "def run():\n"
+        "    return 'real'\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield "heavy_probe"
+    sys.modules.pop("heavy_probe", None)
+    import builtins
+    if hasattr(builtins, 'heavy_probe_executions'):
+        del builtins.heavy_probe_executions
+
+
+class TestLazyImport:
+    """Tests for deferring module execution until first use."""
+
+    @pytest.mark.unit
+    def test_module_executes_on_first_attribute_access(self, heavy_module):
+        """[P0] Test that the module is registered at once but only executed when used."""
+        import builtins
+
+        # GIVEN: A lazily imported module
+        module = lazy_import(heavy_module)
+
+        # THEN: It is importable by name but has not run yet
+        assert sys.modules[heavy_module] is module
+        assert not is_loaded(heavy_module)
+        assert not hasattr(builtins, 'heavy_probe_executions')
+
+        # WHEN: An attribute is accessed
+        assert module.run() == 'real'
+
+        # THEN: The module ran exactly once
+        assert is_loaded(heavy_module)
+        assert builtins.heavy_probe_executions == 1
+        assert lazy_import(heavy_module) is module
+
+    @pytest.mark.unit
+    def test_patching_through_the_lazy_module(self, heavy_module):
+        """[P1] Test that mock.patch on the module name loads it and patches the shared object."""
+        module = lazy_import(heavy_module)
+
+        with patch(f"{heavy_module}.run", return_value='patched'):
+            assert module.run() == 'patched'
+        assert module.run() == 'real'
+
+    @pytest.mark.unit
+    def test_imported_and_missing_modules(self):
+        """[P2] Test that imported modules are returned as is and missing ones raise."""
+        assert lazy_import("json") is sys.modules["json"]
+        assert is_loaded("json")
+        assert not is_loaded("no_such_module_here")
+        with pytest.raises(ModuleNotFoundError, match="no_such_module_here"):
+            lazy_import("no_such_module_here")
@@ -0,0 +1,109 @@
+"""Unit tests for the load_test.py multi-session load-test harness."""
+import json
+import os
+
+import pytest
+
+import load_test
+from fake_replicate import Distribution, FakeConfig
+from load_test import JOURNEYS, deep_size, parse_journeys, percentiles, run_load_test
+
+
+def _fast_fake(**overrides):
+    return FakeConfig(processing_time=Distribution('fixed', (0.05,)), seed=2, **overrides)
+
+
+class TestPercentiles:
+    """Tests for the report's latency summaries."""
+
+    @pytest.mark.unit
+    def test_nearest_rank(self):
+        """[P1] Test nearest-rank percentiles, mean and max."""
+        summary = percentiles([float(value) for value in range(1, 101)])
+        assert summary == {'count': 100, 'mean': 50.5, 'p50': 50.0, 'p90': 90.0, 'p95': 95.0, 'p99': 99.0,
+                           'max': 100.0}
+        assert percentiles([2.0], (50,)) == {'count': 1, 'mean': 2.0, 'p50': 2.0, 'max': 2.0}
+        assert percentiles([]) == {'count': 0}
+
+    @pytest.mark.unit
+    def test_deep_size_counts_referenced_objects(self):
+        """[P2] Test that nested containers are included once."""
+        shared = "x" * 1000
+        assert deep_size({'a': [shared, shared]}) > 1000
+        assert deep_size({'a': [shared, shared]}) < 2000
+
+
+class TestParseJourneys:
+    """Tests for journey file validation."""
+
+    @pytest.mark.unit
+    def test_builtin_journeys_are_valid(self):
+        """[P1] Test that the built-in journeys pass validation."""
+        assert parse_journeys(JOURNEYS) is JOURNEYS
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("data, match", [
+        ([], "non-empty mapping"),
+        ({'j': []}, "non-empty list"),
+        ({'j': [{'action': 'open'}, {'action': 'fly'}]}, "unknown action 'fly'"),
+        ({'j': [{'action': 'open'}, {'action': 'set', 'key': 'form_width'}]}, "needs 'key' and 'value'"),
+        ({'j': [{'action': 'open'}, {'action': 'prompt'}]}, "needs 'text'"),
+        ({'j': [{'action': 'submit'}]}, "must start with 'open'"),
+    ])
+    def test_rejects_malformed_journeys(self, data, match):
+        """[P2] Test that malformed journeys are rejected with the step at fault."""
+        with pytest.raises(ValueError, match=match):
+            parse_journeys(data)
+
+
+class TestRunLoadTest:
+    """Tests running simulated sessions through the real app against the fake API."""
+
+    @pytest.mark.integration
+    @pytest.mark.slow
+    def test_sessions_generate_and_download(self, monkeypatch):
+        """[P0] Test that concurrent sessions generate and download, and the report covers every metric."""
+        # GIVEN: No Replicate settings in the environment
+        monkeypatch.delenv("REPLICATE_BASE_URL", raising=False)
+
+        # WHEN: Two sessions each run the generate journey against a fast fake API
+        report = run_load_test({'generate': JOURNEYS['generate']}, sessions=2, iterations=1,
+                               fake_config=_fast_fake(), timeout=25)
+
+        # THEN: Both generations ran through the fake API and were downloaded without errors
+        assert report['errors']['count'] == 0, report['errors']['samples']
+        assert report['errors']['journeys_completed'] == 2
+        assert report['reruns_by_action']['open']['count'] == 2
+        assert report['reruns_by_action']['submit']['count'] == 2
+        assert report['downloads']['count'] == 2
+        assert report['downloads']['bytes'] > 0
+        assert report['fake_server']['created'] == 2
+        assert report['throughput']['generations_per_minute'] > 0
+        assert report['memory']['session_state_kb']['count'] == 2
+        assert {'p50', 'p95', 'p99'} <= set(report['reruns'])
+        json.dumps(report)
+
+        # AND: The environment is restored
+        assert "REPLICATE_BASE_URL" not in os.environ
+
+    @pytest.mark.integration
+    @pytest.mark.slow
+    def test_injected_failures_are_counted(self):
+        """[P1] Test that failed generations show up in the error rate by type."""
+        report = run_load_test({'generate': JOURNEYS['generate']}, sessions=1, iterations=1,
+                               fake_config=_fast_fake(failure_rate=1.0), timeout=25)
+
+        assert report['errors']['by_type'] == {'app_error': 1}
+        assert report['errors']['rate'] > 0
+        assert report['errors']['journeys_completed'] == 0
+        assert report['downloads']['count'] == 0
+
+
+class TestCommandLine:
+    """Tests for the load test's command line."""
+
+    @pytest.mark.unit
+    def test_rejects_unknown_journey(self, capsys):
+        """[P2] Test that an unknown journey name exits with a usage error before any session starts."""
+        assert load_test.main(["--journey", "teleport"]) == 2
+        assert "Unknown journey(s): teleport" in capsys.readouterr().err
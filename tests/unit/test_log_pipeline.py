@@ -0,0 +1,145 @@
+"""Unit tests for utils.log_pipeline module."""
+import io
+import json
+import logging
+import threading
+
+import pytest
+
+from utils.log_pipeline import LogPipeline, SamplingFilter, bind_correlation, correlation_ids, log_correlation
+
+
+@pytest.fixture
+def target():
+    """A logger of its own, so the pipeline never touches the root logger or caplog."""
+    log = logging.getLogger("tests.log_pipeline")
+    log.propagate = False
+    log.setLevel(logging.DEBUG)
+    yield log
+    log.propagate = True
+    log.setLevel(logging.NOTSET)
+
+
+def _lines(stream: io.StringIO) -> list:
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+class TestCorrelation:
+    """Tests for session and job ids on records."""
+
+    @pytest.mark.unit
+    def test_json_lines_carry_ids_across_threads(self, target):
+        """[P0] Test that ids set on the script thread reach records logged by bound workers, formatted as JSON."""
+        # GIVEN: A JSON pipeline attached to the test logger
+        stream = io.StringIO()
+        pipeline = LogPipeline('json', 'DEBUG', stream=stream, loggers=()).start(target)
+
+        # WHEN: Logging within a session, within a job, from a bound worker thread and with an exception
+        try:
+            with log_correlation(session_id="s1"):
+                target.info("rerun %d", 1)
+                with log_correlation(job_id="trace-1"):
+                    worker = threading.Thread(target=bind_correlation(lambda: target.info("from %s", "worker")))
+                    worker.start()
+                    worker.join()
+                    try:
+                        raise TimeoutError("took too long")
+                    except TimeoutError:
+                        target.error("failed", exc_info=True, extra={'model_id': "sdxl"})
+                assert correlation_ids() == ("s1", None)
+            target.warning("outside")
+        finally:
+            pipeline.stop()
+
+        # THEN: Every record has its ids, messages are merged and extras and tracebacks are kept
+        rerun, worker_line, failed, outside = _lines(stream)
+        assert (rerun['message'], rerun['session_id'], rerun['job_id']) == ("rerun 1", "s1", None)
+        assert (worker_line['message'], worker_line['session_id'], worker_line['job_id']) == \
+            ("from worker", "s1", "trace-1")
+        assert worker_line['thread'] != rerun['thread']
+        assert failed['level'] == "ERROR" and failed['model_id'] == "sdxl"
+        assert failed['exc'].endswith("TimeoutError: took too long")
+        assert (outside['session_id'], outside['job_id']) == (None, None)
+        assert rerun['logger'] == "tests.log_pipeline" and rerun['ts'].endswith("+00:00")
+
+    @pytest.mark.unit
+    def test_messages_are_formatted_on_the_listener(self, target):
+        """[P1] Test that records are queued with their arguments (the stock QueueHandler merges them first)."""
+        stream = io.StringIO()
+        pipeline = LogPipeline('text', 'INFO', stream=stream, loggers=())
+        queued = []
+        pipeline.handler.enqueue = queued.append
+        pipeline.start(target)
+        try:
+            with log_correlation(session_id="s1"):
+                target.info("Persisted %s (%d bytes)", "a.png", 300)
+        finally:
+            pipeline.stop()
+
+        [record] = queued
+        assert (record.msg, record.args) == ("Persisted %s (%d bytes)", ("a.png", 300))
+        formatted = pipeline.listener.handlers[0].format(record)
+        assert formatted.endswith("INFO tests.log_pipeline [session=s1 job=None] Persisted a.png (300 bytes)")
+
+
+class TestSamplingAndOverhead:
+    """Tests for keeping the logging thread's cost bounded."""
+
+    @pytest.mark.unit
+    def test_debug_records_are_sampled_per_call_site(self, target):
+        """[P1] Test that 1 in N DEBUG records per call site are kept while INFO and above always are."""
+        stream = io.StringIO()
+        pipeline = LogPipeline('json', 'DEBUG', sample_every=10, stream=stream, loggers=()).start(target)
+        try:
+            for idx in range(25):
+                target.debug(f"Persisted image {idx}")
+            for idx in range(3):
+                target.debug(f"Loaded wordlist {idx}")
+            for idx in range(5):
+                target.info(f"Submitted {idx}")
+        finally:
+            pipeline.stop()
+
+        messages = [line['message'] for line in _lines(stream)]
+        assert [m for m in messages if m.startswith("Persisted")] == \
+            ["Persisted image 0", "Persisted image 10", "Persisted image 20"]
+        assert [m for m in messages if m.startswith("Loaded")] == ["Loaded wordlist 0"]
+        assert len([m for m in messages if m.startswith("Submitted")]) == 5
+        assert pipeline.stats()['sampled_out'] == 24
+
+    @pytest.mark.unit
+    def test_full_queue_drops_records_and_overhead_is_per_thread(self, target):
+        """[P1] Test that a stalled listener never blocks the caller and the cost is counted on the calling thread."""
+        # GIVEN: A pipeline whose listener is not running and whose queue holds 3 records
+        pipeline = LogPipeline('json', 'INFO', stream=io.StringIO(), max_queue=3, loggers=())
+        target.addHandler(pipeline.handler)
+        try:
+            # WHEN: Logging 5 records here and 2 on another thread
+            for idx in range(5):
+                target.info("record %d", idx)
+            other = []
+            worker = threading.Thread(target=lambda: (target.info("a"), target.info("b"),
+                                                      other.append(pipeline.thread_overhead())))
+            worker.start()
+            worker.join()
+        finally:
+            target.removeHandler(pipeline.handler)
+
+        # THEN: The extra records are dropped and each thread sees only its own records
+        stats = pipeline.stats()
+        assert (stats['queued'], stats['dropped_full']) == (3, 4)
+        records, seconds = pipeline.thread_overhead()
+        assert records == 5 and 0 < seconds < 1
+        assert other[0][0] == 2
+
+    @pytest.mark.unit
+    def test_validation(self):
+        """[P2] Test rejected formats, levels and sampling rates."""
+        with pytest.raises(ValueError, match="Log format"):
+            LogPipeline('xml')
+        with pytest.raises(ValueError, match="Unknown log level"):
+            LogPipeline('json', 'LOUD')
+        with pytest.raises(ValueError, match="at least 1"):
+            SamplingFilter(0)
+        assert LogPipeline('text', 'debug').stats() == {'format': 'text', 'level': 'DEBUG', 'queued': 0,
+                                                         'sampled_out': 0, 'dropped_full': 0}
@@ -0,0 +1,210 @@
+"""Unit tests for utils.log_progress module."""
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+
+from utils.hedging import PredictionFailed
+from utils.log_progress import (
+    LOG_PARSERS,
+    LogCursor,
+    LogProgressTracker,
+    StepLineParser,
+    StepProgress,
+    TqdmParser,
+    follow_prediction,
+    get_log_parser,
+    register_log_parser,
+    run_with_logs,
+)
+
+FIXTURES = Path(__file__).resolve().parent.parent / "fixtures" / "logs"
+
+
+def _read_fixture(name: str) -> str:
+    return (FIXTURES / name).read_text(encoding="utf-8", newline="")
+
+
+class ReplayPrediction:
+    """Prediction whose logs grow by one chunk per reload, replaying a recorded log."""
+
+    def __init__(self, logs: str, chunk_size: int = 97, final_status: str = 'succeeded'):
+        self._logs = logs
+        self._chunk_size = chunk_size
+        self._final_status = final_status
+        self.length = 0
+        self.status = 'starting'
+        self.output = ["https://example.com/out-0.png"]
+        self.error = None if final_status == 'succeeded' else "CUDA out of memory"
+
+    @property
+    def logs(self):
+        return self._logs[:self.length]
+
+    def reload(self):
+        self.length = min(self.length + self._chunk_size, len(self._logs))
+        self.status = 'processing' if self.length < len(self._logs) else self._final_status
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestParsers:
+    """Tests for the built-in log parsers."""
+
+    @pytest.mark.unit
+    def test_tqdm_parser_reads_progress_bars(self):
+        """[P0] Test that tqdm bar lines yield step counters."""
+        parser = TqdmParser()
+        assert parser.parse(" 46%|████▌     | 23/50 [00:03<00:04,  6.71it/s]") == StepProgress(23, 50)
+        assert parser.parse("23/50") == StepProgress(23, 50)
+
+    @pytest.mark.unit
+    def test_tqdm_parser_ignores_dates_and_ratios(self):
+        """[P1] Test that dates, paths and impossible counters are not mistaken for steps."""
+        parser = TqdmParser()
+        assert parser.parse("2024/05/11 10:02:11 loading weights took 1.2s") is None
+        assert parser.parse("Saved image to /tmp/1/2.png") is None
+        assert parser.parse("| 60/50 [00:01<00:00]") is None
+
+    @pytest.mark.unit
+    def test_step_line_parser(self):
+        """[P1] Test explicit step lines in both styles."""
+        parser = StepLineParser()
+        assert parser.parse("Step 3/20 loss=0.1") == StepProgress(3, 20)
+        assert parser.parse("sampling step 7 of 30") == StepProgress(7, 30)
+        assert parser.parse(" 46%|████▌     | 23/50") is None
+
+    @pytest.mark.unit
+    def test_registry(self):
+        """[P1] Test that model families can register their own parsers."""
+        class DoneParser:
+            def parse(self, line):
+                return StepProgress(1, 1) if line == "done" else None
+
+        register_log_parser('done-only', DoneParser)
+        try:
+            assert isinstance(get_log_parser('done-only'), DoneParser)
+        finally:
+            LOG_PARSERS.pop('done-only')
+        with pytest.raises(ValueError, match="Unknown log parser 'nope'"):
+            get_log_parser('nope')
+
+
+class TestLogCursor:
+    """Tests for offset-based incremental log reads."""
+
+    @pytest.mark.unit
+    def test_feed_returns_only_new_complete_lines(self):
+        """[P0] Test that each feed consumes only the new tail and keeps the partial line."""
+        cursor = LogCursor()
+        assert cursor.feed("Using seed: 1\nLoad") == ["Using seed: 1"]
+        assert cursor.partial == "Load"
+        assert cursor.feed("Using seed: 1\nLoading\r  2%| 1/50") == ["Loading"]
+        assert cursor.partial == "  2%| 1/50"
+        assert cursor.offset == len("Using seed: 1\nLoading\r  2%| 1/50")
+        assert cursor.feed("Using seed: 1\nLoading\r  2%| 1/50") == []
+
+    @pytest.mark.unit
+    def test_feed_restarts_when_log_shrinks(self):
+        """[P2] Test that a reset log is read again from the start."""
+        cursor = LogCursor()
+        cursor.feed("a long first attempt\n")
+        assert cursor.feed("retry\n") == ["retry"]
+
+
+class TestLogProgressTracker:
+    """Tests for turning replayed logs into progress."""
+
+    @pytest.mark.unit
+    def test_replays_sdxl_log_with_refiner_pass(self):
+        """[P0] Test that a recorded SDXL log yields monotonic progress and a second pass for the refiner."""
+        # GIVEN: A recorded SDXL + refiner log replayed in small chunks
+        logs = _read_fixture("sdxl_refiner.log")
+        clock = FakeClock()
+        tracker = LogProgressTracker(TqdmParser(), clock=clock)
+        seen = []
+
+        # WHEN: Feeding the growing log as successive polls would
+        for end in range(0, len(logs) + 97, 97):
+            clock.now += 0.5
+            progress = tracker.update(logs[:end])
+            if progress is not None:
+                seen.append(progress)
+
+        # THEN: The base pass climbs to 40/40, then the refiner pass runs to 10/10
+        base = [p for p in seen if p.pass_number == 1]
+        refiner = [p for p in seen if p.pass_number == 2]
+        assert base[-1] == StepProgress(40, 40, 1)
+        assert [p.step for p in base] == sorted(p.step for p in base)
+        assert refiner[-1] == StepProgress(10, 10, 2)
+        assert tracker.eta() == pytest.approx(0.0)
+
+    @pytest.mark.unit
+    def test_replays_flux_log_ignoring_timestamps(self):
+        """[P1] Test that timestamps in a recorded log do not produce bogus steps."""
+        tracker = LogProgressTracker(TqdmParser())
+        progress = tracker.update(_read_fixture("flux.log"))
+        assert progress == StepProgress(28, 28, 1)
+
+    @pytest.mark.unit
+    def test_replays_step_lines(self):
+        """[P1] Test the step-line parser against its recorded log."""
+        logs = _read_fixture("step_lines.log")
+        tracker = LogProgressTracker(get_log_parser('steps'))
+        assert tracker.update(logs[:logs.index("Step 8/20")]) == StepProgress(7, 20, 1)
+        assert tracker.update(logs) == StepProgress(20, 20, 1)
+
+    @pytest.mark.unit
+    def test_eta_from_step_rate(self):
+        """[P1] Test that the ETA follows the observed step rate."""
+        clock = FakeClock()
+        tracker = LogProgressTracker(TqdmParser(), clock=clock)
+        tracker.update("| 0/50 [00:00<?]\n")
+        assert tracker.eta() is None
+        clock.now = 5.0
+        tracker.update("| 0/50 [00:00<?]\n| 10/50 [00:05<00:20]\n")
+        assert tracker.latest.fraction == pytest.approx(0.2)
+        assert tracker.eta() == pytest.approx(20.0)
+
+
+class TestFollowPrediction:
+    """Tests for polling predictions while streaming their logs."""
+
+    @pytest.mark.unit
+    def test_streams_logs_until_done(self):
+        """[P0] Test that logs are delivered after every poll and the output returned."""
+        prediction = ReplayPrediction(_read_fixture("flux.log"), chunk_size=200)
+        tracker = LogProgressTracker(TqdmParser())
+        sleep = MagicMock()
+
+        output = follow_prediction(prediction, tracker.update, poll_interval=0.5, sleep=sleep)
+
+        assert output == ["https://example.com/out-0.png"]
+        assert tracker.latest == StepProgress(28, 28, 1)
+        assert sleep.call_count >= 2
+
+    @pytest.mark.unit
+    def test_failed_prediction_raises(self):
+        """[P1] Test that failures surface with the prediction error, and a bad callback is tolerated."""
+        prediction = ReplayPrediction("boom\n", final_status='failed')
+        with pytest.raises(PredictionFailed, match="CUDA out of memory"):
+            follow_prediction(prediction, MagicMock(side_effect=RuntimeError("bad parser")), sleep=lambda _: None)
+
+    @pytest.mark.unit
+    def test_run_with_logs_creates_versioned_prediction(self):
+        """[P1] Test that run_with_logs creates the prediction like replicate.run would."""
+        client = MagicMock()
+        client.predictions.create.return_value = ReplayPrediction("| 1/1 [00:00<00:00]\n", chunk_size=1000)
+        on_logs = MagicMock()
+
+        output = run_with_logs(client, "owner/model:v1", {'prompt': 'x'}, on_logs, poll_interval=0)
+
+        client.predictions.create.assert_called_once_with(version="v1", input={'prompt': 'x'})
+        assert output == ["https://example.com/out-0.png"]
+        on_logs.assert_called_with("| 1/1 [00:00<00:00]\n")
@@ -0,0 +1,209 @@
+"""Unit tests for the main.py headless command-line runner."""
+import json
+import threading
+
+import pytest
+from PIL import Image
+from unittest.mock import patch
+
+import main as cli
+from tests.support.helpers import create_png_bytes
+
+
+# =============================================================================
+# Fixtures
+# =============================================================================
+
+
+class FakeClient:
+    """Stands in for replicate.Client, returning one URL per requested output."""
+
+    def __init__(self, fail_prompts=()):
+        self.calls = []
+        self.fail_prompts = set(fail_prompts)
+        self._lock = threading.Lock()
+
+    def run(self, ref, input=None, use_file_output=True):
+        with self._lock:
+            self.calls.append((ref, input))
+        if input['prompt'] in self.fail_prompts:
+            raise RuntimeError("prediction failed")
+        return [f"https://fake.replicate/{len(self.calls)}-{i}.png" for i in range(input.get('num_outputs', 1))]
+
+
+@pytest.fixture
+def config_files(tmp_path, monkeypatch):
+    """Write small models.yaml/presets.yaml files and return their paths.
+
+    Runs from tmp_path, since presets.yaml validation reads models.yaml from
+    the working directory.
+    """
+    monkeypatch.chdir(tmp_path)
+    models = tmp_path / "models.yaml"
+    models.write_text(
+        "models:\n"
+        "  - id: sdxl\n    name: SDXL\n    endpoint: stability-ai/sdxl:v1\n"
+        "  - id: trooper\n    name: Trooper\n    endpoint: owner/trooper:v2\n"
+    )
+    presets = tmp_path / "presets.yaml"
+    presets.write_text(
+        "presets:\n"
+        "  - id: trooper-default\n    name: Trooper\n    model_id: trooper\n"
+        "    trigger_words: [TROOPER]\n    settings:\n      num_inference_steps: 25\n"
+    )
+    return str(models), str(presets)
+
+
+def _run(argv, client):
+    """Parse argv and run the generate command with a fake client and fetcher."""
+    args = cli.build_parser().parse_args(argv)
+    png = create_png_bytes(4, 4)
+    return cli.run_generate(args, client=client, fetch=lambda url: [png[:10], png[10:]])
+
+
+# =============================================================================
+# Tests
+# =============================================================================
+
+
+class TestParseSetting:
+    """Tests for --set parsing."""
+
+    @pytest.mark.unit
+    def test_values_are_typed(self):
+        """[P1] Test that --set values are parsed as YAML scalars."""
+        assert cli.parse_setting("seed=42") == ("seed", 42)
+        assert cli.parse_setting("guidance_scale=7.5") == ("guidance_scale", 7.5)
+        assert cli.parse_setting("refine=None") == ("refine", "None")
+
+    @pytest.mark.unit
+    def test_missing_equals_is_rejected(self):
+        """[P2] Test that malformed overrides fail argument parsing."""
+        with pytest.raises(SystemExit):
+            cli.build_parser().parse_args(["generate", "--prompt", "x", "--set", "seed"])
+
+
+class TestRunGenerate:
+    """Tests for the generate command."""
+
+    @pytest.mark.unit
+    def test_prompts_from_flags_apply_presets_and_write_outputs(self, tmp_path, config_files):
+        """[P0] Test that flag prompts use presets, run concurrently and write PNGs with metadata."""
+        # GIVEN: Two prompts for a model with a trigger-word preset
+        models, presets = config_files
+        out = tmp_path / "out"
+        client = FakeClient()
+
+        # WHEN: Running generate
+        code = _run(["generate", "--prompt", "a soldier", "--prompt", "a ship", "--model", "trooper",
+                     "--set", "num_outputs=2", "--set", "seed=7", "--models", models, "--presets", presets,
+                     "--output-dir", str(out), "--concurrency", "2"], client)
+
+        # THEN: Inputs carry trigger words and preset settings; files and manifests are written
+        assert code == 0
+        inputs = sorted(call[1]['prompt'] for call in client.calls)
+        assert inputs == ["TROOPER a ship", "TROOPER a soldier"]
+        assert all(call[0] == "owner/trooper:v2" for call in client.calls)
+        assert all(call[1]['num_inference_steps'] == 25 and call[1]['seed'] == 7 for call in client.calls)
+        assert sorted(p.name for p in out.glob("*.png")) == [
+            "prompt-1_1.png", "prompt-1_2.png", "prompt-2_1.png", "prompt-2_2.png"]
+        with Image.open(out / "prompt-1_1.png") as image:
+            assert image.text['prompt'] == "TROOPER a soldier"
+            assert image.text['seed'] == "7"
+        results = [json.loads(line) for line in (out / "results.jsonl").read_text().splitlines()]
+        assert [r['files'] for r in results] == [["prompt-1_1.png", "prompt-1_2.png"],
+                                                 ["prompt-2_1.png", "prompt-2_2.png"]]
+        manifest = json.loads((out / "manifest.json").read_text())
+        assert manifest['count'] == 4
+        assert not list(out.glob("*.part"))
+
+    @pytest.mark.unit
+    def test_jsonl_file_resumes_and_reports_failures(self, tmp_path, config_files):
+        """[P0] Test that a JSONL run resumes finished rows and exits non-zero on failures."""
+        # GIVEN: A JSONL file where one row fails on the first run
+        models, presets = config_files
+        out = tmp_path / "out"
+        batch = tmp_path / "prompts.jsonl"
+        batch.write_text('{"id": "a", "prompt": "a fox"}\n{"id": "b", "prompt": "an owl", "model_id": "trooper"}\n')
+        argv = ["generate", "--file", str(batch), "--models", models, "--presets", presets, "--output-dir", str(out)]
+
+        first = _run(argv, FakeClient(fail_prompts={"TROOPER an owl"}))
+
+        # WHEN: Running again with a healthy client
+        client = FakeClient()
+        second = _run(argv, client)
+
+        # THEN: Only the failed row is re-run
+        assert first == 1
+        assert second == 0
+        assert [call[1]['prompt'] for call in client.calls] == ["TROOPER an owl"]
+        results = [json.loads(line) for line in (out / "results.jsonl").read_text().splitlines()]
+        assert [r['resumed'] for r in results] == [True, False]
+
+    @pytest.mark.unit
+    def test_template_prompts_expand_with_wordlists_and_cap(self, tmp_path, config_files):
+        """[P1] Test that a templated prompt expands to one job per combination, up to the cap."""
+        # GIVEN: A template using an alternation and a wordlist, capped at 3 prompts
+        models, presets = config_files
+        (tmp_path / "wordlists").mkdir()
+        (tmp_path / "wordlists" / "seasons.txt").write_text("# seasons\nwinter\nsummer\n")
+        out = tmp_path / "out"
+        client = FakeClient()
+
+        # WHEN: Running generate
+        code = _run(["generate", "--prompt", "a {red|arctic} fox in __seasons__", "--models", models,
+                     "--presets", presets, "--output-dir", str(out), "--max-combinations", "3",
+                     "--concurrency", "1"], client)
+
+        # THEN: The first three combinations ran, each named after the source prompt
+        assert code == 0
+        assert [call[1]['prompt'] for call in client.calls] == [
+            "a red fox in winter", "a red fox in summer", "a arctic fox in winter"]
+        results = [json.loads(line) for line in (out / "results.jsonl").read_text().splitlines()]
+        assert [r['id'] for r in results] == ["prompt-1-1", "prompt-1-2", "prompt-1-3"]
+
+    @pytest.mark.unit
+    def test_base_url_is_passed_to_client(self, tmp_path, config_files, monkeypatch):
+        """[P1] Test that --base-url targets a different API server (e.g. a local fake)."""
+        models, presets = config_files
+        monkeypatch.setenv("REPLICATE_API_TOKEN", "r8_test")
+        args = cli.build_parser().parse_args(
+            ["generate", "--prompt", "x", "--models", models, "--presets", presets,
+             "--output-dir", str(tmp_path / "out"), "--base-url", "http://127.0.0.1:8765"])
+
+        with patch('replicate.Client', return_value=FakeClient()) as mock_client:
+            cli.run_generate(args, fetch=lambda url: [create_png_bytes(2, 2)])
+
+        mock_client.assert_called_once_with(api_token="r8_test", base_url="http://127.0.0.1:8765")
+
+    @pytest.mark.unit
+    def test_main_reports_config_errors(self, tmp_path, capsys):
+        """[P1] Test that configuration errors exit with code 2 and a message."""
+        code = cli.main(["generate", "--prompt", "x", "--models", str(tmp_path / "missing.yaml")])
+
+        assert code == 2
+        assert "Error:" in capsys.readouterr().err
+
+
+class TestRunReport:
+    """Tests for the report command over the app's request log."""
+
+    @pytest.mark.unit
+    def test_report_reads_archives_and_the_live_log(self, tmp_path, capsys):
+        """[P1] Test that the report covers rotated and current entries, as text or JSON, and errors on no log."""
+        import gzip
+        log = tmp_path / "requests.jsonl"
+        entry = {'model_id': 'sdxl', 'prompt': "a red fox", 'status': 'succeeded', 'duration': 4.0}
+        (tmp_path / "requests.20261018T000000.jsonl.gz").write_bytes(gzip.compress((json.dumps(entry) + "\n").encode()))
+        log.write_text(json.dumps({**entry, 'status': 'failed', 'error_type': 'network'}) + "\n")
+
+        assert cli.main(["report", "--log", str(log), "--json"]) == 0
+        report = json.loads(capsys.readouterr().out)
+        assert report['requests'] == 2
+        assert (report['models'][0]['model'], report['models'][0]['failure_rate']) == ("sdxl", 0.5)
+        assert report['top_prompts'] == [{'prompt': "a red fox", 'count': 2}]
+
+        assert cli.main(["report", "--log", str(log)]) == 0
+        assert "sdxl" in capsys.readouterr().out
+        assert cli.main(["report", "--log", str(tmp_path / "missing.jsonl")]) == 2
+        assert "No request log" in capsys.readouterr().err
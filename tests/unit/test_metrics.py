@@ -0,0 +1,146 @@
+"""Unit tests for utils.metrics and utils.metrics_server modules."""
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from utils.metrics import AppMetrics, MetricsRegistry
+from utils.metrics_server import CONTENT_TYPE, MetricsServer
+
+
+def _samples(text: str) -> dict:
+    """Map 'name{labels}' to its value, skipping HELP/TYPE lines."""
+    return {line.rsplit(' ', 1)[0]: float(line.rsplit(' ', 1)[1])
+            for line in text.splitlines() if line and not line.startswith('#')}
+
+
+class TestRegistry:
+    """Tests for metric families and the text exposition format."""
+
+    @pytest.mark.unit
+    def test_counters_gauges_and_histograms_render_in_exposition_format(self):
+        """[P0] Test the HELP/TYPE headers, label escaping and cumulative histogram buckets."""
+        # GIVEN: One family of each type
+        registry = MetricsRegistry()
+        errors = registry.counter("app_errors_total", "Errors.", ('type',))
+        depth = registry.gauge("app_depth", "Depth.")
+        duration = registry.histogram("app_duration_seconds", "Duration.", buckets=(0.1, 1.0))
+
+        # WHEN: Recording values
+        errors.labels('network').inc()
+        errors.labels(type='say "hi"\n').inc(2)
+        depth.set(5)
+        depth.dec(2)
+        for value in (0.05, 0.1, 0.5, 3.0):
+            duration.observe(value)
+        text = registry.render()
+
+        # THEN: Each family is rendered with its headers and series
+        assert text.startswith("# HELP app_errors_total Errors.\n# TYPE app_errors_total counter\n")
+        assert "# TYPE app_duration_seconds histogram\n" in text
+        assert _samples(text) == {
+            'app_errors_total{type="network"}': 1,
+            'app_errors_total{type="say \\"hi\\"\\n"}': 2,
+            'app_depth': 3,
+            'app_duration_seconds_bucket{le="0.1"}': 2,
+            'app_duration_seconds_bucket{le="1"}': 3,
+            'app_duration_seconds_bucket{le="+Inf"}': 4,
+            'app_duration_seconds_sum': 3.65,
+            'app_duration_seconds_count': 4,
+        }
+
+    @pytest.mark.unit
+    def test_concurrent_increments_are_not_lost(self):
+        """[P1] Test that counters and histograms stay exact under concurrent updates."""
+        registry = MetricsRegistry()
+        counter = registry.counter("app_hits_total", "Hits.", ('worker',))
+        histogram = registry.histogram("app_latency_seconds", "Latency.")
+
+        def work(idx):
+            for _ in range(2000):
+                counter.labels(str(idx % 2)).inc()
+                histogram.observe(0.01)
+
+        threads = [threading.Thread(target=work, args=(idx,)) for idx in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        samples = _samples(registry.render())
+        assert samples['app_hits_total{worker="0"}'] == samples['app_hits_total{worker="1"}'] == 8000
+        assert samples['app_latency_seconds_count'] == 16000
+
+    @pytest.mark.unit
+    def test_collect_time_functions_and_validation(self, caplog):
+        """[P2] Test values read at scrape time, a failing reader, and rejected names."""
+        registry = MetricsRegistry()
+        registry.gauge("app_queue_depth", "Queue depth.", ('queue',), function=lambda: {('predictions',): 3})
+        registry.gauge("app_broken", "Broken.", function=lambda: 1 / 0)
+
+        samples = _samples(registry.render())
+        assert samples == {'app_queue_depth{queue="predictions"}': 3}
+        assert "Could not collect metric app_broken" in caplog.text
+
+        with pytest.raises(ValueError, match="already registered"):
+            registry.gauge("app_queue_depth", "Again.")
+        with pytest.raises(ValueError, match="Invalid metric name"):
+            registry.counter("app-errors", "Dashes.")
+        with pytest.raises(ValueError, match="Invalid label name"):
+            registry.histogram("app_h", "Reserved label.", ('le',))
+        with pytest.raises(ValueError, match="only go up"):
+            registry.counter("app_c_total", "Counter.").inc(-1)
+
+
+class TestAppMetrics:
+    """Tests for the app's own metrics."""
+
+    @pytest.mark.unit
+    def test_reruns_sessions_and_errors(self):
+        """[P0] Test rerun counting, the active-session window and pre-declared error types."""
+        # GIVEN: App metrics with a short active window
+        metrics = AppMetrics(active_window=0.2)
+
+        # WHEN: Two sessions rerun, one of them twice, and a submission fails
+        metrics.observe_rerun("s1", 0.02)
+        metrics.observe_rerun("s1", 0.3)
+        metrics.observe_rerun("s2", 0.04)
+        metrics.observe_rerun(None, 0.01)
+        metrics.error('network')
+        samples = _samples(metrics.registry.render())
+
+        # THEN: Reruns, durations, sessions and errors are exposed; unseen error types read 0
+        assert samples['app_reruns_total'] == 4
+        assert samples['app_rerun_duration_seconds_count'] == 4
+        assert samples['app_rerun_duration_seconds_bucket{le="0.025"}'] == 2
+        assert samples['app_active_sessions'] == 2
+        assert samples['app_replicate_errors_total{type="network"}'] == 1
+        assert samples['app_replicate_errors_total{type="replicate"}'] == 0
+
+        # AND: Sessions drop out once they stop rerunning
+        time.sleep(0.25)
+        assert metrics.active_sessions() == 0
+
+
+class TestMetricsServer:
+    """Tests for the /metrics sidecar."""
+
+    @pytest.mark.unit
+    def test_serves_metrics_and_404s_elsewhere(self):
+        """[P1] Test that GET /metrics returns the registry as Prometheus text."""
+        metrics = AppMetrics()
+        metrics.observe_rerun("s1", 0.1)
+        server = MetricsServer(metrics.registry, "127.0.0.1", 0).start()
+        try:
+            with urllib.request.urlopen(server.url, timeout=5) as response:
+                body = response.read().decode()
+                assert response.headers['Content-Type'] == CONTENT_TYPE
+            with pytest.raises(urllib.error.HTTPError) as error:
+                urllib.request.urlopen(server.url.replace("/metrics", "/"), timeout=5)
+            assert error.value.code == 404
+        finally:
+            server.stop()
+
+        assert _samples(body)['app_reruns_total'] == 1
@@ -0,0 +1,150 @@
+"""Unit tests for utils.persister module."""
+import threading
+
+import pytest
+from unittest.mock import MagicMock, patch
+
+from utils.image_store import ImageStore
+from utils.persister import BackgroundPersister, http_fetch
+
+
+@pytest.fixture
+def store(tmp_path):
+    """Create an image store in a temporary directory."""
+    return ImageStore(str(tmp_path))
+
+
+class TestHttpFetch:
+    """Tests for http_fetch() function."""
+
+    @pytest.mark.unit
+    def test_http_fetch_streams_response(self):
+        """[P1] Test that responses are streamed instead of read whole."""
+        response = MagicMock()
+        response.__enter__.return_value = response
+        response.iter_content.return_value = [b'ab', b'', b'cd']
+
+        with patch('utils.persister.requests.get', return_value=response) as mock_get:
+            chunks = list(http_fetch("https://example.com/a.png", timeout=5))
+
+        assert chunks == [b'ab', b'cd']
+        assert mock_get.call_args[1]['stream'] is True
+        response.raise_for_status.assert_called_once()
+
+
+class TestBackgroundPersister:
+    """Tests for BackgroundPersister class."""
+
+    @pytest.mark.unit
+    def test_submit_persists_in_background_and_resolves(self, store):
+        """[P0] Test that submitted URLs are stored and resolve to local paths."""
+        # GIVEN: A persister with a fake fetcher
+        persister = BackgroundPersister(store, fetch=lambda url: [b'png-', url.encode()])
+        url = "https://replicate.delivery/a/out-0.png"
+
+        # WHEN: Submitting and waiting for the queue to drain
+        assert persister.submit(url) is True
+        assert persister.wait(timeout=5)
+
+        # THEN: The URL resolves to the stored copy
+        resolved = persister.resolve(url)
+        assert resolved != url
+        assert open(resolved, 'rb').read() == b'png-' + url.encode()
+        assert persister.status(url) == 'stored'
+        assert persister.rewrite([url, "gallery/local.png"]) == [resolved, "gallery/local.png"]
+        persister.close()
+
+    @pytest.mark.unit
+    def test_submit_never_blocks_when_queue_full(self, store):
+        """[P0] Test that a full queue drops work instead of blocking the caller."""
+        # GIVEN: A single worker stuck on the first job and a queue of size 1
+        release = threading.Event()
+
+        def slow_fetch(url):
+            release.wait(5)
+            return [b'data']
+
+        persister = BackgroundPersister(store, fetch=slow_fetch, max_queue=1, workers=1)
+
+        # WHEN: Submitting more jobs than the queue can hold
+        results = [persister.submit(f"https://example.com/{i}.png") for i in range(5)]
+
+        # THEN: Extra jobs are dropped immediately and counted
+        assert results.count(False) >= 1
+        assert persister.stats()['dropped'] >= 1
+        release.set()
+        assert persister.wait(timeout=5)
+        persister.close()
+
+    @pytest.mark.unit
+    def test_retries_transient_failures(self, store):
+        """[P1] Test that failed fetches are retried with backoff."""
+        attempts = []
+
+        def flaky_fetch(url):
+            attempts.append(url)
+            if len(attempts) < 3:
+                raise ConnectionError("temporary failure")
+            return [b'ok']
+
+        persister = BackgroundPersister(store, fetch=flaky_fetch, max_retries=3, retry_backoff=0.01)
+        url = "https://example.com/flaky.png"
+
+        persister.submit(url)
+        assert persister.wait(timeout=5)
+
+        assert len(attempts) == 3
+        assert persister.status(url) == 'stored'
+        assert persister.stats()['retries'] == 2
+        persister.close()
+
+    @pytest.mark.unit
+    def test_gives_up_after_max_retries(self, store):
+        """[P1] Test that permanently failing URLs are marked failed and keep their URL."""
+        def failing_fetch(url):
+            raise ConnectionError("gone")
+
+        persister = BackgroundPersister(store, fetch=failing_fetch, max_retries=1, retry_backoff=0.01)
+        url = "https://example.com/expired.png"
+
+        persister.submit(url)
+        assert persister.wait(timeout=5)
+
+        assert persister.status(url) == 'failed'
+        assert persister.resolve(url) == url
+        assert persister.stats()['failed'] == 1
+        persister.close()
+
+    @pytest.mark.unit
+    def test_skips_non_remote_and_already_stored(self, store):
+        """[P2] Test that local paths are ignored and stored URLs are not refetched."""
+        fetch = MagicMock(return_value=[b'data'])
+        persister = BackgroundPersister(store, fetch=fetch)
+        url = "https://example.com/once.png"
+
+        assert persister.submit("gallery/puppy.png") is False
+        persister.submit(url)
+        persister.wait(timeout=5)
+        persister.submit(url)
+        persister.wait(timeout=5)
+
+        assert fetch.call_count == 1
+        persister.close()
+
+    @pytest.mark.unit
+    def test_on_stored_reports_download_time(self, store):
+        """[P1] Test that the on_stored callback receives the download duration once stored."""
+        # GIVEN: A callback recording durations, one of which raises
+        durations = []
+        persister = BackgroundPersister(store, fetch=lambda url: [b'data'])
+
+        # WHEN: Submitting two URLs with callbacks
+        persister.submit("https://example.com/a.png", on_stored=durations.append)
+        persister.submit("https://example.com/b.png", on_stored=MagicMock(side_effect=RuntimeError("boom")))
+        assert persister.wait(timeout=5)
+
+        # THEN: The duration is reported and a failing callback does not fail persistence
+        assert len(durations) == 1 and durations[0] >= 0
+        assert persister.stats()['stored'] == 2
+        assert persister._callbacks == {}
+        persister.close()
@@ -0,0 +1,125 @@
+"""Unit tests for utils.png_metadata module."""
+import io
+import json
+import zlib
+
+import pytest
+from PIL import Image
+
+from tests.support.helpers import create_png_bytes
+from utils.png_metadata import (
+    build_metadata_chunks,
+    embed_png_metadata,
+    find_iend_offset,
+    find_iend_offset_in_file,
+    generation_metadata,
+    iter_file_with_chunks,
+    make_chunk,
+    text_chunk,
+)
+
+
+class TestChunkEncoding:
+    """Tests for make_chunk() and text_chunk()."""
+
+    @pytest.mark.unit
+    def test_make_chunk_layout_and_crc(self):
+        """[P1] Test that chunks carry length, type, data and a valid CRC."""
+        chunk = make_chunk(b'tEXt', b'key\0value')
+
+        assert chunk[:4] == (9).to_bytes(4, 'big')
+        assert chunk[4:8] == b'tEXt'
+        assert chunk[8:-4] == b'key\0value'
+        assert int.from_bytes(chunk[-4:], 'big') == zlib.crc32(b'tEXtkey\0value')
+
+    @pytest.mark.unit
+    def test_text_chunk_uses_itxt_for_non_latin1(self):
+        """[P1] Test that non-Latin-1 text falls back to UTF-8 iTXt."""
+        assert text_chunk('prompt', 'café')[4:8] == b'tEXt'
+        assert text_chunk('prompt', 'rocket 🚀')[4:8] == b'iTXt'
+
+    @pytest.mark.unit
+    def test_text_chunk_rejects_invalid_keyword(self):
+        """[P2] Test that invalid PNG keywords raise ValueError."""
+        with pytest.raises(ValueError):
+            text_chunk('', 'x')
+        with pytest.raises(ValueError):
+            text_chunk('k' * 80, 'x')
+
+
+class TestEmbedPngMetadata:
+    """Tests for embed_png_metadata() function."""
+
+    @pytest.mark.unit
+    def test_embed_is_readable_and_preserves_pixels(self):
+        """[P0] Test that embedded metadata is readable and pixels are untouched."""
+        # GIVEN: A PNG and generation metadata including unicode and nested settings
+        original = create_png_bytes(16, 16)
+        metadata = generation_metadata({
+            'prompt': 'astronaut on a unicorn 🦄',
+            'negative_prompt': 'blurry',
+            'model_id': 'sdxl',
+            'endpoint': 'stability-ai/sdxl:abc',
+            'settings': {'width': 16, 'seed': 42},
+        })
+
+        # WHEN: Embedding the metadata
+        result = embed_png_metadata(original, metadata)
+
+        # THEN: Pillow sees the text chunks and decodes identical pixels
+        with Image.open(io.BytesIO(result)) as embedded, Image.open(io.BytesIO(original)) as source:
+            assert embedded.text['prompt'] == 'astronaut on a unicorn 🦄'
+            assert embedded.text['model_id'] == 'sdxl'
+            assert embedded.text['seed'] == '42'
+            assert json.loads(embedded.text['settings']) == {'seed': 42, 'width': 16}
+            assert embedded.tobytes() == source.tobytes()
+        # AND: The original bytes are a prefix/suffix split around the inserted chunks
+        offset = find_iend_offset(memoryview(original))
+        assert result[:offset] == original[:offset]
+        assert result.endswith(original[offset:])
+
+    @pytest.mark.unit
+    def test_embed_skips_none_values(self):
+        """[P2] Test that None values do not produce chunks."""
+        assert build_metadata_chunks({'seed': None}) == b''
+        original = create_png_bytes()
+        assert embed_png_metadata(original, {'seed': None}) == original
+
+    @pytest.mark.unit
+    def test_embed_rejects_non_png(self):
+        """[P1] Test that non-PNG payloads raise ValueError."""
+        with pytest.raises(ValueError, match="Not a PNG"):
+            embed_png_metadata(b'GIF89a....', {'prompt': 'x'})
+
+    @pytest.mark.unit
+    def test_embed_rejects_truncated_png(self):
+        """[P2] Test that PNGs without IEND raise ValueError."""
+        truncated = create_png_bytes()[:-12]
+        with pytest.raises(ValueError, match="IEND"):
+            embed_png_metadata(truncated, {'prompt': 'x'})
+
+
+class TestStreamingSplice:
+    """Tests for file-based IEND lookup and streaming splice."""
+
+    @pytest.mark.unit
+    def test_streamed_splice_matches_in_memory_embed(self, tmp_path):
+        """[P1] Test that streaming from disk produces the same bytes as embedding in memory."""
+        original = create_png_bytes(32, 32)
+        path = tmp_path / "image.png"
+        path.write_bytes(original)
+        chunks = build_metadata_chunks({'prompt': 'p'})
+
+        with open(path, 'rb') as f:
+            offset = find_iend_offset_in_file(f)
+        streamed = b''.join(iter_file_with_chunks(str(path), offset, chunks, chunk_size=17))
+
+        assert streamed == embed_png_metadata(original, {'prompt': 'p'})
+
+    @pytest.mark.unit
+    def test_find_iend_in_file_returns_none_for_non_png(self, tmp_path):
+        """[P2] Test that non-PNG files are reported as None instead of raising."""
+        path = tmp_path / "not.png"
+        path.write_bytes(b'plain text')
+        with open(path, 'rb') as f:
+            assert find_iend_offset_in_file(f) is None
@@ -0,0 +1,65 @@
+"""Unit tests for the profile_startup.py import-time and cold-start profiler."""
+import pytest
+
+import profile_startup
+from profile_startup import ImportRecord, parse_importtime, profile_once, summarize_imports
+
+IMPORTTIME_OUTPUT = """\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:       300 |        420 | site
+2026-10-19 07:26:52.157 Thread 'MainThread': missing ScriptRunContext!
+import time:      5000 |       5000 |     yaml.reader
+import time:      2000 |       7000 |   yaml
+import time:       900 |       9000 | config.model_loader
+"""
+
+
+class TestImportTime:
+    """Tests for parsing and summarizing -X importtime output."""
+
+    @pytest.mark.unit
+    def test_parse_importtime(self):
+        """[P1] Test that records carry self, cumulative time and nesting depth, skipping other lines."""
+        records = parse_importtime(IMPORTTIME_OUTPUT)
+
+        assert records == [
+            ImportRecord('_io', 120, 120, 1),
+            ImportRecord('site', 300, 420, 0),
+            ImportRecord('yaml.reader', 5000, 5000, 2),
+            ImportRecord('yaml', 2000, 7000, 1),
+            ImportRecord('config.model_loader', 900, 9000, 0),
+        ]
+
+    @pytest.mark.unit
+    def test_summarize_imports(self):
+        """[P1] Test the total and the top-level (cumulative) and own-time rankings."""
+        summary = summarize_imports(parse_importtime(IMPORTTIME_OUTPUT), top=2)
+
+        assert summary == {
+            'modules': 5,
+            'total_ms': 8.32,
+            'top_cumulative': [{'module': 'config.model_loader', 'ms': 9.0}, {'module': 'site', 'ms': 0.42}],
+            'top_self': [{'module': 'yaml.reader', 'ms': 5.0}, {'module': 'yaml', 'ms': 2.0}],
+        }
+
+
+class TestColdStart:
+    """Tests profiling the real app in a fresh interpreter."""
+
+    @pytest.mark.integration
+    @pytest.mark.slow
+    def test_first_render_defers_generation_modules(self):
+        """[P0] Test that first render succeeds without loading the API client or HTTP stack."""
+        result = profile_once()
+
+        assert result['exceptions'] == []
+        assert result['loaded'] == {'replicate': False, 'requests': False, 'httpx': False}
+        assert any(record.module == 'streamlit' for record in result['imports'])
+        assert result['phases_ms']['process_to_first_render'] >= result['phases_ms']['first_render'] > 0
+
+    @pytest.mark.unit
+    def test_rejects_zero_runs(self, capsys):
+        """[P2] Test that an invalid run count exits with a usage error."""
+        assert profile_startup.main(["--runs", "0"]) == 2
+        assert "runs must be at least 1" in capsys.readouterr().err
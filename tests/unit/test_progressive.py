@@ -0,0 +1,111 @@
+"""Unit tests for utils.progressive module."""
+import random
+
+import pytest
+
+from utils.progressive import (
+    ProgressiveConfig,
+    draft_settings,
+    parse_progressive,
+    plan_progressive,
+)
+from utils.result_cache import cache_key
+
+MODEL = {'id': 'sdxl', 'name': 'SDXL', 'endpoint': 'stability-ai/sdxl:v1'}
+
+
+def _presets(progressive=None):
+    preset = {'id': 'sdxl-default', 'name': 'SDXL Default', 'model_id': 'sdxl', 'trigger_words': ['SDXL'],
+              'settings': {'width': 1024, 'height': 1024, 'num_inference_steps': 50}}
+    if progressive is not None:
+        preset['progressive'] = progressive
+    return {'sdxl': [preset]}
+
+
+class TestParseProgressive:
+    """Tests for parse_progressive()."""
+
+    @pytest.mark.unit
+    def test_defaults_and_values(self):
+        """[P1] Test that a missing section gives defaults and values are copied through."""
+        assert parse_progressive(None) == ProgressiveConfig()
+        config = parse_progressive({'draft': {'num_inference_steps': 8}, 'auto_promote': True})
+        assert config.draft == {'num_inference_steps': 8}
+        assert config.final == {}
+        assert config.auto_promote is True
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("config, match", [
+        ([1], "must be a mapping"),
+        ({'drafts': {}}, "Unknown 'progressive' option"),
+        ({'draft': 12}, "progressive.draft"),
+        ({'auto_promote': 'yes'}, "auto_promote"),
+    ])
+    def test_rejects_malformed(self, config, match):
+        """[P1] Test that malformed progressive sections are rejected."""
+        with pytest.raises(ValueError, match=match):
+            parse_progressive(config)
+
+
+class TestDraftSettings:
+    """Tests for draft_settings()."""
+
+    @pytest.mark.unit
+    def test_derives_cheap_draft(self):
+        """[P0] Test quarter steps, half size in multiples of 64, no refiner, same prompt and seed."""
+        final = {'prompt': 'a fox', 'seed': 5, 'width': 1024, 'height': 768, 'num_inference_steps': 50,
+                 'refine': 'expert_ensemble_refiner'}
+
+        draft = draft_settings(final, ProgressiveConfig())
+
+        assert draft == {'prompt': 'a fox', 'seed': 5, 'width': 512, 'height': 384,
+                         'num_inference_steps': 12, 'refine': 'no_refiner'}
+
+    @pytest.mark.unit
+    def test_respects_minimums_and_overrides(self):
+        """[P1] Test floors for small renders and that preset overrides win, except prompt and seed."""
+        final = {'prompt': 'a fox', 'seed': 5, 'width': 320, 'height': 256, 'num_inference_steps': 10}
+        draft = draft_settings(final, ProgressiveConfig(draft={'width': 640, 'seed': 99, 'scheduler': 'K_EULER'}))
+        assert draft['num_inference_steps'] == 4
+        assert draft['height'] == 256
+        assert draft['width'] == 640
+        assert draft['seed'] == 5
+        assert draft['scheduler'] == 'K_EULER'
+
+
+class TestPlanProgressive:
+    """Tests for plan_progressive()."""
+
+    @pytest.mark.unit
+    def test_pairs_drafts_and_finals_by_seed(self):
+        """[P0] Test that each draft and its final share a seed and differ only in cost settings."""
+        presets = _presets({'draft': {'num_inference_steps': 8}, 'final': {'guidance_scale': 9}})
+
+        plan = plan_progressive(MODEL, presets, "a fox", count=3, seed=100)
+
+        assert [job.model_input['seed'] for job in plan.drafts] == [100, 101, 102]
+        assert [job.model_input['seed'] for job in plan.finals] == [100, 101, 102]
+        draft, final = plan.drafts[0], plan.finals[0]
+        assert draft.model_input['prompt'] == final.model_input['prompt'] == "SDXL a fox"
+        assert (draft.model_input['num_inference_steps'], final.model_input['num_inference_steps']) == (8, 50)
+        assert (draft.model_input['width'], final.model_input['width']) == (512, 1024)
+        assert final.model_input['guidance_scale'] == 9
+        assert {job.model_input['num_outputs'] for job in plan.drafts + plan.finals} == {1}
+        assert final.key == cache_key(final.endpoint, final.model_input)
+        assert (draft.record['stage'], final.record['stage']) == ('draft', 'final')
+        assert plan.auto_promote is False
+
+    @pytest.mark.unit
+    def test_random_seed_and_auto_promote(self):
+        """[P1] Test that a missing seed is drawn once and auto_promote comes from the preset."""
+        plan = plan_progressive(MODEL, _presets({'auto_promote': True}), "a fox", count=2,
+                                rng=random.Random(1))
+        seeds = [job.model_input['seed'] for job in plan.drafts]
+        assert seeds[1] == seeds[0] + 1
+        assert plan.auto_promote is True
+
+    @pytest.mark.unit
+    def test_rejects_bad_count(self):
+        """[P2] Test the draft count bounds."""
+        with pytest.raises(ValueError, match="between 1 and"):
+            plan_progressive(MODEL, {}, "a fox", count=0)
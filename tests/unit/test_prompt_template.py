@@ -0,0 +1,140 @@
+"""Unit tests for utils.prompt_template module."""
+import random
+import tracemalloc
+
+import pytest
+
+from utils.batch import BatchRow
+from utils.prompt_template import (
+    PromptTemplate,
+    WordlistLoader,
+    count_expanded,
+    expand_rows,
+    is_template,
+    render_prompt,
+)
+
+
+@pytest.fixture
+def wordlists(tmp_path):
+    """Wordlist directory with a weighted list and a nested list."""
+    (tmp_path / "colors.txt").write_text("# primary colours\nred\n\n3::blue\n")
+    (tmp_path / "animals").mkdir()
+    (tmp_path / "animals" / "pets.txt").write_text("__colors__ cat\ndog\n")
+    return WordlistLoader(str(tmp_path))
+
+
+class TestPromptTemplate:
+    """Tests for PromptTemplate parsing and expansion."""
+
+    @pytest.mark.unit
+    def test_alternation_expands_in_stable_order(self):
+        """[P0] Test that every combination is produced once, last choice varying fastest."""
+        template = PromptTemplate("a {red|blue} {cat|dog}")
+
+        assert template.count() == 4
+        assert list(template.combinations()) == ["a red cat", "a red dog", "a blue cat", "a blue dog"]
+
+    @pytest.mark.unit
+    def test_nested_and_empty_options(self):
+        """[P1] Test nested alternations and empty options, with spaces tidied."""
+        template = PromptTemplate("a {|very {big|small}} dog")
+
+        assert list(template.combinations()) == ["a dog", "a very big dog", "a very small dog"]
+
+    @pytest.mark.unit
+    def test_variables_reuse_one_choice(self):
+        """[P1] Test that ${name=...} binds a choice and ${name} repeats it."""
+        template = PromptTemplate("${c={red|blue}}a ${c} hat and ${c} shoes")
+
+        assert list(template.combinations()) == ["a red hat and red shoes", "a blue hat and blue shoes"]
+
+    @pytest.mark.unit
+    def test_weights_bias_sampling_but_not_combinations(self):
+        """[P1] Test that weights only affect random sampling."""
+        template = PromptTemplate("{9::cat|dog}")
+        rng = random.Random(0)
+
+        samples = [template.sample(rng) for _ in range(1000)]
+
+        assert list(template.combinations()) == ["cat", "dog"]
+        assert 850 < samples.count("cat") < 950
+
+    @pytest.mark.unit
+    def test_wordlists_support_weights_comments_and_nesting(self, wordlists):
+        """[P0] Test that wordlists skip comments, accept weights and may reference other lists."""
+        template = PromptTemplate("a __animals/pets__", wordlists)
+
+        assert list(template.combinations()) == ["a red cat", "a blue cat", "a dog"]
+        assert template.count() == 3
+
+    @pytest.mark.unit
+    def test_escapes_and_plain_text(self):
+        """[P2] Test that escaped characters are literal and plain prompts are not templates."""
+        assert list(PromptTemplate(r"a \{b\|c\} d").combinations()) == ["a {b|c} d"]
+        assert is_template("a plain prompt, 4k") is False
+        assert is_template("a {b|c}") and is_template("__colors__") and is_template("${x=y}")
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("text, message", [
+        ("a {b|c", "Unclosed '{'"),
+        ("a ${x}", "used before it is defined"),
+        ("a ${=b}", "Expected a variable name"),
+        ("__missing__", "not found"),
+        ("__/etc/passwd__", "Invalid wordlist name"),
+    ])
+    def test_invalid_templates_raise(self, wordlists, text, message):
+        """[P1] Test that malformed templates raise ValueError with a useful message."""
+        with pytest.raises(ValueError, match=message):
+            list(PromptTemplate(text, wordlists).combinations())
+
+    @pytest.mark.unit
+    def test_large_expansion_is_lazy(self):
+        """[P0] Test that a million-combination template is counted and iterated without materialising."""
+        template = PromptTemplate(" ".join("{a|b|c|d|e|f|g|h|i|j}" for _ in range(6)))
+
+        tracemalloc.start()
+        try:
+            combinations = template.combinations(limit=5000)
+            first = next(combinations)
+            consumed = 1 + sum(1 for _ in combinations)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        assert template.count() == 1_000_000
+        assert first == "a a a a a a"
+        assert consumed == 5000
+        assert peak < 1_000_000
+
+    @pytest.mark.unit
+    def test_render_prompt_leaves_plain_prompts_alone(self):
+        """[P1] Test that render_prompt only touches templated prompts."""
+        assert render_prompt("a {cat|cat}") == "a cat"
+        assert render_prompt("a plain prompt") == "a plain prompt"
+
+
+class TestExpandRows:
+    """Tests for expand_rows() and count_expanded()."""
+
+    @pytest.mark.unit
+    def test_rows_expand_lazily_with_stable_ids_and_cap(self):
+        """[P0] Test that templated rows fan out under the cap and plain rows pass through."""
+        rows = [
+            BatchRow(id="a", prompt="a {red|blue|green} fox", model_id="sdxl", settings={'seed': 1}),
+            BatchRow(id="b", prompt="an owl"),
+        ]
+
+        expanded = expand_rows(iter(rows), max_combinations=2)
+
+        assert next(expanded).id == "a-1"
+        remaining = list(expanded)
+        assert [(row.id, row.prompt) for row in remaining] == [("a-2", "a blue fox"), ("b", "an owl")]
+        assert remaining[0].model_id == "sdxl" and remaining[0].settings == {'seed': 1}
+        assert count_expanded(rows, max_combinations=2) == 3
+
+    @pytest.mark.unit
+    def test_count_names_the_bad_row(self):
+        """[P1] Test that template errors are reported with the row id before anything runs."""
+        with pytest.raises(ValueError, match="Row broken: Unclosed"):
+            count_expanded([BatchRow(id="broken", prompt="a {fox")])
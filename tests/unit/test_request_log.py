@@ -0,0 +1,122 @@
+"""Unit tests for utils.request_log module."""
+import gzip
+import json
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from utils.request_log import RequestLog, RequestLogReport, TopCounter, archive_paths, iter_request_log
+
+
+def _entry(idx: int, model: str = "sdxl", status: str = "succeeded", **extra) -> dict:
+    return {'model_id': model, 'prompt': f"prompt {idx % 3}", 'status': status, 'duration': 1.0 + idx, **extra}
+
+
+class TestRequestLog:
+    """Tests for batched, rotated writes."""
+
+    @pytest.mark.unit
+    def test_entries_are_batched_fsynced_and_stamped(self, tmp_path):
+        """[P0] Test that queued entries are written in batches with one fsync each, in order."""
+        # GIVEN: A request log with a long flush interval, so entries pile up into one batch
+        path = tmp_path / "logs" / "requests.jsonl"
+        with patch('utils.request_log.os.fsync') as fsync:
+            log = RequestLog(str(path), flush_interval=5.0)
+
+            # WHEN: Recording several entries and flushing
+            for idx in range(5):
+                log.record(_entry(idx))
+            assert log.flush(5)
+            log.close()
+
+        # THEN: They are on disk in order, with a UTC timestamp, after a single write and fsync
+        entries = [json.loads(line) for line in path.read_text().splitlines()]
+        assert [entry['duration'] for entry in entries] == [1.0, 2.0, 3.0, 4.0, 5.0]
+        assert entries[0]['ts'].endswith("+00:00")
+        stats = log.stats()
+        assert (stats['recorded'], stats['written'], stats['batches'], stats['dropped']) == (5, 5, 1, 0)
+        assert fsync.call_count == 1
+        assert stats['bytes'] == path.stat().st_size
+
+    @pytest.mark.unit
+    def test_rotates_by_size_and_age_into_gzip_archives(self, tmp_path):
+        """[P0] Test that a full or old file is gzipped aside and reading streams archives, then the live file."""
+        path = tmp_path / "requests.jsonl"
+        log = RequestLog(str(path), max_bytes=300, flush_interval=0)
+        try:
+            for idx in range(6):
+                log.record(_entry(idx))
+                assert log.flush(5)
+        finally:
+            log.close()
+        size_rotations = log.stats()['rotations']
+        assert size_rotations >= 1
+        assert all(len(gzip.decompress(archive.read_bytes())) <= 300 for archive in archive_paths(str(path)))
+        assert [entry['duration'] for entry in iter_request_log(str(path))] == [1.0, 2.0, 3.0, 4.0, 5.0, 6.0]
+
+        # A restarted log picks up the existing file and rotates it once its first entry is too old
+        old = {'ts': "2026-01-01T00:00:00.000+00:00", **_entry(6)}
+        path.write_text(json.dumps(old) + "\n")
+        with patch('utils.request_log.time.strftime', return_value="20990101T000000"):
+            log = RequestLog(str(path), max_age=3600, flush_interval=0)
+            log.record(_entry(7))
+            assert log.flush(5)
+            log.close()
+        assert log.stats()['rotations'] == 1
+        assert archive_paths(str(path))[-1].name == "requests.20990101T000000.jsonl.gz"
+        assert [json.loads(line)['duration'] for line in path.read_text().splitlines()] == [8.0]
+
+    @pytest.mark.unit
+    def test_full_queue_drops_without_blocking_and_bad_lines_are_skipped(self, tmp_path):
+        """[P1] Test that a stalled writer never blocks record() and a torn last line is skipped when reading."""
+        path = tmp_path / "requests.jsonl"
+        release = threading.Event()
+        log = RequestLog(str(path), max_queue=2, batch_size=1, flush_interval=0)
+        with patch.object(log, '_write', side_effect=lambda batch: release.wait(5)):
+            started = time.perf_counter()
+            for idx in range(10):
+                log.record(_entry(idx))
+            assert time.perf_counter() - started < 1
+            release.set()
+            assert log.flush(5)
+        log.close()
+        assert log.stats()['dropped'] >= 7
+
+        path.write_text(json.dumps(_entry(0)) + "\n[1, 2]\n" + '{"model_id": "sd')
+        assert len(list(iter_request_log(str(path)))) == 1
+        assert list(iter_request_log(str(tmp_path / "missing.jsonl"))) == []
+
+
+class TestRequestLogReport:
+    """Tests for the streaming analytics over the log."""
+
+    @pytest.mark.unit
+    def test_per_model_volume_latency_failures_and_top_prompts(self):
+        """[P0] Test per-model counts, failure rate, latency percentiles and the most frequent prompts."""
+        report = RequestLogReport(top=2)
+        for idx in range(20):
+            report.add(_entry(idx, timings={'queue': 0.5, 'predict': 2.0}))
+        for idx in range(5):
+            report.add(_entry(idx, model="flux", status="failed", error_type="network"))
+        report.add({'endpoint': "owner/model:v1", 'status': "failed"})
+
+        sdxl, flux, other = report.models()
+        assert (sdxl['model'], sdxl['requests'], sdxl['failed'], sdxl['failure_rate']) == ("sdxl", 20, 0, 0)
+        assert sdxl['p50'] == pytest.approx(10.5, abs=1.5) and sdxl['max'] == 20.0
+        assert (sdxl['queue_p95'], sdxl['predict_p95']) == (0.5, 2.0)
+        assert (flux['failure_rate'], flux['errors'], flux['predict_p95']) == (1.0, {'network': 5}, None)
+        assert (other['model'], other['errors']) == ("owner/model:v1", {'unknown': 1})
+        assert report.top_prompts() == [("prompt 0", 9), ("prompt 1", 9)]
+        text = report.format()
+        assert text.startswith("26 request(s)") and "Top prompts:" in text
+
+    @pytest.mark.unit
+    def test_top_counter_keeps_heavy_hitters_in_constant_memory(self):
+        """[P2] Test that frequent values survive a long tail of distinct ones."""
+        counter = TopCounter(capacity=10)
+        for idx in range(5000):
+            counter.add("popular" if idx % 4 == 0 else f"rare {idx}")
+        assert len(counter._counts) == 10
+        assert counter.top(1)[0][0] == "popular"
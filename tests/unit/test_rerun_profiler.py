@@ -0,0 +1,121 @@
+"""Unit tests for utils.rerun_profiler module."""
+import json
+import pstats
+import threading
+import time
+
+import pytest
+
+from utils.rerun_profiler import RerunProfile, RerunProfiler, _safe_tag
+
+
+def _busy(seconds: float) -> int:
+    deadline = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < deadline:
+        total += sum(range(200))
+    return total
+
+
+def _profile(profiler, seconds=0.0, **tags):
+    with profiler.profile() as rerun:
+        _busy(seconds)
+        rerun.tags.update(tags)
+    return rerun
+
+
+class TestSpeedscopeProfiles:
+    """Tests for sampled flamegraph profiles."""
+
+    @pytest.mark.unit
+    def test_sampled_profile_is_written_with_tags(self, tmp_path):
+        """[P0] Test that a rerun is sampled into a speedscope file named after its tags."""
+        # GIVEN: A sampling profiler
+        profiler = RerunProfiler(str(tmp_path), fmt='speedscope', interval=0.001)
+
+        # WHEN: Profiling a busy rerun
+        rerun = _profile(profiler, 0.1, session_id="3f2a9c1e-77", model_id="flux_dev", interaction="edit-width")
+
+        # THEN: The file carries the tags and a sampled profile of the busy function
+        profile = rerun.profile
+        assert (profile.session_id, profile.model_id, profile.interaction) == ("3f2a9c1e", "flux-dev", "edit-width")
+        assert profile.duration >= 0.1
+        assert profile.path.name.endswith(".speedscope.json")
+        data = json.loads(profile.path.read_text())
+        assert data['$schema'] == "https://www.speedscope.app/file-format-schema.json"
+        sampled = data['profiles'][0]
+        assert sampled['type'] == 'sampled'
+        assert len(sampled['samples']) == len(sampled['weights']) > 0
+        names = [frame['name'] for frame in data['shared']['frames']]
+        assert '_busy' in names
+        # Stacks are ordered from the root: the caller comes before the busy function
+        assert any(stack.index(names.index('_busy')) > stack.index(names.index('_profile'))
+                   for stack in sampled['samples'] if names.index('_busy') in stack)
+
+
+class TestPstatsProfiles:
+    """Tests for deterministic cProfile profiles."""
+
+    @pytest.mark.unit
+    def test_pstats_profile_loads_and_concurrent_reruns_are_skipped(self, tmp_path):
+        """[P1] Test that pstats files load, and a rerun overlapping a cProfile run is left unprofiled."""
+        profiler = RerunProfiler(str(tmp_path), fmt='pstats')
+        inside, release = threading.Event(), threading.Event()
+
+        def slow_rerun():
+            with profiler.profile() as rerun:
+                inside.set()
+                release.wait(5)
+                rerun.tags['interaction'] = 'generate'
+
+        thread = threading.Thread(target=slow_rerun)
+        thread.start()
+        inside.wait(5)
+        skipped = _profile(profiler, interaction='rerun')
+        release.set()
+        thread.join()
+
+        assert skipped.profile is None
+        assert profiler.stats()['skipped_busy'] == 1
+        [profile] = profiler.recent()
+        assert profile.interaction == 'generate'
+        assert pstats.Stats(str(profile.path)).total_calls > 0
+
+
+class TestProfileRing:
+    """Tests for the bounded on-disk ring."""
+
+    @pytest.mark.unit
+    def test_oldest_profiles_are_evicted_and_ring_survives_restart(self, tmp_path):
+        """[P0] Test that only max_files profiles are kept and a new profiler picks them up."""
+        # GIVEN: A ring of two profiles
+        profiler = RerunProfiler(str(tmp_path), fmt='speedscope', max_files=2)
+
+        # WHEN: Three reruns are profiled
+        first = _profile(profiler, interaction='initial')
+        _profile(profiler, 0.05, interaction='generate')
+        _profile(profiler, interaction='rerun')
+
+        # THEN: The oldest file is gone and the slowest rerun is listed first
+        assert not first.profile.path.exists()
+        assert len(list(tmp_path.iterdir())) == 2
+        assert [p.interaction for p in profiler.recent()] == ['rerun', 'generate']
+        assert profiler.slowest(1)[0].interaction == 'generate'
+        assert profiler.stats()['evicted'] == 1
+
+        # AND: After a restart with a smaller ring, the directory is read back and trimmed
+        (tmp_path / "notes.txt").write_text("not a profile")
+        restarted = RerunProfiler(str(tmp_path), fmt='pstats', max_files=1)
+        assert [p.interaction for p in restarted.recent()] == ['rerun']
+        assert (tmp_path / "notes.txt").exists()
+
+    @pytest.mark.unit
+    def test_tags_and_config_validation(self, tmp_path):
+        """[P2] Test file-name-safe tags and rejected settings."""
+        assert _safe_tag("owner/model_v2 beta") == "owner-model-v2-beta"
+        assert _safe_tag(None) == "-"
+        assert RerunProfile.from_path(tmp_path / "notes.txt") is None
+        with pytest.raises(ValueError, match="Profile format"):
+            RerunProfiler(str(tmp_path), fmt='flamegraph')
+        with pytest.raises(ValueError, match="max_files"):
+            RerunProfiler(str(tmp_path), max_files=0)
@@ -0,0 +1,71 @@
+"""Unit tests for utils.result_cache module."""
+import json
+
+import pytest
+
+from utils.batch import BatchJob, run_batch
+from utils.result_cache import ResultCache, cache_key
+
+
+class TestCacheKey:
+    """Tests for cache_key() function."""
+
+    @pytest.mark.unit
+    def test_key_ignores_dict_order_but_not_values(self):
+        """[P1] Test that keys are canonical over input ordering."""
+        assert cache_key("a/b:v", {'x': 1, 'y': 2}) == cache_key("a/b:v", {'y': 2, 'x': 1})
+        assert cache_key("a/b:v", {'x': 1}) != cache_key("a/b:v", {'x': 2})
+        assert cache_key("a/b:v1", {'x': 1}) != cache_key("a/b:v2", {'x': 1})
+
+
+class TestResultCache:
+    """Tests for ResultCache class."""
+
+    @pytest.mark.unit
+    def test_persists_across_instances(self, tmp_path):
+        """[P0] Test that cached outputs survive a restart."""
+        path = tmp_path / "cache.jsonl"
+        ResultCache(str(path)).put("k1", ["https://example.com/a.png"])
+
+        reloaded = ResultCache(str(path))
+
+        assert reloaded.get("k1") == ["https://example.com/a.png"]
+        assert reloaded.get("missing") is None
+        assert reloaded.stats() == {'entries': 1, 'hits': 1, 'misses': 1}
+
+    @pytest.mark.unit
+    def test_evicts_least_recently_used(self):
+        """[P1] Test LRU eviction once max_entries is reached."""
+        cache = ResultCache(max_entries=2)
+        cache.put("a", ["1"])
+        cache.put("b", ["2"])
+        cache.get("a")
+        cache.put("c", ["3"])
+
+        assert "a" in cache and "c" in cache
+        assert "b" not in cache
+
+    @pytest.mark.unit
+    def test_compacts_superseded_lines_on_load(self, tmp_path):
+        """[P2] Test that a file full of overwritten entries is rewritten on load."""
+        path = tmp_path / "cache.jsonl"
+        path.write_text("".join(json.dumps({'key': 'k', 'outputs': [str(i)]}) + '\n' for i in range(10)))
+
+        cache = ResultCache(str(path))
+
+        assert cache.get("k") == ["9"]
+        assert len(path.read_text().splitlines()) == 1
+
+    @pytest.mark.unit
+    def test_deduplicates_batch_jobs(self):
+        """[P0] Test that run_batch skips jobs whose key is already cached."""
+        cache = ResultCache()
+        jobs = [BatchJob(index=i, key=f"k{i}", endpoint="a/b:v", model_input={'i': i}, record={}) for i in range(3)]
+        cache.put("k1", ["cached.png"])
+        calls = []
+
+        results = run_batch(jobs, lambda job: calls.append(job.key) or [f"{job.key}.png"], checkpoint=cache)
+
+        assert sorted(calls) == ["k0", "k2"]
+        assert [r.outputs for r in results] == [["k0.png"], ["cached.png"], ["k2.png"]]
+        assert cache.get("k2") == ["k2.png"]
@@ -0,0 +1,203 @@
+"""Unit tests for utils.routing module."""
+import random
+import threading
+
+import pytest
+
+from utils.hedging import PredictionCanceled, PredictionFailed
+from utils.routing import Route, Router, model_routes, parse_routes, run_deployment
+
+
+class StubReplicateAPI:
+    """
+    In-process stand-in for the Replicate predictions API.
+
+    ``predictions.create(deployment=...)`` returns a prediction that succeeds
+    unless the deployment is listed in ``down``, or is canceled (as a superseded
+    prediction is) if ``cancel_all`` is set; every call is recorded.
+    """
+
+    def __init__(self, down=(), cancel_all=False):
+        self.down = set(down)
+        self.cancel_all = cancel_all
+        self.calls = []
+        self.predictions = self
+        self._lock = threading.Lock()
+
+    def create(self, deployment=None, version=None, input=None):
+        with self._lock:
+            self.calls.append(deployment or version)
+        target = deployment or version
+        return _StubPrediction(target, failed=target in self.down, canceled=self.cancel_all)
+
+
+class _StubPrediction:
+    def __init__(self, target, failed, canceled=False):
+        self.target = target
+        self.failed = failed
+        self.canceled = canceled
+        self.status = 'starting'
+        self.output = None
+        self.error = None
+
+    def wait(self):
+        if self.canceled:
+            self.status = 'canceled'
+        elif self.failed:
+            self.status, self.error = 'failed', "deployment unavailable"
+        else:
+            self.status, self.output = 'succeeded', [f"https://example.com/{self.target}.png"]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+MODEL = {
+    'id': 'trooper',
+    'endpoint': 'owner/trooper:v1',
+    'routes': [
+        {'deployment': 'owner/trooper-prod', 'weight': 3},
+        {'deployment': 'owner/trooper-canary', 'weight': 1, 'name': 'canary'},
+    ],
+}
+
+
+def _api_runner(api):
+    """run_fn that sends deployment routes to the stub API and endpoint routes to a plain success."""
+    def run_fn(route, model_input):
+        if route.kind == 'deployment':
+            return run_deployment(api, route.target, model_input)
+        api.calls.append(route.target)
+        return [f"https://example.com/{route.target}.png"]
+    return run_fn
+
+
+class TestParseRoutes:
+    """Tests for parse_routes() and model_routes()."""
+
+    @pytest.mark.unit
+    def test_routes_with_implicit_endpoint_fallback(self):
+        """[P0] Test that configured routes keep their order and the model endpoint becomes a fallback."""
+        routes = parse_routes(MODEL)
+
+        assert [(r.kind, r.target, r.weight, r.fallback) for r in routes] == [
+            ('deployment', 'owner/trooper-prod', 3.0, False),
+            ('deployment', 'owner/trooper-canary', 1.0, False),
+            ('endpoint', 'owner/trooper:v1', 1.0, True),
+        ]
+        assert routes[1].label == 'canary'
+        assert parse_routes({'id': 'x', 'endpoint': 'a/b:v'}) == []
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("routes, message", [
+        ([], "non-empty list"),
+        ([{'deployment': 'a/b', 'endpoint': 'a/b:v'}], "exactly one of"),
+        ([{'deployment': 'nodash'}], "owner/name"),
+        ([{'deployment': 'a/b', 'weight': 0}], "positive number"),
+        ([{'deployment': 'a/b', 'region': 'eu'}], "unknown option"),
+        ([{'deployment': 'a/b', 'fallback': True}], "not a fallback"),
+    ])
+    def test_invalid_routes_raise(self, routes, message):
+        """[P1] Test that malformed routes raise ValueError naming the problem."""
+        with pytest.raises(ValueError, match=message):
+            model_routes([{'id': 'x', 'endpoint': 'a/b:v', 'routes': routes}])
+
+
+class TestRouter:
+    """Tests for Router route selection and failover against a stub API."""
+
+    @pytest.mark.unit
+    def test_traffic_follows_weights_and_skips_fallback(self):
+        """[P0] Test that healthy routes share traffic by weight and the fallback gets none."""
+        api = StubReplicateAPI()
+        router = Router(model_routes([MODEL]), rng=random.Random(1))
+
+        for _ in range(400):
+            router.run('owner/trooper:v1', {'prompt': 'x'}, _api_runner(api))
+
+        prod, canary = api.calls.count('owner/trooper-prod'), api.calls.count('owner/trooper-canary')
+        assert prod + canary == 400
+        assert 2.0 < prod / canary < 4.5
+        assert 'owner/trooper:v1' not in api.calls
+
+    @pytest.mark.unit
+    def test_fails_over_and_takes_broken_route_out_of_rotation(self):
+        """[P0] Test automatic failover and the cooldown after repeated failures."""
+        # GIVEN: The production deployment is down
+        api = StubReplicateAPI(down={'owner/trooper-prod'})
+        clock = FakeClock()
+        router = Router(model_routes([MODEL]), failure_threshold=2, cooldown=30, clock=clock,
+                        rng=random.Random(0))
+        run_fn = _api_runner(api)
+
+        # WHEN: Running predictions until prod has failed twice
+        outputs = [router.run('owner/trooper:v1', {'prompt': 'x'}, run_fn) for _ in range(20)]
+
+        # THEN: Every request succeeded, and prod was tried only until its circuit opened
+        assert all(output == ["https://example.com/owner/trooper-canary.png"] for output in outputs)
+        assert api.calls.count('owner/trooper-prod') == 2
+        prod = next(s for s in router.stats()['owner/trooper:v1'] if s['route'] == 'deployment:owner/trooper-prod')
+        assert prod['healthy'] is False and prod['failures'] == 2
+
+        # AND: After the cooldown, prod gets traffic again
+        clock.now = 31
+        api.down.clear()
+        for _ in range(20):
+            router.run('owner/trooper:v1', {'prompt': 'x'}, run_fn)
+        assert api.calls.count('owner/trooper-prod') > 2
+
+    @pytest.mark.unit
+    def test_canceled_prediction_is_final_and_not_held_against_the_route(self):
+        """[P0] Test that a superseded prediction is neither failed over nor counted toward the circuit breaker."""
+        # GIVEN: Every prediction gets canceled, as when the user keeps resubmitting
+        api = StubReplicateAPI(cancel_all=True)
+        router = Router(model_routes([MODEL]), failure_threshold=2, rng=random.Random(0))
+
+        # WHEN: Running more predictions than the failure threshold
+        for _ in range(5):
+            with pytest.raises(PredictionCanceled):
+                router.run('owner/trooper:v1', {'prompt': 'x'}, _api_runner(api))
+
+        # THEN: Each created exactly one prediction, and every route is still healthy and idle
+        assert len(api.calls) == 5
+        for route in router.stats()['owner/trooper:v1']:
+            assert (route['healthy'], route['failures'], route['in_flight']) == (True, 0, 0)
+
+    @pytest.mark.unit
+    def test_all_routes_down_falls_back_to_endpoint_then_raises(self):
+        """[P1] Test that the model endpoint is the last resort and the last error surfaces."""
+        api = StubReplicateAPI(down={'owner/trooper-prod', 'owner/trooper-canary'})
+        router = Router(model_routes([MODEL]), rng=random.Random(0))
+
+        assert router.run('owner/trooper:v1', {}, _api_runner(api)) == ["https://example.com/owner/trooper:v1.png"]
+
+        def always_fail(route, model_input):
+            raise PredictionFailed(f"{route.target} down")
+
+        with pytest.raises(PredictionFailed, match="owner/trooper:v1 down"):
+            router.run('owner/trooper:v1', {}, always_fail)
+
+    @pytest.mark.unit
+    def test_busy_and_slow_routes_lose_first_choice(self):
+        """[P1] Test that queue depth and latency lower a route's share."""
+        clock = FakeClock()
+        fast = Route('deployment', 'o/fast')
+        slow = Route('deployment', 'o/slow')
+        router = Router({'o/m:v': [fast, slow]}, clock=clock, rng=random.Random(3))
+
+        def timed(route, model_input):
+            clock.now += 10.0 if route is slow else 1.0
+            return []
+
+        for _ in range(50):
+            router.run('o/m:v', {}, timed)
+
+        latencies = {s['route']: s['latency'] for s in router.stats()['o/m:v']}
+        assert latencies['deployment:o/slow'] > latencies['deployment:o/fast']
+        firsts = [router.plan('o/m:v')[0] for _ in range(200)]
+        assert firsts.count(fast) > 150
@@ -0,0 +1,111 @@
+"""Unit tests for utils.sweep module."""
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from utils.batch import BatchJob, BatchResult
+from utils.sweep import (
+    build_contact_sheet,
+    expand_grid,
+    load_thumbnails,
+    parse_values,
+    plan_sweep,
+    tile_grid,
+)
+
+MODEL = {'id': 'sdxl', 'name': 'SDXL', 'endpoint': 'stability-ai/sdxl:v1'}
+
+
+def _png(color) -> bytes:
+    """Encode a small solid-colour PNG."""
+    buffer = io.BytesIO()
+    Image.new('RGB', (40, 20), color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class TestGridExpansion:
+    """Tests for parse_values() and expand_grid()."""
+
+    @pytest.mark.unit
+    def test_parse_values_casts_and_dedupes(self):
+        """[P1] Test comma-separated parsing with duplicates removed."""
+        assert parse_values("5, 7.5, 5,, 10", float) == [5.0, 7.5, 10.0]
+        with pytest.raises(ValueError, match="Invalid value 'x'"):
+            parse_values("10, x", int)
+
+    @pytest.mark.unit
+    def test_expand_grid_is_cartesian_product(self):
+        """[P0] Test that every combination appears exactly once."""
+        grid = expand_grid({'guidance_scale': [5, 7.5, 5], 'scheduler': ['DDIM', 'K_EULER'], 'unused': []})
+
+        assert len(grid) == 4
+        assert grid[0] == {'guidance_scale': 5, 'scheduler': 'DDIM'}
+        assert grid[-1] == {'guidance_scale': 7.5, 'scheduler': 'K_EULER'}
+
+
+class TestPlanSweep:
+    """Tests for plan_sweep() function."""
+
+    @pytest.mark.unit
+    def test_layout_and_inputs(self):
+        """[P0] Test column/row layout, fixed seed and single output per cell."""
+        plan = plan_sweep(MODEL, {}, "a fox",
+                          {'guidance_scale': [5.0, 10.0], 'num_inference_steps': [20, 40], 'scheduler': ['DDIM']},
+                          base_settings={'seed': 42}, column_param='guidance_scale')
+
+        assert plan.columns == 2
+        assert plan.row_labels == ["num_inference_steps=20, scheduler=DDIM", "num_inference_steps=40, scheduler=DDIM"]
+        assert plan.column_labels == ["guidance_scale=5.0", "guidance_scale=10.0"]
+        assert [(j.model_input['num_inference_steps'], j.model_input['guidance_scale']) for j in plan.jobs] == [
+            (20, 5.0), (20, 10.0), (40, 5.0), (40, 10.0)]
+        assert {j.model_input['seed'] for j in plan.jobs} == {42}
+        assert {j.model_input['num_outputs'] for j in plan.jobs} == {1}
+        assert len({j.key for j in plan.jobs}) == 4
+
+    @pytest.mark.unit
+    def test_rejects_empty_and_oversized_sweeps(self):
+        """[P1] Test that empty or too-large grids raise ValueError."""
+        with pytest.raises(ValueError, match="at least one value"):
+            plan_sweep(MODEL, {}, "a fox", {'guidance_scale': []})
+        with pytest.raises(ValueError, match="limit is 4"):
+            plan_sweep(MODEL, {}, "a fox", {'guidance_scale': [1.0, 2.0, 3.0], 'num_inference_steps': [1, 2]},
+                       max_cells=4)
+
+
+class TestContactSheet:
+    """Tests for thumbnail loading and NumPy tiling."""
+
+    @pytest.mark.unit
+    def test_tile_grid_places_cells_row_major(self):
+        """[P0] Test that cells land in the right tile and gaps are grey."""
+        cells = [np.full((2, 2, 3), value, dtype=np.uint8) for value in (10, 20, 30)] + [None]
+
+        grid = tile_grid(cells, rows=2, columns=2, cell_size=2)
+
+        assert grid.shape == (4, 4, 3)
+        assert grid[0, 0, 0] == 10 and grid[0, 2, 0] == 20
+        assert grid[2, 0, 0] == 30
+        assert tuple(grid[3, 3]) == (200, 200, 200)
+
+    @pytest.mark.unit
+    def test_build_contact_sheet_from_results(self):
+        """[P1] Test that results become one labelled sheet with failed cells greyed out."""
+        job = BatchJob(index=0, key="k", endpoint="e", model_input={}, record={'job_id': 'x'})
+        results = [
+            BatchResult(job=job, outputs=["red"]),
+            BatchResult(job=job, error="boom"),
+            BatchResult(job=job, outputs=["blue"]),
+            BatchResult(job=job, outputs=["broken"]),
+        ]
+        images = {'red': _png((255, 0, 0)), 'blue': _png((0, 0, 255)), 'broken': b'not a png'}
+
+        thumbnails = load_thumbnails(results, lambda url: io.BytesIO(images[url]), cell_size=32)
+        sheet = np.asarray(build_contact_sheet(thumbnails, ["row 1", "row 2"], ["col 1", "col 2"], cell_size=32))
+
+        assert thumbnails[1] is None and thumbnails[3] is None
+        assert sheet.shape == (28 + 64, 200 + 64, 3)
+        assert tuple(sheet[28 + 16, 200 + 16]) == (255, 0, 0)
+        assert tuple(sheet[28 + 48, 200 + 16]) == (0, 0, 255)
+        assert tuple(sheet[28 + 16, 200 + 48]) == (200, 200, 200)
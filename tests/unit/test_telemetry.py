@@ -0,0 +1,165 @@
+"""Unit tests for utils.telemetry module."""
+import random
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+from utils.telemetry import (
+    LatencyStats,
+    P2Quantile,
+    TelemetryStore,
+    progress_fraction,
+    setting_bucket,
+)
+
+
+class TestP2Quantile:
+    """Tests for the P² streaming quantile estimator."""
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("p", [0.5, 0.95])
+    def test_estimate_tracks_exact_percentile(self, p):
+        """[P0] Test that P² stays close to the exact percentile of a skewed stream."""
+        # GIVEN: 20k exponentially distributed latencies
+        rng = random.Random(7)
+        values = [rng.expovariate(1 / 12) for _ in range(20000)]
+
+        # WHEN: Streaming them through the estimator
+        estimator = P2Quantile(p)
+        for value in values:
+            estimator.add(value)
+
+        # THEN: The estimate is within 3% of numpy's percentile
+        exact = float(np.percentile(values, p * 100))
+        assert estimator.value() == pytest.approx(exact, rel=0.03)
+
+    @pytest.mark.unit
+    def test_memory_is_constant(self):
+        """[P0] Test that the estimator keeps five markers however many values it sees."""
+        estimator = P2Quantile(0.95)
+        for value in range(10):
+            estimator.add(float(value))
+        size_after_ten = sys.getsizeof(estimator._heights)
+
+        for value in range(100000):
+            estimator.add(float(value % 97))
+
+        assert len(estimator._heights) == 5
+        assert sys.getsizeof(estimator._heights) == size_after_ten
+        assert estimator.count == 100010
+
+    @pytest.mark.unit
+    def test_exact_for_first_samples(self):
+        """[P1] Test nearest-rank results before the markers are initialized."""
+        estimator = P2Quantile(0.5)
+        assert estimator.value() is None
+        for value in (9.0, 1.0, 5.0):
+            estimator.add(value)
+        assert estimator.value() == 5.0
+
+    @pytest.mark.unit
+    def test_rejects_invalid_quantile(self):
+        """[P2] Test that quantiles outside (0, 1) are rejected."""
+        with pytest.raises(ValueError):
+            P2Quantile(1.0)
+
+
+class TestLatencyStats:
+    """Tests for LatencyStats aggregates."""
+
+    @pytest.mark.unit
+    def test_as_dict(self):
+        """[P1] Test count, mean and max alongside the percentiles."""
+        stats = LatencyStats()
+        assert stats.as_dict()['mean'] is None
+        for seconds in (2.0, 4.0, 6.0):
+            stats.add(seconds)
+        summary = stats.as_dict()
+        assert summary['count'] == 3
+        assert summary['mean'] == pytest.approx(4.0)
+        assert summary['max'] == 6.0
+        assert summary['p50'] == 4.0
+
+
+class TestTelemetryStore:
+    """Tests for TelemetryStore recording and estimates."""
+
+    @pytest.mark.unit
+    def test_setting_bucket(self):
+        """[P2] Test the resolution × steps bucket label."""
+        assert setting_bucket({'width': 1024, 'height': 768, 'num_inference_steps': 30}) == "1024x768@30"
+        assert setting_bucket({}) == "?x?@?"
+
+    @pytest.mark.unit
+    def test_estimate_prefers_bucket_then_model(self):
+        """[P0] Test that a bucket with enough samples wins over the model-wide median."""
+        # GIVEN: Many fast small generations and a few slow large ones
+        store = TelemetryStore()
+        small = {'width': 512, 'height': 512, 'num_inference_steps': 20}
+        large = {'width': 1024, 'height': 1024, 'num_inference_steps': 50}
+        for _ in range(10):
+            store.record('sdxl', small, {'total': 5.0})
+
+        # THEN: An unseen bucket falls back to the model-wide median
+        assert store.estimate('sdxl', large) == pytest.approx(5.0)
+        assert store.estimate('other', large) is None
+
+        # WHEN: The large bucket gets enough samples of its own
+        for _ in range(3):
+            store.record('sdxl', large, {'total': 30.0})
+
+        # THEN: Its own median is used
+        assert store.estimate('sdxl', large) == pytest.approx(30.0)
+        assert store.estimate('sdxl', small) == pytest.approx(5.0)
+
+    @pytest.mark.unit
+    def test_snapshot_and_throughput(self):
+        """[P1] Test admin rows per model, bucket and phase, and generation counts."""
+        store = TelemetryStore()
+        settings = {'width': 1024, 'height': 1024, 'num_inference_steps': 50}
+        store.record('sdxl', settings, {'queue': 0.5, 'predict': 9.5, 'total': 10.0, 'bogus': 1.0})
+        store.record('sdxl', settings, {'download': 1.2})
+
+        rows = store.snapshot()
+
+        assert [(r['bucket'], r['phase']) for r in rows] == [
+            ('*', 'queue'), ('*', 'predict'), ('*', 'download'), ('*', 'total'),
+            ('1024x1024@50', 'queue'), ('1024x1024@50', 'predict'),
+            ('1024x1024@50', 'download'), ('1024x1024@50', 'total'),
+        ]
+        assert rows[3]['p95'] == 10.0
+        assert store.throughput() == {'sdxl': 1}
+
+    @pytest.mark.unit
+    def test_concurrent_records(self):
+        """[P1] Test that concurrent writers do not lose samples."""
+        store = TelemetryStore()
+        settings = {'width': 512, 'height': 512, 'num_inference_steps': 20}
+
+        def writer():
+            for _ in range(500):
+                store.record('sdxl', settings, {'total': 1.0})
+
+        threads = [threading.Thread(target=writer) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert store.throughput() == {'sdxl': 2000}
+
+
+class TestProgressFraction:
+    """Tests for progress_fraction()."""
+
+    @pytest.mark.unit
+    def test_progress_never_completes_early(self):
+        """[P1] Test linear progress up to 90% and a slow creep below 99% after."""
+        assert progress_fraction(5, None) == 0.0
+        assert progress_fraction(5, 10) == pytest.approx(0.5)
+        overdue = [progress_fraction(elapsed, 10) for elapsed in (9, 10, 20, 1000)]
+        assert overdue == sorted(overdue)
+        assert all(fraction < 1.0 for fraction in overdue)
+        assert overdue[-1] == pytest.approx(0.99)
@@ -0,0 +1,182 @@
+"""Unit tests for utils.tracing module."""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utils.tracing import JsonlSpanExporter, OtlpSpanExporter, Tracer, build_exporter, otlp_payload
+
+
+class ListExporter:
+    """Collects exported batches in memory."""
+
+    def __init__(self, fail: bool = False):
+        self.batches = []
+        self.fail = fail
+
+    def export(self, spans):
+        if self.fail:
+            raise ConnectionError("collector down")
+        self.batches.append(list(spans))
+
+    @property
+    def spans(self):
+        return [span for batch in self.batches for span in batch]
+
+
+class TestSpans:
+    """Tests for span nesting, timing and export."""
+
+    @pytest.mark.unit
+    def test_nested_spans_share_a_trace_and_threads_attach_by_parent(self, tmp_path):
+        """[P0] Test that spans nest through the context, other threads attach by parent or bind, and JSONL is written."""
+        # GIVEN: A tracer writing JSONL
+        tracer = Tracer(JsonlSpanExporter(str(tmp_path / "traces" / "spans.jsonl")))
+
+        # WHEN: Opening nested spans, one failing, plus a span recorded from another thread
+        with tracer.span("submission", model_id="sdxl") as root:
+            with tracer.span("build_input", num_outputs=2, skipped=None):
+                pass
+            with pytest.raises(TimeoutError):
+                with tracer.span("prediction"):
+                    raise TimeoutError("took too long")
+            workers = [threading.Thread(target=lambda: tracer.record("download", root.start, root.start + 0.25,
+                                                                     parent=root.context, bytes=1024)),
+                       threading.Thread(target=tracer.bind(lambda: tracer.record("queue_wait", 0.0, 0.0)))]
+            for worker in workers:
+                worker.start()
+                worker.join()
+        with tracer.span("unrelated"):
+            pass
+        assert tracer.flush(5)
+
+        # THEN: Every span of the submission is in one trace, parented to the root
+        spans = {s['name']: s for s in map(json.loads, (tmp_path / "traces" / "spans.jsonl").read_text().splitlines())}
+        assert spans['submission']['parent_id'] is None
+        for name in ('build_input', 'prediction', 'download', 'queue_wait'):
+            assert spans[name]['trace_id'] == spans['submission']['trace_id']
+            assert spans[name]['parent_id'] == spans['submission']['span_id']
+        assert spans['unrelated']['trace_id'] != spans['submission']['trace_id']
+        assert spans['build_input']['attributes'] == {'num_outputs': 2}
+        assert (spans['prediction']['status'], spans['prediction']['error']) == ('error', "TimeoutError: took too long")
+        assert spans['download']['duration_ms'] == pytest.approx(250)
+        assert spans['submission']['end'] >= spans['build_input']['end'] >= spans['build_input']['start']
+        assert tracer.current() is None
+        assert tracer.stats()['exported'] == 6
+
+    @pytest.mark.unit
+    def test_prediction_phases_use_replicate_durations_from_local_create_time(self):
+        """[P1] Test that Replicate's queue and processing phases are laid out after the local create time."""
+        exporter = ListExporter()
+        tracer = Tracer(exporter)
+        prediction = {'id': "p-1", 'status': "succeeded", 'metrics': {'predict_time': 4.0},
+                      'created_at': "2026-10-19T10:00:00Z", 'started_at': "2026-10-19T10:00:02.5Z",
+                      'completed_at': "2026-10-19T10:00:06.5Z"}
+
+        tracer.record_prediction(prediction, created=1000.0)
+        tracer.record_prediction({'id': "p-2", 'created_at': "2026-10-19T10:00:00Z"}, created=1000.0)
+        assert tracer.flush(5)
+
+        queued, processing = exporter.spans
+        assert (queued.name, queued.start, queued.end) == ("prediction.queue", 1000.0, 1002.5)
+        assert (processing.name, processing.start, processing.end) == ("prediction.processing", 1002.5, 1006.5)
+        assert processing.attributes == {'prediction_id': "p-1", 'status': "succeeded", 'predict_time': 4.0}
+
+
+class TestExport:
+    """Tests for exporting off the request path."""
+
+    @pytest.mark.unit
+    def test_failed_exports_and_full_queue_drop_spans_without_raising(self):
+        """[P1] Test that a failing exporter and a full queue are counted instead of slowing spans down."""
+        failing = Tracer(ListExporter(fail=True))
+        with failing.span("prediction"):
+            pass
+        assert failing.flush(5)
+        assert failing.stats()['export_errors'] == 1
+
+        blocked = threading.Event()
+
+        class BlockingExporter(ListExporter):
+            def export(self, spans):
+                blocked.wait(5)
+                super().export(spans)
+
+        exporter = BlockingExporter()
+        tracer = Tracer(exporter, max_queue=2, batch_size=1)
+        for idx in range(6):
+            tracer.record("download", 0.0, 1.0, index=idx)
+        blocked.set()
+        assert tracer.flush(5)
+        stats = tracer.stats()
+        assert stats['finished'] == 6
+        assert stats['dropped'] == 6 - len(exporter.spans) > 0
+
+        # Without an exporter, spans are created but nothing is queued
+        disabled = Tracer(None)
+        with disabled.span("render"):
+            pass
+        assert disabled.flush() and disabled.stats() == {'finished': 1, 'exported': 0, 'dropped': 0,
+                                                          'export_errors': 0, 'queued': 0, 'exporter': None}
+
+    @pytest.mark.unit
+    def test_otlp_exporter_posts_json_to_the_collector(self):
+        """[P1] Test that spans are sent as an OTLP/HTTP JSON request to /v1/traces."""
+        received = []
+
+        class Collector(BaseHTTPRequestHandler):
+            def do_POST(self):
+                received.append((self.path, self.headers['Content-Type'],
+                                 json.loads(self.rfile.read(int(self.headers['Content-Length'])))))
+                self.send_response(200)
+                self.end_headers()
+                self.wfile.write(b"{}")
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Collector)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            tracer = Tracer(OtlpSpanExporter(f"http://127.0.0.1:{server.server_port}/", service_name="boss-test"))
+            with tracer.span("submission", endpoint="owner/m:v1", num_outputs=2, hedged=False, ratio=0.5):
+                with pytest.raises(ValueError):
+                    with tracer.span("resolve_preset"):
+                        raise ValueError("bad endpoint")
+            assert tracer.flush(5)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        [(path, content_type, body)] = received
+        assert (path, content_type) == ("/v1/traces", "application/json")
+        resource_spans = body['resourceSpans'][0]
+        assert resource_spans['resource']['attributes'] == [{'key': 'service.name',
+                                                             'value': {'stringValue': 'boss-test'}}]
+        child, root = resource_spans['scopeSpans'][0]['spans']
+        assert child['parentSpanId'] == root['spanId'] and 'parentSpanId' not in root
+        assert len(root['traceId']) == 32 and len(root['spanId']) == 16
+        assert root['attributes'] == [
+            {'key': 'endpoint', 'value': {'stringValue': 'owner/m:v1'}},
+            {'key': 'num_outputs', 'value': {'intValue': '2'}},
+            {'key': 'hedged', 'value': {'boolValue': False}},
+            {'key': 'ratio', 'value': {'doubleValue': 0.5}},
+        ]
+        assert child['status'] == {'code': 2, 'message': "ValueError: bad endpoint"}
+        assert int(root['endTimeUnixNano']) >= int(root['startTimeUnixNano'])
+
+    @pytest.mark.unit
+    def test_build_exporter_validation(self, tmp_path):
+        """[P2] Test exporter selection and rejected settings."""
+        assert build_exporter('none') is None
+        assert isinstance(build_exporter('jsonl', str(tmp_path / "s.jsonl")), JsonlSpanExporter)
+        assert build_exporter('otlp', otlp_endpoint="http://collector:4318/v1/traces").url == \
+            "http://collector:4318/v1/traces"
+        with pytest.raises(ValueError, match="needs an endpoint"):
+            build_exporter('otlp')
+        with pytest.raises(ValueError, match="http"):
+            build_exporter('otlp', otlp_endpoint="collector:4318")
+        with pytest.raises(ValueError, match="Trace exporter"):
+            build_exporter('zipkin')
+        assert otlp_payload([])['resourceSpans'][0]['scopeSpans'][0]['spans'] == []
@@ -0,0 +1,334 @@
+"""Module for streaming ZIP/TAR exports of generated images."""
+import json
+import logging
+import tarfile
+import tempfile
+import time
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional
+
+from utils.image_store import DEFAULT_CHUNK_SIZE, ImageStore, output_url
+from utils.png_metadata import (
+    build_metadata_chunks,
+    find_iend_offset_in_file,
+    generation_metadata,
+    iter_file_with_chunks,
+)
+
+logger = logging.getLogger(__name__)
+
+# Supported archive formats and their download MIME types
+ARCHIVE_FORMATS = {
+    'zip': 'application/zip',
+    'tar': 'application/x-tar',
+}
+
+MANIFEST_NAME = "manifest.json"
+
+# Payloads up to this size stay in memory when spooled; larger ones go to a temp file
+DEFAULT_SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+
+_TAR_BLOCK = tarfile.BLOCKSIZE
+_TAR_RECORD = tarfile.RECORDSIZE
+
+
+@dataclass
+class ArchiveEntry:
+    """A single file to be written into an archive.
+
+    Attributes:
+        name: File name inside the archive.
+        size: Exact size in bytes (required by the TAR header).
+        chunks: Zero-argument callable returning the file content as byte chunks.
+        mtime: Modification time recorded in the archive.
+    """
+    name: str
+    size: int
+    chunks: Callable[[], Iterable[bytes]]
+    mtime: float = 0.0
+
+
+class _ChunkSink:
+    """Write-only file object that collects archive bytes until drained."""
+
+    def __init__(self):
+        self._buffer: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._buffer.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> Iterator[bytes]:
+        buffered, self._buffer = self._buffer, []
+        for chunk in buffered:
+            if chunk:
+                yield chunk
+
+
+def file_entry(name: str, path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> ArchiveEntry:
+    """
+    Build an archive entry that streams a file from disk.
+
+    Args:
+        name: File name inside the archive.
+        path: Path of the file on disk.
+        chunk_size: Read size used while streaming.
+
+    Returns:
+        ArchiveEntry reading the file lazily in chunks.
+    """
+    file_path = Path(path)
+    stat = file_path.stat()
+
+    def _chunks() -> Iterator[bytes]:
+        with open(file_path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    return ArchiveEntry(name=name, size=stat.st_size, chunks=_chunks, mtime=stat.st_mtime)
+
+
+def png_file_entry(name: str, path: str, metadata: Dict[str, Any],
+                   chunk_size: int = DEFAULT_CHUNK_SIZE) -> ArchiveEntry:
+    """
+    Build an archive entry that streams a PNG with text metadata spliced in.
+
+    The metadata chunks are inserted before IEND while streaming, so pixels
+    are never decoded. Files that are not well-formed PNGs are archived as-is.
+
+    Args:
+        name: File name inside the archive.
+        path: Path of the PNG on disk.
+        metadata: Key/value pairs to embed as tEXt/iTXt chunks.
+        chunk_size: Read size used while streaming.
+
+    Returns:
+        ArchiveEntry whose size accounts for the inserted chunks.
+    """
+    extra = build_metadata_chunks(metadata)
+    with open(path, 'rb') as f:
+        iend_offset = find_iend_offset_in_file(f)
+    if not extra or iend_offset is None:
+        return file_entry(name, path, chunk_size)
+    stat = Path(path).stat()
+    return ArchiveEntry(
+        name=name,
+        size=stat.st_size + len(extra),
+        chunks=lambda: iter_file_with_chunks(path, iend_offset, extra, chunk_size),
+        mtime=stat.st_mtime,
+    )
+
+
+def bytes_entry(name: str, data: bytes, mtime: Optional[float] = None) -> ArchiveEntry:
+    """Build an archive entry from an in-memory payload (e.g. the manifest)."""
+    return ArchiveEntry(name=name, size=len(data), chunks=lambda: [data],
+                        mtime=time.time() if mtime is None else mtime)
+
+
+def build_manifest(records: List[Dict[str, Any]]) -> bytes:
+    """
+    Serialize per-file generation details as a JSON manifest.
+
+    Args:
+        records: One dict per archived file (file name, prompt, settings, ...).
+
+    Returns:
+        UTF-8 encoded JSON document.
+    """
+    manifest = {
+        'generated_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'count': len(records),
+        'files': records,
+    }
+    return json.dumps(manifest, indent=2, ensure_ascii=False, default=str).encode('utf-8')
+
+
+def iter_zip_chunks(entries: Iterable[ArchiveEntry]) -> Iterator[bytes]:
+    """
+    Stream a ZIP archive without building it in memory.
+
+    Entries are written with ``ZIP_STORED``: generated PNGs are already
+    compressed, so deflating them again only costs CPU. Since the output is
+    not seekable, sizes and CRCs are emitted in data descriptors.
+
+    Args:
+        entries: Entries to archive, consumed lazily.
+
+    Yields:
+        Successive chunks of the ZIP file.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as zf:
+        for entry in entries:
+            zinfo = zipfile.ZipInfo(entry.name, date_time=_zip_date_time(entry.mtime))
+            zinfo.compress_type = zipfile.ZIP_STORED
+            zinfo.file_size = entry.size
+            with zf.open(zinfo, 'w', force_zip64=entry.size >= zipfile.ZIP64_LIMIT) as dest:
+                for chunk in entry.chunks():
+                    dest.write(chunk)
+                    yield from sink.drain()
+            yield from sink.drain()
+    yield from sink.drain()
+
+
+def iter_tar_chunks(entries: Iterable[ArchiveEntry]) -> Iterator[bytes]:
+    """
+    Stream an uncompressed TAR archive without building it in memory.
+
+    Args:
+        entries: Entries to archive, consumed lazily. Each entry's ``size``
+            must match the number of bytes its chunks produce.
+
+    Yields:
+        Successive chunks of the TAR file.
+
+    Raises:
+        ValueError: If an entry produces a different number of bytes than declared.
+    """
+    total = 0
+    for entry in entries:
+        info = tarfile.TarInfo(entry.name)
+        info.size = entry.size
+        info.mtime = int(entry.mtime)
+        info.mode = 0o644
+        header = info.tobuf(tarfile.PAX_FORMAT, 'utf-8', 'surrogateescape')
+        yield header
+        total += len(header)
+        written = 0
+        for chunk in entry.chunks():
+            written += len(chunk)
+            yield chunk
+        if written != entry.size:
+            raise ValueError(f"Archive entry '{entry.name}' produced {written} bytes, expected {entry.size}")
+        padding = (-written) % _TAR_BLOCK
+        if padding:
+            yield b'\0' * padding
+        total += written + padding
+    # End-of-archive marker, padded to a full record like tarfile does
+    trailer = 2 * _TAR_BLOCK
+    trailer += (-(total + trailer)) % _TAR_RECORD
+    yield b'\0' * trailer
+
+
+def iter_archive_chunks(entries: Iterable[ArchiveEntry], archive_format: str = 'zip') -> Iterator[bytes]:
+    """
+    Stream an archive in the requested format.
+
+    Args:
+        entries: Entries to archive.
+        archive_format: 'zip' or 'tar'.
+
+    Yields:
+        Successive chunks of the archive.
+
+    Raises:
+        ValueError: If the format is not supported.
+    """
+    if archive_format == 'zip':
+        return iter_zip_chunks(entries)
+    if archive_format == 'tar':
+        return iter_tar_chunks(entries)
+    raise ValueError(f"Unsupported archive format '{archive_format}'. Expected one of: {', '.join(ARCHIVE_FORMATS)}")
+
+
+def spool_archive(chunks: Iterable[bytes], max_memory: int = DEFAULT_SPOOL_MAX_MEMORY) -> BinaryIO:
+    """
+    Collect streamed archive chunks into a rewound file object.
+
+    Small archives stay in memory; larger ones roll over to a temporary file,
+    so peak memory stays bounded regardless of archive size.
+
+    Args:
+        chunks: Archive chunks, e.g. from :func:`iter_archive_chunks`.
+        max_memory: Size threshold before spilling to disk.
+
+    Returns:
+        Readable binary file object positioned at the start.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=max_memory, mode='w+b')
+    for chunk in chunks:
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+
+def ensure_stored(output, store: ImageStore, fetch: Callable[[str], Iterable[bytes]]) -> Path:
+    """
+    Return a local path for an output, streaming it into the store if needed.
+
+    Args:
+        output: Output URL, ``FileOutput`` or local path.
+        store: Image store used for remote outputs.
+        fetch: Function returning byte chunks for a URL.
+
+    Returns:
+        Path of the local copy.
+    """
+    url = output_url(output)
+    if not url.startswith(('http://', 'https://')):
+        return Path(url)
+    key = store.key_for(url)
+    if not store.contains(key):
+        store.write_stream(key, fetch(url))
+    return store.path_for(key)
+
+
+def export_outputs(outputs: List, store: ImageStore, fetch: Callable[[str], Iterable[bytes]],
+                   records: Optional[List[Dict[str, Any]]] = None, archive_format: str = 'zip',
+                   name_template: str = "output_file_{index}.png",
+                   embed_metadata: bool = True) -> Iterator[bytes]:
+    """
+    Stream an archive of generated outputs plus a JSON manifest.
+
+    Outputs not yet persisted are streamed into the store first, so every
+    entry is read back from disk in chunks. PNG entries carry their
+    generation record as text chunks unless ``embed_metadata`` is False.
+
+    Args:
+        outputs: Output URLs or stored paths, in display order.
+        store: Image store holding (or receiving) the outputs.
+        fetch: Function returning byte chunks for a URL.
+        records: Optional per-output details merged into the manifest.
+        archive_format: 'zip' or 'tar'.
+        name_template: File name pattern; ``{index}`` is 1-based.
+        embed_metadata: Embed prompt/model/settings into each PNG.
+
+    Yields:
+        Successive chunks of the archive.
+    """
+    def _entries() -> Iterator[ArchiveEntry]:
+        manifest_records = []
+        for idx, output in enumerate(outputs):
+            name = name_template.format(index=idx + 1)
+            record = {'file': name, 'source': output_url(output)}
+            if records and idx < len(records) and records[idx]:
+                record.update(records[idx])
+            try:
+                path = ensure_stored(output, store, fetch)
+            except Exception as e:
+                # Keep exporting the rest; the manifest says what is missing and why
+                logger.error("Failed to fetch image %d from %s for archive export: %s", idx + 1, record['source'], e)
+                record.update(file=None, error=str(e))
+                manifest_records.append(record)
+                continue
+            if embed_metadata and records and idx < len(records) and records[idx]:
+                yield png_file_entry(name, str(path), generation_metadata(records[idx]))
+            else:
+                yield file_entry(name, str(path))
+            manifest_records.append(record)
+        yield bytes_entry(MANIFEST_NAME, build_manifest(manifest_records))
+
+    return iter_archive_chunks(_entries(), archive_format)
+
+
+def _zip_date_time(mtime: float) -> tuple:
+    # ZIP timestamps cannot represent dates before 1980
+    return time.localtime(max(mtime, 315532800))[:6]
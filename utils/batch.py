@@ -0,0 +1,470 @@
+"""Module for running batches of prompts from JSONL or CSV files with bounded concurrency."""
+import csv
+import hashlib
+import io
+import json
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from utils.generation import find_model, resolve_generation
+from utils.image_store import output_urls
+
+logger = logging.getLogger(__name__)
+
+BATCH_FORMATS = ('jsonl', 'csv')
+
+# Row fields with a fixed meaning; any other column/key is treated as a setting override
+ROW_FIELDS = ('id', 'request_id', 'prompt', 'negative_prompt', 'model_id', 'preset', 'settings')
+
+DEFAULT_MAX_CONCURRENCY = 4
+
+
+@dataclass
+class BatchRow:
+    """
+    One prompt row from a batch file.
+
+    Attributes:
+        id: Row identifier (``id``/``request_id`` column, or the line number).
+        prompt: Prompt text.
+        model_id: Model override; None uses the default model.
+        preset: Preset id override; None uses the model's default preset.
+        negative_prompt: Negative prompt override.
+        settings: Setting overrides (width, num_inference_steps, seed, ...).
+    """
+    id: str
+    prompt: str
+    model_id: Optional[str] = None
+    preset: Optional[str] = None
+    negative_prompt: Optional[str] = None
+    settings: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class BatchJob:
+    """
+    A fully resolved prediction to run.
+
+    Attributes:
+        index: Position in the batch (used to keep results in order).
+        key: Stable key used for resuming; changes when the row's inputs change.
+        endpoint: Replicate endpoint.
+        model_input: Input payload for the prediction.
+        record: Generation details for PNG metadata and the archive manifest.
+    """
+    index: int
+    key: str
+    endpoint: str
+    model_input: Dict[str, Any]
+    record: Dict[str, Any]
+
+
+@dataclass
+class BatchResult:
+    """Outcome of one batch job."""
+    job: BatchJob
+    outputs: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+    duration: float = 0.0
+    resumed: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class BatchProgress:
+    """
+    Running totals for a batch, with a throughput-based ETA.
+
+    Jobs restored from a checkpoint count towards ``done`` but not towards
+    throughput, so resuming does not make the ETA wildly optimistic.
+    """
+    total: Optional[int]
+    completed: int = 0
+    failed: int = 0
+    resumed: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def done(self) -> int:
+        return self.completed + self.failed + self.resumed
+
+    @property
+    def rate(self) -> float:
+        """Executed jobs per second since the batch started."""
+        executed = self.completed + self.failed
+        return executed / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def fraction(self) -> float:
+        if not self.total:
+            return 0.0
+        return min(self.done / self.total, 1.0)
+
+    @property
+    def eta_seconds(self) -> Optional[float]:
+        """Estimated seconds remaining, or None until a rate is known."""
+        if self.total is None or self.rate <= 0:
+            return None
+        return max(self.total - self.done, 0) / self.rate
+
+
+def detect_batch_format(filename: str) -> str:
+    """
+    Infer the batch format from a file name.
+
+    Raises:
+        ValueError: If the extension is not .jsonl or .csv.
+    """
+    suffix = Path(filename).suffix.lower().lstrip('.')
+    if suffix == 'json':
+        suffix = 'jsonl'
+    if suffix not in BATCH_FORMATS:
+        raise ValueError(f"Unsupported batch file '{filename}'. Expected one of: .{', .'.join(BATCH_FORMATS)}")
+    return suffix
+
+
+def _coerce_cell(value: str) -> Any:
+    """Convert a CSV cell into int/float/bool where it looks like one."""
+    text = value.strip()
+    lowered = text.lower()
+    if lowered in ('true', 'false'):
+        return lowered == 'true'
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            continue
+    return value
+
+
+def _row_from_mapping(data: Dict[str, Any], line: int) -> BatchRow:
+    """Validate a parsed JSONL object or CSV record and build a BatchRow."""
+    prompt = data.get('prompt')
+    if not isinstance(prompt, str) or not prompt.strip():
+        raise ValueError(f"Line {line}: 'prompt' is required and must be a non-empty string")
+
+    settings = data.get('settings') or {}
+    if isinstance(settings, str):
+        try:
+            settings = json.loads(settings)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Line {line}: 'settings' is not valid JSON: {e}") from e
+    if not isinstance(settings, dict):
+        raise ValueError(f"Line {line}: 'settings' must be an object, got {type(settings).__name__}")
+    # Flat keys override the nested settings object
+    settings = {**settings, **{k: v for k, v in data.items() if k not in ROW_FIELDS and v not in (None, '')}}
+
+    row_id = data.get('id') or data.get('request_id') or str(line)
+    return BatchRow(
+        id=str(row_id),
+        prompt=prompt,
+        model_id=data.get('model_id') or None,
+        preset=data.get('preset') or None,
+        negative_prompt=data.get('negative_prompt') or None,
+        settings=settings,
+    )
+
+
+def iter_batch_rows(data, batch_format: str) -> Iterator[BatchRow]:
+    """
+    Parse batch rows lazily from JSONL or CSV text.
+
+    JSONL rows are objects with at least ``prompt``; blank lines and lines
+    starting with ``#`` are skipped. CSV files need a header row with a
+    ``prompt`` column. In both formats ``id`` (or ``request_id``),
+    ``model_id``, ``preset``, ``negative_prompt`` and ``settings`` (an
+    object, or JSON text in CSV) are optional, and any other key is treated
+    as a setting override.
+
+    Args:
+        data: File contents as str or UTF-8 bytes.
+        batch_format: 'jsonl' or 'csv'.
+
+    Yields:
+        BatchRow objects in file order.
+
+    Raises:
+        ValueError: If the content or a row is invalid (message includes the line number).
+    """
+    if isinstance(data, bytes):
+        try:
+            data = data.decode('utf-8-sig')
+        except UnicodeDecodeError as e:
+            raise ValueError(f"Batch file must be UTF-8 text: {e}") from e
+    if not isinstance(data, str):
+        raise ValueError(f"Batch file must be text, got {type(data).__name__}")
+
+    if batch_format == 'jsonl':
+        for line_no, line in enumerate(data.splitlines(), start=1):
+            stripped = line.strip()
+            if not stripped or stripped.startswith('#'):
+                continue
+            try:
+                obj = json.loads(stripped)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Line {line_no}: invalid JSON: {e}") from e
+            if not isinstance(obj, dict):
+                raise ValueError(f"Line {line_no}: expected a JSON object, got {type(obj).__name__}")
+            yield _row_from_mapping(obj, line_no)
+    elif batch_format == 'csv':
+        reader = csv.DictReader(io.StringIO(data))
+        if not reader.fieldnames or 'prompt' not in reader.fieldnames:
+            raise ValueError("CSV batch files need a header row with a 'prompt' column")
+        for record in reader:
+            values = {k: (_coerce_cell(v) if k not in ROW_FIELDS and isinstance(v, str) else v)
+                      for k, v in record.items() if k is not None}
+            yield _row_from_mapping(values, reader.line_num)
+    else:
+        raise ValueError(f"Unsupported batch format '{batch_format}'. Expected one of: {', '.join(BATCH_FORMATS)}")
+
+
+def load_batch_file(path: str) -> List[BatchRow]:
+    """
+    Read and validate a batch file from disk.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+        ValueError: If the file format or any row is invalid.
+    """
+    file_path = Path(path)
+    return list(iter_batch_rows(file_path.read_bytes(), detect_batch_format(file_path.name)))
+
+
+def job_key(row_id: str, endpoint: str, model_input: Dict[str, Any]) -> str:
+    """Build a resume key that changes whenever the row's effective inputs change."""
+    digest = hashlib.sha256(
+        json.dumps([endpoint, model_input], sort_keys=True, default=str).encode('utf-8')
+    ).hexdigest()[:16]
+    return f"{row_id}:{digest}"
+
+
+def plan_jobs(rows: Iterable[BatchRow], models: List[Dict[str, Any]],
+              presets: Dict[str, List[Dict[str, Any]]],
+              default_model_id: Optional[str] = None) -> Iterator[BatchJob]:
+    """
+    Resolve batch rows into jobs, applying presets and trigger words.
+
+    Args:
+        rows: Parsed rows (consumed lazily).
+        models: Model configurations from models.yaml.
+        presets: Presets grouped by model_id.
+        default_model_id: Model used for rows without ``model_id``.
+
+    Yields:
+        BatchJob objects in row order.
+
+    Raises:
+        ValueError: If a row references an unknown model or preset.
+    """
+    for index, row in enumerate(rows):
+        try:
+            model = find_model(models, row.model_id or default_model_id)
+            endpoint, model_input, preset = resolve_generation(
+                model, presets, row.prompt, preset_id=row.preset,
+                settings=row.settings, negative_prompt=row.negative_prompt)
+        except ValueError as e:
+            raise ValueError(f"Row {row.id}: {e}") from e
+        record = {
+            'job_id': row.id,
+            'prompt': model_input['prompt'],
+            'negative_prompt': model_input.get('negative_prompt'),
+            'model_id': model.get('id'),
+            'preset': preset.get('id') if preset else None,
+            'endpoint': endpoint,
+            'seed': model_input.get('seed'),
+            'settings': model_input,
+        }
+        yield BatchJob(index=index, key=job_key(row.id, endpoint, model_input),
+                       endpoint=endpoint, model_input=model_input, record=record)
+
+
+class BatchCheckpoint:
+    """
+    Append-only JSONL log of finished jobs, used to resume interrupted batches.
+
+    Each successful job is written as soon as it completes, so a batch that
+    is interrupted (browser closed, rerun, crash) skips those jobs next time.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._completed: Optional[Dict[str, List[str]]] = None
+
+    def load(self) -> Dict[str, List[str]]:
+        """
+        Return outputs of previously completed jobs keyed by job key.
+
+        A truncated last line (from a crash mid-write) is ignored.
+        """
+        completed: Dict[str, List[str]] = {}
+        if not self.path.exists():
+            return completed
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning("Ignoring malformed checkpoint line in %s", self.path)
+                    continue
+                completed[entry['key']] = entry.get('outputs', [])
+        return completed
+
+    def get(self, key: str) -> Optional[List[str]]:
+        """Return the outputs of a completed job, or None; the file is read on first use."""
+        with self._lock:
+            if self._completed is None:
+                self._completed = self.load()
+            return self._completed.get(key)
+
+    def record(self, result: BatchResult) -> None:
+        """Append a successful result to the checkpoint."""
+        if not result.ok or result.resumed:
+            return
+        line = json.dumps({'key': result.job.key, 'outputs': result.outputs,
+                           'duration': round(result.duration, 3)})
+        with self._lock:
+            if self._completed is not None:
+                self._completed[result.job.key] = result.outputs
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+                f.flush()
+
+
+def checkpoint_path_for(batch_dir: str, content: bytes) -> Path:
+    """Derive a checkpoint path from the batch file content, so re-uploading the same file resumes it."""
+    return Path(batch_dir) / f"{hashlib.sha256(content).hexdigest()[:16]}.jsonl"
+
+
+def run_batch(jobs: Iterable[BatchJob], run_fn: Callable[[BatchJob], Any],
+              max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+              checkpoint: Optional[BatchCheckpoint] = None, total: Optional[int] = None,
+              on_result: Optional[Callable[[BatchResult, BatchProgress], None]] = None,
+              clock: Callable[[], float] = time.monotonic) -> List[BatchResult]:
+    """
+    Execute jobs with at most ``max_concurrency`` predictions in flight.
+
+    Jobs are pulled from ``jobs`` only when a slot frees up, so generators
+    are consumed lazily. ``on_result`` runs in the calling thread after each
+    job, which makes it safe to update Streamlit elements from it. A failing
+    job is recorded and does not stop the batch.
+
+    Args:
+        jobs: Jobs to run (any iterable, consumed lazily).
+        run_fn: Called with each job in a worker thread; returns the model
+                output (URL, FileOutput or list of them).
+        max_concurrency: Maximum number of concurrent predictions.
+        checkpoint: Optional checkpoint used to skip and record finished jobs: anything
+                    with ``get(key)`` and ``record(result)``, such as a BatchCheckpoint
+                    or a ResultCache (whose lookups then count as cache hits and misses).
+        total: Number of jobs, if known, for progress and ETA.
+        on_result: Progress callback receiving each result and the running totals.
+        clock: Monotonic clock (injectable for tests).
+
+    Returns:
+        Results in job order.
+
+    Raises:
+        ValueError: If max_concurrency is less than 1.
+    """
+    if max_concurrency < 1:
+        raise ValueError(f"max_concurrency must be at least 1, got {max_concurrency}")
+
+    progress = BatchProgress(total=total)
+    results: List[BatchResult] = []
+    started = clock()
+
+    def _execute(job: BatchJob) -> Tuple[List[str], float]:
+        job_started = clock()
+        outputs = output_urls(run_fn(job))
+        return outputs, clock() - job_started
+
+    def _finish(result: BatchResult) -> None:
+        if result.resumed:
+            progress.resumed += 1
+        elif result.ok:
+            progress.completed += 1
+        else:
+            progress.failed += 1
+        progress.elapsed = clock() - started
+        if checkpoint is not None:
+            checkpoint.record(result)
+        results.append(result)
+        if on_result:
+            on_result(result, progress)
+
+    job_iter = iter(jobs)
+    in_flight: Dict[Any, BatchJob] = {}
+    executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='batch')
+    try:
+        exhausted = False
+        while not exhausted or in_flight:
+            # Top up free slots; resumed jobs complete immediately without using a slot
+            while not exhausted and len(in_flight) < max_concurrency:
+                job = next(job_iter, None)
+                if job is None:
+                    exhausted = True
+                    break
+                cached = checkpoint.get(job.key) if checkpoint is not None else None
+                if cached is not None:
+                    _finish(BatchResult(job=job, outputs=cached, resumed=True))
+                    continue
+                in_flight[executor.submit(_execute, job)] = job
+            if not in_flight:
+                continue
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = in_flight.pop(future)
+                try:
+                    outputs, duration = future.result()
+                    _finish(BatchResult(job=job, outputs=outputs, duration=duration))
+                except Exception as e:
+                    logger.error("Batch job %s failed: %s: %s", job.record.get('job_id'), type(e).__name__, e)
+                    _finish(BatchResult(job=job, error=f"{type(e).__name__}: {e}"))
+    finally:
+        # On interruption, drop queued work; finished jobs are already checkpointed
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    results.sort(key=lambda r: r.job.index)
+    return results
+
+
+def archive_inputs(results: Iterable[BatchResult]) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """
+    Flatten successful results into (outputs, manifest records) for export_outputs().
+
+    Each record carries the job's generation details plus the output index
+    within the job, so multi-output jobs stay traceable in the manifest.
+    """
+    outputs: List[str] = []
+    records: List[Dict[str, Any]] = []
+    for result in results:
+        if not result.ok:
+            continue
+        for idx, output in enumerate(result.outputs):
+            outputs.append(output)
+            records.append({**result.job.record, 'output_index': idx})
+    return outputs, records
+
+
+def format_eta(seconds: Optional[float]) -> str:
+    """Format an ETA for display, e.g. '3m 05s'."""
+    if seconds is None:
+        return "estimating…"
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds}s"
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f"{minutes}m {seconds:02d}s"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes:02d}m"
@@ -0,0 +1,112 @@
+"""Bounded queue drained in batches by a background thread, for writers that must stay off the request path."""
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+class BatchWriter:
+    """
+    Hand queued items to ``write`` in batches on a daemon thread.
+
+    :meth:`put` never blocks: when the queue is full the item is dropped
+    and counted. The thread waits up to ``flush_interval`` seconds for a
+    batch to fill, or until ``batch_size`` items are queued, then calls
+    ``write`` once with the batch. ``write`` must handle its own errors;
+    an exception would stop the thread.
+
+    Args:
+        write: Called as ``write(batch)`` on the writer thread.
+        name: Writer thread name.
+        max_queue: Items waiting to be written.
+        batch_size: Most items per ``write`` call.
+        flush_interval: Seconds to wait for a batch to fill before writing it.
+        on_close: Called on the writer thread after the last batch, once :meth:`close` is called.
+    """
+
+    def __init__(self, write: Callable[[List[Any]], None], name: str, max_queue: int, batch_size: int,
+                 flush_interval: float, on_close: Optional[Callable[[], None]] = None):
+        self.write = write
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_close = on_close
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._dropped = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._worker, name=name, daemon=True)
+        self._thread.start()
+
+    def put(self, item: Any) -> bool:
+        """
+        Queue an item without blocking; it must not be changed after this call.
+
+        Returns:
+            True if queued, False if the queue was full and the item was dropped.
+        """
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+            return False
+        return True
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """
+        Write every item queued so far.
+
+        Returns:
+            True once ``write`` has returned for each of them, False on timeout.
+        """
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Write what is queued, then stop the thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self.flush(timeout)
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, int]:
+        """Return the items dropped so far and those waiting to be written."""
+        with self._lock:
+            return {'dropped': self._dropped, 'queued': self._queue.qsize()}
+
+    def _worker(self) -> None:
+        while True:
+            batch: List[Any] = []
+            waiters: List[threading.Event] = []
+            stop = False
+            item = self._queue.get()
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is None:
+                    stop = True
+                    break
+                if isinstance(item, threading.Event):
+                    # A flush writes what is queued now instead of waiting for the batch to fill
+                    waiters.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+            if batch:
+                self.write(batch)
+            for waiter in waiters:
+                waiter.set()
+            if stop:
+                if self.on_close is not None:
+                    self.on_close()
+                return
@@ -0,0 +1,162 @@
+"""Module for coalescing compatible single-image requests into multi-output predictions."""
+import logging
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.image_store import output_urls
+from utils.result_cache import cache_key
+
+logger = logging.getLogger(__name__)
+
+# Replicate's SDXL-style models accept at most four outputs per prediction
+DEFAULT_MAX_OUTPUTS = 4
+
+# Inputs that may differ between requests merged into one prediction
+_MERGEABLE_KEYS = ('seed', 'num_outputs')
+
+
+def coalesce_key(endpoint: str, model_input: Dict[str, Any]) -> str:
+    """Key shared by requests that can be served by one prediction (everything but seed and num_outputs)."""
+    return cache_key(endpoint, {k: v for k, v in model_input.items() if k not in _MERGEABLE_KEYS})
+
+
+@dataclass
+class _Group:
+    """Requests waiting to be merged into one prediction."""
+    endpoint: str
+    model_input: Dict[str, Any]
+    max_outputs: int
+    requests: List[Tuple[int, Future]] = field(default_factory=list)
+    outputs: int = 0
+    closed: threading.Event = field(default_factory=threading.Event)
+
+    def add(self, num_outputs: int) -> Future:
+        future: Future = Future()
+        self.requests.append((num_outputs, future))
+        self.outputs += num_outputs
+        return future
+
+
+class Coalescer:
+    """
+    Merges compatible requests that arrive within a short window into one prediction.
+
+    Requests are compatible when they target the same endpoint with the same
+    input apart from ``seed`` and ``num_outputs``. The first request of a
+    group waits up to ``window`` seconds (less if the group fills up), then
+    runs a single prediction with the combined ``num_outputs`` and hands each
+    request its share of the outputs, in arrival order.
+
+    Requests with an explicit seed are never merged, since one prediction
+    cannot reproduce several requested seeds; neither are requests that
+    already ask for the maximum number of outputs.
+
+    Args:
+        run_fn: Called as ``run_fn(endpoint, model_input)`` to run a prediction.
+        window: Seconds the first request of a group waits for others.
+        max_outputs: Default cap on merged ``num_outputs`` per prediction.
+    """
+
+    def __init__(self, run_fn: Callable[[str, Dict[str, Any]], Any], window: float = 0.25,
+                 max_outputs: int = DEFAULT_MAX_OUTPUTS):
+        if window < 0:
+            raise ValueError(f"Coalescing window must not be negative, got {window}")
+        self.run_fn = run_fn
+        self.window = window
+        self.max_outputs = max_outputs
+        self._lock = threading.Lock()
+        self._open: Dict[str, _Group] = {}
+        self._stats = {'requests': 0, 'predictions': 0, 'merged': 0, 'bypassed': 0}
+
+    def submit(self, endpoint: str, model_input: Dict[str, Any],
+               max_outputs: Optional[int] = None) -> List[str]:
+        """
+        Run a request, possibly sharing a prediction with concurrent compatible requests.
+
+        Blocks until this request's outputs are available.
+
+        Args:
+            endpoint: Replicate endpoint.
+            model_input: Prediction input.
+            max_outputs: Per-model cap on ``num_outputs`` (defaults to the coalescer's).
+
+        Returns:
+            This request's output URLs.
+
+        Raises:
+            Exception: Whatever the shared prediction raised.
+        """
+        limit = max_outputs or self.max_outputs
+        num_outputs = int(model_input.get('num_outputs') or 1)
+        with self._lock:
+            self._stats['requests'] += 1
+            bypass = model_input.get('seed') is not None or num_outputs >= limit or self.window <= 0
+            if bypass:
+                self._stats['bypassed'] += 1
+        if bypass:
+            self._count_prediction()
+            return output_urls(self.run_fn(endpoint, model_input))
+
+        key = coalesce_key(endpoint, model_input)
+        with self._lock:
+            group = self._open.get(key)
+            if group is not None and group.outputs + num_outputs <= group.max_outputs:
+                future = group.add(num_outputs)
+                if group.outputs >= group.max_outputs:
+                    # Full: launch now instead of waiting out the window
+                    del self._open[key]
+                    group.closed.set()
+                leader = False
+            else:
+                if group is not None:
+                    # Cannot fit: launch the existing group early and start a new one
+                    del self._open[key]
+                    group.closed.set()
+                group = _Group(endpoint=endpoint, max_outputs=limit,
+                               model_input={k: v for k, v in model_input.items() if k not in _MERGEABLE_KEYS})
+                future = group.add(num_outputs)
+                self._open[key] = group
+                leader = True
+
+        if leader:
+            group.closed.wait(self.window)
+            with self._lock:
+                if self._open.get(key) is group:
+                    del self._open[key]
+            self._execute(group)
+        return future.result()
+
+    def _count_prediction(self, merged: int = 0) -> None:
+        with self._lock:
+            self._stats['predictions'] += 1
+            self._stats['merged'] += merged
+
+    def _execute(self, group: _Group) -> None:
+        """Run one prediction for the group and split its outputs between the requests."""
+        requests = len(group.requests)
+        self._count_prediction(merged=requests if requests > 1 else 0)
+        if requests > 1:
+            logger.info("Coalesced %s requests into one prediction with %s outputs on %s",
+                        requests, group.outputs, group.endpoint)
+        try:
+            outputs = output_urls(self.run_fn(group.endpoint, {**group.model_input, 'num_outputs': group.outputs}))
+        except BaseException as e:
+            for _, future in group.requests:
+                future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            return
+        offset = 0
+        for num_outputs, future in group.requests:
+            future.set_result(outputs[offset:offset + num_outputs])
+            offset += num_outputs
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Return counters: requests seen, predictions run, requests that shared a
+        prediction, and requests that bypassed coalescing.
+        """
+        with self._lock:
+            return dict(self._stats)
@@ -0,0 +1,122 @@
+"""Module for fanning one prompt out to several models concurrently."""
+import logging
+import time
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from utils.generation import ConcurrencyLimiter, resolve_generation
+from utils.image_store import output_urls
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CompareResult:
+    """
+    Outcome of one model in a compare run.
+
+    Attributes:
+        index: Position of the model in the selection (grid column order).
+        model_id: Model id from models.yaml.
+        model_name: Display name.
+        endpoint: Replicate endpoint used.
+        model_input: Input sent to the model (trigger words and preset applied).
+        outputs: Output URLs.
+        error: Error message if the prediction failed.
+        latency: Seconds the prediction took, excluding time queued for a slot.
+        queued: Seconds spent waiting for a global concurrency slot.
+    """
+    index: int
+    model_id: str
+    model_name: str
+    endpoint: str
+    model_input: Dict[str, Any]
+    outputs: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+    latency: float = 0.0
+    queued: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @property
+    def record(self) -> Dict[str, Any]:
+        """Generation details for PNG metadata and archive manifests."""
+        return {
+            'prompt': self.model_input.get('prompt'),
+            'negative_prompt': self.model_input.get('negative_prompt'),
+            'model_id': self.model_id,
+            'endpoint': self.endpoint,
+            'seed': self.model_input.get('seed'),
+            'settings': self.model_input,
+        }
+
+
+def iter_fan_out(models: List[Dict[str, Any]], presets: Dict[str, List[Dict[str, Any]]], prompt: str,
+                 run_fn: Callable[[str, Dict[str, Any]], Any], settings: Optional[Dict[str, Any]] = None,
+                 negative_prompt: Optional[str] = None,
+                 limiter: Optional[ConcurrencyLimiter] = None,
+                 clock: Callable[[], float] = time.monotonic) -> Iterator[CompareResult]:
+    """
+    Run one prompt against several models in parallel, yielding results as they finish.
+
+    Each model gets its own default preset and trigger words, so the same
+    user prompt is adapted per model exactly as the sidebar would adapt it.
+    All predictions are submitted at once; ``limiter`` (if given) applies the
+    global concurrency cap, so wall-clock time approaches the slowest model
+    rather than the sum of all of them.
+
+    Args:
+        models: Model configurations to compare, in display order.
+        presets: Presets grouped by model_id.
+        prompt: User prompt (without trigger words).
+        run_fn: Called as ``run_fn(endpoint, model_input)`` from worker threads.
+        settings: Setting overrides applied on top of each model's preset.
+        negative_prompt: Negative prompt override.
+        limiter: Global concurrency limiter shared with other features.
+        clock: Monotonic clock (injectable for tests).
+
+    Yields:
+        CompareResult objects in completion order. A failing model yields a
+        result with ``error`` set; it does not affect the others.
+    """
+    pending: List[CompareResult] = []
+    for index, model in enumerate(models):
+        try:
+            endpoint, model_input, _ = resolve_generation(
+                model, presets, prompt, settings=settings, negative_prompt=negative_prompt)
+        except ValueError as e:
+            yield CompareResult(index=index, model_id=model.get('id', '?'),
+                                model_name=model.get('name', model.get('id', '?')),
+                                endpoint=str(model.get('endpoint')), model_input={}, error=str(e))
+            continue
+        pending.append(CompareResult(index=index, model_id=model.get('id', '?'),
+                                     model_name=model.get('name', model.get('id', '?')),
+                                     endpoint=endpoint, model_input=model_input))
+    if not pending:
+        return
+
+    def _execute(result: CompareResult) -> CompareResult:
+        submitted = started = clock()
+        try:
+            with limiter.slot() if limiter is not None else nullcontext():
+                started = clock()
+                result.outputs = output_urls(run_fn(result.endpoint, result.model_input))
+        except Exception as e:
+            logger.error("Compare run failed for model '%s': %s: %s", result.model_id, type(e).__name__, e)
+            result.error = f"{type(e).__name__}: {e}"
+        result.queued = started - submitted
+        result.latency = clock() - started
+        return result
+
+    executor = ThreadPoolExecutor(max_workers=len(pending), thread_name_prefix='compare')
+    try:
+        futures = [executor.submit(_execute, result) for result in pending]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        # Closing the generator early (a rerun or stop) must not wait for the slowest model
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,181 @@
+"""Module for resolving model, preset and settings into Replicate prediction inputs."""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from utils.preset_manager import inject_trigger_words, select_preset
+
+logger = logging.getLogger(__name__)
+
+# Defaults matching the sidebar form
+DEFAULT_SETTINGS: Dict[str, Any] = {
+    'width': 1024,
+    'height': 1024,
+    'num_outputs': 1,
+    'scheduler': 'DDIM',
+    'num_inference_steps': 50,
+    'guidance_scale': 7.5,
+    'prompt_strength': 0.8,
+    'refine': 'expert_ensemble_refiner',
+    'high_noise_frac': 0.8,
+}
+
+DEFAULT_NEGATIVE_PROMPT = "the absolute worst quality, distorted features"
+
+# Default process-wide cap on predictions in flight (MAX_CONCURRENT_PREDICTIONS)
+DEFAULT_MAX_CONCURRENT_PREDICTIONS = 8
+
+
+def find_model(models: List[Dict[str, Any]], model_id: Optional[str]) -> Dict[str, Any]:
+    """
+    Look up a model configuration by id.
+
+    Args:
+        models: Model configurations from load_models_config().
+        model_id: Model id to find. If None, the first model with ``default: true``
+                  (or the first model) is returned.
+
+    Returns:
+        The matching model configuration.
+
+    Raises:
+        ValueError: If no models are configured or model_id is unknown.
+    """
+    if not models:
+        raise ValueError("No models configured")
+    if model_id is None:
+        for model in models:
+            if model.get('default', False) is True:
+                return model
+        return models[0]
+    for model in models:
+        if model.get('id') == model_id:
+            return model
+    raise ValueError(
+        f"Unknown model_id '{model_id}'. Valid model IDs: {', '.join(m.get('id', '?') for m in models)}"
+    )
+
+
+def build_model_input(prompt: str, settings: Dict[str, Any],
+                      negative_prompt: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Build the ``input`` payload for a prediction.
+
+    Args:
+        prompt: Final prompt text (trigger words already applied).
+        settings: Generation settings; unknown keys are passed through so
+                  model-specific inputs (e.g. ``seed``) reach the API.
+        negative_prompt: Optional negative prompt.
+
+    Returns:
+        Dict suitable for ``replicate.run(endpoint, input=...)``.
+    """
+    model_input = {'prompt': prompt}
+    model_input.update({key: value for key, value in settings.items() if value is not None})
+    if negative_prompt:
+        model_input['negative_prompt'] = negative_prompt
+    return model_input
+
+
+def resolve_generation(model: Dict[str, Any], presets: Dict[str, List[Dict[str, Any]]], prompt: str,
+                       preset_id: Optional[str] = None, settings: Optional[Dict[str, Any]] = None,
+                       negative_prompt: Optional[str] = None,
+                       apply_preset: bool = True) -> Tuple[str, Dict[str, Any], Optional[Dict[str, Any]]]:
+    """
+    Resolve a prompt plus overrides into an endpoint and model input.
+
+    Settings are layered as: application defaults, then preset settings, then
+    explicit overrides. Preset trigger words are injected into the prompt the
+    same way the sidebar does when a preset is applied.
+
+    Args:
+        model: Model configuration (must have an endpoint).
+        presets: Presets grouped by model_id, as returned by load_presets_config().
+        prompt: User prompt.
+        preset_id: Explicit preset id; defaults to the model's default preset.
+        settings: Per-request setting overrides.
+        negative_prompt: Negative prompt; falls back to the preset, then the app default.
+        apply_preset: Set False to skip presets entirely.
+
+    Returns:
+        Tuple of (endpoint, model_input, preset_or_None).
+
+    Raises:
+        ValueError: If the model has no endpoint or the preset id is unknown.
+    """
+    endpoint = model.get('endpoint')
+    if not endpoint or not isinstance(endpoint, str) or not endpoint.strip():
+        raise ValueError(f"Invalid model endpoint: {endpoint}. Cannot proceed with image generation.")
+
+    preset = select_preset(presets.get(model.get('id'), []), preset_id) if apply_preset else None
+    merged = dict(DEFAULT_SETTINGS)
+    if preset:
+        merged.update(preset.get('settings') or {})
+        prompt = inject_trigger_words(prompt, preset.get('trigger_words'),
+                                      preset.get('trigger_words_position', 'prepend'))
+    merged.update(settings or {})
+
+    # negative_prompt may arrive via preset settings or overrides as well as explicitly
+    merged_negative = merged.pop('negative_prompt', None)
+    if negative_prompt is None:
+        negative_prompt = merged_negative if merged_negative is not None else DEFAULT_NEGATIVE_PROMPT
+
+    return endpoint, build_model_input(prompt, merged, negative_prompt), preset
+
+
+class ConcurrencyLimiter:
+    """
+    Process-wide cap on concurrent predictions.
+
+    Every code path that starts a prediction (single generation, batch,
+    compare, sweep) takes a slot first, so the total number of predictions
+    in flight stays under the limit no matter how many features or sessions
+    are running at once.
+
+    Args:
+        limit: Maximum number of concurrent predictions.
+
+    Raises:
+        ValueError: If limit is less than 1.
+    """
+
+    def __init__(self, limit: int):
+        if limit < 1:
+            raise ValueError(f"Concurrency limit must be at least 1, got {limit}")
+        self.limit = limit
+        self._semaphore = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._peak = 0
+        self._waiting = 0
+
+    @contextmanager
+    def slot(self) -> Iterator[float]:
+        """
+        Hold one prediction slot for the duration of the block.
+
+        Yields:
+            Seconds spent waiting for the slot.
+        """
+        started = time.monotonic()
+        with self._lock:
+            self._waiting += 1
+        self._semaphore.acquire()
+        waited = time.monotonic() - started
+        with self._lock:
+            self._waiting -= 1
+            self._in_flight += 1
+            self._peak = max(self._peak, self._in_flight)
+        try:
+            yield waited
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, int]:
+        """Return current and peak in-flight counts, and callers waiting for a slot."""
+        with self._lock:
+            return {'limit': self.limit, 'in_flight': self._in_flight, 'peak': self._peak, 'waiting': self._waiting}
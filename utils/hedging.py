@@ -0,0 +1,321 @@
+"""Module for hedged predictions: race a second prediction when the first is slow to start."""
+import logging
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Prediction statuses reported by the Replicate API
+STARTING = 'starting'
+PROCESSING = 'processing'
+SUCCEEDED = 'succeeded'
+CANCELED = 'canceled'
+TERMINAL_STATUSES = ('succeeded', 'failed', 'canceled')
+
+DEFAULT_POLL_INTERVAL = 0.5
+
+# Start latencies remembered per endpoint for the percentile threshold
+_SAMPLE_WINDOW = 200
+
+# Callback receiving a prediction's full log text after each poll
+LogCallback = Callable[[str], None]
+# Callback receiving a prediction as soon as it is created (e.g. to cancel it later)
+CreatedCallback = Callable[[Any], None]
+
+
+class PredictionFailed(RuntimeError):
+    """Raised when every prediction of a hedged request failed or was canceled."""
+
+
+class PredictionCanceled(PredictionFailed):
+    """Raised when a prediction was canceled on purpose (e.g. superseded); retrying it elsewhere is pointless."""
+
+
+@dataclass
+class HedgePolicy:
+    """
+    Per-model hedging configuration (the ``hedge`` key in models.yaml).
+
+    Attributes:
+        percentile: Start-latency percentile after which a hedge is issued.
+        min_delay: Never hedge before this many seconds.
+        initial_delay: Threshold used until ``min_samples`` start latencies are known.
+        min_samples: Samples needed before the learned percentile is trusted.
+        budget: Maximum hedges as a fraction of primary predictions.
+        alternate: Endpoint for the hedge (e.g. a deployment); defaults to the same endpoint.
+    """
+    percentile: float = 95.0
+    min_delay: float = 2.0
+    initial_delay: float = 10.0
+    min_samples: int = 20
+    budget: float = 0.1
+    alternate: Optional[str] = None
+
+
+def parse_hedge_policy(config: Any) -> Optional[HedgePolicy]:
+    """
+    Build a HedgePolicy from a models.yaml ``hedge`` value.
+
+    ``hedge: true`` enables hedging with defaults; a mapping overrides
+    individual fields and may set ``enabled: false``.
+
+    Returns:
+        The policy, or None if hedging is disabled.
+
+    Raises:
+        ValueError: If the configuration is malformed.
+    """
+    if config is None or config is False:
+        return None
+    if config is True:
+        return HedgePolicy()
+    if not isinstance(config, dict):
+        raise ValueError(f"'hedge' must be true/false or a mapping, got {type(config).__name__}")
+    config = dict(config)
+    if not config.pop('enabled', True):
+        return None
+    unknown = set(config) - set(HedgePolicy.__dataclass_fields__)
+    if unknown:
+        raise ValueError(f"Unknown 'hedge' option(s): {', '.join(sorted(unknown))}")
+    policy = HedgePolicy(**config)
+    for name in ('percentile', 'min_delay', 'initial_delay', 'budget'):
+        value = getattr(policy, name)
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+            raise ValueError(f"'hedge.{name}' must be a non-negative number, got {value!r}")
+    if not 0 < policy.percentile <= 100:
+        raise ValueError(f"'hedge.percentile' must be between 0 and 100, got {policy.percentile}")
+    if not isinstance(policy.min_samples, int) or policy.min_samples < 1:
+        raise ValueError(f"'hedge.min_samples' must be a positive integer, got {policy.min_samples!r}")
+    if policy.alternate is not None and (not isinstance(policy.alternate, str) or '/' not in policy.alternate):
+        raise ValueError(f"'hedge.alternate' must be an endpoint like owner/model:version, got {policy.alternate!r}")
+    return policy
+
+
+def create_prediction(client: Any, endpoint: str, model_input: Dict[str, Any]) -> Any:
+    """
+    Create (without waiting for) a prediction for an endpoint.
+
+    Args:
+        client: The ``replicate`` module or a ``replicate.Client``.
+        endpoint: ``owner/model:version`` or ``owner/model`` (latest version).
+        model_input: Prediction input.
+
+    Returns:
+        The Prediction object.
+    """
+    model, _, version = endpoint.partition(':')
+    if version:
+        return client.predictions.create(version=version, input=model_input)
+    return client.models.predictions.create(model=model, input=model_input)
+
+
+class StartLatencyTracker:
+    """Remembers recent time-to-start samples per endpoint and derives hedge thresholds."""
+
+    def __init__(self, window: int = _SAMPLE_WINDOW):
+        self._samples: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, seconds: float) -> None:
+        with self._lock:
+            self._samples[endpoint].append(seconds)
+
+    def threshold(self, endpoint: str, policy: HedgePolicy) -> float:
+        """Seconds a prediction may spend starting before it is hedged."""
+        with self._lock:
+            samples = sorted(self._samples.get(endpoint, ()))
+        if len(samples) < policy.min_samples:
+            return max(policy.initial_delay, policy.min_delay)
+        rank = max(math.ceil(policy.percentile / 100 * len(samples)) - 1, 0)
+        return max(samples[rank], policy.min_delay)
+
+
+class Hedger:
+    """
+    Runs predictions with an opt-in hedge for slow starts.
+
+    A prediction that is still ``starting`` (queued or cold-booting) after
+    the model's learned start-latency percentile gets a second prediction,
+    on the same endpoint or the policy's alternate. The first to succeed
+    wins and the other is canceled. Hedges are capped by each policy's
+    budget, a fraction of primary predictions.
+
+    Every prediction of the race, hedges included, is passed to
+    ``on_created``, so a superseded request can cancel all of them. Logs
+    come from the first prediction to start, the one most likely to win.
+
+    Args:
+        create_fn: Called as ``create_fn(endpoint, model_input)``; returns a
+                   Prediction with ``status``, ``output``, ``error``, ``reload()`` and ``cancel()``.
+        policies: Hedge policy per primary endpoint; other endpoints are not hedged.
+        poll_interval: Seconds between status polls.
+        clock: Monotonic clock (injectable for tests).
+        sleep: Sleep function (injectable for tests).
+    """
+
+    def __init__(self, create_fn: Callable[[str, Dict[str, Any]], Any], policies: Dict[str, HedgePolicy],
+                 poll_interval: float = DEFAULT_POLL_INTERVAL, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.create_fn = create_fn
+        self.policies = dict(policies)
+        self.poll_interval = poll_interval
+        self.clock = clock
+        self.sleep = sleep
+        self.tracker = StartLatencyTracker()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = defaultdict(lambda: {
+            'primaries': 0, 'hedges_issued': 0, 'hedge_wins': 0, 'primary_wins': 0,
+            'budget_denied': 0, 'extra_seconds': 0.0,
+        })
+
+    def policy_for(self, endpoint: str) -> Optional[HedgePolicy]:
+        return self.policies.get(endpoint)
+
+    def _allow_hedge(self, endpoint: str, policy: HedgePolicy) -> bool:
+        with self._lock:
+            stats = self._stats[endpoint]
+            if stats['hedges_issued'] < policy.budget * stats['primaries'] + 1:
+                stats['hedges_issued'] += 1
+                return True
+            stats['budget_denied'] += 1
+            return False
+
+    def _count(self, endpoint: str, key: str, amount: float = 1) -> None:
+        with self._lock:
+            self._stats[endpoint][key] += amount
+
+    def run(self, endpoint: str, model_input: Dict[str, Any], on_logs: Optional[LogCallback] = None,
+            on_created: Optional[CreatedCallback] = None) -> Any:
+        """
+        Run a prediction, hedging it if it is slow to start.
+
+        Args:
+            endpoint: Primary endpoint.
+            model_input: Prediction input.
+            on_logs: Called with the full log text of the first prediction to start after every poll, if given.
+            on_created: Called with each prediction (primary and hedge) as soon as it is created, if given.
+
+        Returns:
+            The winning prediction's output.
+
+        Raises:
+            PredictionCanceled: If every prediction was canceled (e.g. superseded), so retrying is pointless.
+            PredictionFailed: If every prediction failed or was canceled, and at least one failed.
+        """
+        policy = self.policy_for(endpoint)
+        self._count(endpoint, 'primaries')
+        created = self.clock()
+        active: List[Dict[str, Any]] = []
+        hedge_at = created + self.tracker.threshold(endpoint, policy) if policy else math.inf
+        hedged = policy is None
+        errors = []
+        statuses = []
+        leader = None
+        finished = False
+
+        try:
+            self._create(endpoint, model_input, 'primary', created, active, on_created)
+            while True:
+                for entry in list(active):
+                    prediction = entry['prediction']
+                    prediction.reload()
+                    now = self.clock()
+                    if entry['started'] is None and prediction.status != STARTING:
+                        entry['started'] = now
+                        self.tracker.record(endpoint, now - entry['created'])
+                    if leader is None and entry['started'] is not None:
+                        leader = entry
+                    if entry is leader and on_logs is not None:
+                        self._report_logs(prediction, on_logs)
+                    if prediction.status == SUCCEEDED:
+                        finished = True
+                        self._finish(endpoint, entry, [other for other in active if other is not entry], now)
+                        return prediction.output
+                    if prediction.status in TERMINAL_STATUSES:
+                        errors.append(f"{entry['role']} {prediction.status}: {prediction.error}")
+                        statuses.append(prediction.status)
+                        active.remove(entry)
+                        if entry is leader:
+                            leader = None
+                if not active:
+                    message = "; ".join(errors) or "Prediction did not complete"
+                    if statuses and all(status == CANCELED for status in statuses):
+                        raise PredictionCanceled(message)
+                    raise PredictionFailed(message)
+
+                primary_waiting = any(e['role'] == 'primary' and e['started'] is None for e in active)
+                if not hedged and primary_waiting and self.clock() >= hedge_at:
+                    hedged = True
+                    if self._allow_hedge(endpoint, policy):
+                        target = policy.alternate or endpoint
+                        logger.info("Hedging prediction on %s after %.1fs in '%s'; hedge target %s",
+                                    endpoint, self.clock() - created, STARTING, target)
+                        self._create(target, model_input, 'hedge', self.clock(), active, on_created)
+                    else:
+                        logger.info("Hedge budget exhausted for %s; waiting on the primary", endpoint)
+                self.sleep(self.poll_interval)
+        finally:
+            # A poll or hedge create that raised leaves predictions billing with nobody polling them
+            if not finished:
+                for entry in active:
+                    self._cancel(endpoint, entry)
+
+    def _create(self, endpoint: str, model_input: Dict[str, Any], role: str, created: float,
+                active: List[Dict[str, Any]], on_created: Optional[CreatedCallback]) -> None:
+        """Create a prediction of the race and hand it to ``on_created``; it is polled (and canceled) from then on."""
+        prediction = self.create_fn(endpoint, model_input)
+        active.append({'prediction': prediction, 'role': role, 'created': created, 'started': None})
+        if on_created is not None:
+            on_created(prediction)
+
+    def _report_logs(self, prediction: Any, on_logs: LogCallback) -> None:
+        """Pass a prediction's logs to the callback; callback errors are logged, not raised."""
+        try:
+            on_logs(prediction.logs or "")
+        except Exception as e:
+            logger.warning("Log callback failed for prediction %s: %s", getattr(prediction, 'id', '?'), e)
+
+    def _finish(self, endpoint: str, winner: Dict[str, Any], losers: List[Dict[str, Any]], now: float) -> None:
+        """Record the winner and cancel the other prediction, charging its running time as extra cost."""
+        if winner['role'] == 'hedge':
+            self._count(endpoint, 'hedge_wins')
+        elif losers:
+            self._count(endpoint, 'primary_wins')
+        for loser in losers:
+            self._cancel(endpoint, loser)
+            if loser['started'] is not None:
+                self._count(endpoint, 'extra_seconds', now - loser['started'])
+
+    def _cancel(self, endpoint: str, entry: Dict[str, Any]) -> None:
+        """Cancel a prediction that is no longer wanted; failures are logged, not raised."""
+        try:
+            entry['prediction'].cancel()
+        except Exception as e:
+            logger.warning("Could not cancel %s prediction on %s: %s", entry['role'], endpoint, e)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Return hedging counters per endpoint: primaries, hedges issued, wins, denials and extra seconds."""
+        with self._lock:
+            return {endpoint: dict(stats) for endpoint, stats in self._stats.items()}
+
+
+def hedge_policies(models: List[Dict[str, Any]]) -> Dict[str, HedgePolicy]:
+    """
+    Collect hedge policies keyed by endpoint from model configurations.
+
+    Raises:
+        ValueError: If a model's ``hedge`` configuration is malformed.
+    """
+    policies = {}
+    for model in models:
+        try:
+            policy = parse_hedge_policy(model.get('hedge'))
+        except ValueError as e:
+            raise ValueError(f"Model '{model.get('id', '?')}': {e}") from e
+        if policy is not None:
+            policies[model['endpoint']] = policy
+    return policies
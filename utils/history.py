@@ -0,0 +1,268 @@
+"""Searchable generation history in SQLite, with an FTS5 index over prompts and batched background writes."""
+import functools
+import io
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from PIL import Image
+
+from utils.batch_writer import BatchWriter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 200
+DEFAULT_MAX_QUEUE = 10000
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_FLUSH_INTERVAL = 0.25
+DEFAULT_THUMBNAIL_SIZE = 160
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS generations (
+    id INTEGER PRIMARY KEY,
+    created REAL NOT NULL,
+    session_id TEXT,
+    job_id TEXT UNIQUE,
+    model_id TEXT,
+    endpoint TEXT,
+    preset TEXT,
+    prompt TEXT NOT NULL,
+    negative_prompt TEXT,
+    seed INTEGER,
+    settings TEXT NOT NULL,
+    outputs TEXT NOT NULL,
+    timings TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS generations_by_model ON generations (model_id, id);
+CREATE VIRTUAL TABLE IF NOT EXISTS generations_fts USING fts5 (
+    prompt, content='generations', content_rowid='id', tokenize='unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS generations_fts_insert AFTER INSERT ON generations BEGIN
+    INSERT INTO generations_fts (rowid, prompt) VALUES (new.id, new.prompt);
+END;
+CREATE TRIGGER IF NOT EXISTS generations_fts_delete AFTER DELETE ON generations BEGIN
+    INSERT INTO generations_fts (generations_fts, rowid, prompt) VALUES ('delete', old.id, old.prompt);
+END;
+"""
+
+_COLUMNS = ("id", "created", "session_id", "job_id", "model_id", "endpoint", "preset", "prompt",
+            "negative_prompt", "seed", "settings", "outputs", "timings")
+_INSERT = (f"INSERT OR IGNORE INTO generations ({', '.join(_COLUMNS[1:])}) "
+           f"VALUES ({', '.join('?' * (len(_COLUMNS) - 1))})")
+_SELECT = ", ".join(f"g.{column}" for column in _COLUMNS)
+_TERM = re.compile(r'\w+', re.UNICODE)
+
+
+@dataclass
+class HistoryEntry:
+    """
+    One stored generation.
+
+    ``outputs`` lists ``{'url': ..., 'key': ...}`` per image, where ``key``
+    is the image store blob the URL is persisted under (see ImageStore.key_for).
+    """
+
+    prompt: str
+    model_id: Optional[str] = None
+    endpoint: Optional[str] = None
+    preset: Optional[str] = None
+    negative_prompt: Optional[str] = None
+    seed: Optional[int] = None
+    settings: Dict[str, Any] = field(default_factory=dict)
+    outputs: List[Dict[str, str]] = field(default_factory=list)
+    timings: Dict[str, float] = field(default_factory=dict)
+    session_id: Optional[str] = None
+    job_id: Optional[str] = None
+    created: float = field(default_factory=time.time)
+    id: Optional[int] = None
+
+    def _values(self) -> tuple:
+        return (self.created, self.session_id, self.job_id, self.model_id, self.endpoint, self.preset, self.prompt,
+                self.negative_prompt, self.seed, json.dumps(self.settings, default=str), json.dumps(self.outputs),
+                json.dumps(self.timings))
+
+    @classmethod
+    def from_row(cls, row: tuple) -> "HistoryEntry":
+        values = dict(zip(_COLUMNS, row))
+        for column in ('settings', 'outputs', 'timings'):
+            values[column] = json.loads(values[column])
+        return cls(**values)
+
+
+@dataclass
+class HistoryPage:
+    """A page of entries, newest first; pass ``next_cursor`` to get the next (older) page."""
+
+    entries: List[HistoryEntry]
+    next_cursor: Optional[str] = None
+
+
+def fts_query(text: str) -> Optional[str]:
+    """
+    Turn free text into an FTS5 query matching every word as a prefix.
+
+    Punctuation and FTS5 operators in the text are ignored, so any input is
+    a valid query. Returns None when the text has no words.
+    """
+    terms = _TERM.findall(text or "")
+    return " ".join(f'"{term}"*' for term in terms) or None
+
+
+class HistoryStore:
+    """
+    Generation history in one SQLite file, searchable by prompt.
+
+    :meth:`add` only queues the entry; a :class:`BatchWriter` thread
+    inserts queued entries in batches, one transaction each, so the request
+    path never waits on SQLite. When the queue is full, entries are dropped
+    and counted. Reads open their own connection and page by id (keyset
+    pagination), so a page costs the same at any depth of the history.
+
+    Args:
+        path: Database file; its directory is created if needed.
+        max_queue: Entries waiting to be written.
+        batch_size: Most entries per transaction.
+        flush_interval: Seconds to wait for a batch to fill before writing it.
+    """
+
+    def __init__(self, path: str, max_queue: int = DEFAULT_MAX_QUEUE, batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._stats = {'recorded': 0, 'written': 0, 'batches': 0, 'write_errors': 0}
+        self._writer = BatchWriter(lambda batch: self._write(batch), "history-writer", max_queue, batch_size,
+                                   flush_interval, on_close=self._connection.close)
+
+    def add(self, entry: HistoryEntry) -> None:
+        """Queue a generation for writing; it must not be changed after this call."""
+        if self._writer.put(entry):
+            with self._lock:
+                self._stats['recorded'] += 1
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """
+        Write every entry added so far.
+
+        Returns:
+            True once they are committed, False on timeout.
+        """
+        return self._writer.flush(timeout)
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Write what is queued, then stop the writer."""
+        self._writer.close(timeout)
+
+    def search(self, text: str = "", model_id: Optional[str] = None, cursor: Optional[str] = None,
+               limit: int = DEFAULT_PAGE_SIZE) -> HistoryPage:
+        """
+        Find generations, newest first.
+
+        Args:
+            text: Words that must all start a word of the prompt; empty lists everything.
+            model_id: Only this model's generations.
+            cursor: ``next_cursor`` of the previous page, or None for the first page.
+            limit: Entries per page (at most MAX_PAGE_SIZE).
+
+        Returns:
+            The page, with a cursor for the next one if there are more.
+
+        Raises:
+            ValueError: If the cursor was not returned by this method.
+        """
+        if cursor is not None and not str(cursor).isdigit():
+            raise ValueError(f"Invalid history cursor {cursor!r}")
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        before = int(cursor) if cursor is not None else (1 << 63) - 1
+        match = fts_query(text)
+        conditions, params = ["g.id < ?"], [before]
+        if model_id is not None:
+            conditions.append("g.model_id = ?")
+            params.append(model_id)
+        if match is None:
+            sql = f"SELECT {_SELECT} FROM generations g WHERE {' AND '.join(conditions)} ORDER BY g.id DESC LIMIT ?"
+        else:
+            sql = (f"SELECT {_SELECT} FROM generations_fts f JOIN generations g ON g.id = f.rowid "
+                   f"WHERE generations_fts MATCH ? AND f.rowid < ? AND {' AND '.join(conditions)} "
+                   f"ORDER BY f.rowid DESC LIMIT ?")
+            params = [match, before] + params
+        with self._reader() as connection:
+            rows = connection.execute(sql, params + [limit + 1]).fetchall()
+        entries = [HistoryEntry.from_row(row) for row in rows[:limit]]
+        return HistoryPage(entries, str(entries[-1].id) if len(rows) > limit else None)
+
+    def models(self) -> List[str]:
+        """Model ids with at least one generation."""
+        models: List[str] = []
+        with self._reader() as connection:
+            # One index seek per model instead of a DISTINCT scan over every row
+            row = connection.execute("SELECT MIN(model_id) FROM generations").fetchone()
+            while row is not None and row[0] is not None:
+                models.append(row[0])
+                row = connection.execute("SELECT MIN(model_id) FROM generations WHERE model_id > ?",
+                                         (row[0],)).fetchone()
+        return models
+
+    def stats(self) -> Dict[str, Any]:
+        """Return entry and batch counters."""
+        with self._lock:
+            return dict(self._stats, **self._writer.stats(), path=str(self.path))
+
+    def _reader(self) -> "_ClosingConnection":
+        return _ClosingConnection(sqlite3.connect(f"file:{self.path}?mode=ro", uri=True))
+
+    def _write(self, batch: List[HistoryEntry]) -> None:
+        try:
+            with self._connection:
+                # Entries whose job id is already stored are skipped, so rowcount is what was new
+                written = self._connection.executemany(_INSERT, [entry._values() for entry in batch]).rowcount
+        except sqlite3.Error as e:
+            logger.warning("Could not write %d generation(s) to %s: %s", len(batch), self.path, e)
+            with self._lock:
+                self._stats['write_errors'] += 1
+            return
+        with self._lock:
+            self._stats['written'] += written
+            self._stats['batches'] += 1
+
+
+class _ClosingConnection:
+    """Context manager that closes a read connection (sqlite3's own only ends the transaction)."""
+
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+
+    def __enter__(self) -> sqlite3.Connection:
+        return self.connection
+
+    def __exit__(self, *exc_info) -> None:
+        self.connection.close()
+
+
+@functools.lru_cache(maxsize=512)
+def thumbnail_png(path: str, size: int = DEFAULT_THUMBNAIL_SIZE) -> Optional[bytes]:
+    """
+    Downscale a stored image to a PNG thumbnail, or None if it cannot be read.
+
+    Stored blobs never change, so thumbnails are cached by path.
+    """
+    try:
+        with Image.open(path) as image:
+            image.thumbnail((size, size))
+            buffer = io.BytesIO()
+            image.save(buffer, format='PNG')
+            return buffer.getvalue()
+    except (OSError, ValueError) as e:
+        logger.warning("Could not build a thumbnail of %s: %s", path, e)
+        return None
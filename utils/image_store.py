@@ -0,0 +1,148 @@
+"""Module for storing generated images on local disk."""
+import hashlib
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, List, Optional
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Read/write granularity used when streaming blobs in and out of the store
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+def output_url(output) -> str:
+    """
+    Normalize a Replicate output item to its URL string.
+
+    ``replicate.run`` returns plain URL strings on older clients and
+    ``FileOutput`` objects (which carry a ``url`` attribute) on newer ones.
+
+    Args:
+        output: A single item from a prediction's output list.
+
+    Returns:
+        The URL (or local path) of the output as a string.
+    """
+    return str(getattr(output, 'url', output))
+
+
+def output_urls(output) -> List[str]:
+    """
+    Normalize a whole prediction output (single item, list or None) to URL strings.
+
+    Args:
+        output: Value returned by ``replicate.run`` or a prediction's ``output``.
+
+    Returns:
+        List of URLs; empty if the prediction produced nothing.
+    """
+    if output is None:
+        return []
+    if isinstance(output, (list, tuple)):
+        return [output_url(item) for item in output]
+    return [output_url(output)]
+
+
+class ImageStore:
+    """
+    Local directory of persisted generation outputs.
+
+    Blobs are keyed by a hash of the URL they were fetched from, so the
+    location of a stored copy is known before it has been written. Writes go
+    to a temporary file first and are moved into place atomically, so readers
+    never observe a partially written image.
+    """
+
+    def __init__(self, root: str = "image_store"):
+        """
+        Args:
+            root: Directory where images are stored. Created on first write.
+        """
+        self.root = Path(root)
+
+    def key_for(self, url: str) -> str:
+        """
+        Build the storage key for a source URL.
+
+        Args:
+            url: The URL the image was (or will be) fetched from.
+
+        Returns:
+            Hash-based file name, keeping the URL's extension (default ``.png``).
+        """
+        suffix = Path(urlparse(url).path).suffix.lower() or '.png'
+        digest = hashlib.sha256(url.encode('utf-8')).hexdigest()[:32]
+        return f"{digest}{suffix}"
+
+    def path_for(self, key: str) -> Path:
+        """Return the on-disk path for a storage key."""
+        return self.root / key
+
+    def contains(self, key: str) -> bool:
+        """Return True if a blob for ``key`` has been fully written."""
+        return self.path_for(key).is_file()
+
+    def write_stream(self, key: str, chunks: Iterable[bytes]) -> tuple[Path, int, str]:
+        """
+        Stream chunks into the store under ``key``.
+
+        Args:
+            key: Storage key (see :meth:`key_for`).
+            chunks: Iterable of byte chunks; never materialized as a whole.
+
+        Returns:
+            Tuple of (path, size_in_bytes, sha256_hexdigest) of the stored blob.
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        target = self.path_for(key)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_name = tempfile.mkstemp(dir=self.root, prefix='.tmp-', suffix=target.suffix)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    if not chunk:
+                        continue
+                    f.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+            os.replace(tmp_name, target)
+        except BaseException:
+            try:
+                os.unlink(tmp_name)
+            except OSError:
+                pass
+            raise
+        return target, size, digest.hexdigest()
+
+    def open(self, key: str) -> BinaryIO:
+        """Open a stored blob for binary reading."""
+        return open(self.path_for(key), 'rb')
+
+    def iter_chunks(self, key: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+        """
+        Stream a stored blob in fixed-size chunks.
+
+        Args:
+            key: Storage key of the blob.
+            chunk_size: Maximum number of bytes per chunk.
+
+        Yields:
+            Successive chunks of the blob.
+        """
+        with self.open(key) as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def size_of(self, key: str) -> Optional[int]:
+        """Return the size in bytes of a stored blob, or None if missing."""
+        try:
+            return self.path_for(key).stat().st_size
+        except OSError:
+            return None
@@ -0,0 +1,234 @@
+"""Module for tracking in-flight predictions per session, with supersede, pinning and an orphan reaper."""
+import itertools
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Sessions not seen for this long are considered closed and their predictions canceled
+DEFAULT_ORPHAN_TIMEOUT = 600.0
+DEFAULT_REAP_INTERVAL = 60.0
+
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELED = 'canceled'
+
+
+@dataclass
+class InflightJob:
+    """
+    One generation started by a session.
+
+    Attributes:
+        job_id: Registry-wide id.
+        session_id: Owning session.
+        label: Short description shown to the user (e.g. the prompt).
+        pinned: Pinned jobs survive supersede and deliver their result later.
+        status: running, succeeded, failed or canceled.
+        predictions: The Replicate predictions created for the job, oldest
+            first; a hedged job races two, a failed-over one tries several.
+        outputs: Output URLs once succeeded.
+        error: Error message once failed.
+    """
+    job_id: int
+    session_id: str
+    label: str
+    started: float
+    pinned: bool = False
+    status: str = RUNNING
+    predictions: List[Any] = field(default_factory=list)
+    outputs: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+
+    @property
+    def prediction(self) -> Any:
+        """The most recently created prediction, or None before the first."""
+        return self.predictions[-1] if self.predictions else None
+
+    @property
+    def prediction_id(self) -> Optional[str]:
+        return getattr(self.prediction, 'id', None)
+
+    @property
+    def canceled(self) -> bool:
+        return self.status == CANCELED
+
+
+class PredictionRegistry:
+    """
+    Tracks in-flight predictions per session so stale ones can be canceled.
+
+    A new submit supersedes the session's older running jobs: each is
+    canceled through the predictions API unless pinned. Sessions heartbeat
+    with :meth:`touch` on every rerun; :meth:`reap` cancels the jobs of
+    sessions that have not been seen for ``orphan_timeout`` seconds, such
+    as closed browser tabs.
+
+    A job may be superseded before its prediction exists (e.g. while it
+    waits for a concurrency slot); the prediction is then canceled as soon
+    as it is attached.
+
+    Args:
+        orphan_timeout: Seconds without a heartbeat before a session's jobs are reaped.
+        clock: Monotonic clock (injectable for tests).
+    """
+
+    def __init__(self, orphan_timeout: float = DEFAULT_ORPHAN_TIMEOUT, clock: Callable[[], float] = time.monotonic):
+        self.orphan_timeout = orphan_timeout
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._jobs: Dict[int, InflightJob] = {}
+        self._last_seen: Dict[str, float] = {}
+        self._stats = {'started': 0, 'superseded': 0, 'reaped': 0, 'cancel_errors': 0}
+        self._reaper: Optional[threading.Thread] = None
+
+    def touch(self, session_id: str) -> None:
+        """Record that a session is still alive."""
+        with self._lock:
+            self._last_seen[session_id] = self.clock()
+
+    def begin(self, session_id: str, label: str = "", pinned: bool = False) -> InflightJob:
+        """Register a new running job for a session."""
+        with self._lock:
+            now = self.clock()
+            job = InflightJob(job_id=next(self._ids), session_id=session_id, label=label, started=now, pinned=pinned)
+            self._jobs[job.job_id] = job
+            self._last_seen[session_id] = now
+            self._stats['started'] += 1
+        return job
+
+    def attach(self, job: InflightJob, prediction: Any) -> None:
+        """Associate a created prediction with a job; cancels it right away if the job was already canceled."""
+        with self._lock:
+            job.predictions.append(prediction)
+            canceled = job.status == CANCELED
+        if canceled:
+            self._cancel_prediction(job, prediction)
+
+    def finish(self, job: InflightJob, outputs: Optional[List[str]] = None, error: Optional[str] = None) -> None:
+        """Mark a job as done. A canceled job stays canceled."""
+        with self._lock:
+            if job.status == CANCELED:
+                return
+            job.status = FAILED if error is not None else SUCCEEDED
+            job.outputs = list(outputs or [])
+            job.error = error
+            # Unpinned results are only useful to the script run waiting for them
+            if not job.pinned:
+                self._jobs.pop(job.job_id, None)
+
+    def discard(self, job: InflightJob) -> None:
+        """Stop tracking a job whose result has been delivered."""
+        with self._lock:
+            self._jobs.pop(job.job_id, None)
+
+    def pin(self, job_id: int, pinned: bool = True) -> bool:
+        """Pin or unpin a job. Returns False if the job is unknown."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return False
+            job.pinned = pinned
+            return True
+
+    def jobs(self, session_id: str) -> List[InflightJob]:
+        """Return the session's tracked jobs, oldest first."""
+        with self._lock:
+            return [job for job in self._jobs.values() if job.session_id == session_id]
+
+    def take_finished(self, session_id: str) -> List[InflightJob]:
+        """Remove and return the session's pinned jobs that have finished."""
+        with self._lock:
+            done = [job for job in self._jobs.values()
+                    if job.session_id == session_id and job.status in (SUCCEEDED, FAILED)]
+            for job in done:
+                del self._jobs[job.job_id]
+        return done
+
+    def supersede(self, session_id: str, keep: Optional[InflightJob] = None) -> List[InflightJob]:
+        """
+        Cancel the session's running, unpinned jobs.
+
+        Args:
+            session_id: Session whose jobs are superseded.
+            keep: A job to leave running (typically the new one).
+
+        Returns:
+            The canceled jobs.
+        """
+        with self._lock:
+            stale = [job for job in self._jobs.values()
+                     if job.session_id == session_id and job.status == RUNNING
+                     and not job.pinned and job is not keep]
+            self._stats['superseded'] += len(stale)
+        for job in stale:
+            logger.info("Superseding job %s (prediction %s) for session %s", job.job_id, job.prediction_id, session_id)
+        return self._cancel(stale)
+
+    def reap(self) -> List[InflightJob]:
+        """Cancel every job of sessions that have not been seen for ``orphan_timeout`` seconds."""
+        now = self.clock()
+        with self._lock:
+            gone = {session for session, seen in self._last_seen.items() if now - seen > self.orphan_timeout}
+            orphans = [job for job in self._jobs.values() if job.session_id in gone]
+            for session in gone:
+                del self._last_seen[session]
+            for job in orphans:
+                if job.status != RUNNING:
+                    del self._jobs[job.job_id]
+            running = [job for job in orphans if job.status == RUNNING]
+            self._stats['reaped'] += len(running)
+        if running:
+            logger.warning("Reaping %d prediction(s) from %d closed session(s)", len(running), len(gone))
+        return self._cancel(running)
+
+    def _cancel(self, jobs: List[InflightJob]) -> List[InflightJob]:
+        with self._lock:
+            for job in jobs:
+                job.status = CANCELED
+                self._jobs.pop(job.job_id, None)
+        for job in jobs:
+            with self._lock:
+                predictions = list(job.predictions)
+            for prediction in predictions:
+                # Losing hedges and failed-over routes already ended; only running ones still bill
+                if getattr(prediction, 'status', None) not in (SUCCEEDED, FAILED, CANCELED):
+                    self._cancel_prediction(job, prediction)
+        return jobs
+
+    def _cancel_prediction(self, job: InflightJob, prediction: Any) -> None:
+        try:
+            prediction.cancel()
+        except Exception as e:
+            with self._lock:
+                self._stats['cancel_errors'] += 1
+            logger.warning("Could not cancel prediction %s of job %s: %s", getattr(prediction, 'id', None),
+                           job.job_id, e)
+
+    def start_reaper(self, interval: float = DEFAULT_REAP_INTERVAL) -> None:
+        """Start a daemon thread that calls :meth:`reap` every ``interval`` seconds (idempotent)."""
+        with self._lock:
+            if self._reaper is not None:
+                return
+            self._reaper = threading.Thread(target=self._reap_forever, args=(interval,),
+                                            name="prediction-reaper", daemon=True)
+        self._reaper.start()
+
+    def _reap_forever(self, interval: float) -> None:
+        while True:
+            time.sleep(interval)
+            try:
+                self.reap()
+            except Exception as e:
+                logger.error("Prediction reaper failed: %s", e)
+
+    def stats(self) -> Dict[str, int]:
+        """Return counters: jobs started, superseded, reaped, cancel errors, and currently running."""
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if job.status == RUNNING)
+            return dict(self._stats, running=running, sessions=len(self._last_seen))
@@ -0,0 +1,46 @@
+"""Lazily loaded modules for imports that only some code paths need."""
+import importlib.util
+import sys
+import threading
+import types
+
+_lock = threading.Lock()
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """
+    Return module ``name``, deferring its execution until an attribute is first accessed.
+
+    The module is registered in sys.modules straight away, so ``import name``
+    elsewhere, ``unittest.mock.patch("name.attr")`` and attribute access all
+    see the same object; the first of them to touch an attribute pays the
+    import cost. Modules that are already imported are returned as is.
+
+    Args:
+        name: Absolute module name, e.g. "replicate".
+
+    Returns:
+        The (possibly not yet executed) module.
+
+    Raises:
+        ModuleNotFoundError: If the module cannot be found.
+    """
+    with _lock:
+        module = sys.modules.get(name)
+        if module is not None:
+            return module
+        spec = importlib.util.find_spec(name)
+        if spec is None or spec.loader is None:
+            raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+        loader = importlib.util.LazyLoader(spec.loader)
+        spec.loader = loader
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        loader.exec_module(module)
+        return module
+
+
+def is_loaded(name: str) -> bool:
+    """Return True if module ``name`` has been imported and executed (not merely registered lazily)."""
+    module = sys.modules.get(name)
+    return module is not None and not isinstance(module, importlib.util._LazyModule)
@@ -0,0 +1,253 @@
+"""Non-blocking log pipeline: records are queued on the calling thread and formatted and written by a listener thread."""
+import contextlib
+import contextvars
+import functools
+import itertools
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, Optional, Sequence, TextIO, Tuple
+
+LOG_FORMATS = ('json', 'text', 'none')
+
+DEFAULT_LOG_LEVEL = "INFO"
+DEFAULT_SAMPLE_EVERY = 10
+DEFAULT_MAX_QUEUE = 10000
+# Loggers owned by the app; their level is set by the pipeline, everything else stays at the root's level
+APP_LOGGERS = ('__main__', 'streamlit_app', 'utils', 'config')
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s [session=%(session_id)s job=%(job_id)s] %(message)s"
+
+_session_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('log_session_id', default=None)
+_job_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('log_job_id', default=None)
+
+# Attributes every LogRecord has; anything else was passed with ``extra=`` and is added to JSON lines
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {
+    'message', 'asctime', 'session_id', 'job_id', 'taskName'}
+
+
+@contextlib.contextmanager
+def log_correlation(session_id: Optional[str] = None, job_id: Optional[str] = None) -> Iterator[None]:
+    """
+    Tag every record logged in this block (on this thread) with a session and/or job id.
+
+    Ids left as None keep the value of an enclosing block.
+    """
+    tokens = []
+    if session_id is not None:
+        tokens.append((_session_id, _session_id.set(session_id)))
+    if job_id is not None:
+        tokens.append((_job_id, _job_id.set(job_id)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def correlation_ids() -> Tuple[Optional[str], Optional[str]]:
+    """The (session_id, job_id) records logged now are tagged with."""
+    return _session_id.get(), _job_id.get()
+
+
+def bind_correlation(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Bind ``fn`` to the correlation ids set now, so records it logs on another thread carry them.
+
+    Only the ids are carried over; the rest of the calling thread's context
+    (such as Streamlit's script run context) is not.
+    """
+    session_id, job_id = correlation_ids()
+
+    @functools.wraps(fn)
+    def bound(*args, **kwargs):
+        with log_correlation(session_id, job_id):
+            return fn(*args, **kwargs)
+
+    return bound
+
+
+class CorrelationFilter(logging.Filter):
+    """Stamp records with the current session and job ids (runs on the logging thread)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, 'session_id'):
+            record.session_id = _session_id.get()
+        if not hasattr(record, 'job_id'):
+            record.job_id = _job_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep one in ``every`` records at or below ``level`` from each call site.
+
+    Call sites are told apart by logger and line number, so f-string
+    messages that differ on every call are still sampled together. The first
+    record from a call site is always kept.
+
+    Args:
+        every: Keep 1 in this many records; 1 keeps them all.
+        level: Records at this level or below are sampled.
+    """
+
+    def __init__(self, every: int = DEFAULT_SAMPLE_EVERY, level: int = logging.DEBUG):
+        super().__init__()
+        if every < 1:
+            raise ValueError(f"Sampling must keep 1 in at least 1 records, got {every}")
+        self.every = every
+        self.level = level
+        self._counters: Dict[Tuple[str, int], Iterator[int]] = {}
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self.level or self.every == 1:
+            return True
+        key = (record.name, record.lineno)
+        counter = self._counters.get(key)
+        if counter is None:
+            counter = self._counters.setdefault(key, itertools.count())
+        if next(counter) % self.every:
+            with self._lock:
+                self.dropped += 1
+            return False
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, correlation ids, thread and exception."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'session_id': getattr(record, 'session_id', None),
+            'job_id': getattr(record, 'job_id', None),
+            'thread': record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and key not in entry:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class _OverheadQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that defers all formatting to the listener and times its own cost per thread.
+
+    The stock QueueHandler formats the message (and any traceback) before
+    enqueueing. Here the record is enqueued as is, so ``%`` arguments are
+    only merged when the listener writes the record. Pass values rather than
+    objects that are mutated right after the call.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.full = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.full += 1
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        start = time.perf_counter()
+        try:
+            return super().handle(record)
+        finally:
+            local = self._local
+            local.records = getattr(local, 'records', 0) + 1
+            local.seconds = getattr(local, 'seconds', 0.0) + time.perf_counter() - start
+
+    def thread_overhead(self) -> Tuple[int, float]:
+        local = self._local
+        return getattr(local, 'records', 0), getattr(local, 'seconds', 0.0)
+
+
+class LogPipeline:
+    """
+    Route logging through a queue so handler I/O never runs on the logging thread.
+
+    Loggers only stamp correlation ids, sample debug records and enqueue;
+    a QueueListener thread formats each record (JSON or text) and writes it
+    to ``stream``. When the queue is full, records are dropped and counted
+    rather than blocking the caller.
+
+    Args:
+        fmt: 'json' or 'text'.
+        level: Level for the app's own loggers (APP_LOGGERS).
+        sample_every: Keep 1 in this many DEBUG records per call site.
+        stream: Where the listener writes; stderr by default.
+        max_queue: Records waiting for the listener before new ones are dropped.
+        loggers: Logger names whose level is set to ``level``.
+    """
+
+    def __init__(self, fmt: str = 'json', level: str = DEFAULT_LOG_LEVEL, sample_every: int = DEFAULT_SAMPLE_EVERY,
+                 stream: Optional[TextIO] = None, max_queue: int = DEFAULT_MAX_QUEUE,
+                 loggers: Sequence[str] = APP_LOGGERS):
+        if fmt not in ('json', 'text'):
+            raise ValueError(f"Log format must be 'json' or 'text', got {fmt!r}")
+        resolved = logging.getLevelName(str(level).upper())
+        if not isinstance(resolved, int):
+            raise ValueError(f"Unknown log level {level!r}")
+        self.fmt = fmt
+        self.level = resolved
+        self.loggers = tuple(loggers)
+        self.sampler = SamplingFilter(sample_every)
+        self.handler = _OverheadQueueHandler(queue.Queue(max_queue))
+        self.handler.addFilter(self.sampler)
+        self.handler.addFilter(CorrelationFilter())
+        output = logging.StreamHandler(stream if stream is not None else sys.stderr)
+        output.setFormatter(JsonFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT))
+        self.listener = logging.handlers.QueueListener(self.handler.queue, output, respect_handler_level=True)
+        self._target: Optional[logging.Logger] = None
+
+    def start(self, target: Optional[logging.Logger] = None) -> "LogPipeline":
+        """Attach to ``target`` (the root logger by default) and start the listener thread."""
+        self._target = target if target is not None else logging.getLogger()
+        for name in self.loggers:
+            logging.getLogger(name).setLevel(self.level)
+        self.listener.start()
+        self._target.addHandler(self.handler)
+        return self
+
+    def stop(self) -> None:
+        """Detach and write out every queued record."""
+        if self._target is None:
+            return
+        self._target.removeHandler(self.handler)
+        self._target = None
+        self.listener.stop()
+
+    def thread_overhead(self) -> Tuple[int, float]:
+        """
+        Records handled and seconds spent handling them on the calling thread so far.
+
+        This is what logging costs the caller once a logger has decided to
+        emit: filtering, stamping ids and enqueueing. Building an f-string
+        message happens before that and is not included.
+        """
+        return self.handler.thread_overhead()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the format, queue depth and dropped-record counters."""
+        return {'format': self.fmt, 'level': logging.getLevelName(self.level), 'queued': self.handler.queue.qsize(),
+                'sampled_out': self.sampler.dropped, 'dropped_full': self.handler.full}
@@ -0,0 +1,276 @@
+"""Module for live generation progress parsed from Replicate prediction logs."""
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.hedging import (
+    CANCELED,
+    SUCCEEDED,
+    TERMINAL_STATUSES,
+    CreatedCallback,
+    LogCallback,
+    PredictionCanceled,
+    PredictionFailed,
+    create_prediction,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLL_INTERVAL = 0.5
+
+_LINE_BREAK = re.compile(r'[\r\n]')
+
+
+@dataclass(frozen=True)
+class StepProgress:
+    """
+    Sampler progress reported by a model's logs.
+
+    Attributes:
+        step: Steps completed in the current pass.
+        total: Steps in the current pass.
+        pass_number: 1 for the first progress bar; SDXL's refiner, upscalers
+                     and similar second stages start a new pass.
+    """
+    step: int
+    total: int
+    pass_number: int = 1
+
+    @property
+    def fraction(self) -> float:
+        return min(self.step / self.total, 1.0) if self.total else 0.0
+
+
+class TqdmParser:
+    """
+    Parses tqdm progress bars, as printed by diffusers pipelines and most Cog models.
+
+    Matches lines like `` 46%|████▌     | 23/50 [00:03<00:04,  6.71it/s]``
+    and bare ``23/50`` counters.
+    """
+
+    _PATTERN = re.compile(r'(?:^|\|)\s*(\d+)\s*/\s*(\d+)(?=\s*(?:\[|$))')
+
+    def parse(self, line: str) -> Optional[StepProgress]:
+        match = self._PATTERN.search(line)
+        if not match:
+            return None
+        step, total = int(match.group(1)), int(match.group(2))
+        if total == 0 or step > total:
+            return None
+        return StepProgress(step, total)
+
+
+class StepLineParser:
+    """Parses explicit step lines such as ``Step 23/50`` or ``step 23 of 50``."""
+
+    _PATTERN = re.compile(r'\bstep\s*[:#]?\s*(\d+)\s*(?:/|of)\s*(\d+)', re.IGNORECASE)
+
+    def parse(self, line: str) -> Optional[StepProgress]:
+        match = self._PATTERN.search(line)
+        if not match:
+            return None
+        step, total = int(match.group(1)), int(match.group(2))
+        if total == 0 or step > total:
+            return None
+        return StepProgress(step, total)
+
+
+# Parser factories by model family name (the ``log_parser`` key in models.yaml)
+LOG_PARSERS: Dict[str, Callable[[], Any]] = {
+    'tqdm': TqdmParser,
+    'steps': StepLineParser,
+}
+
+
+def register_log_parser(name: str, factory: Callable[[], Any]) -> None:
+    """
+    Register a log parser for a model family.
+
+    Args:
+        name: Family name referenced by ``log_parser`` in models.yaml.
+        factory: Callable returning an object with ``parse(line) -> Optional[StepProgress]``.
+    """
+    LOG_PARSERS[name] = factory
+
+
+def get_log_parser(name: str) -> Any:
+    """
+    Create a parser for a model family.
+
+    Raises:
+        ValueError: If no parser is registered under ``name``.
+    """
+    factory = LOG_PARSERS.get(name)
+    if factory is None:
+        raise ValueError(f"Unknown log parser '{name}'. Available: {', '.join(sorted(LOG_PARSERS))}")
+    return factory()
+
+
+class LogCursor:
+    """
+    Incremental reader over a growing log.
+
+    Remembers how much of the log has been consumed, so each poll only
+    splits and parses the new tail. Both ``\\n`` and ``\\r`` end a line, since
+    tqdm redraws its bar in place with ``\\r``. The trailing unterminated
+    line is held back as :attr:`partial` until it is complete: a poll can end
+    mid-line, and ``4/4`` cut from ``4/40`` would read as a finished pass.
+    """
+
+    def __init__(self):
+        self.offset = 0
+        self.partial = ""
+
+    def feed(self, logs: Optional[str]) -> List[str]:
+        """
+        Consume the log up to its current end.
+
+        Args:
+            logs: The full log text as returned by the latest poll.
+
+        Returns:
+            Complete lines added since the previous call.
+        """
+        if not logs:
+            return []
+        if len(logs) < self.offset:
+            # The log was reset (e.g. the prediction restarted); start over
+            self.offset = 0
+            self.partial = ""
+        new = logs[self.offset:]
+        self.offset = len(logs)
+        parts = _LINE_BREAK.split(self.partial + new)
+        self.partial = parts.pop()
+        return [line for line in parts if line.strip()]
+
+
+class LogProgressTracker:
+    """
+    Turns successive log polls into step progress and a step-rate ETA.
+
+    Thread-safe: :meth:`update` is called from the thread polling the
+    prediction while the UI thread reads :attr:`latest` and :meth:`eta`.
+
+    Args:
+        parser: Object with ``parse(line) -> Optional[StepProgress]``.
+        clock: Monotonic clock (injectable for tests).
+    """
+
+    def __init__(self, parser: Any, clock: Callable[[], float] = time.monotonic):
+        self.parser = parser
+        self.clock = clock
+        self._cursor = LogCursor()
+        self._lock = threading.Lock()
+        self._latest: Optional[StepProgress] = None
+        self._pass_started: Optional[tuple] = None
+        self._eta: Optional[float] = None
+
+    @property
+    def latest(self) -> Optional[StepProgress]:
+        with self._lock:
+            return self._latest
+
+    def eta(self) -> Optional[float]:
+        """Seconds left in the current pass at the observed step rate, or None until the rate is known."""
+        with self._lock:
+            return self._eta
+
+    def update(self, logs: Optional[str]) -> Optional[StepProgress]:
+        """
+        Parse the log text added since the last update.
+
+        Args:
+            logs: The prediction's full log text.
+
+        Returns:
+            The latest progress, or None if no step counter has been seen yet.
+        """
+        lines = self._cursor.feed(logs)
+        now = self.clock()
+        with self._lock:
+            for line in lines:
+                progress = self.parser.parse(line)
+                if progress is not None:
+                    self._advance(progress, now)
+            return self._latest
+
+    def _advance(self, progress: StepProgress, now: float) -> None:
+        latest = self._latest
+        pass_number = 1
+        if latest is not None:
+            pass_number = latest.pass_number
+            if progress.total != latest.total or progress.step < latest.step:
+                pass_number += 1
+        progress = StepProgress(progress.step, progress.total, pass_number)
+        if latest is None or pass_number != latest.pass_number:
+            self._pass_started = (now, progress.step)
+            self._eta = None
+        elif progress.step > self._pass_started[1] and now > self._pass_started[0]:
+            rate = (progress.step - self._pass_started[1]) / (now - self._pass_started[0])
+            self._eta = (progress.total - progress.step) / rate
+        self._latest = progress
+
+
+def follow_prediction(prediction: Any, on_logs: Optional[LogCallback] = None,
+                      poll_interval: float = DEFAULT_POLL_INTERVAL,
+                      sleep: Callable[[float], None] = time.sleep) -> Any:
+    """
+    Poll a prediction until it finishes, passing its logs to ``on_logs`` after each poll.
+
+    Args:
+        prediction: Prediction with ``status``, ``logs``, ``output``, ``error`` and ``reload()``.
+        on_logs: Called with the full log text after every poll, if given.
+        poll_interval: Seconds between polls.
+        sleep: Sleep function (injectable for tests).
+
+    Returns:
+        The prediction output.
+
+    Raises:
+        PredictionFailed: If the prediction failed.
+        PredictionCanceled: If the prediction was canceled.
+    """
+    while True:
+        if on_logs is not None:
+            try:
+                on_logs(prediction.logs or "")
+            except Exception as e:
+                logger.warning("Log callback failed for prediction %s: %s", getattr(prediction, 'id', '?'), e)
+        if prediction.status in TERMINAL_STATUSES:
+            break
+        sleep(poll_interval)
+        prediction.reload()
+    if prediction.status == CANCELED:
+        raise PredictionCanceled(f"Prediction {prediction.status}: {prediction.error}")
+    if prediction.status != SUCCEEDED:
+        raise PredictionFailed(f"Prediction {prediction.status}: {prediction.error}")
+    return prediction.output
+
+
+def run_with_logs(client: Any, endpoint: str, model_input: Dict[str, Any], on_logs: Optional[LogCallback] = None,
+                  poll_interval: float = DEFAULT_POLL_INTERVAL, on_created: Optional[CreatedCallback] = None) -> Any:
+    """
+    Run a prediction like ``replicate.run`` while streaming its logs to ``on_logs``.
+
+    Args:
+        client: The ``replicate`` module or a ``replicate.Client``.
+        endpoint: ``owner/model:version`` or ``owner/model``.
+        model_input: Prediction input.
+        on_logs: Called with the full log text after every poll, if given.
+        poll_interval: Seconds between polls.
+        on_created: Called with the prediction right after it is created, if given.
+
+    Returns:
+        The prediction output.
+
+    Raises:
+        PredictionFailed: If the prediction failed or was canceled.
+    """
+    prediction = create_prediction(client, endpoint, model_input)
+    if on_created is not None:
+        on_created(prediction)
+    return follow_prediction(prediction, on_logs, poll_interval)
@@ -0,0 +1,322 @@
+"""In-process metrics registry rendered in the Prometheus text format (served by utils.metrics_server)."""
+import bisect
+import logging
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+DEFAULT_ACTIVE_WINDOW = 300.0
+LOG_OVERHEAD_BUCKETS = (0.00001, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05)
+# Mirrors the except branches around a submission in streamlit_app.main_page
+REPLICATE_ERROR_TYPES = ('validation', 'configuration', 'network', 'replicate', 'unexpected')
+
+_NAME = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*$')
+_LABEL = re.compile(r'^[a-zA-Z_][a-zA-Z0-9_]*$')
+
+# Collect-time function: one value, or values keyed by label-value tuples
+MetricFunction = Callable[[], Any]
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _label_text(names: Sequence[str], values: Sequence[Any]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class _Value:
+    """A float behind its own lock, so updates to different series never contend."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value += amount
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self._value = float(value)
+
+    def get(self) -> float:
+        with self._lock:
+            return self._value
+
+
+class _HistogramValue:
+    """Bucket counts, sum and count for one histogram series."""
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self._lock = threading.Lock()
+        self._buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        with self._lock:
+            return list(self._counts), self._sum
+
+
+class _Metric:
+    """
+    Base for a named metric family with optional labels.
+
+    Args:
+        name: Metric name.
+        documentation: HELP text.
+        labelnames: Label names; series are picked with :meth:`labels`.
+        function: Optional callable evaluated at collect time instead of
+                  stored values. It returns a number, or for labelled metrics
+                  a dict of label-value tuples to numbers.
+
+    Raises:
+        ValueError: If a name is not a valid metric or label name.
+    """
+
+    type = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 function: Optional[MetricFunction] = None):
+        if not _NAME.match(name):
+            raise ValueError(f"Invalid metric name {name!r}")
+        for label in labelnames:
+            if not _LABEL.match(label) or label.startswith('__') or label == 'le':
+                raise ValueError(f"Invalid label name {label!r} for {name}")
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.function = function
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], Any] = {}
+
+    def labels(self, *values: Any, **kwargs: Any) -> Any:
+        """Return the series for these label values, creating it on first use."""
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {values}")
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self) -> Any:
+        return _Value()
+
+    def _series(self) -> Iterator[Tuple[Tuple[str, ...], Any]]:
+        if self.function is None:
+            yield from list(self._children.items())
+            return
+        try:
+            result = self.function()
+        except Exception as e:
+            logger.warning("Could not collect metric %s: %s", self.name, e)
+            return
+        if isinstance(result, dict):
+            for key, value in result.items():
+                yield (key if isinstance(key, tuple) else (key,)), value
+        elif result is not None:
+            yield (), result
+
+    def render(self) -> List[str]:
+        """Exposition lines for this metric family."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for key, value in self._series():
+            value = value.get() if isinstance(value, _Value) else value
+            lines.append(f"{self.name}{_label_text(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing count; name it ``*_total``."""
+
+    type = 'counter'
+
+    def inc(self, amount: float = 1.0) -> None:
+        """Increment the unlabelled series."""
+        if amount < 0:
+            raise ValueError(f"Counters only go up, got {amount}")
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    """Value that goes up and down."""
+
+    type = 'gauge'
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.labels().inc(-amount)
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observations in cumulative buckets.
+
+    Args:
+        buckets: Upper bounds in increasing order; ``+Inf`` is added.
+    """
+
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        if list(buckets) != sorted(buckets) or not buckets:
+            raise ValueError(f"Histogram buckets must be sorted and non-empty, got {buckets}")
+        self.buckets = tuple(float(b) for b in buckets if b != float('inf'))
+
+    def _new_child(self) -> _HistogramValue:
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        """Record an observation in the unlabelled series."""
+        self.labels().observe(value)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        names = self.labelnames + ('le',)
+        for key, child in list(self._children.items()):
+            counts, total = child.snapshot()
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_label_text(names, key + (_format_value(bound),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_label_text(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """A set of metric families rendered together in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> Any:
+        """
+        Add a metric family.
+
+        Raises:
+            ValueError: If a family with the same name is registered.
+        """
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                function: Optional[MetricFunction] = None) -> Counter:
+        return self.register(Counter(name, documentation, labelnames, function))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              function: Optional[MetricFunction] = None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Every family in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "".join(line + "\n" for metric in metrics for line in metric.render())
+
+
+class AppMetrics:
+    """
+    The app's own metrics on a registry.
+
+    Reruns, rerun duration, per-rerun logging cost, submission errors by
+    type and active sessions are recorded here. Values owned by other components (predictions in
+    flight, queue depths, cache hit ratios, bytes downloaded) are read from
+    their ``stats()`` at scrape time through :meth:`watch`, so the request
+    path pays nothing for them.
+
+    Args:
+        registry: Registry to register on; a new one by default.
+        active_window: Seconds since its last rerun for which a session counts as active.
+    """
+
+    def __init__(self, registry: Optional[MetricsRegistry] = None, active_window: float = DEFAULT_ACTIVE_WINDOW):
+        self.registry = registry if registry is not None else MetricsRegistry()
+        self.active_window = active_window
+        self._lock = threading.Lock()
+        self._last_seen: Dict[str, float] = {}
+        self.reruns = self.registry.counter("app_reruns_total", "Script reruns across all sessions.")
+        self.rerun_duration = self.registry.histogram("app_rerun_duration_seconds", "Wall time of one script rerun.")
+        self.errors = self.registry.counter("app_replicate_errors_total",
+                                            "Failed submissions by error type.", ('type',))
+        for error_type in REPLICATE_ERROR_TYPES:
+            self.errors.labels(error_type)
+        self.log_records = self.registry.counter("app_log_records_total", "Log records handled on script threads.")
+        self.log_overhead = self.registry.histogram("app_log_overhead_seconds",
+                                                    "Time one rerun spent handing log records to the log pipeline.",
+                                                    buckets=LOG_OVERHEAD_BUCKETS)
+        self.registry.gauge("app_active_sessions",
+                            f"Sessions that reran in the last {active_window:g} seconds.",
+                            function=self.active_sessions)
+
+    def observe_rerun(self, session_id: Optional[str], seconds: float) -> None:
+        """Count a finished rerun and mark its session active."""
+        self.reruns.inc()
+        self.rerun_duration.observe(seconds)
+        if session_id is not None:
+            now = time.monotonic()
+            with self._lock:
+                self._last_seen[session_id] = now
+
+    def observe_logging(self, records: int, seconds: float) -> None:
+        """Record what logging cost one rerun (see LogPipeline.thread_overhead)."""
+        self.log_records.inc(records)
+        self.log_overhead.observe(seconds)
+
+    def active_sessions(self) -> int:
+        """Sessions seen within the active window; older ones are forgotten."""
+        cutoff = time.monotonic() - self.active_window
+        with self._lock:
+            for session_id in [s for s, seen in self._last_seen.items() if seen < cutoff]:
+                del self._last_seen[session_id]
+            return len(self._last_seen)
+
+    def error(self, error_type: str) -> None:
+        """Count a failed submission; ``error_type`` is one of REPLICATE_ERROR_TYPES."""
+        self.errors.labels(error_type).inc()
+
+    def watch(self, name: str, documentation: str, function: MetricFunction, labelnames: Sequence[str] = (),
+              kind: str = 'gauge') -> None:
+        """Expose a value read at scrape time (``kind`` is 'gauge' or 'counter')."""
+        register = self.registry.counter if kind == 'counter' else self.registry.gauge
+        register(name, documentation, labelnames, function)
@@ -0,0 +1,68 @@
+"""Sidecar HTTP server exposing a metrics registry at ``/metrics``.
+
+Kept apart from utils.metrics so http.server is only imported when metrics are served.
+"""
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+
+from utils.metrics import MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    server: "MetricsServer"
+
+    def do_GET(self) -> None:
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug("metrics: " + format, *args)
+
+
+class MetricsServer(ThreadingHTTPServer):
+    """
+    Serve ``GET /metrics`` for a registry from a daemon thread, next to the Streamlit server.
+
+    Args:
+        registry: Registry to render on each scrape.
+        host: Interface to bind.
+        port: Port to bind; 0 picks a free port.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, registry: MetricsRegistry, host: str = "0.0.0.0", port: int = 9464):
+        super().__init__((host, port), _MetricsHandler)
+        self.registry = registry
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self) -> "MetricsServer":
+        """Serve in a daemon thread."""
+        self._thread = threading.Thread(target=self.serve_forever, args=(0.5,), name="metrics-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving and close the socket."""
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,253 @@
+"""Background persistence of Replicate outputs before their delivery URLs expire."""
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from utils.image_store import DEFAULT_CHUNK_SIZE, ImageStore, output_url
+from utils.lazy import lazy_import
+
+# Loaded on the first download rather than when the app starts
+requests = lazy_import("requests")
+
+logger = logging.getLogger(__name__)
+
+# Fetch function signature: takes a URL, returns an iterable of byte chunks
+Fetcher = Callable[[str], Iterable[bytes]]
+
+_MAX_FAILED_ENTRIES = 1024
+
+
+def http_fetch(url: str, timeout: float = 30.0, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Stream a remote file in chunks without holding it in memory.
+
+    Args:
+        url: URL to download.
+        timeout: Connect/read timeout in seconds.
+        chunk_size: Maximum size of each yielded chunk.
+
+    Yields:
+        Byte chunks of the response body.
+
+    Raises:
+        requests.exceptions.RequestException: On network or HTTP errors.
+    """
+    with requests.get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            if chunk:
+                yield chunk
+
+
+def is_remote_url(value: str) -> bool:
+    """Return True if ``value`` is an http(s) URL that needs persisting."""
+    return isinstance(value, str) and value.startswith(('http://', 'https://'))
+
+
+class BackgroundPersister:
+    """
+    Write-behind persistence stage for generation outputs.
+
+    Callers hand over output URLs as soon as a prediction completes and get
+    control back immediately; worker threads stream each URL into an
+    :class:`ImageStore`, retrying transient failures with exponential backoff.
+    The queue is bounded and :meth:`submit` never blocks: when it is full the
+    job is dropped (and logged), and the original URL keeps being used.
+
+    Once a copy is stored, :meth:`resolve` maps the source URL to the local
+    path so callers can rewrite the references they hold.
+    """
+
+    def __init__(self, store: ImageStore, fetch: Optional[Fetcher] = None,
+                 max_queue: int = 64, workers: int = 2, max_retries: int = 3,
+                 retry_backoff: float = 0.5):
+        """
+        Args:
+            store: Destination image store.
+            fetch: Function returning byte chunks for a URL. Defaults to :func:`http_fetch`.
+            max_queue: Maximum number of jobs waiting to be persisted.
+            workers: Number of worker threads.
+            max_retries: Retries per URL after the first failed attempt.
+            retry_backoff: Base delay in seconds; doubles after each retry.
+        """
+        self.store = store
+        self._fetch = fetch or http_fetch
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue(maxsize=max_queue)
+        self._max_retries = max_retries
+        self._retry_backoff = retry_backoff
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pending: set = set()
+        self._failed: Dict[str, str] = {}
+        self._callbacks: Dict[str, Callable[[float], None]] = {}
+        self._stats = {'submitted': 0, 'stored': 0, 'failed': 0, 'dropped': 0, 'retries': 0, 'bytes': 0}
+        self._closed = False
+        self._threads: List[threading.Thread] = []
+        for idx in range(max(1, workers)):
+            thread = threading.Thread(target=self._worker, name=f"image-persister-{idx}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, output, on_stored: Optional[Callable[[float], None]] = None) -> bool:
+        """
+        Schedule an output for persistence without blocking.
+
+        Args:
+            output: Output URL (or ``FileOutput``) returned by the prediction.
+            on_stored: Optional callback invoked from the worker thread with the
+                       seconds spent downloading and storing, once the copy is stored.
+
+        Returns:
+            True if the output is stored or queued, False if it was skipped
+            (not a remote URL, persister closed, or queue full).
+        """
+        url = output_url(output)
+        if not is_remote_url(url) or self._closed:
+            return False
+        if self.store.contains(self.store.key_for(url)):
+            return True
+        with self._lock:
+            if url in self._pending:
+                return True
+            self._failed.pop(url, None)
+            try:
+                self._queue.put_nowait(url)
+            except queue.Full:
+                self._stats['dropped'] += 1
+                logger.warning("Persistence queue full; not persisting %s", url)
+                return False
+            self._pending.add(url)
+            if on_stored is not None:
+                self._callbacks[url] = on_stored
+            self._stats['submitted'] += 1
+        return True
+
+    def resolve(self, output) -> str:
+        """
+        Map an output to its stored copy if one exists.
+
+        Args:
+            output: Output URL (or ``FileOutput``) or an already-resolved path.
+
+        Returns:
+            Local path of the stored copy, or the original URL if it has not
+            been persisted (yet).
+        """
+        url = output_url(output)
+        if not is_remote_url(url):
+            return url
+        key = self.store.key_for(url)
+        if self.store.contains(key):
+            return str(self.store.path_for(key))
+        return url
+
+    def rewrite(self, outputs: Optional[Iterable]) -> Optional[List[str]]:
+        """
+        Rewrite a list of outputs to point at stored copies where available.
+
+        Args:
+            outputs: Iterable of output URLs/paths, or None.
+
+        Returns:
+            New list with persisted entries replaced by local paths, or None
+            if ``outputs`` was None.
+        """
+        if outputs is None:
+            return None
+        return [self.resolve(item) for item in outputs]
+
+    def status(self, output) -> Optional[str]:
+        """Return 'stored', 'pending', 'failed' or None for an output."""
+        url = output_url(output)
+        if self.store.contains(self.store.key_for(url)):
+            return 'stored'
+        with self._lock:
+            if url in self._pending:
+                return 'pending'
+            if url in self._failed:
+                return 'failed'
+        return None
+
+    def stats(self) -> Dict[str, int]:
+        """Return a snapshot of submission/storage counters, including bytes downloaded."""
+        with self._lock:
+            return dict(self._stats, queued=len(self._pending))
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until every queued job has finished (for CLI use and tests).
+
+        Args:
+            timeout: Maximum seconds to wait, or None to wait indefinitely.
+
+        Returns:
+            True if the queue drained, False on timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._idle:
+            while self._pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Stop accepting jobs and shut the worker threads down."""
+        self._closed = True
+        for _ in self._threads:
+            try:
+                self._queue.put(None, timeout=timeout)
+            except queue.Full:
+                break
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _worker(self) -> None:
+        while True:
+            url = self._queue.get()
+            if url is None:
+                return
+            try:
+                self._persist(url)
+            finally:
+                with self._idle:
+                    self._pending.discard(url)
+                    self._callbacks.pop(url, None)
+                    self._idle.notify_all()
+
+    def _persist(self, url: str) -> None:
+        key = self.store.key_for(url)
+        for attempt in range(self._max_retries + 1):
+            started = time.monotonic()
+            try:
+                path, size, _ = self.store.write_stream(key, self._fetch(url))
+                elapsed = time.monotonic() - started
+                with self._lock:
+                    self._stats['stored'] += 1
+                    self._stats['bytes'] += size
+                    callback = self._callbacks.get(url)
+                logger.debug("Persisted %s to %s (%d bytes) in %.2fs", url, path, size, elapsed)
+                if callback is not None:
+                    try:
+                        callback(elapsed)
+                    except Exception as e:
+                        logger.warning("on_stored callback for %s failed: %s", url, e)
+                return
+            except Exception as e:
+                if attempt >= self._max_retries:
+                    with self._lock:
+                        self._stats['failed'] += 1
+                        self._failed[url] = str(e)
+                        # Keep failure bookkeeping bounded in long-lived processes
+                        if len(self._failed) > _MAX_FAILED_ENTRIES:
+                            self._failed.pop(next(iter(self._failed)))
+                    logger.error("Failed to persist %s after %d attempt(s): %s", url, attempt + 1, e)
+                    return
+                with self._lock:
+                    self._stats['retries'] += 1
+                delay = self._retry_backoff * (2 ** attempt)
+                logger.warning("Persisting %s failed (attempt %d): %s. Retrying in %.1fs", url, attempt + 1, e, delay)
+                time.sleep(delay)
@@ -0,0 +1,204 @@
+"""Module for embedding generation parameters into PNG files without re-encoding."""
+import json
+import logging
+import struct
+import zlib
+from typing import Any, BinaryIO, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# Keys written into the PNG, in order; values that are not strings are JSON-encoded
+METADATA_KEYS = ('prompt', 'negative_prompt', 'model_id', 'endpoint', 'seed', 'settings')
+
+_CHUNK_HEADER = struct.Struct('>I4s')
+_CHUNK_OVERHEAD = 12  # length + type + CRC
+
+
+def make_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    """
+    Build a raw PNG chunk (length, type, data, CRC).
+
+    Args:
+        chunk_type: Four-byte chunk type, e.g. b'tEXt'.
+        data: Chunk payload.
+
+    Returns:
+        Encoded chunk bytes.
+    """
+    crc = zlib.crc32(data, zlib.crc32(chunk_type)) & 0xFFFFFFFF
+    return b''.join((_CHUNK_HEADER.pack(len(data), chunk_type), data, struct.pack('>I', crc)))
+
+
+def text_chunk(keyword: str, text: str) -> bytes:
+    """
+    Build a text chunk for a keyword/value pair.
+
+    Uses ``tEXt`` when the text is Latin-1 encodable (as the PNG spec
+    requires for tEXt) and an uncompressed UTF-8 ``iTXt`` chunk otherwise.
+
+    Args:
+        keyword: 1-79 Latin-1 characters, no NUL bytes.
+        text: Value to store.
+
+    Returns:
+        Encoded chunk bytes.
+
+    Raises:
+        ValueError: If the keyword is not valid for PNG text chunks.
+    """
+    try:
+        key = keyword.encode('latin-1')
+    except UnicodeEncodeError:
+        raise ValueError(f"PNG text keyword must be Latin-1: {keyword!r}")
+    if not 1 <= len(key) <= 79 or b'\0' in key:
+        raise ValueError(f"PNG text keyword must be 1-79 characters without NUL: {keyword!r}")
+    try:
+        return make_chunk(b'tEXt', key + b'\0' + text.encode('latin-1'))
+    except UnicodeEncodeError:
+        # keyword, compression flag, compression method, empty language tag, empty translated keyword
+        return make_chunk(b'iTXt', key + b'\0\0\0\0\0' + text.encode('utf-8'))
+
+
+def build_metadata_chunks(metadata: Dict[str, Any]) -> bytes:
+    """
+    Encode generation parameters as consecutive PNG text chunks.
+
+    Args:
+        metadata: Mapping of keys to values; None values are skipped.
+
+    Returns:
+        Concatenated chunk bytes (empty if there is nothing to write).
+    """
+    chunks = []
+    for key, value in metadata.items():
+        if value is None:
+            continue
+        text = value if isinstance(value, str) else json.dumps(value, sort_keys=True, default=str)
+        chunks.append(text_chunk(key, text))
+    return b''.join(chunks)
+
+
+def generation_metadata(record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Select the fields embedded into PNGs from a generation record.
+
+    Args:
+        record: Generation details (prompt, negative_prompt, model_id, endpoint, seed, settings).
+
+    Returns:
+        Ordered dict restricted to :data:`METADATA_KEYS`; the seed falls back
+        to ``settings['seed']`` when not given explicitly.
+    """
+    metadata = {key: record.get(key) for key in METADATA_KEYS}
+    settings = record.get('settings')
+    if metadata['seed'] is None and isinstance(settings, dict):
+        metadata['seed'] = settings.get('seed')
+    return metadata
+
+
+def find_iend_offset(data: memoryview) -> int:
+    """
+    Locate the IEND chunk by walking chunk headers.
+
+    Args:
+        data: The PNG file contents.
+
+    Returns:
+        Byte offset where the IEND chunk starts.
+
+    Raises:
+        ValueError: If the data is not a PNG or has no IEND chunk.
+    """
+    if bytes(data[:8]) != PNG_SIGNATURE:
+        raise ValueError("Not a PNG file (bad signature)")
+    offset = 8
+    end = len(data)
+    while offset + _CHUNK_OVERHEAD <= end:
+        length, chunk_type = _CHUNK_HEADER.unpack_from(data, offset)
+        if chunk_type == b'IEND':
+            return offset
+        offset += _CHUNK_OVERHEAD + length
+    raise ValueError("Truncated PNG: IEND chunk not found")
+
+
+def embed_png_metadata(data: bytes, metadata: Dict[str, Any]) -> bytes:
+    """
+    Insert text chunks before IEND without decoding or re-encoding pixels.
+
+    The input is sliced through a ``memoryview``, so the only copy made is
+    the single join into the output buffer.
+
+    Args:
+        data: Original PNG bytes.
+        metadata: Key/value pairs to embed.
+
+    Returns:
+        New PNG bytes with the text chunks spliced in before IEND.
+
+    Raises:
+        ValueError: If ``data`` is not a valid PNG.
+    """
+    chunks = build_metadata_chunks(metadata)
+    view = memoryview(data)
+    offset = find_iend_offset(view)
+    if not chunks:
+        return bytes(data)
+    return b''.join((view[:offset], chunks, view[offset:]))
+
+
+def find_iend_offset_in_file(f: BinaryIO) -> Optional[int]:
+    """
+    Locate the IEND chunk in an open PNG file by seeking over chunk bodies.
+
+    Args:
+        f: Binary file object opened for reading (position is changed).
+
+    Returns:
+        Offset of the IEND chunk, or None if the file is not a well-formed PNG.
+    """
+    f.seek(0)
+    if f.read(8) != PNG_SIGNATURE:
+        return None
+    offset = 8
+    while True:
+        header = f.read(_CHUNK_HEADER.size)
+        if len(header) < _CHUNK_HEADER.size:
+            return None
+        length, chunk_type = _CHUNK_HEADER.unpack(header)
+        if chunk_type == b'IEND':
+            return offset
+        offset += _CHUNK_OVERHEAD + length
+        f.seek(offset)
+
+
+def iter_file_with_chunks(path: str, insert_at: int, chunks: bytes,
+                          chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """
+    Stream a file from disk, splicing ``chunks`` in at ``insert_at``.
+
+    Args:
+        path: File to stream.
+        insert_at: Byte offset where the extra bytes are inserted.
+        chunks: Bytes to insert (e.g. from :func:`build_metadata_chunks`).
+        chunk_size: Read size used while streaming.
+
+    Yields:
+        Byte chunks of the resulting file.
+    """
+    with open(path, 'rb') as f:
+        remaining = insert_at
+        while remaining > 0:
+            block = f.read(min(chunk_size, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+        if chunks:
+            yield chunks
+        while True:
+            block = f.read(chunk_size)
+            if not block:
+                break
+            yield block
@@ -26,7 +26,8 @@ def load_presets_config(file_path: str = "presets.yaml", validate_model_ids: boo
     
     # Handle missing file gracefully (AC: 4)
     if not file_path_obj.exists():
-        logger.warning(f"Presets configuration file not found: {file_path}. Application will continue without presets.")
+        logger.warning("Presets configuration file not found: %s. Application will continue without presets.",
+                       file_path)
         return {}
     
     # Parse YAML
@@ -39,7 +40,7 @@ def load_presets_config(file_path: str = "presets.yaml", validate_model_ids: boo
             mark = e.problem_mark
             error_msg += f" at line {mark.line + 1}, column {mark.column + 1}"
         error_msg += f": {str(e)}"
-        logger.error(f"YAML parsing error in {file_path}: {error_msg}", exc_info=True)
+        logger.error("YAML parsing error in %s: %s", file_path, error_msg, exc_info=True)
         raise yaml.YAMLError(error_msg) from e
     
     # Validate root structure
@@ -65,9 +66,9 @@ def load_presets_config(file_path: str = "presets.yaml", validate_model_ids: boo
             from config.model_loader import load_models_config
             models = load_models_config("models.yaml")
             valid_model_ids = [model['id'] for model in models]
-            logger.debug(f"Loaded {len(valid_model_ids)} valid model ID(s) for preset validation")
+            logger.debug("Loaded %d valid model ID(s) for preset validation", len(valid_model_ids))
         except (FileNotFoundError, ValueError, yaml.YAMLError) as e:
-            logger.warning(f"Could not load models.yaml for preset validation: {e}. Skipping model_id validation.")
+            logger.warning("Could not load models.yaml for preset validation: %s. Skipping model_id validation.", e)
             valid_model_ids = None
     
     # Validate and group presets by model_id
@@ -89,7 +90,7 @@ def load_presets_config(file_path: str = "presets.yaml", validate_model_ids: boo
                 f"Preset '{preset_name}' (id: {preset_id}): Missing required fields: {', '.join(missing_fields)}. "
                 f"Please ensure all presets in presets.yaml have 'id', 'name', and 'model_id' fields."
             )
-            logger.error(f"Validation error for preset at index {idx + 1}: {error_msg}")
+            logger.error("Validation error for preset at index %d: %s", idx + 1, error_msg)
             raise ValueError(error_msg)
         
         # Validate field types
@@ -112,6 +113,14 @@ def load_presets_config(file_path: str = "presets.yaml", validate_model_ids: boo
                 logger.error(error_msg)
                 raise ValueError(error_msg)
         
+        if 'progressive' in preset:
+            try:
+                _validate_progressive(preset['progressive'])
+            except ValueError as e:
+                error_msg = f"Preset {idx + 1}: {e}"
+                logger.error(error_msg)
+                raise ValueError(error_msg) from e
+        
         # Validate model_id references against models.yaml (cross-reference check - AC: 2)
         if valid_model_ids is not None:
             model_id = preset['model_id']
@@ -123,7 +132,7 @@ def load_presets_config(file_path: str = "presets.yaml", validate_model_ids: boo
                     f"model_id must reference a valid model.id from models.yaml. "
                     f"Valid model IDs: {', '.join(valid_model_ids)}"
                 )
-                logger.error(f"Validation error for preset at index {idx + 1}: {error_msg}")
+                logger.error("Validation error for preset at index %d: %s", idx + 1, error_msg)
                 raise ValueError(error_msg)
         
         # Group by model_id (single-pass grouping for efficiency - AC: 6)
@@ -132,7 +141,8 @@ def load_presets_config(file_path: str = "presets.yaml", validate_model_ids: boo
             presets_by_model[model_id] = []
         presets_by_model[model_id].append(preset)
     
-    logger.info(f"Successfully loaded {len(data['presets'])} preset(s) from {file_path}, grouped into {len(presets_by_model)} model(s)")
+    logger.info("Successfully loaded %d preset(s) from %s, grouped into %d model(s)",
+                len(data['presets']), file_path, len(presets_by_model))
     return presets_by_model
 
 
@@ -195,4 +205,102 @@ def validate_preset_config(preset: Dict[str, Any], valid_model_ids: List[str] =
                 f"Field 'settings' must be a dictionary, got {type(preset['settings']).__name__}"
             )
     
+    if 'progressive' in preset:
+        _validate_progressive(preset['progressive'])
+    
     return True
+
+
+def _validate_progressive(config: Any) -> None:
+    """
+    Validate a preset's optional ``progressive`` draft/final settings.
+    
+    Raises:
+        ValueError: If the configuration is malformed.
+    """
+    # Imported here: utils.progressive builds on this module
+    from utils.progressive import parse_progressive
+    parse_progressive(config)
+
+
+# Preset setting keys and the sidebar form session-state keys they populate
+SETTING_FORM_KEYS: Dict[str, str] = {
+    'width': 'form_width',
+    'height': 'form_height',
+    'num_outputs': 'form_num_outputs',
+    'scheduler': 'form_scheduler',
+    'num_inference_steps': 'form_num_inference_steps',
+    'guidance_scale': 'form_guidance_scale',
+    'prompt_strength': 'form_prompt_strength',
+    'refine': 'form_refine',
+    'high_noise_frac': 'form_high_noise_frac',
+    'negative_prompt': 'form_negative_prompt',
+}
+
+
+def select_preset(model_presets: List[Dict[str, Any]], preset_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Pick the preset to apply from a model's presets.
+    
+    Args:
+        model_presets: Presets for one model, as grouped by load_presets_config().
+        preset_id: Explicit preset id to use. If omitted, the first preset with
+                   ``default: true`` is used, otherwise the first preset.
+    
+    Returns:
+        The selected preset, or None if the model has no presets.
+    
+    Raises:
+        ValueError: If preset_id is given but no preset has that id.
+    """
+    if preset_id:
+        for preset in model_presets or []:
+            if preset.get('id') == preset_id:
+                return preset
+        raise ValueError(f"Unknown preset '{preset_id}'")
+    if not model_presets:
+        return None
+    for preset in model_presets:
+        if preset.get('default', False):
+            return preset
+    return model_presets[0]
+
+
+def format_trigger_words(trigger_words: Any) -> Optional[str]:
+    """
+    Normalize preset trigger words into the text injected into prompts.
+    
+    Args:
+        trigger_words: A string or list of strings from a preset.
+    
+    Returns:
+        Comma-separated trigger words, or None if there are none.
+    """
+    if isinstance(trigger_words, list):
+        filtered = [tw for tw in trigger_words if tw and str(tw).strip()]
+        return ", ".join(str(tw) for tw in filtered) if filtered else None
+    if isinstance(trigger_words, str) and trigger_words.strip():
+        return trigger_words
+    return None
+
+
+def inject_trigger_words(prompt: str, trigger_words: Any, position: str = 'prepend') -> str:
+    """
+    Add trigger words to a prompt.
+    
+    Args:
+        prompt: The prompt text (may be empty).
+        trigger_words: A string or list of strings from a preset.
+        position: 'prepend' (default) or 'append'.
+    
+    Returns:
+        The prompt with trigger words added, or the prompt unchanged if there are none.
+    """
+    trigger_words_str = format_trigger_words(trigger_words)
+    if not trigger_words_str:
+        return prompt
+    if not prompt:
+        return trigger_words_str
+    if position == 'append':
+        return f"{prompt} {trigger_words_str}".strip()
+    return f"{trigger_words_str} {prompt}".strip()
@@ -0,0 +1,177 @@
+"""Module for progressive generation: quick low-cost drafts, promoted to full-quality renders."""
+import logging
+import random
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from utils.batch import BatchJob
+from utils.generation import resolve_generation
+from utils.preset_manager import select_preset
+from utils.result_cache import cache_key
+
+logger = logging.getLogger(__name__)
+
+# Derived draft settings when a preset does not spell them out
+DRAFT_STEP_FRACTION = 0.25
+MIN_DRAFT_STEPS = 4
+DRAFT_SCALE = 0.5
+MIN_DRAFT_SIZE = 256
+# SDXL-family models need dimensions in multiples of 64
+SIZE_MULTIPLE = 64
+
+MAX_DRAFTS = 8
+
+_MAX_SEED = 2 ** 32 - 1
+
+
+@dataclass
+class ProgressiveConfig:
+    """
+    Per-preset progressive settings (the ``progressive`` key in presets.yaml).
+
+    Attributes:
+        draft: Setting overrides for drafts; steps and size not given here are
+               derived from the final settings (a quarter of the steps, half the size).
+        final: Setting overrides applied when a draft is promoted.
+        auto_promote: Promote every draft as soon as it is ready instead of on click.
+    """
+    draft: Dict[str, Any] = field(default_factory=dict)
+    final: Dict[str, Any] = field(default_factory=dict)
+    auto_promote: bool = False
+
+
+def parse_progressive(config: Any) -> ProgressiveConfig:
+    """
+    Build a ProgressiveConfig from a preset's ``progressive`` value.
+
+    Returns:
+        The configuration; defaults when ``config`` is None.
+
+    Raises:
+        ValueError: If the configuration is malformed.
+    """
+    if config is None:
+        return ProgressiveConfig()
+    if not isinstance(config, dict):
+        raise ValueError(f"'progressive' must be a mapping, got {type(config).__name__}")
+    unknown = set(config) - set(ProgressiveConfig.__dataclass_fields__)
+    if unknown:
+        raise ValueError(f"Unknown 'progressive' option(s): {', '.join(sorted(unknown))}")
+    for name in ('draft', 'final'):
+        if not isinstance(config.get(name, {}), dict):
+            raise ValueError(f"'progressive.{name}' must be a mapping of settings, "
+                             f"got {type(config[name]).__name__}")
+    auto_promote = config.get('auto_promote', False)
+    if not isinstance(auto_promote, bool):
+        raise ValueError(f"'progressive.auto_promote' must be true or false, got {auto_promote!r}")
+    return ProgressiveConfig(draft=dict(config.get('draft') or {}), final=dict(config.get('final') or {}),
+                             auto_promote=auto_promote)
+
+
+def _draft_size(size: Any) -> Any:
+    if isinstance(size, bool) or not isinstance(size, int):
+        return size
+    scaled = int(round(size * DRAFT_SCALE / SIZE_MULTIPLE)) * SIZE_MULTIPLE
+    return min(max(scaled, MIN_DRAFT_SIZE), size)
+
+
+def draft_settings(final_input: Dict[str, Any], config: ProgressiveConfig) -> Dict[str, Any]:
+    """
+    Derive a draft's input from the final input.
+
+    Steps drop to a quarter (at least 4) and width/height to half (at least
+    256, in multiples of 64), and the refiner is skipped. The preset's
+    ``draft`` overrides win over the derived values. Prompt and seed are
+    left untouched so the draft previews the same composition.
+
+    Args:
+        final_input: Model input of the full-quality render.
+        config: Progressive configuration.
+
+    Returns:
+        The draft model input.
+    """
+    draft = dict(final_input)
+    steps = final_input.get('num_inference_steps')
+    if isinstance(steps, int) and not isinstance(steps, bool):
+        draft['num_inference_steps'] = min(max(int(steps * DRAFT_STEP_FRACTION), MIN_DRAFT_STEPS), steps)
+    for name in ('width', 'height'):
+        if name in final_input:
+            draft[name] = _draft_size(final_input[name])
+    if 'refine' in final_input:
+        draft['refine'] = 'no_refiner'
+    draft.update(config.draft)
+    for name in ('prompt', 'seed'):
+        if name in final_input:
+            draft[name] = final_input[name]
+    return draft
+
+
+@dataclass
+class ProgressivePlan:
+    """
+    Paired draft and final jobs for one progressive run.
+
+    ``drafts[i]`` and ``finals[i]`` share a seed. Job keys are result-cache
+    keys, so re-running a draft or promoting it twice hits the cache.
+    """
+    drafts: List[BatchJob]
+    finals: List[BatchJob]
+    auto_promote: bool = False
+
+
+def plan_progressive(model: Dict[str, Any], presets: Dict[str, List[Dict[str, Any]]], prompt: str,
+                     count: int = 4, seed: Optional[int] = None, settings: Optional[Dict[str, Any]] = None,
+                     negative_prompt: Optional[str] = None, preset_id: Optional[str] = None,
+                     rng: Optional[random.Random] = None) -> ProgressivePlan:
+    """
+    Plan ``count`` drafts and their full-quality counterparts.
+
+    Each draft is a single image with its own seed (``seed``, ``seed + 1``,
+    ...), so promoting a draft renders exactly its composition at full
+    quality.
+
+    Args:
+        model: Model configuration.
+        presets: Presets grouped by model_id; the chosen preset supplies the progressive settings.
+        prompt: Prompt without trigger words.
+        count: Number of drafts (1 to MAX_DRAFTS).
+        seed: First seed; random when None.
+        settings: Setting overrides for the final render.
+        negative_prompt: Negative prompt override.
+        preset_id: Explicit preset; defaults to the model's default preset.
+        rng: Random source for the seed (injectable for tests).
+
+    Returns:
+        The progressive plan.
+
+    Raises:
+        ValueError: If ``count`` is out of range or the model/preset is invalid.
+    """
+    if not 1 <= count <= MAX_DRAFTS:
+        raise ValueError(f"Number of drafts must be between 1 and {MAX_DRAFTS}, got {count}")
+    preset = select_preset(presets.get(model.get('id'), []), preset_id)
+    config = parse_progressive(preset.get('progressive') if preset else None)
+    if seed is None:
+        seed = (rng or random.Random()).randint(0, _MAX_SEED - MAX_DRAFTS)
+
+    drafts, finals = [], []
+    for idx in range(count):
+        overrides = {**(settings or {}), **config.final, 'seed': seed + idx, 'num_outputs': 1}
+        endpoint, final_input, _ = resolve_generation(model, presets, prompt, preset_id=preset_id,
+                                                      settings=overrides, negative_prompt=negative_prompt)
+        stages = (('draft', draft_settings(final_input, config), drafts), ('final', final_input, finals))
+        for stage, model_input, jobs in stages:
+            record = {
+                'job_id': f"{stage}-{idx + 1}",
+                'stage': stage,
+                'prompt': model_input['prompt'],
+                'negative_prompt': model_input.get('negative_prompt'),
+                'model_id': model.get('id'),
+                'endpoint': endpoint,
+                'seed': model_input.get('seed'),
+                'settings': model_input,
+            }
+            jobs.append(BatchJob(index=idx, key=cache_key(endpoint, model_input),
+                                 endpoint=endpoint, model_input=model_input, record=record))
+    return ProgressivePlan(drafts=drafts, finals=finals, auto_promote=config.auto_promote)
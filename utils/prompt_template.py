@@ -0,0 +1,411 @@
+"""Module for expanding prompt templates with alternations, weights, wordlists and variables.
+
+Template syntax:
+
+- ``{red|blue|green}``: alternation; options may be empty and may nest.
+- ``{3::red|blue}``: weighted option; weights only affect random sampling.
+- ``__colors__``: one option per line from ``<wordlist_dir>/colors.txt``.
+- ``${color={red|blue}}`` binds a variable without printing it; ``${color}``
+  prints the bound value, so one choice can appear several times.
+- ``\\{``, ``\\|``, ``\\}``, ``\\$`` and ``\\_`` escape the special characters.
+
+Templates expand either to every combination (lazily, in a stable order) or
+to weighted random samples.
+"""
+import itertools
+import logging
+import random
+import re
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from utils.batch import BatchRow
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORDLIST_DIR = "wordlists"
+
+# Default cap on prompts expanded from one template (TEMPLATE_MAX_COMBINATIONS)
+DEFAULT_MAX_COMBINATIONS = 1000
+
+# Wordlists may reference other wordlists; this bounds accidental cycles
+_MAX_WORDLIST_DEPTH = 8
+
+_SPECIAL = re.compile(r'\{|\$\{|__[\w\-/]+__')
+_WORDLIST_NAME = re.compile(r'__([\w\-/]+)__')
+_VARIABLE_NAME = re.compile(r'[A-Za-z_]\w*')
+_WEIGHT = re.compile(r'\s*(\d+(?:\.\d+)?)::')
+_SPACES = re.compile(r' {2,}')
+
+Bindings = Dict[str, str]
+
+
+@dataclass
+class Literal:
+    """Plain text."""
+    text: str
+
+    def count(self) -> int:
+        return 1
+
+    def expand(self, bindings: Bindings) -> Iterator[Tuple[str, Bindings]]:
+        yield self.text, bindings
+
+    def sample(self, rng: random.Random, bindings: Bindings) -> Tuple[str, Bindings]:
+        return self.text, bindings
+
+
+@dataclass
+class Concat:
+    """Nodes rendered one after another."""
+    nodes: List['Node'] = field(default_factory=list)
+
+    def count(self) -> int:
+        total = 1
+        for node in self.nodes:
+            total *= node.count()
+        return total
+
+    def expand(self, bindings: Bindings) -> Iterator[Tuple[str, Bindings]]:
+        return self._expand_from(0, bindings)
+
+    def _expand_from(self, start: int, bindings: Bindings) -> Iterator[Tuple[str, Bindings]]:
+        # Recurses instead of using itertools.product, which would materialise every option list
+        if start == len(self.nodes):
+            yield "", bindings
+            return
+        for head, head_bindings in self.nodes[start].expand(bindings):
+            for tail, tail_bindings in self._expand_from(start + 1, head_bindings):
+                yield head + tail, tail_bindings
+
+    def sample(self, rng: random.Random, bindings: Bindings) -> Tuple[str, Bindings]:
+        parts = []
+        for node in self.nodes:
+            text, bindings = node.sample(rng, bindings)
+            parts.append(text)
+        return "".join(parts), bindings
+
+
+@dataclass
+class Choice:
+    """Alternation between weighted options (from ``{a|b}`` or a wordlist)."""
+    options: List[Concat]
+    weights: List[float]
+
+    def count(self) -> int:
+        return sum(option.count() for option in self.options)
+
+    def expand(self, bindings: Bindings) -> Iterator[Tuple[str, Bindings]]:
+        for option in self.options:
+            yield from option.expand(bindings)
+
+    def sample(self, rng: random.Random, bindings: Bindings) -> Tuple[str, Bindings]:
+        option = rng.choices(self.options, weights=self.weights)[0]
+        return option.sample(rng, bindings)
+
+
+@dataclass
+class Define:
+    """``${name=value}``: binds a variable for the rest of the template and prints nothing."""
+    name: str
+    value: Concat
+
+    def count(self) -> int:
+        return self.value.count()
+
+    def expand(self, bindings: Bindings) -> Iterator[Tuple[str, Bindings]]:
+        for text, inner in self.value.expand(bindings):
+            yield "", {**inner, self.name: text}
+
+    def sample(self, rng: random.Random, bindings: Bindings) -> Tuple[str, Bindings]:
+        text, inner = self.value.sample(rng, bindings)
+        return "", {**inner, self.name: text}
+
+
+@dataclass
+class Reference:
+    """``${name}``: prints a bound variable."""
+    name: str
+
+    def count(self) -> int:
+        return 1
+
+    def _value(self, bindings: Bindings) -> str:
+        if self.name not in bindings:
+            raise ValueError(f"Template variable '{self.name}' is used before it is defined")
+        return bindings[self.name]
+
+    def expand(self, bindings: Bindings) -> Iterator[Tuple[str, Bindings]]:
+        yield self._value(bindings), bindings
+
+    def sample(self, rng: random.Random, bindings: Bindings) -> Tuple[str, Bindings]:
+        return self._value(bindings), bindings
+
+
+Node = Union[Literal, Concat, Choice, Define, Reference]
+
+
+class WordlistLoader:
+    """
+    Loads named wordlists from ``<directory>/<name>.txt``.
+
+    Each non-empty line that does not start with ``#`` is one option. A line
+    may start with a ``weight::`` prefix and may itself contain template
+    syntax. Files are re-read only when their modification time changes.
+
+    Args:
+        directory: Directory holding the wordlist files.
+    """
+
+    def __init__(self, directory: str = DEFAULT_WORDLIST_DIR):
+        self.directory = Path(directory)
+        self._cache: Dict[str, Tuple[float, List[str]]] = {}
+
+    def lines(self, name: str) -> List[str]:
+        """
+        Return the option lines of a wordlist.
+
+        Raises:
+            ValueError: If the name escapes the directory or the file does not exist.
+        """
+        if '..' in name.split('/') or name.startswith('/'):
+            raise ValueError(f"Invalid wordlist name '{name}'")
+        path = self.directory / f"{name}.txt"
+        try:
+            mtime = path.stat().st_mtime
+        except FileNotFoundError:
+            raise ValueError(f"Wordlist '__{name}__' not found (expected {path})")
+        cached = self._cache.get(name)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        with open(path, 'r', encoding='utf-8') as f:
+            lines = [line.strip() for line in f]
+        lines = [line for line in lines if line and not line.startswith('#')]
+        if not lines:
+            raise ValueError(f"Wordlist '__{name}__' is empty")
+        self._cache[name] = (mtime, lines)
+        logger.debug("Loaded wordlist '%s' (%d entries) from %s", name, len(lines), path)
+        return lines
+
+
+class _Parser:
+    """Recursive-descent parser producing a Concat node."""
+
+    def __init__(self, text: str, wordlists: Optional[WordlistLoader], depth: int = 0):
+        self.text = text
+        self.pos = 0
+        self.wordlists = wordlists
+        self.depth = depth
+
+    def parse(self) -> Concat:
+        sequence = self._sequence(terminators='')
+        if self.pos < len(self.text):
+            raise ValueError(f"Unexpected '{self.text[self.pos]}' at position {self.pos} in template")
+        return sequence
+
+    def _sequence(self, terminators: str) -> Concat:
+        nodes: List[Node] = []
+        buffer: List[str] = []
+
+        def _flush() -> None:
+            if buffer:
+                nodes.append(Literal("".join(buffer)))
+                buffer.clear()
+
+        while self.pos < len(self.text):
+            char = self.text[self.pos]
+            if char == '\\' and self.pos + 1 < len(self.text):
+                buffer.append(self.text[self.pos + 1])
+                self.pos += 2
+            elif char in terminators:
+                break
+            elif char == '{':
+                _flush()
+                nodes.append(self._choice())
+            elif self.text.startswith('${', self.pos):
+                _flush()
+                nodes.append(self._variable())
+            elif (match := _WORDLIST_NAME.match(self.text, self.pos)) is not None:
+                _flush()
+                nodes.append(self._wordlist(match.group(1)))
+                self.pos = match.end()
+            else:
+                buffer.append(char)
+                self.pos += 1
+        _flush()
+        return Concat(nodes)
+
+    def _choice(self) -> Choice:
+        start = self.pos
+        self.pos += 1
+        options, weights = [], []
+        while True:
+            weight = 1.0
+            match = _WEIGHT.match(self.text, self.pos)
+            if match is not None:
+                weight = float(match.group(1))
+                self.pos = match.end()
+            options.append(self._sequence(terminators='|}'))
+            weights.append(weight)
+            if self.pos >= len(self.text):
+                raise ValueError(f"Unclosed '{{' at position {start} in template")
+            closing = self.text[self.pos]
+            self.pos += 1
+            if closing == '}':
+                break
+        if sum(weights) <= 0:
+            raise ValueError(f"Choice at position {start} has no positive weights")
+        return Choice(options, weights)
+
+    def _variable(self) -> Union[Define, Reference]:
+        start = self.pos
+        self.pos += 2
+        match = _VARIABLE_NAME.match(self.text, self.pos)
+        if match is None:
+            raise ValueError(f"Expected a variable name after '${{' at position {start} in template")
+        name = match.group(0)
+        self.pos = match.end()
+        if self.text.startswith('}', self.pos):
+            self.pos += 1
+            return Reference(name)
+        if not self.text.startswith('=', self.pos):
+            raise ValueError(f"Expected '=' or '}}' after variable '{name}' at position {self.pos} in template")
+        self.pos += 1
+        value = self._sequence(terminators='}')
+        if self.pos >= len(self.text):
+            raise ValueError(f"Unclosed '${{' at position {start} in template")
+        self.pos += 1
+        return Define(name, value)
+
+    def _wordlist(self, name: str) -> Choice:
+        if self.wordlists is None:
+            raise ValueError(f"Wordlist '__{name}__' used but no wordlist directory is configured")
+        if self.depth >= _MAX_WORDLIST_DEPTH:
+            raise ValueError(f"Wordlist '__{name}__' nests too deeply (is it referencing itself?)")
+        options, weights = [], []
+        for line in self.wordlists.lines(name):
+            weight = 1.0
+            match = _WEIGHT.match(line)
+            if match is not None:
+                weight = float(match.group(1))
+                line = line[match.end():]
+            options.append(_Parser(line, self.wordlists, self.depth + 1).parse())
+            weights.append(weight)
+        return Choice(options, weights)
+
+
+def is_template(text: Optional[str]) -> bool:
+    """Return True if the text contains any template syntax."""
+    return bool(text) and _SPECIAL.search(text) is not None
+
+
+def _clean(text: str) -> str:
+    # Empty options leave double spaces behind ("a {|big} dog")
+    return _SPACES.sub(' ', text).strip()
+
+
+class PromptTemplate:
+    """
+    A parsed prompt template.
+
+    Args:
+        text: Template text.
+        wordlists: Loader for ``__name__`` wordlists; None disallows them.
+
+    Raises:
+        ValueError: If the template is malformed or references a missing wordlist.
+    """
+
+    def __init__(self, text: str, wordlists: Optional[WordlistLoader] = None):
+        self.text = text
+        self._root = _Parser(text, wordlists).parse()
+
+    def count(self) -> int:
+        """Number of combinations, computed without expanding them."""
+        return self._root.count()
+
+    def combinations(self, limit: Optional[int] = None) -> Iterator[str]:
+        """
+        Yield every combination lazily, in a stable order.
+
+        Weights are ignored; each option appears once. Memory use is
+        proportional to the template, not the number of combinations.
+
+        Args:
+            limit: Stop after this many prompts.
+        """
+        expanded = (_clean(text) for text, _ in self._root.expand({}))
+        return itertools.islice(expanded, limit) if limit is not None else expanded
+
+    def sample(self, rng: Optional[random.Random] = None) -> str:
+        """Render one prompt, picking each choice according to its weights."""
+        text, _ = self._root.sample(rng or random.Random(), {})
+        return _clean(text)
+
+
+def render_prompt(text: str, wordlists: Optional[WordlistLoader] = None,
+                  rng: Optional[random.Random] = None) -> str:
+    """
+    Render one weighted random sample of a prompt; plain prompts are returned unchanged.
+
+    Raises:
+        ValueError: If the template is malformed.
+    """
+    if not is_template(text):
+        return text
+    return PromptTemplate(text, wordlists).sample(rng)
+
+
+def expand_rows(rows: Iterable[BatchRow], wordlists: Optional[WordlistLoader] = None,
+                max_combinations: int = DEFAULT_MAX_COMBINATIONS) -> Iterator[BatchRow]:
+    """
+    Expand templated batch rows into one row per combination, lazily.
+
+    Rows without template syntax pass through unchanged. Expanded rows get
+    ids ``<row id>-<n>`` so checkpoints stay stable across runs. Use with
+    :func:`count_expanded` to size progress bars without expanding.
+
+    Args:
+        rows: Batch rows (consumed lazily).
+        wordlists: Loader for ``__name__`` wordlists.
+        max_combinations: Maximum prompts taken from any one row.
+
+    Yields:
+        BatchRow objects.
+
+    Raises:
+        ValueError: If a template is malformed (raised when its row is reached).
+    """
+    for row in rows:
+        if not is_template(row.prompt):
+            yield row
+            continue
+        template = PromptTemplate(row.prompt, wordlists)
+        if template.count() > max_combinations:
+            logger.warning("Row %s: template has %s combinations; using the first %s",
+                           row.id, template.count(), max_combinations)
+        for n, prompt in enumerate(template.combinations(limit=max_combinations), start=1):
+            yield replace(row, id=f"{row.id}-{n}", prompt=prompt, settings=dict(row.settings))
+
+
+def count_expanded(rows: Iterable[BatchRow], wordlists: Optional[WordlistLoader] = None,
+                   max_combinations: int = DEFAULT_MAX_COMBINATIONS) -> int:
+    """
+    Count the rows :func:`expand_rows` will yield, without expanding any template.
+
+    Also validates every template up front.
+
+    Raises:
+        ValueError: If a template is malformed (the message names the row).
+    """
+    total = 0
+    for row in rows:
+        if not is_template(row.prompt):
+            total += 1
+            continue
+        try:
+            total += min(PromptTemplate(row.prompt, wordlists).count(), max_combinations)
+        except ValueError as e:
+            raise ValueError(f"Row {row.id}: {e}") from e
+    return total
@@ -0,0 +1,318 @@
+"""Append-only JSON-lines log of generation requests, with rotation, and a streaming report over it."""
+import gzip
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from utils.batch_writer import BatchWriter
+from utils.telemetry import LatencyStats
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REQUEST_LOG_PATH = "logs/requests.jsonl"
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_AGE = 24 * 3600.0
+DEFAULT_MAX_QUEUE = 10000
+DEFAULT_BATCH_SIZE = 512
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_TOP = 10
+REPORT_PHASES = ('duration', 'queue', 'predict')
+
+
+def _iso(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat(timespec='milliseconds')
+
+
+def _epoch(value: Any) -> Optional[float]:
+    if not isinstance(value, str):
+        return None
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        return None
+
+
+def archive_paths(path: str) -> List[Path]:
+    """Rotated, gzipped logs of ``path``, oldest first (``requests.<UTC time>.jsonl.gz``)."""
+    path = Path(path)
+    if not path.parent.is_dir():
+        return []
+    prefix, suffix = f"{path.stem}.", f"{path.suffix}.gz"
+
+    def order(archive: Path) -> Tuple[str, int]:
+        # Archives rotated within the same second get a -1, -2, ... counter after the time
+        stamp, _, counter = archive.name[len(prefix):-len(suffix)].partition('-')
+        return stamp, int(counter) if counter.isdigit() else 0
+
+    return sorted(path.parent.glob(f"{prefix}*{suffix}"), key=order)
+
+
+class RequestLog:
+    """
+    Append one JSON line per generation request, written and fsynced off the request path.
+
+    :meth:`record` only puts the entry on a bounded queue. A
+    :class:`BatchWriter` thread serializes entries in batches, appends each batch with one write and
+    one fsync, and rotates the file once it reaches ``max_bytes`` or
+    ``max_age`` seconds since its first entry. Rotated files are gzipped
+    next to it as ``<stem>.<UTC time><suffix>.gz``. When the queue is
+    full, entries are dropped and counted rather than blocking the caller.
+
+    Args:
+        path: File to append to; its directory is created on the first write.
+        max_bytes: Rotate before the file would grow past this size.
+        max_age: Rotate once the file's first entry is this many seconds old.
+        max_queue: Entries waiting to be written.
+        batch_size: Most entries per write and fsync.
+        flush_interval: Seconds to wait for a batch to fill before writing it.
+    """
+
+    def __init__(self, path: str = DEFAULT_REQUEST_LOG_PATH, max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_age: float = DEFAULT_MAX_AGE, max_queue: int = DEFAULT_MAX_QUEUE,
+                 batch_size: int = DEFAULT_BATCH_SIZE, flush_interval: float = DEFAULT_FLUSH_INTERVAL):
+        if max_bytes < 1 or max_age <= 0:
+            raise ValueError(f"max_bytes and max_age must be positive, got {max_bytes} and {max_age}")
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._stats = {'recorded': 0, 'written': 0, 'batches': 0, 'rotations': 0, 'write_errors': 0}
+        self._file = None
+        self._size = 0
+        self._born: Optional[float] = None
+        self._writer = BatchWriter(lambda batch: self._write(batch), "request-log", max_queue, batch_size,
+                                   flush_interval, on_close=self._close_file)
+
+    def record(self, entry: Dict[str, Any]) -> None:
+        """
+        Queue one request for writing; a ``ts`` (UTC, ISO 8601) is added if missing.
+
+        The entry is serialized later on the writer thread, so it must not be
+        changed after this call.
+        """
+        if 'ts' not in entry:
+            entry = {'ts': _iso(time.time()), **entry}
+        if self._writer.put(entry):
+            with self._lock:
+                self._stats['recorded'] += 1
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """
+        Write and fsync every entry recorded so far.
+
+        Returns:
+            True once they are on disk, False on timeout.
+        """
+        return self._writer.flush(timeout)
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Write what is queued, then stop the writer and close the file."""
+        self._writer.close(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return entry, batch and rotation counters and the current file's size."""
+        with self._lock:
+            return dict(self._stats, **self._writer.stats(), bytes=self._size, path=str(self.path))
+
+    def _close_file(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        data = "".join(json.dumps(entry, default=str) + "\n" for entry in batch).encode('utf-8')
+        now = time.time()
+        try:
+            if self._file is None:
+                self._open()
+            if self._size and (self._size + len(data) > self.max_bytes or now - self._born >= self.max_age):
+                self._rotate(now)
+                self._open()
+            self._file.write(data)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except OSError as e:
+            logger.warning("Could not write %d request(s) to %s: %s", len(batch), self.path, e)
+            with self._lock:
+                self._stats['write_errors'] += 1
+            return
+        with self._lock:
+            if not self._size:
+                self._born = _epoch(batch[0].get('ts')) or now
+            self._size += len(data)
+            self._stats['written'] += len(batch)
+            self._stats['batches'] += 1
+
+    def _open(self) -> None:
+        """Open the log for appending, picking up an existing file's size and first entry time."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'ab')
+        size = self._file.tell()
+        born = None
+        if size:
+            with open(self.path, 'rb') as f:
+                try:
+                    born = _epoch(json.loads(f.readline()).get('ts'))
+                except (ValueError, AttributeError):
+                    pass
+            born = born or os.stat(self.path).st_mtime
+        with self._lock:
+            self._size, self._born = size, born
+
+    def _rotate(self, now: float) -> None:
+        """Move the current file aside as a gzipped archive."""
+        self._file.close()
+        self._file = None
+        stamp = time.strftime('%Y%m%dT%H%M%S', time.gmtime(now))
+        archive = self.path.with_name(f"{self.path.stem}.{stamp}{self.path.suffix}.gz")
+        counter = 1
+        while archive.exists():
+            archive = self.path.with_name(f"{self.path.stem}.{stamp}-{counter}{self.path.suffix}.gz")
+            counter += 1
+        partial = archive.with_name(archive.name + ".tmp")
+        with open(self.path, 'rb') as source, gzip.open(partial, 'wb') as target:
+            shutil.copyfileobj(source, target)
+        os.replace(partial, archive)
+        self.path.unlink()
+        with self._lock:
+            self._size = 0
+            self._stats['rotations'] += 1
+        logger.info("Rotated request log to %s", archive)
+
+
+def iter_request_log(path: str = DEFAULT_REQUEST_LOG_PATH) -> Iterator[Dict[str, Any]]:
+    """
+    Stream entries from the rotated archives of ``path`` (oldest first), then from ``path`` itself.
+
+    Files are read line by line, so memory use does not grow with the log.
+    Lines that are not JSON objects, such as a line cut short by a crash,
+    are skipped.
+    """
+    sources = [(gzip.open, archive) for archive in archive_paths(path)]
+    if Path(path).is_file():
+        sources.append((open, Path(path)))
+    for opener, source in sources:
+        with opener(source, 'rt', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logger.debug("Skipping a malformed line in %s", source)
+                    continue
+                if isinstance(entry, dict):
+                    yield entry
+
+
+class TopCounter:
+    """
+    Approximate most frequent values of a stream in constant memory (Space-Saving).
+
+    At most ``capacity`` values are counted. A new value beyond that takes
+    over the least counted one and its count, so counts are upper bounds
+    and values much more frequent than the rest are never lost.
+    """
+
+    def __init__(self, capacity: int = 100):
+        self.capacity = capacity
+        self._counts: Dict[str, int] = {}
+
+    def add(self, value: str) -> None:
+        counts = self._counts
+        if value in counts:
+            counts[value] += 1
+        elif len(counts) < self.capacity:
+            counts[value] = 1
+        else:
+            victim = min(counts, key=counts.get)
+            counts[value] = counts.pop(victim) + 1
+
+    def top(self, limit: int) -> List[Tuple[str, int]]:
+        """The ``limit`` most counted values, most frequent first."""
+        return sorted(self._counts.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+
+class RequestLogReport:
+    """
+    Per-model volume, latency percentiles and failure rates, plus the top prompts, over a stream of entries.
+
+    Memory stays constant per model however many entries are added: latencies
+    are streaming estimates (see utils.telemetry.LatencyStats) and prompts
+    are counted with a :class:`TopCounter`.
+
+    Args:
+        top: Prompts to report.
+    """
+
+    def __init__(self, top: int = DEFAULT_TOP):
+        self.top = top
+        self.requests = 0
+        self._models: Dict[str, Dict[str, Any]] = {}
+        self._prompts = TopCounter(max(top * 10, 100))
+
+    def add(self, entry: Dict[str, Any]) -> None:
+        self.requests += 1
+        model = str(entry.get('model_id') or entry.get('endpoint') or "unknown")
+        summary = self._models.get(model)
+        if summary is None:
+            summary = self._models[model] = {'requests': 0, 'failed': 0, 'errors': {},
+                                             **{phase: LatencyStats() for phase in REPORT_PHASES}}
+        summary['requests'] += 1
+        if entry.get('status') != 'succeeded':
+            summary['failed'] += 1
+            error_type = str(entry.get('error_type') or "unknown")
+            summary['errors'][error_type] = summary['errors'].get(error_type, 0) + 1
+        timings = entry.get('timings') if isinstance(entry.get('timings'), dict) else {}
+        for phase in REPORT_PHASES:
+            value = entry.get(phase) if phase == 'duration' else timings.get(phase)
+            if isinstance(value, (int, float)):
+                summary[phase].add(float(value))
+        if entry.get('prompt'):
+            self._prompts.add(str(entry['prompt']))
+
+    def models(self) -> List[Dict[str, Any]]:
+        """One row per model, busiest first."""
+        rows = []
+        for model, summary in sorted(self._models.items(), key=lambda item: item[1]['requests'], reverse=True):
+            duration, queued, predict = (summary[phase] for phase in REPORT_PHASES)
+            rows.append({
+                'model': model,
+                'requests': summary['requests'],
+                'failed': summary['failed'],
+                'failure_rate': summary['failed'] / summary['requests'],
+                'p50': duration.p50,
+                'p95': duration.p95,
+                'max': duration.max if duration.count else None,
+                'queue_p95': queued.p95,
+                'predict_p95': predict.p95,
+                'errors': dict(summary['errors']),
+            })
+        return rows
+
+    def top_prompts(self) -> List[Tuple[str, int]]:
+        return self._prompts.top(self.top)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {'requests': self.requests, 'models': self.models(),
+                'top_prompts': [{'prompt': prompt, 'count': count} for prompt, count in self.top_prompts()]}
+
+    def format(self) -> str:
+        """The report as plain-text tables."""
+        def seconds(value: Optional[float]) -> str:
+            return "-" if value is None else f"{value:.2f}s"
+
+        lines = [f"{self.requests} request(s)", "",
+                 f"{'model':<28} {'requests':>8} {'failed':>7} {'p50':>8} {'p95':>8} {'max':>8} "
+                 f"{'queue p95':>10} {'predict p95':>12}"]
+        for row in self.models():
+            lines.append(f"{row['model'][:28]:<28} {row['requests']:>8} {row['failure_rate']:>7.1%} "
+                         f"{seconds(row['p50']):>8} {seconds(row['p95']):>8} {seconds(row['max']):>8} "
+                         f"{seconds(row['queue_p95']):>10} {seconds(row['predict_p95']):>12}")
+        lines += ["", "Top prompts:"]
+        lines += [f"{count:>8}  {prompt[:100]}" for prompt, count in self.top_prompts()]
+        return "\n".join(lines)
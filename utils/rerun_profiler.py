@@ -0,0 +1,276 @@
+"""Opt-in per-rerun profiling into a bounded on-disk ring of profile files."""
+import contextlib
+import cProfile
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Profile formats: deterministic cProfile stats, or a sampled flamegraph for https://www.speedscope.app
+PROFILE_FORMATS = {'pstats': '.pstats', 'speedscope': '.speedscope.json'}
+
+DEFAULT_MAX_FILES = 50
+DEFAULT_INTERVAL = 0.001
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+# {started_ms}_{duration_ms}_{session}_{model}_{interaction}{extension}
+_FILENAME = re.compile(r'^(\d+)_(\d+)_([^_]+)_([^_]+)_([^_]+)(\.pstats|\.speedscope\.json)$')
+_UNSAFE = re.compile(r'[^A-Za-z0-9.:-]+')
+
+
+def _safe_tag(value: Any, limit: int = 40) -> str:
+    """Make a tag value safe for a file name: no path separators or underscores."""
+    return _UNSAFE.sub('-', str(value or '-'))[:limit].strip('-') or '-'
+
+
+@dataclass
+class RerunProfile:
+    """One profiled rerun on disk."""
+
+    path: Path
+    started: float
+    duration: float
+    session_id: str
+    model_id: str
+    interaction: str
+
+    @classmethod
+    def from_path(cls, path: Path) -> Optional["RerunProfile"]:
+        """Rebuild an entry from its file name, or None if the name is not a profile's."""
+        match = _FILENAME.match(path.name)
+        if not match:
+            return None
+        started_ms, duration_ms, session_id, model_id, interaction, _ = match.groups()
+        return cls(path, int(started_ms) / 1000, int(duration_ms) / 1000, session_id, model_id, interaction)
+
+    def to_row(self) -> Dict[str, Any]:
+        """Table row for the viewer."""
+        return {
+            'started': time.strftime('%H:%M:%S', time.localtime(self.started)),
+            'duration_ms': round(self.duration * 1000),
+            'session': self.session_id,
+            'model': self.model_id,
+            'interaction': self.interaction,
+            'file': self.path.name,
+        }
+
+
+@dataclass
+class ProfiledRerun:
+    """Handle yielded while a rerun is profiled; set ``tags`` before the block ends."""
+
+    tags: Dict[str, str] = field(default_factory=dict)
+    profile: Optional[RerunProfile] = None
+
+
+class StackSampler:
+    """
+    Sample one thread's Python stack on a background thread.
+
+    Samples are taken every ``interval`` seconds (in practice no more often
+    than the interpreter's switch interval while the thread holds the GIL)
+    and weighted by the time since the previous sample.
+
+    Args:
+        thread_id: ``threading.get_ident()`` of the thread to sample.
+        interval: Seconds between samples.
+    """
+
+    def __init__(self, thread_id: int, interval: float = DEFAULT_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.frames: List[Dict[str, Any]] = []
+        self.samples: List[List[int]] = []
+        self.weights: List[float] = []
+        self._frame_index: Dict[Tuple[str, str, int], int] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="rerun-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                break
+            self._record(frame, now - last)
+            last = now
+
+    def _record(self, frame, weight: float) -> None:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            key = (code.co_qualname, code.co_filename, code.co_firstlineno)
+            index = self._frame_index.get(key)
+            if index is None:
+                index = self._frame_index[key] = len(self.frames)
+                self.frames.append({'name': key[0], 'file': key[1], 'line': key[2]})
+            stack.append(index)
+            frame = frame.f_back
+        stack.reverse()
+        self.samples.append(stack)
+        self.weights.append(weight)
+
+    def speedscope(self, name: str) -> Dict[str, Any]:
+        """Return the samples as a speedscope sampled profile (stacks ordered root first)."""
+        return {
+            '$schema': SPEEDSCOPE_SCHEMA,
+            'name': name,
+            'exporter': 'streamlit-replicate-boss',
+            'shared': {'frames': self.frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'seconds',
+                'startValue': 0,
+                'endValue': sum(self.weights),
+                'samples': self.samples,
+                'weights': self.weights,
+            }],
+        }
+
+
+class RerunProfiler:
+    """
+    Profile whole reruns and keep the most recent ones as files.
+
+    Each profiled rerun is written to ``directory`` (created on first use)
+    with its start time, duration and tags (session id, model id,
+    interaction type) in the file name, so the ring is rebuilt from the
+    directory after a restart. Only the newest ``max_files`` profiles are kept.
+
+    ``speedscope`` samples the rerun's own thread, so concurrent sessions can
+    be profiled at once. ``pstats`` uses cProfile, which Python allows one
+    of at a time; a rerun that starts while another is being profiled with
+    cProfile runs unprofiled.
+
+    Args:
+        directory: Directory for the profile files.
+        fmt: One of PROFILE_FORMATS.
+        max_files: Profiles to keep on disk.
+        interval: Sampling interval in seconds (speedscope only).
+    """
+
+    def __init__(self, directory: str, fmt: str = 'speedscope', max_files: int = DEFAULT_MAX_FILES,
+                 interval: float = DEFAULT_INTERVAL):
+        if fmt not in PROFILE_FORMATS:
+            raise ValueError(f"Profile format must be one of {', '.join(PROFILE_FORMATS)}, got {fmt!r}")
+        if max_files < 1:
+            raise ValueError(f"max_files must be at least 1, got {max_files}")
+        self.directory = Path(directory)
+        self.fmt = fmt
+        self.max_files = max_files
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._cprofile_lock = threading.Lock()
+        self._stats = {'profiled': 0, 'skipped_busy': 0, 'write_errors': 0, 'evicted': 0}
+        paths = self.directory.iterdir() if self.directory.is_dir() else []
+        existing = sorted(filter(None, (RerunProfile.from_path(p) for p in paths)), key=lambda p: p.started)
+        self._ring: Deque[RerunProfile] = deque(existing)
+        self._evict()
+
+    @contextlib.contextmanager
+    def profile(self) -> Iterator[ProfiledRerun]:
+        """
+        Profile the block; the profile is written when it exits, even if it raises.
+
+        Yields:
+            A ProfiledRerun whose ``tags`` (session_id, model_id, interaction)
+            name the file, and whose ``profile`` is set once it is written.
+        """
+        rerun = ProfiledRerun()
+        if self.fmt == 'pstats':
+            if not self._cprofile_lock.acquire(blocking=False):
+                with self._lock:
+                    self._stats['skipped_busy'] += 1
+                yield rerun
+                return
+            profiler = cProfile.Profile()
+            started, start = time.time(), time.perf_counter()
+            try:
+                profiler.enable()
+                try:
+                    yield rerun
+                finally:
+                    profiler.disable()
+                    self._save(rerun, started, time.perf_counter() - start, profiler)
+            finally:
+                self._cprofile_lock.release()
+            return
+        sampler = StackSampler(threading.get_ident(), self.interval)
+        started, start = time.time(), time.perf_counter()
+        sampler.start()
+        try:
+            yield rerun
+        finally:
+            sampler.stop()
+            self._save(rerun, started, time.perf_counter() - start, sampler)
+
+    def _save(self, rerun: ProfiledRerun, started: float, duration: float, source: Any) -> None:
+        tags = rerun.tags
+        name = (f"{int(started * 1000)}_{int(duration * 1000)}_{_safe_tag(tags.get('session_id'), 8)}_"
+                f"{_safe_tag(tags.get('model_id'))}_{_safe_tag(tags.get('interaction'))}{PROFILE_FORMATS[self.fmt]}")
+        path = self.directory / name
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            if self.fmt == 'pstats':
+                source.dump_stats(str(path))
+            else:
+                tmp_path = path.with_name(path.name + ".tmp")
+                tmp_path.write_text(json.dumps(source.speedscope(name)), encoding='utf-8')
+                os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Could not write rerun profile %s: %s", path, e)
+            with self._lock:
+                self._stats['write_errors'] += 1
+            return
+        rerun.profile = RerunProfile.from_path(path)
+        with self._lock:
+            self._stats['profiled'] += 1
+            self._ring.append(rerun.profile)
+            self._evict()
+
+    def _evict(self) -> None:
+        """Delete the oldest profiles beyond max_files (caller holds the lock or is __init__)."""
+        while len(self._ring) > self.max_files:
+            oldest = self._ring.popleft()
+            try:
+                oldest.path.unlink()
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning("Could not delete old rerun profile %s: %s", oldest.path, e)
+            self._stats['evicted'] += 1
+
+    def recent(self) -> List[RerunProfile]:
+        """Profiles on disk, newest first."""
+        with self._lock:
+            return list(reversed(self._ring))
+
+    def slowest(self, limit: int = 10) -> List[RerunProfile]:
+        """The slowest profiled reruns still on disk, slowest first."""
+        with self._lock:
+            return sorted(self._ring, key=lambda p: p.duration, reverse=True)[:limit]
+
+    def stats(self) -> Dict[str, Any]:
+        """Return counters and the number of profiles on disk."""
+        with self._lock:
+            return dict(self._stats, on_disk=len(self._ring), format=self.fmt)
@@ -0,0 +1,139 @@
+"""Module for caching prediction outputs by their exact inputs."""
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 10_000
+
+
+def cache_key(endpoint: str, model_input: Dict[str, Any]) -> str:
+    """
+    Build the cache key for a prediction.
+
+    Keys cover the endpoint (including the model version) and the full
+    input, so only identical requests share a result. Inputs without a
+    ``seed`` are still cached; callers that need fresh samples should set
+    a seed or skip the cache.
+
+    Args:
+        endpoint: Replicate endpoint.
+        model_input: Prediction input.
+
+    Returns:
+        Hex digest identifying the request.
+    """
+    payload = json.dumps([endpoint, model_input], sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """
+    Disk-backed LRU map from prediction inputs to their outputs.
+
+    Entries are appended to a JSONL file as they are added, so the cache
+    survives restarts; the file is compacted on load once it holds many
+    superseded lines. Only the newest ``max_entries`` entries are kept.
+
+    The :meth:`get`/:meth:`record` pair matches :class:`utils.batch.BatchCheckpoint`,
+    so a cache can be passed to :func:`utils.batch.run_batch` to skip jobs
+    whose key is already cached; each job's lookup counts as a hit or miss.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = DEFAULT_MAX_ENTRIES):
+        """
+        Args:
+            path: JSONL file backing the cache, or None for memory only.
+            max_entries: Maximum number of cached requests.
+        """
+        self.path = Path(path) if path else None
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, List[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        if self.path is not None:
+            self._load_file()
+
+    def _load_file(self) -> None:
+        if not self.path.exists():
+            return
+        lines = 0
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                lines += 1
+                try:
+                    entry = json.loads(line)
+                    key, outputs = entry['key'], entry['outputs']
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    logger.warning("Ignoring malformed result cache line in %s", self.path)
+                    continue
+                self._entries[key] = outputs
+                self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        if lines > 2 * max(len(self._entries), 1):
+            self._compact()
+
+    def _compact(self) -> None:
+        """Rewrite the backing file with only the live entries."""
+        tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for key, outputs in self._entries.items():
+                f.write(json.dumps({'key': key, 'outputs': outputs}) + '\n')
+        tmp_path.replace(self.path)
+        logger.info("Compacted result cache %s to %d entries", self.path, len(self._entries))
+
+    def get(self, key: str) -> Optional[List[str]]:
+        """Return cached outputs for ``key`` (marking it recently used), or None."""
+        with self._lock:
+            outputs = self._entries.get(key)
+            if outputs is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return list(outputs)
+
+    def put(self, key: str, outputs: List[str]) -> None:
+        """Store outputs for ``key``, evicting the least recently used entry if full."""
+        outputs = [str(output) for output in outputs]
+        with self._lock:
+            self._entries[key] = outputs
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            if self.path is not None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps({'key': key, 'outputs': outputs}) + '\n')
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        """Return entry count and hit/miss counters."""
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self._hits, 'misses': self._misses}
+
+    # BatchCheckpoint-compatible interface for run_batch()
+
+    def load(self) -> Dict[str, List[str]]:
+        """Return a snapshot of all cached outputs keyed by cache key."""
+        with self._lock:
+            return {key: list(outputs) for key, outputs in self._entries.items()}
+
+    def record(self, result) -> None:
+        """Cache a successful, newly executed batch result under its job key."""
+        if result.ok and not result.resumed and result.outputs:
+            self.put(result.job.key, result.outputs)
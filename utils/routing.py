@@ -0,0 +1,306 @@
+"""Module for routing predictions across a model's deployments and fallback versions."""
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.hedging import CANCELED, PredictionCanceled, PredictionFailed
+from utils.log_progress import CreatedCallback, LogCallback, follow_prediction
+
+logger = logging.getLogger(__name__)
+
+ROUTE_KINDS = ('deployment', 'endpoint')
+
+# Consecutive failures before a route is taken out of rotation, and for how long
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_COOLDOWN = 30.0
+
+# Smoothing factor for the per-route latency average
+_LATENCY_ALPHA = 0.3
+
+
+@dataclass(frozen=True)
+class Route:
+    """
+    One way of running a model.
+
+    Attributes:
+        kind: ``deployment`` (a Replicate deployment name) or ``endpoint`` (``owner/model:version``).
+        target: Deployment name or endpoint.
+        weight: Relative share of traffic when routes are equally healthy.
+        name: Label used in logs and stats.
+        fallback: Only used once every non-fallback route has failed or is out of rotation.
+    """
+    kind: str
+    target: str
+    weight: float = 1.0
+    name: str = ""
+    fallback: bool = False
+
+    @property
+    def label(self) -> str:
+        return self.name or f"{self.kind}:{self.target}"
+
+
+def parse_routes(model: Dict[str, Any]) -> List[Route]:
+    """
+    Build a model's routes from its models.yaml ``routes`` list.
+
+    Each entry has exactly one of ``deployment`` or ``endpoint``, plus an
+    optional ``weight`` (default 1), ``name`` and ``fallback`` flag. The
+    model's own endpoint is appended as a fallback unless a route already
+    uses it.
+
+    Args:
+        model: Model configuration.
+
+    Returns:
+        Routes in configured order; empty if the model has no ``routes``.
+
+    Raises:
+        ValueError: If the routes are malformed.
+    """
+    config = model.get('routes')
+    if config is None:
+        return []
+    if not isinstance(config, list) or not config:
+        raise ValueError("'routes' must be a non-empty list")
+    routes = []
+    for idx, entry in enumerate(config):
+        where = f"routes[{idx}]"
+        if not isinstance(entry, dict):
+            raise ValueError(f"{where} must be a mapping, got {type(entry).__name__}")
+        unknown = set(entry) - set(ROUTE_KINDS) - {'weight', 'name', 'fallback'}
+        if unknown:
+            raise ValueError(f"{where}: unknown option(s): {', '.join(sorted(unknown))}")
+        kinds = [kind for kind in ROUTE_KINDS if kind in entry]
+        if len(kinds) != 1:
+            raise ValueError(f"{where} needs exactly one of 'deployment' or 'endpoint'")
+        kind = kinds[0]
+        target = entry[kind]
+        if not isinstance(target, str) or '/' not in target:
+            raise ValueError(f"{where}: '{kind}' must look like owner/name, got {target!r}")
+        weight = entry.get('weight', 1)
+        if isinstance(weight, bool) or not isinstance(weight, (int, float)) or weight <= 0:
+            raise ValueError(f"{where}: 'weight' must be a positive number, got {weight!r}")
+        name = entry.get('name', "")
+        if not isinstance(name, str):
+            raise ValueError(f"{where}: 'name' must be a string, got {type(name).__name__}")
+        fallback = entry.get('fallback', False)
+        if not isinstance(fallback, bool):
+            raise ValueError(f"{where}: 'fallback' must be true or false, got {fallback!r}")
+        routes.append(Route(kind=kind, target=target, weight=float(weight), name=name, fallback=fallback))
+    if all(route.fallback for route in routes):
+        raise ValueError("'routes' needs at least one route that is not a fallback")
+    endpoint = model.get('endpoint')
+    if isinstance(endpoint, str) and not any(r.kind == 'endpoint' and r.target == endpoint for r in routes):
+        routes.append(Route(kind='endpoint', target=endpoint, name="fallback", fallback=True))
+    return routes
+
+
+def run_deployment(client: Any, deployment: str, model_input: Dict[str, Any],
+                   on_logs: Optional[LogCallback] = None, on_created: Optional[CreatedCallback] = None) -> Any:
+    """
+    Run a prediction on a Replicate deployment and wait for it.
+
+    Args:
+        client: The ``replicate`` module or a ``replicate.Client``.
+        deployment: Deployment name (``owner/name``).
+        model_input: Prediction input.
+        on_logs: Optional callback receiving the prediction's logs while it runs.
+        on_created: Optional callback receiving the prediction right after it is created.
+
+    Returns:
+        The prediction output.
+
+    Raises:
+        PredictionFailed: If the prediction did not succeed.
+        PredictionCanceled: If the prediction was canceled.
+    """
+    prediction = client.predictions.create(deployment=deployment, input=model_input)
+    if on_created is not None:
+        on_created(prediction)
+    if on_logs is not None:
+        return follow_prediction(prediction, on_logs)
+    prediction.wait()
+    if prediction.status == CANCELED:
+        raise PredictionCanceled(f"Deployment {deployment} prediction {prediction.status}: {prediction.error}")
+    if prediction.status != 'succeeded':
+        raise PredictionFailed(f"Deployment {deployment} prediction {prediction.status}: {prediction.error}")
+    return prediction.output
+
+
+class _RouteHealth:
+    """Mutable health counters for one route; guarded by the router lock."""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.latency: Optional[float] = None
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+
+
+class Router:
+    """
+    Picks a route per prediction from health, queue depth and latency, failing over on errors.
+
+    Healthy routes are scored ``weight / ((1 + in_flight) * latency)``; the
+    first route is drawn at random in proportion to its score, so traffic
+    follows the weights while shifting away from busy or slow routes. The
+    other healthy routes follow in score order as failovers, then fallback
+    routes. Fallbacks only take first-choice traffic when no other route is
+    healthy. A route that fails
+    ``failure_threshold`` times in a row is skipped for ``cooldown``
+    seconds (tried last, only if everything else fails), then gets
+    traffic again.
+
+    Args:
+        routes: Routes per primary endpoint (see :func:`parse_routes`).
+        failure_threshold: Consecutive failures that take a route out of rotation.
+        cooldown: Seconds a failing route stays out of rotation.
+        clock: Monotonic clock (injectable for tests).
+        rng: Random source (injectable for tests).
+    """
+
+    def __init__(self, routes: Dict[str, List[Route]], failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 cooldown: float = DEFAULT_COOLDOWN, clock: Callable[[], float] = time.monotonic,
+                 rng: Optional[random.Random] = None):
+        self.routes = {endpoint: list(route_list) for endpoint, route_list in routes.items() if route_list}
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.rng = rng or random.Random()
+        self._lock = threading.Lock()
+        self._health: Dict[Route, _RouteHealth] = {
+            route: _RouteHealth() for route_list in self.routes.values() for route in route_list
+        }
+
+    def has_routes(self, endpoint: str) -> bool:
+        return endpoint in self.routes
+
+    def plan(self, endpoint: str) -> List[Route]:
+        """Return the routes to try for one prediction, in order."""
+        now = self.clock()
+        with self._lock:
+            routes = self.routes.get(endpoint, [])
+            healthy = [r for r in routes if self._health[r].open_until <= now]
+            tripped = sorted((r for r in routes if r not in healthy), key=lambda r: self._health[r].open_until)
+            known = [self._health[r].latency for r in healthy if self._health[r].latency is not None]
+            typical = sorted(known)[len(known) // 2] if known else 1.0
+            scores = {}
+            for route in healthy:
+                health = self._health[route]
+                latency = max(health.latency if health.latency is not None else typical, 0.1)
+                scores[route] = route.weight / ((1 + health.in_flight) * latency)
+        if not healthy:
+            return tripped
+        candidates = [r for r in healthy if not r.fallback] or healthy
+        first = self.rng.choices(candidates, weights=[scores[r] for r in candidates])[0]
+        rest = sorted((r for r in healthy if r is not first), key=lambda r: (r.fallback, -scores[r]))
+        return [first] + rest + tripped
+
+    def run(self, endpoint: str, model_input: Dict[str, Any],
+            run_fn: Callable[[Route, Dict[str, Any]], Any]) -> Any:
+        """
+        Run a prediction, failing over to the next route on errors.
+
+        Args:
+            endpoint: The model's primary endpoint.
+            model_input: Prediction input.
+            run_fn: Called as ``run_fn(route, model_input)``.
+
+        Returns:
+            The first successful route's output.
+
+        Raises:
+            PredictionCanceled: At once, if the prediction was canceled on purpose; that is
+                neither a route failure nor worth retrying on another route.
+            Exception: The last route's error if every route failed.
+        """
+        last_error: Optional[BaseException] = None
+        for attempt, route in enumerate(self.plan(endpoint)):
+            if attempt:
+                logger.warning("Failing over %s to %s after: %s", endpoint, route.label, last_error)
+            started = self._begin(route)
+            try:
+                output = run_fn(route, model_input)
+            except PredictionCanceled:
+                self._release(route)
+                raise
+            except Exception as e:
+                self._end(route, started, ok=False)
+                last_error = e
+                continue
+            self._end(route, started, ok=True)
+            return output
+        if last_error is None:
+            raise ValueError(f"No routes configured for {endpoint}")
+        raise last_error
+
+    def _begin(self, route: Route) -> float:
+        with self._lock:
+            self._health[route].in_flight += 1
+        return self.clock()
+
+    def _release(self, route: Route) -> None:
+        """End an attempt without counting it for or against the route's health."""
+        with self._lock:
+            self._health[route].in_flight -= 1
+
+    def _end(self, route: Route, started: float, ok: bool) -> None:
+        now = self.clock()
+        with self._lock:
+            health = self._health[route]
+            health.in_flight -= 1
+            if ok:
+                elapsed = now - started
+                health.latency = elapsed if health.latency is None else (
+                    _LATENCY_ALPHA * elapsed + (1 - _LATENCY_ALPHA) * health.latency)
+                health.successes += 1
+                health.consecutive_failures = 0
+                return
+            health.failures += 1
+            health.consecutive_failures += 1
+            if health.consecutive_failures >= self.failure_threshold:
+                health.open_until = now + self.cooldown
+                logger.warning("Route %s failed %s times in a row; skipping it for %.0fs",
+                               route.label, health.consecutive_failures, self.cooldown)
+
+    def stats(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Return per-route health for each routed endpoint."""
+        now = self.clock()
+        with self._lock:
+            return {
+                endpoint: [{
+                    'route': route.label,
+                    'weight': route.weight,
+                    'in_flight': self._health[route].in_flight,
+                    'latency': self._health[route].latency,
+                    'successes': self._health[route].successes,
+                    'failures': self._health[route].failures,
+                    'healthy': self._health[route].open_until <= now,
+                } for route in route_list]
+                for endpoint, route_list in self.routes.items()
+            }
+
+
+def model_routes(models: List[Dict[str, Any]]) -> Dict[str, List[Route]]:
+    """
+    Collect routes keyed by primary endpoint for models that configure ``routes``.
+
+    Raises:
+        ValueError: If a model's routes are malformed.
+    """
+    routes = {}
+    for model in models:
+        try:
+            model_route_list = parse_routes(model)
+        except ValueError as e:
+            raise ValueError(f"Model '{model.get('id', '?')}': {e}") from e
+        if model_route_list:
+            routes[model['endpoint']] = model_route_list
+    return routes
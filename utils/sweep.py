@@ -0,0 +1,260 @@
+"""Module for parameter sweeps: Cartesian grids of settings and contact-sheet rendering."""
+import io
+import itertools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from utils.batch import BatchJob, BatchResult
+from utils.generation import resolve_generation
+from utils.result_cache import cache_key
+
+logger = logging.getLogger(__name__)
+
+# Parameters the sweep UI exposes (all are in the sidebar "Refine your output" expander)
+SWEEP_PARAMS = ('guidance_scale', 'num_inference_steps', 'scheduler')
+
+# Hard cap on grid size, so a typo in a value list cannot launch hundreds of predictions
+MAX_SWEEP_CELLS = 64
+
+DEFAULT_CELL_SIZE = 256
+_LABEL_HEIGHT = 28
+_LABEL_WIDTH = 200
+_BACKGROUND = (255, 255, 255)
+_MISSING = (200, 200, 200)
+
+
+@dataclass
+class SweepPlan:
+    """
+    A planned sweep grid.
+
+    Attributes:
+        jobs: One job per cell, in row-major order; ``job.index`` is the cell index.
+        columns: Number of grid columns.
+        row_labels: Label for each row (combination of the row parameters).
+        column_labels: Label for each column (values of the column parameter).
+    """
+    jobs: List[BatchJob]
+    columns: int
+    row_labels: List[str]
+    column_labels: List[str]
+
+    @property
+    def rows(self) -> int:
+        return len(self.row_labels)
+
+
+def parse_values(text: str, cast: Callable[[str], Any] = str) -> List[Any]:
+    """
+    Parse a comma-separated list of sweep values, dropping duplicates.
+
+    Args:
+        text: e.g. ``"5, 7.5, 10"``.
+        cast: Conversion applied to each value (int, float or str).
+
+    Returns:
+        Values in their original order.
+
+    Raises:
+        ValueError: If a value cannot be converted.
+    """
+    values = []
+    for part in text.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            value = cast(part)
+        except ValueError:
+            raise ValueError(f"Invalid value '{part}' for {getattr(cast, '__name__', 'value')} parameter")
+        if value not in values:
+            values.append(value)
+    return values
+
+
+def expand_grid(params: Dict[str, Sequence[Any]]) -> List[Dict[str, Any]]:
+    """
+    Expand per-parameter value lists into their Cartesian product.
+
+    Duplicate values within a parameter are dropped, so every combination
+    is unique. Parameters with no values are ignored.
+
+    Args:
+        params: Ordered mapping of parameter name to candidate values.
+
+    Returns:
+        One settings dict per combination; the last parameter varies fastest.
+    """
+    axes = {name: list(dict.fromkeys(values)) for name, values in params.items() if values}
+    if not axes:
+        return [{}]
+    names = list(axes)
+    return [dict(zip(names, combo)) for combo in itertools.product(*(axes[name] for name in names))]
+
+
+def _label(settings: Dict[str, Any]) -> str:
+    return ", ".join(f"{name}={value}" for name, value in settings.items()) or "-"
+
+
+def plan_sweep(model: Dict[str, Any], presets: Dict[str, List[Dict[str, Any]]], prompt: str,
+               params: Dict[str, Sequence[Any]], base_settings: Optional[Dict[str, Any]] = None,
+               negative_prompt: Optional[str] = None, column_param: Optional[str] = None,
+               max_cells: int = MAX_SWEEP_CELLS) -> SweepPlan:
+    """
+    Plan a sweep grid for one model and prompt.
+
+    ``column_param`` (default: the first swept parameter) varies across
+    columns; the remaining parameters combine into rows. Each cell produces
+    a single image. Job keys are result-cache keys, so cells already in the
+    cache can be skipped.
+
+    Args:
+        model: Model configuration.
+        presets: Presets grouped by model_id (the default preset is applied).
+        prompt: Prompt without trigger words.
+        params: Parameter name to candidate values.
+        base_settings: Settings shared by every cell (e.g. a fixed seed).
+        negative_prompt: Negative prompt override.
+        column_param: Parameter used for the columns.
+        max_cells: Maximum grid size.
+
+    Returns:
+        The sweep plan.
+
+    Raises:
+        ValueError: If nothing is swept, the grid is too large or the model is invalid.
+    """
+    axes = {name: list(dict.fromkeys(values)) for name, values in params.items() if values}
+    if not axes:
+        raise ValueError("Choose at least one value for a parameter to sweep")
+    column_param = column_param if column_param in axes else next(iter(axes))
+    column_values = axes.pop(column_param)
+    row_combos = expand_grid(axes)
+
+    cells = len(column_values) * len(row_combos)
+    if cells > max_cells:
+        raise ValueError(f"Sweep has {cells} cells; the limit is {max_cells}. Remove some values.")
+
+    jobs = []
+    for row_settings in row_combos:
+        for column_value in column_values:
+            overrides = {**(base_settings or {}), **row_settings, column_param: column_value, 'num_outputs': 1}
+            endpoint, model_input, _ = resolve_generation(model, presets, prompt, settings=overrides,
+                                                          negative_prompt=negative_prompt)
+            record = {
+                'job_id': _label({**row_settings, column_param: column_value}),
+                'prompt': model_input['prompt'],
+                'negative_prompt': model_input.get('negative_prompt'),
+                'model_id': model.get('id'),
+                'endpoint': endpoint,
+                'seed': model_input.get('seed'),
+                'settings': model_input,
+            }
+            jobs.append(BatchJob(index=len(jobs), key=cache_key(endpoint, model_input),
+                                 endpoint=endpoint, model_input=model_input, record=record))
+
+    return SweepPlan(jobs=jobs, columns=len(column_values),
+                     row_labels=[_label(combo) for combo in row_combos],
+                     column_labels=[f"{column_param}={value}" for value in column_values])
+
+
+def load_thumbnails(results: Sequence[Optional[BatchResult]], open_image: Callable[[str], Any],
+                    cell_size: int = DEFAULT_CELL_SIZE, max_workers: int = 8) -> List[Optional[np.ndarray]]:
+    """
+    Fetch and downscale the first output of each cell in parallel.
+
+    Args:
+        results: One result per cell (None or failed results give None).
+        open_image: Returns a readable path or file object for an output URL.
+        cell_size: Size of the square cell in pixels.
+        max_workers: Parallel fetch/decode workers.
+
+    Returns:
+        RGB uint8 arrays of shape (cell_size, cell_size, 3), or None per cell.
+    """
+    def _load(result: Optional[BatchResult]) -> Optional[np.ndarray]:
+        if result is None or not result.ok or not result.outputs:
+            return None
+        try:
+            with Image.open(open_image(result.outputs[0])) as image:
+                image = image.convert('RGB')
+                image.thumbnail((cell_size, cell_size))
+                cell = Image.new('RGB', (cell_size, cell_size), _BACKGROUND)
+                cell.paste(image, ((cell_size - image.width) // 2, (cell_size - image.height) // 2))
+                return np.asarray(cell, dtype=np.uint8)
+        except Exception as e:
+            logger.warning("Could not load sweep cell %s: %s", result.job.record.get('job_id'), e)
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='sweep-thumb') as executor:
+        return list(executor.map(_load, results))
+
+
+def tile_grid(cells: Sequence[Optional[np.ndarray]], rows: int, columns: int, cell_size: int) -> np.ndarray:
+    """
+    Tile equally sized cell arrays into one image array.
+
+    Cells are stacked into a (rows, columns, h, w, 3) block and reshaped, so
+    the whole grid is assembled by a single NumPy copy. Missing cells are
+    filled with a neutral grey.
+
+    Returns:
+        Array of shape (rows * cell_size, columns * cell_size, 3).
+    """
+    block = np.empty((rows, columns, cell_size, cell_size, 3), dtype=np.uint8)
+    block[...] = _MISSING
+    for index, cell in enumerate(cells[:rows * columns]):
+        if cell is not None:
+            block[index // columns, index % columns] = cell
+    return block.transpose(0, 2, 1, 3, 4).reshape(rows * cell_size, columns * cell_size, 3)
+
+
+def build_contact_sheet(cells: Sequence[Optional[np.ndarray]], row_labels: List[str], column_labels: List[str],
+                        cell_size: int = DEFAULT_CELL_SIZE) -> Image.Image:
+    """
+    Compose an axis-labelled contact sheet from cell thumbnails.
+
+    Args:
+        cells: Thumbnails in row-major order (see :func:`load_thumbnails`).
+        row_labels: One label per row.
+        column_labels: One label per column.
+        cell_size: Size of each square cell.
+
+    Returns:
+        The contact sheet as a PIL image.
+    """
+    rows, columns = len(row_labels), len(column_labels)
+    grid = tile_grid(cells, rows, columns, cell_size)
+
+    sheet = np.empty((_LABEL_HEIGHT + grid.shape[0], _LABEL_WIDTH + grid.shape[1], 3), dtype=np.uint8)
+    sheet[...] = _BACKGROUND
+    sheet[_LABEL_HEIGHT:, _LABEL_WIDTH:] = grid
+
+    image = Image.fromarray(sheet)
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default()
+    for col, label in enumerate(column_labels):
+        draw.text((_LABEL_WIDTH + col * cell_size + 6, 8), label, fill=(0, 0, 0), font=font)
+    for row, label in enumerate(row_labels):
+        y = _LABEL_HEIGHT + row * cell_size + cell_size // 2 - 6
+        draw.text((6, y), label[:32], fill=(0, 0, 0), font=font)
+    return image
+
+
+def contact_sheet_png(image: Image.Image) -> bytes:
+    """Encode a contact sheet as PNG bytes."""
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG', optimize=False)
+    return buffer.getvalue()
+
+
+def sweep_summary(results: Sequence[BatchResult]) -> Tuple[int, int, int]:
+    """Return (executed, cached, failed) counts for a finished sweep."""
+    cached = sum(1 for result in results if result.resumed)
+    failed = sum(1 for result in results if not result.ok)
+    return len(results) - cached - failed, cached, failed
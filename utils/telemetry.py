@@ -0,0 +1,211 @@
+"""Module for per-model latency telemetry with constant-memory streaming percentiles."""
+import logging
+import math
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Phases recorded per generation
+PHASES = ('queue', 'predict', 'download', 'total')
+
+# Samples needed in a bucket before its estimate is preferred over the model-wide one
+MIN_BUCKET_SAMPLES = 3
+
+_ALL_BUCKETS = '*'
+
+
+class P2Quantile:
+    """
+    Streaming quantile estimator using the P² algorithm (Jain & Chlamtac, 1985).
+
+    Keeps five markers regardless of how many values are added, so memory
+    and per-sample cost are constant. Until five values have been seen the
+    exact nearest-rank quantile of those values is returned.
+
+    Args:
+        p: Quantile to estimate, between 0 and 1 (e.g. 0.95).
+    """
+
+    def __init__(self, p: float):
+        if not 0 < p < 1:
+            raise ValueError(f"Quantile must be between 0 and 1, got {p}")
+        self.p = p
+        self.count = 0
+        self._heights: List[float] = []
+        self._positions = [1, 2, 3, 4, 5]
+        self._desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self._increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, value: float) -> None:
+        """Add one observation."""
+        self.count += 1
+        q = self._heights
+        if self.count <= 5:
+            q.append(value)
+            q.sort()
+            return
+
+        if value < q[0]:
+            q[0] = value
+            k = 0
+        elif value >= q[4]:
+            q[4] = value
+            k = 3
+        else:
+            k = next(i for i in range(4) if q[i] <= value < q[i + 1])
+
+        n = self._positions
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+
+        for i in (1, 2, 3):
+            d = self._desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                step = 1 if d > 0 else -1
+                candidate = self._parabolic(i, step)
+                if not q[i - 1] < candidate < q[i + 1]:
+                    candidate = q[i] + step * (q[i + step] - q[i]) / (n[i + step] - n[i])
+                q[i] = candidate
+                n[i] += step
+
+    def _parabolic(self, i: int, d: int) -> float:
+        q, n = self._heights, self._positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def value(self) -> Optional[float]:
+        """Current estimate, or None before any observation."""
+        if not self._heights:
+            return None
+        if self.count <= 5:
+            rank = max(math.ceil(self.p * len(self._heights)) - 1, 0)
+            return self._heights[rank]
+        return self._heights[2]
+
+
+class LatencyStats:
+    """Count, mean, max, p50 and p95 of a stream of durations, in constant memory."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._p50 = P2Quantile(0.5)
+        self._p95 = P2Quantile(0.95)
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self._p50.add(seconds)
+        self._p95.add(seconds)
+
+    @property
+    def p50(self) -> Optional[float]:
+        return self._p50.value()
+
+    @property
+    def p95(self) -> Optional[float]:
+        return self._p95.value()
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else None,
+            'p50': self.p50,
+            'p95': self.p95,
+            'max': self.max if self.count else None,
+        }
+
+
+def setting_bucket(settings: Dict[str, Any]) -> str:
+    """Bucket label for a generation's cost-relevant settings: ``<width>x<height>@<steps>``."""
+    return f"{settings.get('width', '?')}x{settings.get('height', '?')}@{settings.get('num_inference_steps', '?')}"
+
+
+class TelemetryStore:
+    """
+    Thread-safe latency aggregates per model, setting bucket and phase.
+
+    Every sample is added to its bucket and to the model-wide ``*`` bucket.
+    Each (model, bucket, phase) holds one :class:`LatencyStats`, so memory
+    grows with the number of distinct buckets, not with traffic.
+
+    Phases: ``queue`` (waiting for a local concurrency slot), ``predict``
+    (the Replicate call, including its own queueing and cold start),
+    ``download`` (copying outputs to the image store) and ``total``
+    (queue plus predict: time until images are shown).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[Tuple[str, str, str], LatencyStats] = {}
+
+    def record(self, model_id: str, settings: Dict[str, Any], phases: Dict[str, float]) -> None:
+        """
+        Record phase durations for one generation.
+
+        Args:
+            model_id: Model id (or endpoint when no id is known).
+            settings: Generation settings, used for the bucket.
+            phases: Seconds per phase; unknown phases are ignored.
+        """
+        bucket = setting_bucket(settings)
+        with self._lock:
+            for phase, seconds in phases.items():
+                if phase not in PHASES or seconds is None:
+                    continue
+                for key in ((model_id, bucket, phase), (model_id, _ALL_BUCKETS, phase)):
+                    stats = self._stats.get(key)
+                    if stats is None:
+                        stats = self._stats[key] = LatencyStats()
+                    stats.add(seconds)
+
+    def estimate(self, model_id: str, settings: Dict[str, Any], phase: str = 'total') -> Optional[float]:
+        """
+        Expected (median) duration of a phase for a model and settings.
+
+        Uses the setting bucket once it has a few samples, otherwise the
+        model-wide median; None if the model has no samples yet.
+        """
+        with self._lock:
+            bucket = self._stats.get((model_id, setting_bucket(settings), phase))
+            if bucket is not None and bucket.count >= MIN_BUCKET_SAMPLES:
+                return bucket.p50
+            overall = self._stats.get((model_id, _ALL_BUCKETS, phase))
+            return overall.p50 if overall is not None else None
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Return one row per (model, bucket, phase) with count, mean, p50, p95 and max seconds."""
+        with self._lock:
+            rows = [{'model': model_id, 'bucket': bucket, 'phase': phase, **stats.as_dict()}
+                    for (model_id, bucket, phase), stats in self._stats.items()]
+        phase_order = {phase: idx for idx, phase in enumerate(PHASES)}
+        return sorted(rows, key=lambda row: (row['model'], row['bucket'] != _ALL_BUCKETS, row['bucket'],
+                                             phase_order[row['phase']]))
+
+    def throughput(self) -> Dict[str, int]:
+        """Number of completed generations per model."""
+        with self._lock:
+            return {model_id: stats.count for (model_id, bucket, phase), stats in self._stats.items()
+                    if bucket == _ALL_BUCKETS and phase == 'total'}
+
+
+def progress_fraction(elapsed: float, estimate: Optional[float]) -> float:
+    """
+    Progress towards an estimate, never reaching 1 before the work is done.
+
+    Past the estimate, progress keeps creeping towards (but not reaching)
+    99% so a slow run still visibly moves.
+    """
+    if not estimate or estimate <= 0:
+        return 0.0
+    ratio = elapsed / estimate
+    if ratio <= 0.9:
+        return ratio
+    return min(0.9 + 0.09 * (1 - math.exp(-(ratio - 0.9) * 2)), 0.99)
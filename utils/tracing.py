@@ -0,0 +1,405 @@
+"""Structured tracing spans for the generation pipeline, exported off the request path."""
+import contextlib
+import contextvars
+import json
+import logging
+import secrets
+import threading
+import time
+import urllib.request
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+from utils.batch_writer import BatchWriter
+
+logger = logging.getLogger(__name__)
+
+TRACE_EXPORTERS = ('jsonl', 'otlp', 'none')
+DEFAULT_TRACE_PATH = "traces/spans.jsonl"
+DEFAULT_SERVICE_NAME = "streamlit-replicate-boss"
+DEFAULT_MAX_QUEUE = 2048
+DEFAULT_BATCH_SIZE = 128
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+# OTLP status codes (opentelemetry/proto/trace/v1/trace.proto)
+_OTLP_STATUS = {'ok': 1, 'error': 2}
+_OTLP_SPAN_KIND_INTERNAL = 1
+
+
+@dataclass(frozen=True)
+class SpanContext:
+    """Identifies a span so work on another thread can be attached to it."""
+
+    trace_id: str
+    span_id: str
+
+
+@dataclass
+class Span:
+    """
+    One timed phase of a submission.
+
+    Times are seconds since the epoch; ids are hex strings in the W3C/OTLP
+    sizes (16-byte trace id, 8-byte span id).
+    """
+
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start: float
+    end: Optional[float] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    status: str = 'ok'
+    error: Optional[str] = None
+
+    @property
+    def context(self) -> SpanContext:
+        return SpanContext(self.trace_id, self.span_id)
+
+    @property
+    def duration(self) -> Optional[float]:
+        return None if self.end is None else self.end - self.start
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        """Set an attribute; None values are skipped."""
+        if value is not None:
+            self.attributes[key] = value
+
+    def set_error(self, error: BaseException) -> None:
+        """Mark the span failed with the exception type and message."""
+        self.status = 'error'
+        self.error = f"{type(error).__name__}: {error}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-serializable form, one line of the JSONL export."""
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': round(self.start, 6),
+            'end': round(self.end, 6) if self.end is not None else None,
+            'duration_ms': round(self.duration * 1000, 3) if self.end is not None else None,
+            'status': self.status,
+            'error': self.error,
+            'attributes': self.attributes,
+        }
+
+
+class JsonlSpanExporter:
+    """
+    Append spans to a JSON-lines file, one span per line.
+
+    The file and its directory are created on the first export.
+
+    Args:
+        path: File to append to.
+    """
+
+    def __init__(self, path: str = DEFAULT_TRACE_PATH):
+        self.path = Path(path)
+
+    def export(self, spans: Sequence[Span]) -> None:
+        lines = "".join(json.dumps(span.to_dict(), default=str) + "\n" for span in spans)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open('a', encoding='utf-8') as f:
+            f.write(lines)
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        # int64 is a string in the OTLP JSON mapping
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{'key': key, 'value': _otlp_value(value)} for key, value in attributes.items()]
+
+
+def otlp_payload(spans: Sequence[Span], service_name: str = DEFAULT_SERVICE_NAME) -> Dict[str, Any]:
+    """
+    Encode spans as an OTLP/HTTP JSON ``ExportTraceServiceRequest``.
+
+    Args:
+        spans: Finished spans.
+        service_name: ``service.name`` resource attribute.
+
+    Returns:
+        The request body as a dict.
+    """
+    otlp_spans = []
+    for span in spans:
+        otlp_span = {
+            'traceId': span.trace_id,
+            'spanId': span.span_id,
+            'name': span.name,
+            'kind': _OTLP_SPAN_KIND_INTERNAL,
+            'startTimeUnixNano': str(int(span.start * 1e9)),
+            'endTimeUnixNano': str(int((span.end if span.end is not None else span.start) * 1e9)),
+            'attributes': _otlp_attributes(span.attributes),
+            'status': {'code': _OTLP_STATUS[span.status], **({'message': span.error} if span.error else {})},
+        }
+        if span.parent_id:
+            otlp_span['parentSpanId'] = span.parent_id
+        otlp_spans.append(otlp_span)
+    return {'resourceSpans': [{
+        'resource': {'attributes': _otlp_attributes({'service.name': service_name})},
+        'scopeSpans': [{'scope': {'name': __name__}, 'spans': otlp_spans}],
+    }]}
+
+
+class OtlpSpanExporter:
+    """
+    Send spans to an OpenTelemetry collector over OTLP/HTTP with JSON encoding.
+
+    Uses only the standard library, so no OpenTelemetry packages are needed.
+
+    Args:
+        endpoint: Collector base URL (``OTEL_EXPORTER_OTLP_ENDPOINT``, e.g.
+                  ``http://localhost:4318``); ``/v1/traces`` is appended
+                  unless the URL already ends with it.
+        service_name: ``service.name`` resource attribute.
+        headers: Extra request headers (e.g. an API key for a hosted collector).
+        timeout: Request timeout in seconds.
+    """
+
+    def __init__(self, endpoint: str, service_name: str = DEFAULT_SERVICE_NAME,
+                 headers: Optional[Dict[str, str]] = None, timeout: float = 5.0):
+        endpoint = endpoint.strip().rstrip('/')
+        if not endpoint.startswith(('http://', 'https://')):
+            raise ValueError(f"OTLP endpoint must be an http(s) URL, got {endpoint!r}")
+        self.url = endpoint if endpoint.endswith('/v1/traces') else f"{endpoint}/v1/traces"
+        self.service_name = service_name
+        self.headers = {'Content-Type': 'application/json', **(headers or {})}
+        self.timeout = timeout
+
+    def export(self, spans: Sequence[Span]) -> None:
+        body = json.dumps(otlp_payload(spans, self.service_name), default=str).encode('utf-8')
+        request = urllib.request.Request(self.url, data=body, headers=self.headers, method='POST')
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+def _new_id(size: int) -> str:
+    return secrets.token_hex(size)
+
+
+def _timestamp(value: Any) -> Optional[float]:
+    """Parse an ISO 8601 timestamp from the Replicate API into epoch seconds."""
+    if not isinstance(value, str) or not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        return None
+
+
+class Tracer:
+    """
+    Create spans and hand finished ones to an exporter on a background thread.
+
+    The current span is tracked in a context variable, so spans opened
+    inside another span become its children. Work on other threads is
+    attached by passing ``parent`` explicitly or by running it through
+    :meth:`bind`. Finishing a span only puts it on a bounded
+    :class:`BatchWriter` queue; when the queue is full the span is dropped and counted, so a slow
+    collector never slows a rerun down.
+
+    Args:
+        exporter: Object with ``export(spans)`` (see JsonlSpanExporter,
+                  OtlpSpanExporter), or None to create spans without exporting them.
+        max_queue: Finished spans waiting to be exported.
+        batch_size: Most spans per export call.
+        flush_interval: Seconds to wait for a batch to fill before exporting it.
+    """
+
+    def __init__(self, exporter: Any = None, max_queue: int = DEFAULT_MAX_QUEUE,
+                 batch_size: int = DEFAULT_BATCH_SIZE, flush_interval: float = DEFAULT_FLUSH_INTERVAL):
+        self.exporter = exporter
+        self._current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar(
+            f"current_span_{id(self)}", default=None)
+        self._lock = threading.Lock()
+        self._stats = {'finished': 0, 'exported': 0, 'export_errors': 0}
+        self._writer: Optional[BatchWriter] = None
+        if exporter is not None:
+            self._writer = BatchWriter(lambda batch: self._export(batch), "span-exporter", max_queue, batch_size,
+                                       flush_interval)
+
+    def current(self) -> Optional[SpanContext]:
+        """Context of the span open in this context, or None."""
+        span = self._current.get()
+        return span.context if span is not None else None
+
+    def bind(self, fn: Callable[..., Any]) -> Callable[..., Any]:
+        """
+        Bind ``fn`` to the span open now, so spans it opens on another thread nest under it.
+
+        Only the current span is carried over, not the rest of the caller's context.
+        """
+        parent = self._current.get()
+
+        def _bound(*args, **kwargs):
+            token = self._current.set(parent)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._current.reset(token)
+
+        return _bound
+
+    def _start(self, name: str, start: float, parent: Optional[SpanContext],
+               attributes: Dict[str, Any]) -> Span:
+        parent = parent if parent is not None else self.current()
+        span = Span(name, parent.trace_id if parent else _new_id(16), _new_id(8),
+                    parent.span_id if parent else None, start)
+        for key, value in attributes.items():
+            span.set_attribute(key, value)
+        return span
+
+    @contextlib.contextmanager
+    def span(self, name: str, parent: Optional[SpanContext] = None, **attributes: Any) -> Iterator[Span]:
+        """
+        Time the block as a span; it is marked failed if the block raises.
+
+        Args:
+            name: Span name (the pipeline phase).
+            parent: Parent span, defaulting to the span open in this context.
+            **attributes: Initial attributes; more can be set on the yielded span.
+
+        Yields:
+            The open span.
+        """
+        span = self._start(name, time.time(), parent, attributes)
+        started = time.perf_counter()
+        token = self._current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set_error(e)
+            raise
+        finally:
+            self._current.reset(token)
+            span.end = span.start + (time.perf_counter() - started)
+            self._finish(span)
+
+    def record(self, name: str, start: float, end: float, parent: Optional[SpanContext] = None,
+               **attributes: Any) -> Span:
+        """
+        Record a span for a phase timed elsewhere (a queue wait, a remote phase, a callback).
+
+        Args:
+            name: Span name.
+            start: Start time in seconds since the epoch.
+            end: End time in seconds since the epoch.
+            parent: Parent span, defaulting to the span open in this context.
+            **attributes: Span attributes.
+
+        Returns:
+            The finished span.
+        """
+        span = self._start(name, start, parent, attributes)
+        span.end = max(end, start)
+        self._finish(span)
+        return span
+
+    def record_prediction(self, prediction: Any, created: float, parent: Optional[SpanContext] = None) -> None:
+        """
+        Record Replicate's queue and processing phases of a finished prediction.
+
+        Durations come from the prediction's own ``created_at``,
+        ``started_at`` and ``completed_at``; they are laid out from
+        ``created`` (the local time the create call returned) so clock skew
+        between Replicate and this host does not distort them.
+
+        Args:
+            prediction: Prediction object or dict from the Replicate API.
+            created: Local epoch time the prediction was created.
+            parent: Parent span, defaulting to the span open in this context.
+        """
+        def field_of(name):
+            return prediction.get(name) if isinstance(prediction, dict) else getattr(prediction, name, None)
+
+        created_at, started_at = _timestamp(field_of('created_at')), _timestamp(field_of('started_at'))
+        completed_at = _timestamp(field_of('completed_at'))
+        prediction_id = field_of('id')
+        if created_at is None or started_at is None:
+            return
+        queued_until = created + max(started_at - created_at, 0.0)
+        self.record("prediction.queue", created, queued_until, parent, prediction_id=prediction_id)
+        if completed_at is not None:
+            metrics = field_of('metrics') or {}
+            self.record("prediction.processing", queued_until, queued_until + max(completed_at - started_at, 0.0),
+                        parent, prediction_id=prediction_id, status=field_of('status'),
+                        predict_time=metrics.get('predict_time') if isinstance(metrics, dict) else None)
+
+    def _finish(self, span: Span) -> None:
+        with self._lock:
+            self._stats['finished'] += 1
+        if self._writer is not None:
+            self._writer.put(span)
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """
+        Export every span finished so far (for shutdown, CLI use and tests).
+
+        Returns:
+            True once the exporter has been handed every earlier span, False on timeout.
+        """
+        if self._writer is None:
+            return True
+        return self._writer.flush(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return span counters and the exporter in use."""
+        writer = self._writer.stats() if self._writer is not None else {'dropped': 0, 'queued': 0}
+        with self._lock:
+            return dict(self._stats, **writer,
+                        exporter=type(self.exporter).__name__ if self.exporter is not None else None)
+
+    def _export(self, batch: List[Span]) -> None:
+        try:
+            self.exporter.export(batch)
+        except Exception as e:
+            logger.warning("Could not export %d span(s) with %s: %s", len(batch), type(self.exporter).__name__, e)
+            with self._lock:
+                self._stats['export_errors'] += 1
+            return
+        with self._lock:
+            self._stats['exported'] += len(batch)
+
+
+def build_exporter(kind: str, path: str = DEFAULT_TRACE_PATH, otlp_endpoint: Optional[str] = None,
+                   service_name: str = DEFAULT_SERVICE_NAME) -> Any:
+    """
+    Build the exporter for a TRACE_EXPORTER setting.
+
+    Args:
+        kind: One of TRACE_EXPORTERS.
+        path: JSONL file for ``jsonl``.
+        otlp_endpoint: Collector URL for ``otlp``.
+        service_name: ``service.name`` reported to the collector.
+
+    Returns:
+        The exporter, or None for ``none``.
+
+    Raises:
+        ValueError: If ``kind`` is unknown, or ``otlp`` has no endpoint.
+    """
+    if kind not in TRACE_EXPORTERS:
+        raise ValueError(f"Trace exporter must be one of {', '.join(TRACE_EXPORTERS)}, got {kind!r}")
+    if kind == 'none':
+        return None
+    if kind == 'otlp':
+        if not otlp_endpoint:
+            raise ValueError("The otlp trace exporter needs an endpoint (OTEL_EXPORTER_OTLP_ENDPOINT)")
+        return OtlpSpanExporter(otlp_endpoint, service_name=service_name)
+    return JsonlSpanExporter(path)
+